@@ -84,6 +84,7 @@ _import_structure = {
         "DataCollatorForSOP",
         "DataCollatorForTokenClassification",
         "DataCollatorForWholeWordMask",
+        "DataCollatorWithPacking",
         "DataCollatorWithPadding",
         "DefaultDataCollator",
         "default_data_collator",
@@ -97,6 +98,7 @@ _import_structure = {
     "feature_extraction_sequence_utils": ["SequenceFeatureExtractor"],
     "feature_extraction_utils": ["BatchFeature", "FeatureExtractionMixin"],
     "file_utils": [],
+    "generation_streamers": ["TextIteratorStreamer", "TextStreamer"],
     "hf_argparser": ["HfArgumentParser"],
     "integrations": [
         "is_comet_available",
@@ -410,7 +412,9 @@ _import_structure = {
         "AddedToken",
         "BatchEncoding",
         "CharSpan",
+        "IncrementalDecoder",
         "PreTrainedTokenizerBase",
+        "RaggedArray",
         "SpecialTokensMixin",
         "TokenSpan",
     ],
@@ -725,6 +729,7 @@ else:
         "TextDataset",
         "TextDatasetForNextSentencePrediction",
     ]
+    _import_structure["cache_utils"] = ["PromptCache", "StaticCache", "StaticLayerCache"]
     _import_structure["deepspeed"] = []
     _import_structure["generation_beam_constraints"] = [
         "Constraint",
@@ -732,7 +737,14 @@ else:
         "DisjunctiveConstraint",
         "PhrasalConstraint",
     ]
-    _import_structure["generation_beam_search"] = ["BeamScorer", "BeamSearchScorer", "ConstrainedBeamSearchScorer"]
+    _import_structure["generation_beam_search"] = [
+        "BeamScorer",
+        "BeamSearchScorer",
+        "ConstrainedBeamSearchScorer",
+        "VectorizedBeamSearchScorer",
+    ]
+    _import_structure["generation_continuous_batching"] = ["ContinuousBatchingEngine", "GenerationRequest"]
+    _import_structure["generation_fixed_shape"] = ["FixedShapeDecodingStep"]
     _import_structure["generation_logits_process"] = [
         "ForcedBOSTokenLogitsProcessor",
         "ForcedEOSTokenLogitsProcessor",
@@ -2870,6 +2882,7 @@ if TYPE_CHECKING:
         DataCollatorForSOP,
         DataCollatorForTokenClassification,
         DataCollatorForWholeWordMask,
+        DataCollatorWithPacking,
         DataCollatorWithPadding,
         DefaultDataCollator,
         default_data_collator,
@@ -2878,6 +2891,9 @@ if TYPE_CHECKING:
 
     # Feature Extractor
     from .feature_extraction_utils import BatchFeature, FeatureExtractionMixin
+
+    # Generation
+    from .generation_streamers import TextIteratorStreamer, TextStreamer
     from .hf_argparser import HfArgumentParser
 
     # Integrations
@@ -3165,7 +3181,9 @@ if TYPE_CHECKING:
         AddedToken,
         BatchEncoding,
         CharSpan,
+        IncrementalDecoder,
         PreTrainedTokenizerBase,
+        RaggedArray,
         SpecialTokensMixin,
         TokenSpan,
     )
@@ -3417,6 +3435,7 @@ if TYPE_CHECKING:
         # Benchmarks
         from .benchmark.benchmark import PyTorchBenchmark
         from .benchmark.benchmark_args import PyTorchBenchmarkArguments
+        from .cache_utils import PromptCache, StaticCache, StaticLayerCache
         from .data.datasets import (
             GlueDataset,
             GlueDataTrainingArguments,
@@ -3434,7 +3453,14 @@ if TYPE_CHECKING:
             DisjunctiveConstraint,
             PhrasalConstraint,
         )
-        from .generation_beam_search import BeamScorer, BeamSearchScorer, ConstrainedBeamSearchScorer
+        from .generation_beam_search import (
+            BeamScorer,
+            BeamSearchScorer,
+            ConstrainedBeamSearchScorer,
+            VectorizedBeamSearchScorer,
+        )
+        from .generation_continuous_batching import ContinuousBatchingEngine, GenerationRequest
+        from .generation_fixed_shape import FixedShapeDecodingStep
         from .generation_logits_process import (
             ForcedBOSTokenLogitsProcessor,
             ForcedEOSTokenLogitsProcessor,
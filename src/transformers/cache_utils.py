@@ -0,0 +1,435 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Preallocated key/value caches for auto-regressive decoding."""
+
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import torch
+
+from .utils import logging
+
+
+logger = logging.get_logger(__name__)
+
+
+class StaticCache:
+    r"""
+    Key/value cache preallocated to `max_length` for decoder-only models.
+
+    By default, the attention layers of decoder-only models grow their cache with `torch.cat` at every decoding step,
+    which reallocates and copies the whole cache for every new token. A `StaticCache` allocates the keys and values of
+    all the layers once, with shape `(batch_size, num_heads, max_length, head_dim)`, and the attention layers write the
+    states of the new tokens in place at the current position. The layers then attend over a view of the filled part
+    of the buffers, so decoding does not allocate any new cache memory.
+
+    A `StaticCache` is passed to the model through `past_key_values` (or as `past` to
+    [`~generation_utils.GenerationMixin.generate`]), and the model returns the same object as its `past_key_values`.
+    It is only accepted by models with `supports_static_cache = True`, such as GPT-2, GPT-J, GPT-NeoX, OPT, BLOOM and
+    CodeGen. Indexing the cache gives the [`StaticLayerCache`] of a layer.
+
+    When `cache_position` is set, the cache is in fixed-shape mode, as used by [`FixedShapeDecodingStep`]: the states of
+    the new tokens are written at the positions given by `cache_position`, and the attention layers attend over all
+    the `max_length` positions of the buffers, the positions that are not written yet being masked by the attention
+    mask. The shapes seen by the layers then do not depend on the current length.
+
+    Args:
+        num_layers (`int`):
+            The number of attention layers of the model.
+        batch_size (`int`):
+            The batch size the cache is allocated for. For beam search, this is `batch_size * num_beams`.
+        max_length (`int`):
+            The maximum number of positions (prompt included) the cache can hold.
+        num_heads (`int`):
+            The number of attention heads.
+        head_dim (`int`):
+            The dimension of each attention head.
+        device (`torch.device`, *optional*):
+            The device on which to allocate the cache.
+        dtype (`torch.dtype`, *optional*, defaults to `torch.float32`):
+            The dtype of the cache. Should match the dtype of the model.
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoTokenizer, AutoModelForCausalLM, StaticCache
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+
+    >>> input_ids = tokenizer("Today I believe we can finally", return_tensors="pt").input_ids
+    >>> past = StaticCache.from_model(model, batch_size=1, max_length=30)
+    >>> outputs = model.generate(input_ids, max_length=30, past=past)
+    ```
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        batch_size: int,
+        max_length: int,
+        num_heads: int,
+        head_dim: int,
+        device: Optional[Union[torch.device, str]] = None,
+        dtype: Optional[torch.dtype] = None,
+    ):
+        self.batch_size = batch_size
+        self.max_length = max_length
+        dtype = dtype if dtype is not None else torch.float32
+        cache_shape = (batch_size, num_heads, max_length, head_dim)
+        self.key_cache: List[torch.Tensor] = [
+            torch.zeros(cache_shape, dtype=dtype, device=device) for _ in range(num_layers)
+        ]
+        self.value_cache: List[torch.Tensor] = [
+            torch.zeros(cache_shape, dtype=dtype, device=device) for _ in range(num_layers)
+        ]
+        self._seq_lengths = [0] * num_layers
+        self._layers = tuple(StaticLayerCache(self, layer_idx) for layer_idx in range(num_layers))
+        # the positions at which the new states are written in fixed-shape mode
+        self.cache_position: Optional[torch.LongTensor] = None
+
+    @classmethod
+    def from_model(
+        cls,
+        model,
+        batch_size: int,
+        max_length: int,
+        device: Optional[Union[torch.device, str]] = None,
+        dtype: Optional[torch.dtype] = None,
+    ) -> "StaticCache":
+        """
+        Instantiates a [`StaticCache`] matching the attention layers of `model`.
+
+        Args:
+            model ([`PreTrainedModel`]):
+                A model with `supports_static_cache = True`.
+            batch_size (`int`):
+                The batch size the cache is allocated for.
+            max_length (`int`):
+                The maximum number of positions the cache can hold.
+            device (`torch.device`, *optional*):
+                The device on which to allocate the cache. Defaults to the device of the model.
+            dtype (`torch.dtype`, *optional*):
+                The dtype of the cache. Defaults to the dtype of the model.
+        """
+        if not getattr(model, "supports_static_cache", False):
+            raise ValueError(f"{model.__class__.__name__} does not support `StaticCache` yet.")
+        config = model.config
+        return cls(
+            num_layers=config.num_hidden_layers,
+            batch_size=batch_size,
+            max_length=max_length,
+            num_heads=config.num_attention_heads,
+            head_dim=config.hidden_size // config.num_attention_heads,
+            device=device if device is not None else model.device,
+            dtype=dtype if dtype is not None else model.dtype,
+        )
+
+    def __len__(self) -> int:
+        return len(self._layers)
+
+    def __getitem__(self, layer_idx: int) -> "StaticLayerCache":
+        return self._layers[layer_idx]
+
+    def __iter__(self) -> Iterator["StaticLayerCache"]:
+        return iter(self._layers)
+
+    def __bool__(self) -> bool:
+        # an empty cache behaves like `past=None` in `prepare_inputs_for_generation`, so that the full prompt is fed
+        return self.get_seq_length() > 0
+
+    def get_seq_length(self, layer_idx: int = 0) -> int:
+        """
+        Returns the number of positions already written in the cache of layer `layer_idx`. In fixed-shape mode, returns
+        the number of positions attended before the new ones, which is always `max_length - len(cache_position)`.
+        """
+        if self.cache_position is not None:
+            return self.max_length - self.cache_position.shape[0]
+        return self._seq_lengths[layer_idx]
+
+    def update(
+        self, key_states: torch.Tensor, value_states: torch.Tensor, layer_idx: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Writes the key and value states of the new tokens in the cache of layer `layer_idx`.
+
+        Args:
+            key_states (`torch.Tensor` of shape `(batch_size, num_heads, new_seq_length, head_dim)`):
+                The key states of the new tokens.
+            value_states (`torch.Tensor` of shape `(batch_size, num_heads, new_seq_length, head_dim)`):
+                The value states of the new tokens.
+            layer_idx (`int`):
+                The index of the layer.
+
+        Return:
+            `Tuple[torch.Tensor, torch.Tensor]`: Views on the keys and values of all the positions written so far,
+            of shape `(batch_size, num_heads, seq_length, head_dim)`. In fixed-shape mode, the whole buffers of shape
+            `(batch_size, num_heads, max_length, head_dim)`.
+        """
+        if self.cache_position is not None:
+            key_cache, value_cache = self.key_cache[layer_idx], self.value_cache[layer_idx]
+            key_cache.index_copy_(2, self.cache_position, key_states)
+            value_cache.index_copy_(2, self.cache_position, value_states)
+            return key_cache, value_cache
+
+        start = self._seq_lengths[layer_idx]
+        end = start + key_states.shape[-2]
+        if end > self.max_length:
+            raise ValueError(
+                f"The static cache was allocated for {self.max_length} positions, but {end} positions are needed. "
+                "Allocate the cache with a larger `max_length`."
+            )
+        if key_states.shape[0] != self.batch_size:
+            raise ValueError(
+                f"The static cache was allocated for a batch size of {self.batch_size}, but got key states for a "
+                f"batch size of {key_states.shape[0]}."
+            )
+
+        key_cache, value_cache = self.key_cache[layer_idx], self.value_cache[layer_idx]
+        key_cache[:, :, start:end] = key_states
+        value_cache[:, :, start:end] = value_states
+        self._seq_lengths[layer_idx] = end
+        return key_cache[:, :, :end], value_cache[:, :, :end]
+
+    def reorder_cache(self, beam_idx: torch.LongTensor) -> "StaticCache":
+        """
+        Reorders the batch dimension of the cache in place, as needed by [`~PreTrainedModel.beam_search`] or
+        [`~PreTrainedModel.beam_sample`].
+        """
+        for layer_idx in range(len(self)):
+            device = self.key_cache[layer_idx].device
+            end = self._seq_lengths[layer_idx]
+            for cache in (self.key_cache[layer_idx], self.value_cache[layer_idx]):
+                cache[:, :, :end] = cache[:, :, :end].index_select(0, beam_idx.to(device))
+        return self
+
+    def crop(self, max_length: int) -> "StaticCache":
+        """
+        Discards the positions after the first `max_length` ones, as needed by
+        [`~generation_utils.GenerationMixin.assisted_decoding`] to drop the cache of rejected candidate tokens.
+        """
+        self._seq_lengths = [min(seq_length, max_length) for seq_length in self._seq_lengths]
+        return self
+
+    def reset(self):
+        """Marks the cache as empty so that it can be reused for a new generation, without reallocating it."""
+        self._seq_lengths = [0] * len(self)
+        self.cache_position = None
+
+
+class StaticLayerCache:
+    """
+    The part of a [`StaticCache`] used by a single attention layer, as received by the layer in place of its
+    `layer_past` tuple.
+    """
+
+    def __init__(self, cache: StaticCache, layer_idx: int):
+        self.cache = cache
+        self.layer_idx = layer_idx
+
+    def get_seq_length(self) -> int:
+        return self.cache.get_seq_length(self.layer_idx)
+
+    def update(self, key_states: torch.Tensor, value_states: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """See [`StaticCache.update`]."""
+        return self.cache.update(key_states, value_states, self.layer_idx)
+
+
+class PromptCache:
+    r"""
+    Least-recently-used cache of the keys and values computed for prompts, shared across calls to
+    [`~generation_utils.GenerationMixin.generate`].
+
+    When many prompts start with the same tokens, such as a long system prompt, the forward pass on these tokens is
+    the same for every call. A `PromptCache` passed as `prompt_cache` to [`~generation_utils.GenerationMixin.generate`]
+    stores the keys and values of the prompts, and the next prompts starting with a stored prefix only run the model on
+    the tokens after it.
+
+    Prompts are split into blocks of `block_size` tokens, and each stored prompt is indexed by the hash of every prefix
+    made of whole blocks. A lookup finds the longest indexed prefix of the new prompt, then extends the match token by
+    token with the stored prompts sharing it, so prefixes are shared down to the token. Entries are evicted in
+    least-recently-used order to keep the size of the stored keys and values under `max_cache_bytes`.
+
+    A `PromptCache` stores the keys and values of a single model, on the device of the model. It is only supported by
+    models with `supports_prompt_cache = True`, such as GPT-2, GPT-J, OPT, BLOOM and CodeGen.
+
+    Args:
+        max_cache_bytes (`int`):
+            The maximum size in bytes of the stored keys and values.
+        block_size (`int`, *optional*, defaults to 16):
+            The number of tokens of the blocks used to index the prompts. Prompts shorter than a block are not stored.
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoTokenizer, AutoModelForCausalLM, PromptCache
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+    >>> prompt_cache = PromptCache(max_cache_bytes=2**30)
+
+    >>> system_prompt = "You are a helpful assistant answering questions about the solar system. "
+    >>> for question in ["How far is Mars?", "How hot is Venus?"]:
+    ...     input_ids = tokenizer(system_prompt + question, return_tensors="pt").input_ids
+    ...     outputs = model.generate(input_ids, max_new_tokens=20, prompt_cache=prompt_cache)
+    ```
+    """
+
+    def __init__(self, max_cache_bytes: int, block_size: int = 16):
+        if block_size < 1:
+            raise ValueError(f"`block_size` has to be a strictly positive integer, but is {block_size}.")
+        self.max_cache_bytes = max_cache_bytes
+        self.block_size = block_size
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # the stored prompts in least-recently-used order, and the prompts sharing each block prefix
+        self._entries: "OrderedDict[Tuple[int, ...], _PromptCacheEntry]" = OrderedDict()
+        self._prefix_index: Dict[int, Dict[Tuple[int, ...], None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _prefix_hashes(self, tokens: Tuple[int, ...]) -> List[int]:
+        # each hash chains the hash of the previous blocks, so that hashing all the prefixes is linear in their length
+        hashes = []
+        prefix_hash = 0
+        for start in range(0, len(tokens) - self.block_size + 1, self.block_size):
+            prefix_hash = hash((prefix_hash, tokens[start : start + self.block_size]))
+            hashes.append(prefix_hash)
+        return hashes
+
+    def get(self, tokens: Tuple[int, ...]) -> Tuple[int, Optional[Tuple[Tuple[torch.Tensor]]]]:
+        """
+        Looks up the longest stored prefix of `tokens`.
+
+        Args:
+            tokens (`Tuple[int]`):
+                The token ids of a prompt.
+
+        Return:
+            `Tuple[int, Optional[Tuple[Tuple[torch.Tensor]]]]`: The length of the longest stored prefix of `tokens`,
+            and the keys and values of this prefix, with a batch size of 1, in the format of the `past_key_values` of
+            the model. `(0, None)` if no prefix of `tokens` is stored.
+        """
+        best_length, best_entry = 0, None
+        prefix_hashes = self._prefix_hashes(tokens)
+        for num_blocks in range(len(prefix_hashes), 0, -1):
+            keys = self._prefix_index.get(prefix_hashes[num_blocks - 1])
+            if keys is None:
+                continue
+            block_length = num_blocks * self.block_size
+            for key in keys:
+                # compares the tokens, as different prefixes can have the same hash
+                length = _common_prefix_length(key, tokens)
+                if length >= block_length and length > best_length:
+                    best_length, best_entry = length, self._entries[key]
+            if best_entry is not None:
+                break
+
+        if best_entry is None:
+            self.misses += 1
+            return 0, None
+        self.hits += 1
+        self._entries.move_to_end(best_entry.tokens)
+        return best_length, best_entry.narrow(best_length)
+
+    def put(self, tokens: Tuple[int, ...], past_key_values: Tuple[Tuple[torch.Tensor]], seq_dim: int = -2):
+        """
+        Stores the keys and values of a prompt, evicting the least recently used prompts if needed.
+
+        Args:
+            tokens (`Tuple[int]`):
+                The token ids of the prompt.
+            past_key_values (`Tuple[Tuple[torch.Tensor]]`):
+                The keys and values of the prompt with a batch size of 1, as returned by the model. They are copied.
+            seq_dim (`int`, *optional*, defaults to -2):
+                The sequence dimension of the tensors of `past_key_values`.
+        """
+        if len(tokens) < self.block_size:
+            return
+        if tokens in self._entries:
+            self._entries.move_to_end(tokens)
+            return
+
+        past_key_values = tuple(
+            tuple(past_state.narrow(seq_dim, 0, len(tokens)).clone() for past_state in layer_past)
+            for layer_past in past_key_values
+        )
+        entry = _PromptCacheEntry(tokens, past_key_values, seq_dim, self._prefix_hashes(tokens))
+        if entry.nbytes > self.max_cache_bytes:
+            return
+
+        # the stored prefixes of the prompt are not needed anymore
+        for prefix_hash in entry.prefix_hashes:
+            for key in list(self._prefix_index.get(prefix_hash, ())):
+                if len(key) <= len(tokens) and tokens[: len(key)] == key:
+                    self._remove(key)
+        while self.cache_bytes + entry.nbytes > self.max_cache_bytes:
+            self._remove(next(iter(self._entries)))
+
+        self._entries[tokens] = entry
+        self.cache_bytes += entry.nbytes
+        for prefix_hash in entry.prefix_hashes:
+            self._prefix_index.setdefault(prefix_hash, {})[tokens] = None
+
+    def _remove(self, tokens: Tuple[int, ...]):
+        entry = self._entries.pop(tokens)
+        self.cache_bytes -= entry.nbytes
+        for prefix_hash in entry.prefix_hashes:
+            keys = self._prefix_index[prefix_hash]
+            del keys[tokens]
+            if len(keys) == 0:
+                del self._prefix_index[prefix_hash]
+
+    def clear(self):
+        """Removes all the stored prompts."""
+        self._entries.clear()
+        self._prefix_index.clear()
+        self.cache_bytes = 0
+
+
+class _PromptCacheEntry:
+    def __init__(
+        self,
+        tokens: Tuple[int, ...],
+        past_key_values: Tuple[Tuple[torch.Tensor]],
+        seq_dim: int,
+        prefix_hashes: List[int],
+    ):
+        self.tokens = tokens
+        self.past_key_values = past_key_values
+        self.seq_dim = seq_dim
+        self.prefix_hashes = prefix_hashes
+        self.nbytes = sum(
+            past_state.numel() * past_state.element_size()
+            for layer_past in past_key_values
+            for past_state in layer_past
+        )
+
+    def narrow(self, length: int) -> Tuple[Tuple[torch.Tensor]]:
+        return tuple(
+            tuple(past_state.narrow(self.seq_dim, 0, length) for past_state in layer_past)
+            for layer_past in self.past_key_values
+        )
+
+
+def _common_prefix_length(tokens: Tuple[int, ...], other_tokens: Tuple[int, ...]) -> int:
+    length = 0
+    for token, other_token in zip(tokens, other_tokens):
+        if token != other_token:
+            break
+        length += 1
+    return length
@@ -23,6 +23,7 @@ from .data_collator import (
     DataCollatorForSOP,
     DataCollatorForTokenClassification,
     DataCollatorForWholeWordMask,
+    DataCollatorWithPacking,
     DataCollatorWithPadding,
     DefaultDataCollator,
     default_data_collator,
@@ -12,7 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import random
 import warnings
 from collections.abc import Mapping
 from dataclasses import dataclass
@@ -214,6 +213,10 @@ class DataCollatorWithPadding:
     """
     Data collator that will dynamically pad the inputs received.
 
+    The features can be a list of examples, or a whole batch such as a slice of a [`BatchEncoding`] converted with
+    [`~BatchEncoding.to_columnar`]. Examples holding NumPy arrays, as well as batches of [`RaggedArray`], are padded
+    at once in preallocated arrays, which are converted to PyTorch tensors without a copy.
+
     Args:
         tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
             The tokenizer used for encoding the data.
@@ -243,7 +246,7 @@ class DataCollatorWithPadding:
     pad_to_multiple_of: Optional[int] = None
     return_tensors: str = "pt"
 
-    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def __call__(self, features: Union[List[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
         batch = self.tokenizer.pad(
             features,
             padding=self.padding,
@@ -510,6 +513,19 @@ def tolist(x):
     return x.tolist()
 
 
+def _special_tokens_mask(tokenizer, input_ids):
+    """
+    Computes the special tokens mask of a batch of `input_ids` as a boolean numpy array, only asking `tokenizer` about
+    the distinct ids of the batch instead of every token of every sequence.
+    """
+    import numpy as np
+
+    input_ids = np.asarray(input_ids)
+    unique_ids, inverse = np.unique(input_ids, return_inverse=True)
+    unique_mask = tokenizer.get_special_tokens_mask(unique_ids.tolist(), already_has_special_tokens=True)
+    return np.array(unique_mask, dtype=bool)[inverse].reshape(input_ids.shape)
+
+
 @dataclass
 class DataCollatorForSeq2Seq:
     """
@@ -603,6 +619,166 @@ class DataCollatorForSeq2Seq:
         return features
 
 
+@dataclass
+class DataCollatorWithPacking(DataCollatorMixin):
+    """
+    Data collator that packs several examples in each sequence of `max_length` tokens, instead of padding each example
+    to the longest one. The examples of the batch are placed in as few sequences as possible, the longest ones first,
+    each in the first sequence where it fits, so that only the end of each sequence is padded. The collator thus
+    returns fewer sequences than it receives examples.
+
+    Packed examples do not attend to each other: the collator returns, along with the inputs, the `document_ids` of the
+    tokens (the index of their example in the sequence, starting at 1, with 0 for padding), from which models such as
+    BERT, GPT-2, GPT-NeoX, OPT and T5 build a block-diagonal attention mask, as well as `position_ids` starting at 0 for
+    each example. The examples without `labels` use their `input_ids` as labels. When the labels of an example are its
+    `input_ids`, as in causal language modeling, its first label is ignored, as the model would otherwise predict it
+    from the last token of the previous example. The labels must hold one value per input token, as for language
+    modeling or token classification: a single label per example, as for sequence classification, cannot be packed.
+
+    With `max_target_length`, the examples are packed for sequence-to-sequence models: their `labels` are packed in
+    sequences of `max_target_length` tokens alongside their inputs, and the document indices of the labels are returned
+    as `decoder_document_ids`. No `position_ids` are returned, as these models do not shift the labels.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizer`] or [`PreTrainedTokenizerFast`]):
+            The tokenizer used for encoding the data.
+        max_length (`int`):
+            The length of the packed sequences. Longer examples are truncated.
+        max_target_length (`int`, *optional*):
+            The length of the packed label sequences of sequence-to-sequence models. Longer labels are truncated.
+        label_pad_token_id (`int`, *optional*, defaults to -100):
+            The id to use when padding the labels (-100 will be automatically ignored by PyTorch loss functions).
+        mask_first_label (`bool`, *optional*):
+            Whether or not to ignore the first label of each example. Defaults to ignoring it only for the examples
+            whose labels are their `input_ids`. Ignored with `max_target_length`.
+        return_position_ids (`bool`, *optional*, defaults to `True`):
+            Whether or not to return the `position_ids` of the tokens. Ignored with `max_target_length`.
+        return_tensors (`str`):
+            The type of Tensor to return. Allowable values are "np", "pt" and "tf".
+
+    Example:
+
+    ```python
+    >>> from transformers import AutoTokenizer, DataCollatorWithPacking
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> data_collator = DataCollatorWithPacking(tokenizer, max_length=16)
+    >>> batch = data_collator([tokenizer("Hello world"), tokenizer("How are you?"), tokenizer("Fine")])
+    >>> batch["input_ids"].shape
+    torch.Size([1, 16])
+
+    >>> batch["document_ids"]
+    tensor([[1, 1, 1, 1, 2, 2, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0]])
+    ```
+    """
+
+    tokenizer: PreTrainedTokenizerBase
+    max_length: int
+    max_target_length: Optional[int] = None
+    label_pad_token_id: int = -100
+    mask_first_label: Optional[bool] = None
+    return_position_ids: bool = True
+    return_tensors: str = "pt"
+
+    def _pack(self, lengths: List[int], target_lengths: Optional[List[int]] = None) -> List[List[int]]:
+        # First-fit decreasing: each example goes in the first sequence with enough room left
+        sequences = []
+        rooms = []
+        for index in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+            needed = (lengths[index], target_lengths[index] if target_lengths is not None else 0)
+            for sequence, room in zip(sequences, rooms):
+                if room[0] >= needed[0] and room[1] >= needed[1]:
+                    sequence.append(index)
+                    room[0] -= needed[0]
+                    room[1] -= needed[1]
+                    break
+            else:
+                sequences.append([index])
+                rooms.append([self.max_length - needed[0], (self.max_target_length or 0) - needed[1]])
+        return sequences
+
+    def numpy_call(self, features):
+        import numpy as np
+
+        is_seq2seq = self.max_target_length is not None
+        if is_seq2seq and "labels" not in features[0]:
+            raise ValueError("Packing examples for sequence-to-sequence models requires their `labels`.")
+        # Only labels with one value per input token can be packed, not one label per example (sequence classification)
+        label_name = "label" if "label" in features[0] else "label_ids" if "label_ids" in features[0] else None
+        if label_name is None and not is_seq2seq and "labels" in features[0]:
+            if any(
+                not hasattr(feature["labels"], "__len__") or len(feature["labels"]) != len(feature["input_ids"])
+                for feature in features
+            ):
+                label_name = "labels"
+        if label_name is not None:
+            raise ValueError(
+                f"Cannot pack `{label_name}`: packing examples requires `labels` holding one value per input token, as"
+                " for language modeling or token classification."
+            )
+
+        lengths = [min(len(feature["input_ids"]), self.max_length) for feature in features]
+        target_lengths = None
+        if is_seq2seq:
+            target_lengths = [min(len(feature["labels"]), self.max_target_length) for feature in features]
+        sequences = self._pack(lengths, target_lengths)
+
+        # The other inputs, such as `token_type_ids`, are packed like the `input_ids`, and the attention mask rebuilt
+        input_names = [name for name in features[0].keys() if name not in ("attention_mask", "labels")]
+        shape = (len(sequences), self.max_length)
+        target_shape = (len(sequences), self.max_target_length) if is_seq2seq else shape
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else 0
+        batch = {name: np.zeros(shape, dtype=np.int64) for name in input_names}
+        batch["input_ids"].fill(pad_token_id)
+        batch["attention_mask"] = np.zeros(shape, dtype=np.int64)
+        batch["document_ids"] = np.zeros(shape, dtype=np.int64)
+        if self.return_position_ids and not is_seq2seq:
+            batch["position_ids"] = np.zeros(shape, dtype=np.int64)
+        batch["labels"] = np.full(target_shape, self.label_pad_token_id, dtype=np.int64)
+        if is_seq2seq:
+            batch["decoder_document_ids"] = np.zeros(target_shape, dtype=np.int64)
+
+        for row, indices in enumerate(sequences):
+            start = target_start = 0
+            for document_id, index in enumerate(indices, start=1):
+                feature = features[index]
+                end = start + lengths[index]
+                for name in input_names:
+                    if not hasattr(feature[name], "__len__") or len(feature[name]) != len(feature["input_ids"]):
+                        raise ValueError(f"Cannot pack `{name}`, which does not hold one value per input token.")
+                    batch[name][row, start:end] = feature[name][: lengths[index]]
+                batch["attention_mask"][row, start:end] = 1
+                batch["document_ids"][row, start:end] = document_id
+                if "position_ids" in batch:
+                    batch["position_ids"][row, start:end] = np.arange(lengths[index])
+
+                if is_seq2seq:
+                    target_end = target_start + target_lengths[index]
+                    batch["labels"][row, target_start:target_end] = feature["labels"][: target_lengths[index]]
+                    batch["decoder_document_ids"][row, target_start:target_end] = document_id
+                    target_start = target_end
+                else:
+                    labels = feature["labels"] if "labels" in feature else feature["input_ids"]
+                    batch["labels"][row, start:end] = labels[: lengths[index]]
+                    mask_first_label = self.mask_first_label
+                    if mask_first_label is None:
+                        mask_first_label = list(labels) == list(feature["input_ids"])
+                    if mask_first_label:
+                        batch["labels"][row, start] = self.label_pad_token_id
+                start = end
+        return batch
+
+    def torch_call(self, features):
+        import torch
+
+        return {name: torch.from_numpy(value) for name, value in self.numpy_call(features).items()}
+
+    def tf_call(self, features):
+        import tensorflow as tf
+
+        return {name: tf.convert_to_tensor(value, dtype=tf.int64) for name, value in self.numpy_call(features).items()}
+
+
 @dataclass
 class DataCollatorForLanguageModeling(DataCollatorMixin):
     """
@@ -699,12 +875,7 @@ class DataCollatorForLanguageModeling(DataCollatorMixin):
         special_tokens_mask = batch.pop("special_tokens_mask", None)
         if self.mlm:
             if special_tokens_mask is None:
-                special_tokens_mask = [
-                    self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True)
-                    for val in batch["input_ids"].numpy().tolist()
-                ]
-                # Cannot directly create as bool
-                special_tokens_mask = tf.cast(tf.convert_to_tensor(special_tokens_mask, dtype=tf.int64), tf.bool)
+                special_tokens_mask = tf.convert_to_tensor(_special_tokens_mask(self.tokenizer, batch["input_ids"]))
             else:
                 special_tokens_mask = tf.cast(special_tokens_mask, tf.bool)
             batch["input_ids"], batch["labels"] = self.tf_mask_tokens(
@@ -755,10 +926,7 @@ class DataCollatorForLanguageModeling(DataCollatorMixin):
         # We sample a few tokens in each sequence for MLM training (with probability `self.mlm_probability`)
         probability_matrix = torch.full(labels.shape, self.mlm_probability)
         if special_tokens_mask is None:
-            special_tokens_mask = [
-                self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels.tolist()
-            ]
-            special_tokens_mask = torch.tensor(special_tokens_mask, dtype=torch.bool)
+            special_tokens_mask = torch.from_numpy(_special_tokens_mask(self.tokenizer, labels))
         else:
             special_tokens_mask = special_tokens_mask.bool()
 
@@ -812,26 +980,23 @@ class DataCollatorForLanguageModeling(DataCollatorMixin):
         # We sample a few tokens in each sequence for MLM training (with probability `self.mlm_probability`)
         probability_matrix = np.full(labels.shape, self.mlm_probability)
         if special_tokens_mask is None:
-            special_tokens_mask = [
-                self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels.tolist()
-            ]
-            special_tokens_mask = np.array(special_tokens_mask, dtype=np.bool)
+            special_tokens_mask = _special_tokens_mask(self.tokenizer, labels)
         else:
-            special_tokens_mask = special_tokens_mask.astype(np.bool)
+            special_tokens_mask = special_tokens_mask.astype(bool)
 
         probability_matrix[special_tokens_mask] = 0
         # Numpy doesn't have bernoulli, so we use a binomial with 1 trial
-        masked_indices = np.random.binomial(1, probability_matrix, size=probability_matrix.shape).astype(np.bool)
+        masked_indices = np.random.binomial(1, probability_matrix, size=probability_matrix.shape).astype(bool)
         labels[~masked_indices] = -100  # We only compute loss on masked tokens
 
         # 80% of the time, we replace masked input tokens with tokenizer.mask_token ([MASK])
-        indices_replaced = np.random.binomial(1, 0.8, size=labels.shape).astype(np.bool) & masked_indices
+        indices_replaced = np.random.binomial(1, 0.8, size=labels.shape).astype(bool) & masked_indices
         inputs[indices_replaced] = self.tokenizer.mask_token_id
 
         # 10% of the time, we replace masked input tokens with random word
         # indices_random = torch.bernoulli(torch.full(labels.shape, 0.5)).bool() & masked_indices & ~indices_replaced
         indices_random = (
-            np.random.binomial(1, 0.5, size=labels.shape).astype(np.bool) & masked_indices & ~indices_replaced
+            np.random.binomial(1, 0.5, size=labels.shape).astype(bool) & masked_indices & ~indices_replaced
         )
         random_words = np.random.randint(
             low=0, high=len(self.tokenizer), size=np.count_nonzero(indices_random), dtype=np.int64
@@ -859,6 +1024,8 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
     </Tip>"""
 
     def torch_call(self, examples: List[Union[List[int], Any, Dict[str, Any]]]) -> Dict[str, Any]:
+        import torch
+
         if isinstance(examples[0], Mapping):
             input_ids = [e["input_ids"] for e in examples]
         else:
@@ -866,27 +1033,13 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
             examples = [{"input_ids": e} for e in examples]
 
         batch_input = _torch_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
-
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
-        batch_mask = _torch_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
+        batch_mask = torch.from_numpy(self._whole_word_mask(batch_input, examples))
         inputs, labels = self.torch_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
 
     def tf_call(self, examples: List[Union[List[int], Any, Dict[str, Any]]]) -> Dict[str, Any]:
+        import tensorflow as tf
+
         if isinstance(examples[0], Mapping):
             input_ids = [e["input_ids"] for e in examples]
         else:
@@ -894,23 +1047,7 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
             examples = [{"input_ids": e} for e in examples]
 
         batch_input = _tf_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
-
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
-        batch_mask = _tf_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
+        batch_mask = tf.convert_to_tensor(self._whole_word_mask(batch_input, examples))
         inputs, labels = self.tf_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
 
@@ -922,72 +1059,87 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
             examples = [{"input_ids": e} for e in examples]
 
         batch_input = _numpy_collate_batch(input_ids, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
-
-        mask_labels = []
-        for e in examples:
-            ref_tokens = []
-            for id in tolist(e["input_ids"]):
-                token = self.tokenizer._convert_id_to_token(id)
-                ref_tokens.append(token)
-
-            # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
-            if "chinese_ref" in e:
-                ref_pos = tolist(e["chinese_ref"])
-                len_seq = len(e["input_ids"])
-                for i in range(len_seq):
-                    if i in ref_pos:
-                        ref_tokens[i] = "##" + ref_tokens[i]
-            mask_labels.append(self._whole_word_mask(ref_tokens))
-        batch_mask = _numpy_collate_batch(mask_labels, self.tokenizer, pad_to_multiple_of=self.pad_to_multiple_of)
+        batch_mask = self._whole_word_mask(batch_input, examples)
         inputs, labels = self.numpy_mask_tokens(batch_input, batch_mask)
         return {"input_ids": inputs, "labels": labels}
 
-    def _whole_word_mask(self, input_tokens: List[str], max_predictions=512):
+    def _subword_table(self):
+        """
+        Boolean table telling, for each id of the vocabulary, if the token continues the previous word (its string
+        starts with *##*). It is built once, and again if tokens are added to the tokenizer.
+        """
+        import numpy as np
+
+        if getattr(self, "_subword_ids", None) is None or len(self._subword_ids) < len(self.tokenizer):
+            vocab = self.tokenizer.get_vocab()
+            self._subword_ids = np.zeros(max(len(self.tokenizer), max(vocab.values()) + 1), dtype=bool)
+            for token, index in vocab.items():
+                if token.startswith("##"):
+                    self._subword_ids[index] = True
+        return self._subword_ids
+
+    def _whole_word_mask(self, input_ids: Any, examples: List[Dict[str, Any]], max_predictions=512):
         """
-        Get 0/1 labels for masked tokens with whole word mask proxy
+        Get 0/1 labels for masked tokens with whole word mask proxy, for a whole batch of padded `input_ids` at once.
+        The words of each sequence are drawn in a random order and masked as long as the number of masked tokens stays
+        below `mlm_probability` times the length of the sequence, the words that would exceed it being skipped.
         """
+        import numpy as np
+
         if not isinstance(self.tokenizer, (BertTokenizer, BertTokenizerFast)):
             warnings.warn(
                 "DataCollatorForWholeWordMask is only suitable for BertTokenizer-like tokenizers. "
                 "Please refer to the documentation for more information."
             )
 
-        cand_indexes = []
-        for i, token in enumerate(input_tokens):
-            if token == "[CLS]" or token == "[SEP]":
-                continue
-
-            if len(cand_indexes) >= 1 and token.startswith("##"):
-                cand_indexes[-1].append(i)
-            else:
-                cand_indexes.append([i])
-
-        random.shuffle(cand_indexes)
-        num_to_predict = min(max_predictions, max(1, int(round(len(input_tokens) * self.mlm_probability))))
-        masked_lms = []
-        covered_indexes = set()
-        for index_set in cand_indexes:
-            if len(masked_lms) >= num_to_predict:
+        input_ids = np.asarray(input_ids)
+        batch_size, seq_length = input_ids.shape
+        lengths = np.array([len(e["input_ids"]) for e in examples])
+        offsets = np.zeros_like(lengths) if self.tokenizer.padding_side == "right" else seq_length - lengths
+        positions = np.arange(seq_length)[None, :] - offsets[:, None]
+        special_tokens_mask = _special_tokens_mask(self.tokenizer, input_ids)
+        candidates = (positions >= 0) & (positions < lengths[:, None]) & ~special_tokens_mask
+
+        subword_table = self._subword_table()
+        subwords = subword_table[np.clip(input_ids, 0, len(subword_table) - 1)]
+        # For Chinese tokens, we need extra inf to mark sub-word, e.g [喜,欢]-> [喜，##欢]
+        for i, e in enumerate(examples):
+            if "chinese_ref" in e:
+                subwords[i, np.array(tolist(e["chinese_ref"]), dtype=np.int64) + offsets[i]] = True
+
+        # A sub-word continues the previous word of the sequence, if there is one
+        word_starts = candidates & (~subwords | (np.cumsum(candidates, axis=1) == 1))
+        word_index = np.maximum(np.cumsum(word_starts, axis=1) - 1, 0)
+        num_words = word_starts.sum(axis=1).max()
+        if num_words == 0:
+            return np.zeros(input_ids.shape, dtype=np.int64)
+        word_lengths = np.zeros((batch_size, num_words), dtype=np.int64)
+        rows = np.broadcast_to(np.arange(batch_size)[:, None], input_ids.shape)
+        np.add.at(word_lengths, (rows[candidates], word_index[candidates]), 1)
+
+        # Go through the words of each sequence in a random order
+        order = np.argsort(np.random.random_sample(word_lengths.shape), axis=1)
+        ordered_lengths = np.take_along_axis(word_lengths, order, axis=1)
+        num_to_predict = np.minimum(max_predictions, np.maximum(1, np.round(lengths * self.mlm_probability)))
+        remaining = num_to_predict.astype(np.int64)
+        undecided = ordered_lengths > 0
+        selected = np.zeros_like(undecided)
+        while True:
+            # If adding a whole-word mask would exceed the maximum number of predictions, then just skip this
+            # candidate. As the number of predictions left only decreases, it can't be selected later on.
+            undecided &= ordered_lengths <= remaining[:, None]
+            if not undecided.any():
                 break
-            # If adding a whole-word mask would exceed the maximum number of
-            # predictions, then just skip this candidate.
-            if len(masked_lms) + len(index_set) > num_to_predict:
-                continue
-            is_any_index_covered = False
-            for index in index_set:
-                if index in covered_indexes:
-                    is_any_index_covered = True
-                    break
-            if is_any_index_covered:
-                continue
-            for index in index_set:
-                covered_indexes.add(index)
-                masked_lms.append(index)
+            # Select the next words in order, up to the first one that doesn't fit
+            accepted = undecided & (np.cumsum(ordered_lengths * undecided, axis=1) <= remaining[:, None])
+            selected |= accepted
+            remaining -= (ordered_lengths * accepted).sum(axis=1)
+            undecided &= ~accepted
 
-        if len(covered_indexes) != len(masked_lms):
-            raise ValueError("Length of covered_indexes is not equal to length of masked_lms.")
-        mask_labels = [1 if i in covered_indexes else 0 for i in range(len(input_tokens))]
-        return mask_labels
+        selected_words = np.zeros_like(selected)
+        np.put_along_axis(selected_words, order, selected, axis=1)
+        mask_labels = candidates & np.take_along_axis(selected_words, word_index, axis=1)
+        return mask_labels.astype(np.int64)
 
     def torch_mask_tokens(self, inputs: Any, mask_labels: Any) -> Tuple[Any, Any]:
         """
@@ -1006,10 +1158,8 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
 
         probability_matrix = mask_labels
 
-        special_tokens_mask = [
-            self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels.tolist()
-        ]
-        probability_matrix.masked_fill_(torch.tensor(special_tokens_mask, dtype=torch.bool), value=0.0)
+        special_tokens_mask = torch.from_numpy(_special_tokens_mask(self.tokenizer, labels))
+        probability_matrix.masked_fill_(special_tokens_mask, value=0.0)
         if self.tokenizer._pad_token is not None:
             padding_mask = labels.eq(self.tokenizer.pad_token_id)
             probability_matrix.masked_fill_(padding_mask, value=0.0)
@@ -1047,10 +1197,8 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
 
         masked_indices = tf.cast(mask_labels, tf.bool)
 
-        special_tokens_mask = [
-            self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels
-        ]
-        masked_indices = masked_indices & ~tf.cast(special_tokens_mask, dtype=tf.bool)
+        special_tokens_mask = tf.convert_to_tensor(_special_tokens_mask(self.tokenizer, labels))
+        masked_indices = masked_indices & ~special_tokens_mask
         if self.tokenizer._pad_token is not None:
             padding_mask = inputs == self.tokenizer.pad_token_id
             masked_indices = masked_indices & ~padding_mask
@@ -1086,12 +1234,10 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
         labels = np.copy(inputs)
         # We sample a few tokens in each sequence for masked-LM training (with probability args.mlm_probability defaults to 0.15 in Bert/RoBERTa)
 
-        masked_indices = mask_labels.astype(np.bool)
+        masked_indices = mask_labels.astype(bool)
 
-        special_tokens_mask = [
-            self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels.tolist()
-        ]
-        masked_indices[np.array(special_tokens_mask, dtype=np.bool)] = 0
+        special_tokens_mask = _special_tokens_mask(self.tokenizer, labels)
+        masked_indices[special_tokens_mask] = 0
         if self.tokenizer._pad_token is not None:
             padding_mask = labels == self.tokenizer.pad_token_id
             masked_indices[padding_mask] = 0
@@ -1099,13 +1245,13 @@ class DataCollatorForWholeWordMask(DataCollatorForLanguageModeling):
         labels[~masked_indices] = -100  # We only compute loss on masked tokens
 
         # 80% of the time, we replace masked input tokens with tokenizer.mask_token ([MASK])
-        indices_replaced = np.random.binomial(1, 0.8, size=labels.shape).astype(np.bool) & masked_indices
+        indices_replaced = np.random.binomial(1, 0.8, size=labels.shape).astype(bool) & masked_indices
         inputs[indices_replaced] = self.tokenizer.convert_tokens_to_ids(self.tokenizer.mask_token)
 
         # 10% of the time, we replace masked input tokens with random word
         # indices_random = torch.bernoulli(torch.full(labels.shape, 0.5)).bool() & masked_indices & ~indices_replaced
         indices_random = (
-            np.random.binomial(1, 0.5, size=labels.shape).astype(np.bool) & masked_indices & ~indices_replaced
+            np.random.binomial(1, 0.5, size=labels.shape).astype(bool) & masked_indices & ~indices_replaced
         )
         random_words = np.random.randint(low=0, high=len(self.tokenizer), size=labels.shape, dtype=np.int64)
         inputs[indices_random] = random_words[indices_random]
@@ -1169,10 +1315,8 @@ class DataCollatorForSOP(DataCollatorForLanguageModeling):
         labels = inputs.clone()
         # We sample a few tokens in each sequence for masked-LM training (with probability args.mlm_probability defaults to 0.15 in Bert/RoBERTa)
         probability_matrix = torch.full(labels.shape, self.mlm_probability)
-        special_tokens_mask = [
-            self.tokenizer.get_special_tokens_mask(val, already_has_special_tokens=True) for val in labels.tolist()
-        ]
-        probability_matrix.masked_fill_(torch.tensor(special_tokens_mask, dtype=torch.bool), value=0.0)
+        special_tokens_mask = torch.from_numpy(_special_tokens_mask(self.tokenizer, labels))
+        probability_matrix.masked_fill_(special_tokens_mask, value=0.0)
         if self.tokenizer._pad_token is not None:
             padding_mask = labels.eq(self.tokenizer.pad_token_id)
             probability_matrix.masked_fill_(padding_mask, value=0.0)
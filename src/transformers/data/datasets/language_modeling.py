@@ -12,20 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
 import json
 import os
-import pickle
 import random
 import time
 import warnings
-from typing import Dict, List, Optional
+from collections.abc import Sequence
+from typing import Callable, Dict, List, Optional, Union
 
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 
 from filelock import FileLock
 
 from ...tokenization_utils import PreTrainedTokenizer
+from ...tokenization_utils_base import RaggedArray
 from ...utils import logging
 
 
@@ -38,6 +41,133 @@ DEPRECATION_WARNING = (
 )
 
 
+def _token_dtype(tokenizer: PreTrainedTokenizer) -> np.dtype:
+    """The smallest type holding all the token ids of `tokenizer`."""
+    return np.dtype(np.uint16) if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.dtype(np.int32)
+
+
+def _tokenize(tokenizer: PreTrainedTokenizer, texts: List[str], num_proc: Optional[int] = None, **kwargs):
+    """
+    Returns the `input_ids` of `texts`, encoded in `num_proc` processes by slow tokenizers (fast tokenizers already
+    encode batches in parallel).
+    """
+    if len(texts) == 0:
+        return []
+    if num_proc is not None and not tokenizer.is_fast:
+        kwargs["num_proc"] = num_proc
+    return tokenizer(texts, verbose=False, **kwargs)["input_ids"]
+
+
+def _examples_to_features(
+    examples: List[Dict[str, torch.Tensor]], dtypes: Dict[str, np.dtype]
+) -> Dict[str, Union[RaggedArray, np.ndarray]]:
+    """
+    Stores the values of `examples` in one [`RaggedArray`] per sequence feature, and one array per scalar feature.
+    """
+    features = {}
+    for name, dtype in dtypes.items():
+        values = [np.asarray(example[name]) for example in examples]
+        if len(values) > 0 and values[0].ndim == 0:
+            features[name] = np.array(values, dtype=dtype)
+        else:
+            features[name] = RaggedArray.from_lists(values, dtype=dtype)
+    return features
+
+
+def _save_features(cached_features_file: str, features: Dict[str, Union[RaggedArray, np.ndarray]]):
+    """
+    Saves each feature in flat `.npy` files next to `cached_features_file`: the values of all the examples, and their
+    offsets for sequence features. The index of these files is written last, so that an interrupted save is never
+    loaded.
+    """
+    index = {}
+    for name, feature in features.items():
+        if isinstance(feature, RaggedArray):
+            arrays = {f"{name}.values": feature.values, f"{name}.offsets": feature.offsets}
+        else:
+            arrays = {name: feature}
+        index[name] = list(arrays.keys())
+        for key, array in arrays.items():
+            path = f"{cached_features_file}.{key}.npy"
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+    with open(cached_features_file + ".json.tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(cached_features_file + ".json.tmp", cached_features_file + ".json")
+
+
+def _load_features(cached_features_file: str) -> Dict[str, Union[RaggedArray, np.ndarray]]:
+    """
+    Maps the features saved by `_save_features` in memory: examples are read from disk as they are accessed, instead
+    of all being loaded at once.
+    """
+    with open(cached_features_file + ".json", encoding="utf-8") as f:
+        index = json.load(f)
+    features = {}
+    for name, keys in index.items():
+        arrays = [np.load(f"{cached_features_file}.{key}.npy", mmap_mode="r") for key in keys]
+        features[name] = RaggedArray(*arrays) if len(arrays) == 2 else arrays[0]
+    return features
+
+
+def _load_or_create_features(
+    cached_features_file: Optional[str],
+    create_features: Callable[[], Dict[str, Union[RaggedArray, np.ndarray]]],
+    overwrite_cache: bool = False,
+) -> Dict[str, Union[RaggedArray, np.ndarray]]:
+    """
+    Loads the features cached in `cached_features_file`, or creates them with `create_features` and caches them. The
+    cached features are memory-mapped, so that large datasets load in seconds and don't take up memory.
+    """
+    if cached_features_file is None:
+        return create_features()
+
+    # Make sure only the first process in distributed training processes the dataset,
+    # and the others will use the cache.
+    lock_path = cached_features_file + ".lock"
+    with FileLock(lock_path):
+        if not os.path.exists(cached_features_file + ".json") or overwrite_cache:
+            features = create_features()
+            start = time.time()
+            _save_features(cached_features_file, features)
+            logger.info(f"Saving features into cached file {cached_features_file} [took {time.time() - start:.3f} s]")
+            # Release the features created in memory for the mapped ones
+            del features
+
+        start = time.time()
+        features = _load_features(cached_features_file)
+        logger.info(f"Loading features from cached file {cached_features_file} [took {time.time() - start:.3f} s]")
+    return features
+
+
+def _get_example(features: Dict[str, Union[RaggedArray, np.ndarray]], i: int) -> Dict[str, torch.Tensor]:
+    return {
+        name: torch.from_numpy(feature[i].astype(np.int64))
+        if isinstance(feature, RaggedArray)
+        else torch.tensor(int(feature[i]), dtype=torch.long)
+        for name, feature in features.items()
+    }
+
+
+class _FeatureExamples(Sequence):
+    """
+    The examples of a dataset stored in flat features, as a sequence of dictionaries of tensors built as they are
+    accessed, like the `examples` lists the datasets used to hold.
+    """
+
+    def __init__(self, features: Dict[str, Union[RaggedArray, np.ndarray]]):
+        self.features = features
+
+    def __len__(self):
+        return len(next(iter(self.features.values())))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return _get_example(self.features, i)
+
+
 class TextDataset(Dataset):
     """
     This will be superseded by a framework-agnostic approach soon.
@@ -50,6 +180,7 @@ class TextDataset(Dataset):
         block_size: int,
         overwrite_cache=False,
         cache_dir: Optional[str] = None,
+        num_proc: Optional[int] = None,
     ):
         warnings.warn(
             DEPRECATION_WARNING.format(
@@ -68,48 +199,47 @@ class TextDataset(Dataset):
             f"cached_lm_{tokenizer.__class__.__name__}_{block_size}_{filename}",
         )
 
-        # Make sure only the first process in distributed training processes the dataset,
-        # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-        with FileLock(lock_path):
-
-            if os.path.exists(cached_features_file) and not overwrite_cache:
-                start = time.time()
-                with open(cached_features_file, "rb") as handle:
-                    self.examples = pickle.load(handle)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
-
-            else:
-                logger.info(f"Creating features from dataset file at {directory}")
+        def create_features():
+            logger.info(f"Creating features from dataset file at {directory}")
 
-                self.examples = []
-                with open(file_path, encoding="utf-8") as f:
-                    text = f.read()
+            with open(file_path, encoding="utf-8") as f:
+                text = f.read()
 
+            if num_proc is None:
                 tokenized_text = tokenizer.convert_tokens_to_ids(tokenizer.tokenize(text))
-
-                for i in range(0, len(tokenized_text) - block_size + 1, block_size):  # Truncate in block of block_size
-                    self.examples.append(
-                        tokenizer.build_inputs_with_special_tokens(tokenized_text[i : i + block_size])
-                    )
-                # Note that we are losing the last truncated example here for the sake of simplicity (no padding)
-                # If your dataset is small, first you should look for a bigger one :-) and second you
-                # can change this behavior by adding (model specific) padding.
-
-                start = time.time()
-                with open(cached_features_file, "wb") as handle:
-                    pickle.dump(self.examples, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                logger.info(
-                    f"Saving features into cached file {cached_features_file} [took {time.time() - start:.3f} s]"
-                )
+            else:
+                # Tokenize the text in `num_proc` chunks of about the same number of lines. The chunks are only cut
+                # between a line with text and a line starting with text, as tokenizers such as byte-level BPE ones
+                # merge consecutive line breaks and leading spaces into tokens.
+                lines = text.splitlines(keepends=True)
+                boundaries = [i for i in range(1, len(lines)) if not lines[i - 1].isspace() and lines[i][:1].strip()]
+                cuts = []
+                for chunk_index in range(1, num_proc):
+                    position = bisect.bisect_left(boundaries, chunk_index * len(lines) // num_proc)
+                    if position < len(boundaries) and (len(cuts) == 0 or boundaries[position] > cuts[-1]):
+                        cuts.append(boundaries[position])
+                chunks = ["".join(lines[start:end]) for start, end in zip([0] + cuts, cuts + [len(lines)])]
+                tokenized_text = [
+                    token
+                    for ids in _tokenize(tokenizer, chunks, num_proc=num_proc, add_special_tokens=False)
+                    for token in ids
+                ]
+
+            examples = []
+            for i in range(0, len(tokenized_text) - block_size + 1, block_size):  # Truncate in block of block_size
+                examples.append(tokenizer.build_inputs_with_special_tokens(tokenized_text[i : i + block_size]))
+            # Note that we are losing the last truncated example here for the sake of simplicity (no padding)
+            # If your dataset is small, first you should look for a bigger one :-) and second you
+            # can change this behavior by adding (model specific) padding.
+            return {"input_ids": RaggedArray.from_lists(examples, dtype=_token_dtype(tokenizer))}
+
+        self.examples = _load_or_create_features(cached_features_file, create_features, overwrite_cache)["input_ids"]
 
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, i) -> torch.Tensor:
-        return torch.tensor(self.examples[i], dtype=torch.long)
+        return torch.from_numpy(self.examples[i].astype(np.int64))
 
 
 class LineByLineTextDataset(Dataset):
@@ -117,7 +247,15 @@ class LineByLineTextDataset(Dataset):
     This will be superseded by a framework-agnostic approach soon.
     """
 
-    def __init__(self, tokenizer: PreTrainedTokenizer, file_path: str, block_size: int):
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        file_path: str,
+        block_size: int,
+        overwrite_cache=False,
+        cache_dir: Optional[str] = None,
+        num_proc: Optional[int] = None,
+    ):
         warnings.warn(
             DEPRECATION_WARNING.format(
                 "https://github.com/huggingface/transformers/blob/main/examples/pytorch/language-modeling/run_mlm.py"
@@ -126,23 +264,32 @@ class LineByLineTextDataset(Dataset):
         )
         if os.path.isfile(file_path) is False:
             raise ValueError(f"Input file path {file_path} not found")
-        # Here, we do not cache the features, operating under the assumption
-        # that we will soon use fast multithreaded tokenizers from the
-        # `tokenizers` repo everywhere =)
-        logger.info(f"Creating features from dataset file at {file_path}")
+        # The features are only cached when a `cache_dir` is given
+        cached_features_file = None
+        if cache_dir is not None:
+            cached_features_file = os.path.join(
+                cache_dir,
+                f"cached_line_by_line_{tokenizer.__class__.__name__}_{block_size}_{os.path.basename(file_path)}",
+            )
 
-        with open(file_path, encoding="utf-8") as f:
-            lines = [line for line in f.read().splitlines() if (len(line) > 0 and not line.isspace())]
+        def create_features():
+            logger.info(f"Creating features from dataset file at {file_path}")
 
-        batch_encoding = tokenizer(lines, add_special_tokens=True, truncation=True, max_length=block_size)
-        self.examples = batch_encoding["input_ids"]
-        self.examples = [{"input_ids": torch.tensor(e, dtype=torch.long)} for e in self.examples]
+            with open(file_path, encoding="utf-8") as f:
+                lines = [line for line in f.read().splitlines() if (len(line) > 0 and not line.isspace())]
+
+            input_ids = _tokenize(
+                tokenizer, lines, num_proc=num_proc, add_special_tokens=True, truncation=True, max_length=block_size
+            )
+            return {"input_ids": RaggedArray.from_lists(input_ids, dtype=_token_dtype(tokenizer))}
+
+        self.examples = _load_or_create_features(cached_features_file, create_features, overwrite_cache)["input_ids"]
 
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, i) -> Dict[str, torch.tensor]:
-        return self.examples[i]
+        return {"input_ids": torch.from_numpy(self.examples[i].astype(np.int64))}
 
 
 class LineByLineWithRefDataset(Dataset):
@@ -198,7 +345,15 @@ class LineByLineWithSOPTextDataset(Dataset):
     Dataset for sentence order prediction task, prepare sentence pairs for SOP task
     """
 
-    def __init__(self, tokenizer: PreTrainedTokenizer, file_dir: str, block_size: int):
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizer,
+        file_dir: str,
+        block_size: int,
+        overwrite_cache=False,
+        cache_dir: Optional[str] = None,
+        num_proc: Optional[int] = None,
+    ):
         warnings.warn(
             DEPRECATION_WARNING.format(
                 "https://github.com/huggingface/transformers/blob/main/examples/pytorch/language-modeling/run_mlm.py"
@@ -207,37 +362,62 @@ class LineByLineWithSOPTextDataset(Dataset):
         )
         if os.path.isdir(file_dir) is False:
             raise ValueError(f"{file_dir} is not a directory")
-        logger.info(f"Creating features from dataset file folder at {file_dir}")
-        self.examples = []
-        # TODO: randomness could apply a random seed, ex. rng = random.Random(random_seed)
-        # file path looks like ./dataset/wiki_1, ./dataset/wiki_2
-        for file_name in os.listdir(file_dir):
-            file_path = os.path.join(file_dir, file_name)
-            if os.path.isfile(file_path) is False:
-                raise ValueError(f"{file_path} is not a file")
-            article_open = False
-            with open(file_path, encoding="utf-8") as f:
-                original_lines = f.readlines()
-                article_lines = []
-                for line in original_lines:
-                    if "<doc id=" in line:
-                        article_open = True
-                    elif "</doc>" in line:
-                        article_open = False
-                        document = [
-                            tokenizer.convert_tokens_to_ids(tokenizer.tokenize(line))
-                            for line in article_lines[1:]
-                            if (len(line) > 0 and not line.isspace())
-                        ]
-
-                        examples = self.create_examples_from_document(document, block_size, tokenizer)
-                        self.examples.extend(examples)
-                        article_lines = []
-                    else:
-                        if article_open:
-                            article_lines.append(line)
+        # The features are only cached when a `cache_dir` is given
+        cached_features_file = None
+        if cache_dir is not None:
+            cached_features_file = os.path.join(
+                cache_dir,
+                f"cached_sop_{tokenizer.__class__.__name__}_{block_size}_{os.path.basename(os.path.normpath(file_dir))}",
+            )
+
+        def create_features():
+            logger.info(f"Creating features from dataset file folder at {file_dir}")
+            # TODO: randomness could apply a random seed, ex. rng = random.Random(random_seed)
+            # file path looks like ./dataset/wiki_1, ./dataset/wiki_2
+            documents = []
+            for file_name in os.listdir(file_dir):
+                file_path = os.path.join(file_dir, file_name)
+                if os.path.isfile(file_path) is False:
+                    raise ValueError(f"{file_path} is not a file")
+                article_open = False
+                with open(file_path, encoding="utf-8") as f:
+                    original_lines = f.readlines()
+                    article_lines = []
+                    for line in original_lines:
+                        if "<doc id=" in line:
+                            article_open = True
+                        elif "</doc>" in line:
+                            article_open = False
+                            documents.append(
+                                [line for line in article_lines[1:] if (len(line) > 0 and not line.isspace())]
+                            )
+                            article_lines = []
+                        else:
+                            if article_open:
+                                article_lines.append(line)
+
+            # Tokenize the lines of all the documents at once
+            tokenized_lines = iter(
+                _tokenize(
+                    tokenizer,
+                    [line for document in documents for line in document],
+                    num_proc=num_proc,
+                    add_special_tokens=False,
+                )
+            )
+            examples = []
+            for document in documents:
+                document = [next(tokenized_lines) for _ in document]
+                examples.extend(self.create_examples_from_document(document, block_size, tokenizer))
+            logger.info("Dataset parse finished.")
+
+            return _examples_to_features(
+                examples,
+                {"input_ids": _token_dtype(tokenizer), "token_type_ids": np.uint8, "sentence_order_label": np.int64},
+            )
 
-        logger.info("Dataset parse finished.")
+        self.features = _load_or_create_features(cached_features_file, create_features, overwrite_cache)
+        self.examples = _FeatureExamples(self.features)
 
     def create_examples_from_document(self, document, block_size, tokenizer, short_seq_prob=0.1):
         """Creates examples for a single document."""
@@ -339,10 +519,10 @@ class LineByLineWithSOPTextDataset(Dataset):
         return examples
 
     def __len__(self):
-        return len(self.examples)
+        return len(self.features["sentence_order_label"])
 
     def __getitem__(self, i) -> Dict[str, torch.tensor]:
-        return self.examples[i]
+        return _get_example(self.features, i)
 
 
 class TextDatasetForNextSentencePrediction(Dataset):
@@ -358,6 +538,7 @@ class TextDatasetForNextSentencePrediction(Dataset):
         overwrite_cache=False,
         short_seq_probability=0.1,
         nsp_probability=0.5,
+        num_proc: Optional[int] = None,
     ):
         warnings.warn(
             DEPRECATION_WARNING.format(
@@ -379,10 +560,6 @@ class TextDatasetForNextSentencePrediction(Dataset):
 
         self.tokenizer = tokenizer
 
-        # Make sure only the first process in distributed training processes the dataset,
-        # and the others will use the cache.
-        lock_path = cached_features_file + ".lock"
-
         # Input file format:
         # (1) One sentence per line. These should ideally be actual sentences, not
         # entire paragraphs or arbitrary spans of text. (Because we use the
@@ -396,44 +573,35 @@ class TextDatasetForNextSentencePrediction(Dataset):
         #
         # A new document.
 
-        with FileLock(lock_path):
-            if os.path.exists(cached_features_file) and not overwrite_cache:
-                start = time.time()
-                with open(cached_features_file, "rb") as handle:
-                    self.examples = pickle.load(handle)
-                logger.info(
-                    f"Loading features from cached file {cached_features_file} [took %.3f s]", time.time() - start
-                )
-            else:
-                logger.info(f"Creating features from dataset file at {directory}")
+        def create_features():
+            logger.info(f"Creating features from dataset file at {directory}")
 
-                self.documents = [[]]
-                with open(file_path, encoding="utf-8") as f:
-                    while True:
-                        line = f.readline()
-                        if not line:
-                            break
-                        line = line.strip()
-
-                        # Empty lines are used as document delimiters
-                        if not line and len(self.documents[-1]) != 0:
-                            self.documents.append([])
-                        tokens = tokenizer.tokenize(line)
-                        tokens = tokenizer.convert_tokens_to_ids(tokens)
-                        if tokens:
-                            self.documents[-1].append(tokens)
-
-                logger.info(f"Creating examples from {len(self.documents)} documents.")
-                self.examples = []
-                for doc_index, document in enumerate(self.documents):
-                    self.create_examples_from_document(document, doc_index, block_size)
-
-                start = time.time()
-                with open(cached_features_file, "wb") as handle:
-                    pickle.dump(self.examples, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                logger.info(
-                    f"Saving features into cached file {cached_features_file} [took {time.time() - start:.3f} s]"
-                )
+            with open(file_path, encoding="utf-8") as f:
+                lines = [line.strip() for line in f]
+            tokenized_lines = _tokenize(tokenizer, lines, num_proc=num_proc, add_special_tokens=False)
+
+            self.documents = [[]]
+            for line, tokens in zip(lines, tokenized_lines):
+                # Empty lines are used as document delimiters
+                if not line and len(self.documents[-1]) != 0:
+                    self.documents.append([])
+                if tokens:
+                    self.documents[-1].append(tokens)
+
+            logger.info(f"Creating examples from {len(self.documents)} documents.")
+            self.examples = []
+            for doc_index, document in enumerate(self.documents):
+                self.create_examples_from_document(document, doc_index, block_size)
+
+            features = _examples_to_features(
+                self.examples,
+                {"input_ids": _token_dtype(tokenizer), "token_type_ids": np.uint8, "next_sentence_label": np.int64},
+            )
+            return features
+
+        self.features = _load_or_create_features(cached_features_file, create_features, overwrite_cache)
+        # Only keep the examples in their flat features
+        self.examples = _FeatureExamples(self.features)
 
     def create_examples_from_document(self, document: List[List[int]], doc_index: int, block_size: int):
         """Creates examples for a single document."""
@@ -526,7 +694,7 @@ class TextDatasetForNextSentencePrediction(Dataset):
             i += 1
 
     def __len__(self):
-        return len(self.examples)
+        return len(self.features["next_sentence_label"])
 
     def __getitem__(self, i):
-        return self.examples[i]
+        return _get_example(self.features, i)
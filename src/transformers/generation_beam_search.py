@@ -386,6 +386,323 @@ class BeamSearchScorer(BeamScorer):
         )
 
 
+class VectorizedBeamSearchScorer(BeamScorer):
+    r"""
+    [`BeamScorer`] implementing standard beam search decoding, like [`BeamSearchScorer`], with tensor operations only.
+
+    [`BeamSearchScorer`] loops over the batch and the candidate tokens in Python and keeps the finished hypotheses in
+    Python lists, which synchronizes the device with the CPU several times at every decoding step. This scorer keeps the
+    scores, lengths and tokens of the finished hypotheses of each batch item in tensors allocated on `device`, and
+    updates them with batched operations. The finished hypotheses are only moved to the CPU when the search is
+    finalized. It is a drop-in replacement for [`BeamSearchScorer`] in [`~generation_utils.GenerationMixin.beam_search`],
+    [`~generation_utils.GenerationMixin.beam_sample`] and [`~generation_utils.GenerationMixin.group_beam_search`], and
+    is the scorer used by [`~generation_utils.GenerationMixin.generate`].
+
+    Unlike [`BeamSearchScorer`], it does not check that the candidate tokens contain at most `num_beams` end of sequence
+    tokens per batch item, which is always the case for the candidates selected by the decoding methods above.
+
+    Args:
+        batch_size (`int`):
+            Batch Size of `input_ids` for which standard beam search decoding is run in parallel.
+        num_beams (`int`):
+            Number of beams for beam search.
+        device (`torch.device`):
+            Defines the device type (*e.g.*, `"cpu"` or `"cuda"`) on which this instance of
+            `VectorizedBeamSearchScorer` will be allocated.
+        length_penalty (`float`, *optional*, defaults to 1.0):
+            Exponential penalty to the length. 1.0 means no penalty. Set to values < 1.0 in order to encourage the
+            model to generate shorter sequences, to a value > 1.0 in order to encourage the model to produce longer
+            sequences.
+        do_early_stopping (`bool`, *optional*, defaults to `False`):
+            Whether to stop the beam search when at least `num_beams` sentences are finished per batch or not.
+        num_beam_hyps_to_keep (`int`, *optional*, defaults to 1):
+            The number of beam hypotheses that shall be returned upon calling
+            [`~transformer.VectorizedBeamSearchScorer.finalize`].
+        num_beam_groups (`int`):
+            Number of groups to divide `num_beams` into in order to ensure diversity among different groups of beams.
+            See [this paper](https://arxiv.org/pdf/1610.02424.pdf) for more details.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        num_beams: int,
+        device: torch.device,
+        length_penalty: Optional[float] = 1.0,
+        do_early_stopping: Optional[bool] = False,
+        num_beam_hyps_to_keep: Optional[int] = 1,
+        num_beam_groups: Optional[int] = 1,
+        **kwargs,
+    ):
+        self.batch_size = batch_size
+        self.num_beams = num_beams
+        self.device = device
+        self.length_penalty = length_penalty
+        self.do_early_stopping = do_early_stopping
+        self.num_beam_hyps_to_keep = num_beam_hyps_to_keep
+        self.num_beam_groups = num_beam_groups
+        self.group_size = self.num_beams // self.num_beam_groups
+
+        # the finished hypotheses of each batch item, stored in `num_beams` slots. As in `BeamHypotheses`, hypotheses
+        # with equal scores are ranked by their insertion order, which is tracked by `_hyp_insertion_steps`. The tokens
+        # and beam indices of the hypotheses are right-padded, and their buffers grow with the sequences.
+        self._hyp_scores = torch.full((batch_size, num_beams), -float("inf"), dtype=torch.float32, device=device)
+        self._hyp_is_set = torch.zeros((batch_size, num_beams), dtype=torch.bool, device=device)
+        self._hyp_insertion_steps = torch.full((batch_size, num_beams), -1, dtype=torch.long, device=device)
+        self._hyp_lengths = torch.zeros((batch_size, num_beams), dtype=torch.long, device=device)
+        self._hyp_tokens = torch.zeros((batch_size, num_beams, 0), dtype=torch.long, device=device)
+        self._hyp_beam_indices = torch.full((batch_size, num_beams, 0), -1, dtype=torch.long, device=device)
+        self._num_insertion_steps = 0
+        self._done = torch.zeros(batch_size, dtype=torch.bool, device=device)
+
+        if not isinstance(num_beams, int) or num_beams <= 1:
+            raise ValueError(
+                f"`num_beams` has to be an integer strictly greater than 1, but is {num_beams}. For `num_beams` == 1,"
+                " one should make use of `greedy_search` instead."
+            )
+
+        if not isinstance(num_beam_groups, int) or (num_beam_groups > num_beams) or (num_beams % num_beam_groups != 0):
+            raise ValueError(
+                "`num_beam_groups` has to be an integer smaller or equal than `num_beams` and `num_beams` has to be"
+                f" divisible by `num_beam_groups`, but is {num_beam_groups} with `num_beams` being {num_beams}."
+            )
+
+        if "max_length" in kwargs:
+            warnings.warn(
+                "Passing `max_length` to VectorizedBeamSearchScorer is deprecated and has no effect. "
+                "`max_length` should be passed directly to `beam_search(...)`, `beam_sample(...)`"
+                ", or `group_beam_search(...)`."
+            )
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.all()
+
+    @property
+    def _beam_hyps(self) -> List["BeamHypotheses"]:
+        # the finished hypotheses in the format of `BeamSearchScorer`, for the code inspecting them. This moves all of
+        # them to the CPU.
+        beam_hyps = []
+        scores, lengths = self._hyp_scores.tolist(), self._hyp_lengths.tolist()
+        insertion_steps = self._hyp_insertion_steps.masked_fill(~self._hyp_is_set, -1).tolist()
+        for batch_idx in range(self.batch_size):
+            beam_hyp = BeamHypotheses(self.num_beams, self.length_penalty, self.do_early_stopping)
+            slots = sorted((step, slot) for slot, step in enumerate(insertion_steps[batch_idx]) if step >= 0)
+            for _, slot in slots:
+                hyp = self._hyp_tokens[batch_idx, slot, : lengths[batch_idx][slot]]
+                beam_hyp.beams.append((scores[batch_idx][slot], hyp, None))
+                beam_hyp.worst_score = min(beam_hyp.worst_score, scores[batch_idx][slot])
+            beam_hyps.append(beam_hyp)
+        return beam_hyps
+
+    def _add_hypotheses(
+        self,
+        hyps: torch.LongTensor,
+        sum_logprobs: torch.FloatTensor,
+        is_finished: torch.BoolTensor,
+        beam_indices: Optional[torch.LongTensor] = None,
+    ):
+        """
+        Adds the hypotheses `hyps` of shape `(batch_size, num_hyps, sequence_length)` for which `is_finished` is `True`
+        to the finished hypotheses, keeping the `num_beams` best ones of each batch item.
+
+        The hypotheses are inserted one after the other, in the same way as [`BeamHypotheses.add`], but for all the
+        batch items at once.
+        """
+        batch_size, num_hyps, cur_len = hyps.shape
+        scores = sum_logprobs.float() / (cur_len**self.length_penalty)
+
+        self._hyp_tokens = _pad_last_dim(self._hyp_tokens, cur_len, 0)
+        hyps = _pad_last_dim(hyps, self._hyp_tokens.shape[-1], 0)
+        if beam_indices is not None:
+            self._hyp_beam_indices = _pad_last_dim(self._hyp_beam_indices, beam_indices.shape[-1], -1)
+            beam_indices = _pad_last_dim(beam_indices, self._hyp_beam_indices.shape[-1], -1)
+
+        # the index of the new hypothesis written in each slot, -1 for the slots that are not written
+        written_hyps = torch.full_like(self._hyp_insertion_steps, -1)
+        slots = torch.arange(self.num_beams, device=hyps.device)
+        for hyp_idx in range(num_hyps):
+            score = scores[:, hyp_idx]
+            num_hyps_set = self._hyp_is_set.sum(dim=-1)
+            worst_scores = self._hyp_scores.masked_fill(~self._hyp_is_set, float("inf")).min(dim=-1).values
+            is_full = num_hyps_set == self.num_beams
+            is_added = is_finished[:, hyp_idx] & (~is_full | (score > worst_scores))
+
+            # a full list replaces its worst hypothesis, the first inserted one in case of equal scores
+            is_worst = self._hyp_is_set & (self._hyp_scores == worst_scores.unsqueeze(-1))
+            worst_slot = self._hyp_insertion_steps.masked_fill(~is_worst, self._num_insertion_steps).argmin(dim=-1)
+            free_slot = self._hyp_is_set.long().argmin(dim=-1)
+            slot = torch.where(is_full, worst_slot, free_slot)
+            is_written = (slots == slot.unsqueeze(-1)) & is_added.unsqueeze(-1)
+
+            self._hyp_scores = torch.where(is_written, score.unsqueeze(-1), self._hyp_scores)
+            self._hyp_is_set = self._hyp_is_set | is_written
+            self._hyp_insertion_steps = self._hyp_insertion_steps.masked_fill(is_written, self._num_insertion_steps)
+            written_hyps = written_hyps.masked_fill(is_written, hyp_idx)
+            self._num_insertion_steps += 1
+
+        # the tokens of the hypotheses are only copied once all of them are inserted
+        is_written = (written_hyps >= 0).unsqueeze(-1)
+        written_hyps = written_hyps.clamp(min=0).unsqueeze(-1)
+        self._hyp_lengths = self._hyp_lengths.masked_fill(is_written.squeeze(-1), cur_len)
+        self._hyp_tokens = torch.where(
+            is_written, hyps.gather(1, written_hyps.expand(-1, -1, hyps.shape[-1])), self._hyp_tokens
+        )
+        if beam_indices is not None:
+            self._hyp_beam_indices = torch.where(
+                is_written,
+                beam_indices.gather(1, written_hyps.expand(-1, -1, beam_indices.shape[-1])),
+                self._hyp_beam_indices,
+            )
+
+    def process(
+        self,
+        input_ids: torch.LongTensor,
+        next_scores: torch.FloatTensor,
+        next_tokens: torch.LongTensor,
+        next_indices: torch.LongTensor,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+        beam_indices: Optional[torch.LongTensor] = None,
+    ) -> Tuple[torch.Tensor]:
+        cur_len = input_ids.shape[-1]
+        if not (self.batch_size == (input_ids.shape[0] // self.group_size)):
+            if self.num_beam_groups > 1:
+                raise ValueError(
+                    f"A group beam size of {input_ids.shape[0]} is used as the input, but a group beam "
+                    f"size of {self.group_size} is expected by the beam scorer."
+                )
+            else:
+                raise ValueError(
+                    f"A beam size of {input_ids.shape[0]} is used as the input, but a beam size of "
+                    f"{self.group_size} is expected by the beam scorer."
+                )
+
+        device = input_ids.device
+        num_candidates = next_tokens.shape[-1]
+        batch_beam_indices = (
+            next_indices + torch.arange(self.batch_size, device=device).unsqueeze(-1) * self.group_size
+        )
+        if eos_token_id is not None:
+            is_eos = next_tokens == eos_token_id
+        else:
+            is_eos = torch.zeros_like(next_tokens, dtype=torch.bool)
+
+        # the `group_size` best candidates that do not end with eos continue as beams
+        candidate_ranks = torch.arange(num_candidates, device=device)
+        next_beams = (is_eos.long() * num_candidates + candidate_ranks).sort(dim=-1).indices[:, : self.group_size]
+        next_beam_scores = next_scores.gather(-1, next_beams)
+        next_beam_tokens = next_tokens.gather(-1, next_beams)
+        next_beam_indices = batch_beam_indices.gather(-1, next_beams)
+
+        # the batch items that are done are padded
+        done = self._done.unsqueeze(-1)
+        pad_token_id = pad_token_id if pad_token_id is not None else eos_token_id
+        next_beam_scores = next_beam_scores.masked_fill(done, 0)
+        next_beam_tokens = next_beam_tokens.masked_fill(done, pad_token_id if pad_token_id is not None else 0)
+        next_beam_indices = next_beam_indices.masked_fill(done, 0)
+
+        # the candidates ending with eos among the `group_size` best ones are finished hypotheses
+        if eos_token_id is not None:
+            hyp_indices = batch_beam_indices[:, : self.group_size]
+            hyp_beam_indices = None
+            if beam_indices is not None:
+                # the beam indices of the hypotheses are followed by the index of their last beam
+                beam_indices, beam_indices_lengths = _beam_indices_to_tensor(beam_indices, device)
+                hyp_beam_indices = _pad_last_dim(beam_indices[hyp_indices], beam_indices.shape[-1] + 1, -1)
+                hyp_beam_indices = hyp_beam_indices.scatter(
+                    -1, beam_indices_lengths[hyp_indices].unsqueeze(-1), next_indices[:, : self.group_size, None]
+                )
+            self._add_hypotheses(
+                input_ids[hyp_indices],
+                next_scores[:, : self.group_size],
+                is_eos[:, : self.group_size] & ~done,
+                beam_indices=hyp_beam_indices,
+            )
+
+        # a batch item is done when none of its beams can become better than its worst finished hypothesis
+        is_done = self._hyp_is_set.all(dim=-1)
+        if not self.do_early_stopping:
+            best_running_score = next_scores.max(dim=-1).values.float() / (cur_len**self.length_penalty)
+            is_done = is_done & (self._hyp_scores.min(dim=-1).values >= best_running_score)
+        self._done = self._done | is_done
+
+        return UserDict(
+            {
+                "next_beam_scores": next_beam_scores.view(-1),
+                "next_beam_tokens": next_beam_tokens.view(-1),
+                "next_beam_indices": next_beam_indices.view(-1),
+            }
+        )
+
+    def finalize(
+        self,
+        input_ids: torch.LongTensor,
+        final_beam_scores: torch.FloatTensor,
+        final_beam_tokens: torch.LongTensor,
+        final_beam_indices: torch.LongTensor,
+        max_length: int,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+        beam_indices: Optional[torch.LongTensor] = None,
+    ) -> Tuple[torch.LongTensor]:
+        cur_len = input_ids.shape[-1]
+
+        # finalize all open beam hypotheses and add to generated hypotheses
+        if beam_indices is not None:
+            beam_indices, _ = _beam_indices_to_tensor(beam_indices, input_ids.device)
+            beam_indices = beam_indices.view(self.batch_size, self.num_beams, -1)
+        self._add_hypotheses(
+            input_ids.view(self.batch_size, self.num_beams, cur_len),
+            final_beam_scores.view(self.batch_size, self.num_beams),
+            (~self._done).unsqueeze(-1).expand(-1, self.num_beams),
+            beam_indices=beam_indices,
+        )
+
+        # select the best hypotheses
+        # ranks the hypotheses by decreasing score, and the last inserted first in case of equal scores
+        scores, insertion_steps = self._hyp_scores.unsqueeze(1), self._hyp_insertion_steps.unsqueeze(1)
+        is_ranked_before = (scores > scores.transpose(1, 2)) | (
+            (scores == scores.transpose(1, 2)) & (insertion_steps > insertion_steps.transpose(1, 2))
+        )
+        ranks = is_ranked_before.sum(dim=-1)
+        best = ranks.argsort(dim=-1)[:, : self.num_beam_hyps_to_keep]
+        best_scores = self._hyp_scores.gather(-1, best).view(-1)
+        sent_lengths = self._hyp_lengths.gather(-1, best).view(-1)
+
+        # prepare for adding eos
+        sent_lengths_max = sent_lengths.max().item() + 1
+        sent_max_len = min(sent_lengths_max, max_length) if max_length is not None else sent_lengths_max
+
+        # shorter batches are padded if needed
+        if sent_lengths.min().item() != sent_lengths.max().item():
+            assert pad_token_id is not None, "`pad_token_id` has to be defined"
+        pad_token_id = pad_token_id if pad_token_id is not None else 0
+        eos_token_id = eos_token_id if eos_token_id is not None else pad_token_id
+
+        # fill with hypotheses and eos_token_id if the latter fits in
+        positions = torch.arange(sent_max_len, device=input_ids.device)
+        hyps = self._hyp_tokens.gather(1, best[..., None].expand(-1, -1, self._hyp_tokens.shape[-1]))
+        hyps = _pad_last_dim(hyps.view(-1, hyps.shape[-1]), sent_max_len, pad_token_id)[:, :sent_max_len]
+        decoded = hyps.masked_fill(positions >= sent_lengths[:, None], pad_token_id)
+        decoded = decoded.masked_fill(positions == sent_lengths[:, None], eos_token_id)
+
+        indices = None
+        if beam_indices is not None:
+            indices = self._hyp_beam_indices.gather(
+                1, best[..., None].expand(-1, -1, self._hyp_beam_indices.shape[-1])
+            )
+            indices = _pad_last_dim(indices.view(-1, indices.shape[-1]), sent_max_len, -1)[:, :sent_max_len]
+
+        return UserDict(
+            {
+                "sequences": decoded,
+                "sequence_scores": best_scores,
+                "beam_indices": indices,
+            }
+        )
+
+
 class ConstrainedBeamSearchScorer(BeamScorer):
     r"""
     [`BeamScorer`] implementing constrained beam search decoding.
@@ -893,3 +1210,26 @@ class BeamHypotheses:
             cur_score = best_sum_logprobs / cur_len**self.length_penalty
             ret = self.worst_score >= cur_score
             return ret
+
+
+def _pad_last_dim(tensor: torch.Tensor, length: int, value: int) -> torch.Tensor:
+    """Right-pads the last dimension of `tensor` to `length` with `value`."""
+    if tensor.shape[-1] >= length:
+        return tensor
+    return torch.nn.functional.pad(tensor, (0, length - tensor.shape[-1]), value=value)
+
+
+def _beam_indices_to_tensor(
+    beam_indices: Tuple[Tuple[int]], device: torch.device
+) -> Tuple[torch.LongTensor, torch.LongTensor]:
+    """
+    Converts the tuples of beam indices tracked by the decoding methods to a tensor right-padded with -1, and returns it
+    with the length of each tuple.
+    """
+    lengths = [len(row_beam_indices) for row_beam_indices in beam_indices]
+    max_length = max(lengths, default=0)
+    padded = [[int(index) for index in row] + [-1] * (max_length - len(row)) for row in beam_indices]
+    return (
+        torch.tensor(padded, dtype=torch.long, device=device).view(len(beam_indices), max_length),
+        torch.tensor(lengths, dtype=torch.long, device=device),
+    )
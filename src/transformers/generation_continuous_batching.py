@@ -0,0 +1,340 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+import torch
+from torch import nn
+
+from .generation_logits_process import LogitsProcessorList
+from .utils import logging
+
+
+logger = logging.get_logger(__name__)
+
+
+@dataclass
+class GenerationRequest:
+    """
+    A single prompt submitted to a [`ContinuousBatchingEngine`].
+
+    Args:
+        input_ids (`List[int]`):
+            The token ids of the prompt.
+        max_new_tokens (`int`, *optional*, defaults to 20):
+            The maximum number of tokens to generate for this request, ignoring the number of tokens in the prompt.
+        request_id (`Any`, *optional*):
+            An identifier chosen by the caller to match finished requests with their submitters.
+        generated_ids (`List[int]`):
+            The tokens generated so far. Filled by the engine.
+        finished (`bool`):
+            Whether the request has been retired from the running batch, either because it produced `eos_token_id`
+            or because it reached `max_new_tokens`.
+    """
+
+    input_ids: List[int]
+    max_new_tokens: int = 20
+    request_id: Optional[Any] = None
+    generated_ids: List[int] = field(default_factory=list)
+    finished: bool = False
+
+    @property
+    def sequence(self) -> List[int]:
+        """The prompt followed by the generated tokens, as [`~generation_utils.GenerationMixin.generate`] gives it."""
+        return self.input_ids + self.generated_ids
+
+
+class ContinuousBatchingEngine:
+    r"""
+    Generation engine implementing *continuous* (or *in-flight*) batching for decoder-only models.
+
+    [`~generation_utils.GenerationMixin.generate`] runs a fixed batch until its longest sequence is done, so rows that
+    finish early keep being decoded as padding. The engine instead schedules requests between decoding steps: finished
+    rows are retired from the batch right after the step that finished them, and waiting requests are prefilled and
+    admitted into the freed slots, so that every slot of the batch keeps producing tokens.
+
+    The running batch is kept left-padded: the key/value cache of newly admitted requests is padded on the left (and
+    masked out through the attention mask) to the length of the running batch, or the other way around, and columns
+    that are padding for every row are dropped after rows are retired. The engine relies on the model's
+    `prepare_inputs_for_generation`, `_update_model_kwargs_for_generation` and `_reorder_cache` methods, and therefore
+    supports models that derive their position ids from the attention mask and whose cache is batch-first, such as
+    GPT-2, GPT-J, CodeGen, OPT and BLOOM.
+
+    Args:
+        model ([`PreTrainedModel`]):
+            The decoder-only model used for generation.
+        max_batch_size (`int`, *optional*, defaults to 8):
+            The maximum number of requests decoded together.
+        pad_token_id (`int`, *optional*):
+            The id of the *padding* token. Defaults to `model.config.pad_token_id`, then to `eos_token_id`.
+        eos_token_id (`int`, *optional*):
+            The id of the *end-of-sequence* token. Defaults to `model.config.eos_token_id`.
+        do_sample (`bool`, *optional*, defaults to `False`):
+            Whether or not to use sampling ; use greedy decoding otherwise.
+        logits_processor (`LogitsProcessorList`, *optional*):
+            An instance of [`LogitsProcessorList`] applied to the scores of every step. Note that the processors see
+            the left-padded `input_ids` of the whole running batch.
+        logits_warper (`LogitsProcessorList`, *optional*):
+            An instance of [`LogitsProcessorList`] of [`LogitsWarper`] applied before multinomial sampling. Only used
+            if `do_sample=True`.
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoTokenizer, AutoModelForCausalLM, ContinuousBatchingEngine
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+
+    >>> engine = ContinuousBatchingEngine(model, max_batch_size=2)
+    >>> for i, prompt in enumerate(["Hello, my dog is", "The capital of France is", "Today I believe"]):
+    ...     _ = engine.add_request(tokenizer(prompt).input_ids, max_new_tokens=10, request_id=i)
+
+    >>> outputs = engine.run()
+    >>> texts = tokenizer.batch_decode([request.sequence for request in outputs])
+    ```
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        max_batch_size: int = 8,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+        do_sample: bool = False,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        logits_warper: Optional[LogitsProcessorList] = None,
+    ):
+        if model.config.is_encoder_decoder:
+            raise ValueError("`ContinuousBatchingEngine` only supports decoder-only models.")
+        if not isinstance(max_batch_size, int) or max_batch_size <= 0:
+            raise ValueError(f"`max_batch_size` has to be a strictly positive integer, but is {max_batch_size}")
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.eos_token_id = eos_token_id if eos_token_id is not None else model.config.eos_token_id
+        pad_token_id = pad_token_id if pad_token_id is not None else model.config.pad_token_id
+        self.pad_token_id = pad_token_id if pad_token_id is not None else self.eos_token_id
+        if self.pad_token_id is None:
+            raise ValueError("`pad_token_id` or `eos_token_id` has to be defined to pad the running batch.")
+        self.do_sample = do_sample
+        self.logits_processor = logits_processor if logits_processor is not None else LogitsProcessorList()
+        self.logits_warper = logits_warper if logits_warper is not None else LogitsProcessorList()
+        # BLOOM stores its cache as `(batch_size, seq_length, num_heads, head_dim)`
+        self._cache_seq_dim = 1 if model.config.model_type == "bloom" else -2
+
+        self.waiting: Deque[GenerationRequest] = deque()
+        self.running: List[GenerationRequest] = []
+        self._input_ids: Optional[torch.LongTensor] = None
+        self._model_kwargs: Dict[str, Any] = {}
+
+    def add_request(
+        self,
+        input_ids: Union[List[int], torch.LongTensor],
+        max_new_tokens: int = 20,
+        request_id: Optional[Any] = None,
+    ) -> GenerationRequest:
+        """
+        Queues a prompt. It is admitted into the running batch at the next step that has a free slot.
+
+        Args:
+            input_ids (`List[int]` or `torch.LongTensor` of shape `(sequence_length,)`):
+                The token ids of the prompt.
+            max_new_tokens (`int`, *optional*, defaults to 20):
+                The maximum number of tokens to generate for this request.
+            request_id (`Any`, *optional*):
+                An identifier for the request.
+
+        Return:
+            [`GenerationRequest`]: The queued request, updated in place as generation progresses.
+        """
+        if isinstance(input_ids, torch.Tensor):
+            input_ids = input_ids.view(-1).tolist()
+        if len(input_ids) == 0:
+            raise ValueError("Cannot add a request with an empty prompt.")
+        if max_new_tokens <= 0:
+            raise ValueError(f"`max_new_tokens` has to be a strictly positive integer, but is {max_new_tokens}")
+        request = GenerationRequest(input_ids=list(input_ids), max_new_tokens=max_new_tokens, request_id=request_id)
+        self.waiting.append(request)
+        return request
+
+    def has_unfinished_requests(self) -> bool:
+        return len(self.waiting) > 0 or len(self.running) > 0
+
+    @torch.no_grad()
+    def step(self) -> List[GenerationRequest]:
+        """
+        Runs one scheduling iteration: admits waiting requests into the free slots of the batch (which produces their
+        first token), then decodes one token for the requests that were already running, and retires every request
+        that finished.
+
+        Return:
+            `List[GenerationRequest]`: The requests that finished during this step.
+        """
+        num_running = len(self.running)
+        if num_running > 0:
+            self._decode()
+
+        num_free_slots = self.max_batch_size - len(self.running)
+        if num_free_slots > 0 and len(self.waiting) > 0:
+            admitted = [self.waiting.popleft() for _ in range(min(num_free_slots, len(self.waiting)))]
+            self._admit(admitted)
+
+        return self._retire_finished()
+
+    def run(self) -> List[GenerationRequest]:
+        """
+        Steps until every queued request is finished.
+
+        Return:
+            `List[GenerationRequest]`: The requests, in the order in which they finished.
+        """
+        finished = []
+        while self.has_unfinished_requests():
+            finished.extend(self.step())
+        return finished
+
+    def _next_tokens(self, input_ids: torch.LongTensor, next_token_logits: torch.FloatTensor) -> torch.LongTensor:
+        next_token_scores = self.logits_processor(input_ids, next_token_logits)
+        if self.do_sample:
+            next_token_scores = self.logits_warper(input_ids, next_token_scores)
+            probs = nn.functional.softmax(next_token_scores, dim=-1)
+            return torch.multinomial(probs, num_samples=1).squeeze(1)
+        return torch.argmax(next_token_scores, dim=-1)
+
+    def _forward(
+        self, input_ids: torch.LongTensor, model_kwargs: Dict[str, Any]
+    ) -> Tuple[torch.LongTensor, Dict[str, Any]]:
+        model_inputs = self.model.prepare_inputs_for_generation(input_ids, **model_kwargs)
+        outputs = self.model(**model_inputs, return_dict=True)
+
+        next_tokens = self._next_tokens(input_ids, outputs.logits[:, -1, :])
+        model_kwargs = self.model._update_model_kwargs_for_generation(outputs, model_kwargs, is_encoder_decoder=False)
+        return torch.cat([input_ids, next_tokens[:, None]], dim=-1), model_kwargs
+
+    def _decode(self):
+        self._input_ids, self._model_kwargs = self._forward(self._input_ids, self._model_kwargs)
+        for request, token in zip(self.running, self._input_ids[:, -1].tolist()):
+            request.generated_ids.append(token)
+
+    def _admit(self, requests: List[GenerationRequest]):
+        device = self.model.device
+        max_prompt_length = max(len(request.input_ids) for request in requests)
+        input_ids = torch.full((len(requests), max_prompt_length), self.pad_token_id, dtype=torch.long, device=device)
+        attention_mask = torch.zeros_like(input_ids)
+        for i, request in enumerate(requests):
+            prompt_length = len(request.input_ids)
+            input_ids[i, max_prompt_length - prompt_length :] = torch.tensor(request.input_ids, device=device)
+            attention_mask[i, max_prompt_length - prompt_length :] = 1
+
+        # prefill the new requests on their own, this also produces their first token
+        input_ids, model_kwargs = self._forward(input_ids, {"attention_mask": attention_mask, "use_cache": True})
+        for request, token in zip(requests, input_ids[:, -1].tolist()):
+            request.generated_ids.append(token)
+
+        if len(self.running) == 0:
+            self._input_ids, self._model_kwargs = input_ids, model_kwargs
+        else:
+            self._input_ids, self._model_kwargs = self._merge(
+                self._input_ids, self._model_kwargs, input_ids, model_kwargs
+            )
+        self.running.extend(requests)
+
+    def _merge(
+        self,
+        input_ids: torch.LongTensor,
+        model_kwargs: Dict[str, Any],
+        new_input_ids: torch.LongTensor,
+        new_model_kwargs: Dict[str, Any],
+    ) -> Tuple[torch.LongTensor, Dict[str, Any]]:
+        # left-pad the shorter of the two batches so that both share the same cache length
+        length, new_length = input_ids.shape[-1], new_input_ids.shape[-1]
+        if length < new_length:
+            input_ids, model_kwargs = self._left_pad(input_ids, model_kwargs, new_length - length)
+        elif new_length < length:
+            new_input_ids, new_model_kwargs = self._left_pad(new_input_ids, new_model_kwargs, length - new_length)
+
+        model_kwargs["attention_mask"] = torch.cat(
+            [model_kwargs["attention_mask"], new_model_kwargs["attention_mask"]], dim=0
+        )
+        model_kwargs["past"] = tuple(
+            tuple(torch.cat([state, new_state], dim=0) for state, new_state in zip(layer_past, new_layer_past))
+            for layer_past, new_layer_past in zip(model_kwargs["past"], new_model_kwargs["past"])
+        )
+        return torch.cat([input_ids, new_input_ids], dim=0), model_kwargs
+
+    def _left_pad(
+        self, input_ids: torch.LongTensor, model_kwargs: Dict[str, Any], padding_length: int
+    ) -> Tuple[torch.LongTensor, Dict[str, Any]]:
+        input_ids = nn.functional.pad(input_ids, (padding_length, 0), value=self.pad_token_id)
+        model_kwargs["attention_mask"] = nn.functional.pad(model_kwargs["attention_mask"], (padding_length, 0))
+
+        def pad_state(state):
+            seq_dim = self._cache_seq_dim % state.dim()
+            pad_shape = list(state.shape)
+            pad_shape[seq_dim] = padding_length
+            return torch.cat([state.new_zeros(pad_shape), state], dim=seq_dim)
+
+        model_kwargs["past"] = tuple(
+            tuple(pad_state(state) for state in layer_past) for layer_past in model_kwargs["past"]
+        )
+        return input_ids, model_kwargs
+
+    def _retire_finished(self) -> List[GenerationRequest]:
+        finished, keep_idx = [], []
+        for i, request in enumerate(self.running):
+            last_token = request.generated_ids[-1]
+            if last_token == self.eos_token_id or len(request.generated_ids) >= request.max_new_tokens:
+                request.finished = True
+                finished.append(request)
+            else:
+                keep_idx.append(i)
+
+        if len(finished) == 0:
+            return finished
+
+        self.running = [self.running[i] for i in keep_idx]
+        if len(self.running) == 0:
+            self._input_ids, self._model_kwargs = None, {}
+            return finished
+
+        keep_idx = torch.tensor(keep_idx, dtype=torch.long, device=self._input_ids.device)
+        input_ids = self._input_ids.index_select(0, keep_idx)
+        attention_mask = self._model_kwargs["attention_mask"].index_select(0, keep_idx)
+        past = self.model._reorder_cache(self._model_kwargs["past"], keep_idx)
+
+        # drop the columns that are padding for all the remaining rows
+        num_padding_columns = int((attention_mask.cumsum(-1) == 0).sum(-1).min())
+        if num_padding_columns > 0:
+            input_ids = input_ids[:, num_padding_columns:]
+            attention_mask = attention_mask[:, num_padding_columns:]
+            past = tuple(
+                tuple(
+                    state.narrow(
+                        self._cache_seq_dim % state.dim(),
+                        num_padding_columns,
+                        state.shape[self._cache_seq_dim] - num_padding_columns,
+                    )
+                    for state in layer_past
+                )
+                for layer_past in past
+            )
+
+        self._input_ids = input_ids
+        self._model_kwargs["attention_mask"] = attention_mask
+        self._model_kwargs["past"] = past
+        return finished
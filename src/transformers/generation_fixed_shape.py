@@ -0,0 +1,235 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Decoding steps running the model on tensors whose shapes do not change during generation."""
+
+import inspect
+from typing import TYPE_CHECKING, Optional
+
+import torch
+
+from .cache_utils import StaticCache
+
+
+if TYPE_CHECKING:
+    from .modeling_utils import PreTrainedModel
+
+
+class FixedShapeDecodingStep:
+    r"""
+    Runs the decoding steps of a decoder-only model on preallocated tensors whose shapes do not change from one step to
+    the next.
+
+    In [`~generation_utils.GenerationMixin.greedy_search`] and [`~generation_utils.GenerationMixin.sample`], the inputs
+    of the model grow with every generated token: the attention mask gets longer, and the key/value cache is
+    concatenated with the new states (or, for a [`StaticCache`], attended up to the current length). A step can then
+    not be captured once and replayed, as with CUDA graphs, and compilers specialize it for every new length. A
+    `FixedShapeDecodingStep` feeds the model with buffers of fixed shapes instead:
+
+    - the new tokens and their positions, of shape `(batch_size, 1)`,
+    - an attention mask of shape `(batch_size, max_length)`, indexed by position in the cache, in which the positions
+      that are not generated yet are masked,
+    - a [`StaticCache`] in fixed-shape mode, in which the new states are written at the current position and all the
+      `max_length` positions are attended.
+
+    Only the prompt is processed with dynamic shapes. All the following steps run the same operations on the same
+    tensors, so that with `use_cuda_graph=True` the first of them is captured in a CUDA graph, which is then replayed
+    for all the following ones, removing the Python and kernel launch overhead of the forward pass. The graph is kept
+    when the step is reused for another generation with the same batch size and maximum length.
+
+    It is used by [`~generation_utils.GenerationMixin.generate`] with `fixed_shape_decoding`, and is only supported by
+    models with `supports_fixed_shape_decoding = True`, such as GPT-2 and BLOOM, whose positions are derived from
+    `position_ids` or from the attention mask rather than from the length of the cache.
+
+    Args:
+        model ([`PreTrainedModel`]):
+            A decoder-only model with `supports_fixed_shape_decoding = True`.
+        batch_size (`int`):
+            The batch size of the sequences to generate.
+        max_length (`int`):
+            The maximum length of the sequences to generate, prompt included.
+        use_cuda_graph (`bool`, *optional*, defaults to `False`):
+            Whether to capture the decoding step in a CUDA graph and replay it. Requires the model to be on a CUDA
+            device.
+        cache ([`StaticCache`], *optional*):
+            The cache to use, which must be allocated for `batch_size` and `max_length`. If not provided, a cache is
+            allocated with [`StaticCache.from_model`].
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoModelForCausalLM, AutoTokenizer, FixedShapeDecodingStep
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+    >>> inputs = tokenizer(["Today I believe we can finally"], return_tensors="pt")
+
+    >>> outputs = model.generate(**inputs, max_length=30, fixed_shape_decoding="eager")
+
+    >>> # a step can be reused for several generations with the same batch size and maximum length
+    >>> decoding_step = FixedShapeDecodingStep(model, batch_size=1, max_length=30)
+    >>> outputs = model.generate(**inputs, max_length=30, fixed_shape_decoding=decoding_step)
+    ```
+    """
+
+    def __init__(
+        self,
+        model: "PreTrainedModel",
+        batch_size: int,
+        max_length: int,
+        use_cuda_graph: bool = False,
+        cache: Optional[StaticCache] = None,
+    ):
+        if not getattr(model, "supports_fixed_shape_decoding", False):
+            raise ValueError(f"{model.__class__.__name__} does not support fixed-shape decoding yet.")
+        if use_cuda_graph and model.device.type != "cuda":
+            raise ValueError(f"CUDA graphs require a model on a CUDA device, but the model is on {model.device}.")
+        if cache is None:
+            cache = StaticCache.from_model(model, batch_size=batch_size, max_length=max_length)
+        elif cache.batch_size != batch_size or cache.max_length != max_length:
+            raise ValueError(
+                f"The cache was allocated for a batch size of {cache.batch_size} and {cache.max_length} positions, but"
+                f" the decoding step needs a batch size of {batch_size} and {max_length} positions."
+            )
+
+        self.model = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.use_cuda_graph = use_cuda_graph
+        self.cache = cache
+
+        # the buffers fed to the model at every step
+        device = model.device
+        self.input_ids = torch.zeros((batch_size, 1), dtype=torch.long, device=device)
+        self.position_ids = torch.zeros((batch_size, 1), dtype=torch.long, device=device)
+        self.cache_position = torch.zeros(1, dtype=torch.long, device=device)
+        self.attention_mask = torch.zeros((batch_size, max_length), dtype=torch.long, device=device)
+
+        self._accepts_position_ids = "position_ids" in set(inspect.signature(model.forward).parameters.keys())
+        self._cur_len = None
+        self._graph = None
+        self._graph_logits = None
+
+    def reset(self):
+        """Prepares the step for a new generation, keeping its buffers and its CUDA graph."""
+        self.cache.reset()
+        self._cur_len = None
+
+    def __call__(
+        self, input_ids: torch.LongTensor, attention_mask: Optional[torch.LongTensor] = None
+    ) -> torch.FloatTensor:
+        """
+        Returns the logits of the tokens following `input_ids`.
+
+        The first call processes the prompt `input_ids` with its `attention_mask`. Each of the following calls must
+        receive the sequences of the previous call extended by one token.
+
+        Args:
+            input_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`):
+                The sequences generated so far.
+            attention_mask (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+                The attention mask of the prompt. Only used by the first call.
+
+        Return:
+            `torch.FloatTensor` of shape `(batch_size, vocab_size)`: The logits of the next tokens.
+        """
+        cur_len = input_ids.shape[-1]
+        if self._cur_len is None:
+            return self._prefill(input_ids, attention_mask)
+        if cur_len != self._cur_len + 1:
+            raise ValueError(
+                f"The decoding step expects sequences of length {self._cur_len + 1}, but got sequences of length "
+                f"{cur_len}. Call `reset()` before starting a new generation."
+            )
+        if cur_len > self.max_length:
+            raise ValueError(f"The decoding step was allocated for {self.max_length} positions, but got {cur_len}.")
+        self._cur_len = cur_len
+
+        self.input_ids.copy_(input_ids[:, -1:])
+        self.cache_position.fill_(cur_len - 1)
+        if self.use_cuda_graph:
+            if self._graph is None:
+                self._capture()
+            self._graph.replay()
+            # the output of the graph is overwritten by the next replay
+            logits = self._graph_logits.clone()
+        else:
+            logits = self._decode()
+        self.position_ids.add_(1)
+        return logits
+
+    def _prefill(self, input_ids: torch.LongTensor, attention_mask: Optional[torch.LongTensor]) -> torch.FloatTensor:
+        batch_size, prompt_length = input_ids.shape
+        if batch_size != self.batch_size:
+            raise ValueError(
+                f"The decoding step was allocated for a batch size of {self.batch_size}, but got {batch_size}."
+            )
+        if prompt_length >= self.max_length:
+            raise ValueError(
+                f"The prompt has {prompt_length} tokens, but the decoding step was allocated for {self.max_length}"
+                " positions."
+            )
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+
+        # the prompt is processed with a regular static cache
+        self.cache.reset()
+        model_inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "past_key_values": self.cache,
+            "use_cache": True,
+            "return_dict": True,
+        }
+        if self._accepts_position_ids:
+            position_ids = attention_mask.long().cumsum(-1) - 1
+            model_inputs["position_ids"] = position_ids.masked_fill(attention_mask == 0, 1)
+        with torch.no_grad():
+            logits = self.model(**model_inputs).logits[:, -1, :]
+
+        self.attention_mask.zero_()
+        self.attention_mask[:, :prompt_length] = attention_mask
+        self.position_ids.copy_(attention_mask.long().sum(-1, keepdim=True))
+        self.cache.cache_position = self.cache_position
+        self._cur_len = prompt_length
+        return logits
+
+    @torch.no_grad()
+    def _decode(self) -> torch.FloatTensor:
+        # the new tokens attend to their own position, the positions after it are still masked
+        self.attention_mask.index_fill_(1, self.cache_position, 1)
+        model_inputs = {
+            "input_ids": self.input_ids,
+            "attention_mask": self.attention_mask,
+            "past_key_values": self.cache,
+            "use_cache": True,
+            "return_dict": True,
+        }
+        if self._accepts_position_ids:
+            model_inputs["position_ids"] = self.position_ids
+        return self.model(**model_inputs).logits[:, -1, :]
+
+    def _capture(self):
+        # CUDA graphs require a few warm-up runs on a side stream before being captured. They write the same states at
+        # the same position of the cache, so they do not change the result of the step.
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(2):
+                self._decode()
+        torch.cuda.current_stream().wait_stream(stream)
+
+        self._graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self._graph):
+            self._graph_logits = self._decode()
@@ -15,7 +15,8 @@
 
 import inspect
 import math
-from typing import Callable, Iterable, List, Optional, Tuple
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 import torch
@@ -274,39 +275,44 @@ class TypicalLogitsWarper(LogitsWarper):
         return scores
 
 
-def _get_ngrams(ngram_size: int, prev_input_ids: torch.Tensor, num_hypos: int):
-    generated_ngrams = [{} for _ in range(num_hypos)]
-    for idx in range(num_hypos):
-        gen_tokens = prev_input_ids[idx].tolist()
-        generated_ngram = generated_ngrams[idx]
-        for ngram in zip(*[gen_tokens[i:] for i in range(ngram_size)]):
-            prev_ngram_tuple = tuple(ngram[:-1])
-            generated_ngram[prev_ngram_tuple] = generated_ngram.get(prev_ngram_tuple, []) + [ngram[-1]]
-    return generated_ngrams
+def _get_ngrams(ngram_size: int, input_ids: torch.LongTensor) -> torch.LongTensor:
+    """Returns all the n-grams of `input_ids`, as a tensor of shape `(batch_size, num_ngrams, ngram_size)`."""
+    return input_ids.unfold(-1, ngram_size, 1)
 
 
-def _get_generated_ngrams(banned_ngrams, prev_input_ids, ngram_size, cur_len):
-    # Before decoding the next token, prevent decoding of ngrams that have already appeared
-    start_idx = cur_len + 1 - ngram_size
-    ngram_idx = tuple(prev_input_ids[start_idx:cur_len].tolist())
-    return banned_ngrams.get(ngram_idx, [])
-
+def _ban_ngram_completions(
+    scores: torch.FloatTensor, ngrams: torch.LongTensor, prev_tokens: torch.LongTensor
+) -> torch.FloatTensor:
+    """
+    Sets to `-inf` the scores of the tokens that would complete an n-gram of `ngrams` starting with `prev_tokens`.
 
-def _calc_banned_ngram_tokens(
-    ngram_size: int, prev_input_ids: torch.Tensor, num_hypos: int, cur_len: int
-) -> List[Iterable[int]]:
-    """Copied from fairseq for no_repeat_ngram in beam_search"""
-    if cur_len + 1 < ngram_size:
-        # return no banned tokens if we haven't generated no_repeat_ngram_size tokens yet
-        return [[] for _ in range(num_hypos)]
+    Args:
+        scores (`torch.FloatTensor` of shape `(num_hypos, vocab_size)`):
+            The scores to process.
+        ngrams (`torch.LongTensor` of shape `(num_hypos, num_ngrams, ngram_size)`):
+            The n-grams that cannot be repeated by each hypothesis.
+        prev_tokens (`torch.LongTensor` of shape `(num_hypos, ngram_size - 1)`):
+            The last tokens of each hypothesis.
+    """
+    # all the n-grams of all the hypotheses are compared at once, and their last tokens are banned with one scatter
+    is_match = (ngrams[..., :-1] == prev_tokens.unsqueeze(1)).all(dim=-1)
+    return _scatter_banned_tokens(scores, ngrams[..., -1], is_match)
 
-    generated_ngrams = _get_ngrams(ngram_size, prev_input_ids, num_hypos)
 
-    banned_tokens = [
-        _get_generated_ngrams(generated_ngrams[hypo_idx], prev_input_ids[hypo_idx], ngram_size, cur_len)
-        for hypo_idx in range(num_hypos)
-    ]
-    return banned_tokens
+def _scatter_banned_tokens(
+    scores: torch.FloatTensor, tokens: torch.LongTensor, is_banned: torch.BoolTensor
+) -> torch.FloatTensor:
+    """Sets `scores[i, tokens[i, j]]` to `-inf` in place wherever `is_banned[i, j]`, with a single scatter."""
+    if tokens.shape[-1] == 0:
+        return scores
+    # The writes of the tokens that are not banned are redirected to the first banned token of their row, or to the
+    # first token of the row if none is banned (rewriting its own score). This way, all the writes to a given position
+    # write the same value, and the scatter is deterministic.
+    redirect_tokens = tokens.gather(1, is_banned.long().argmax(dim=-1, keepdim=True))
+    redirect_scores = scores.gather(1, redirect_tokens).masked_fill(is_banned.any(dim=-1, keepdim=True), -float("inf"))
+    scatter_tokens = torch.where(is_banned, tokens, redirect_tokens)
+    scatter_scores = torch.where(is_banned, redirect_scores.new_tensor(-float("inf")), redirect_scores)
+    return scores.scatter_(1, scatter_tokens, scatter_scores)
 
 
 class NoRepeatNGramLogitsProcessor(LogitsProcessor):
@@ -325,14 +331,18 @@ class NoRepeatNGramLogitsProcessor(LogitsProcessor):
         self.ngram_size = ngram_size
 
     def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
-        num_batch_hypotheses = scores.shape[0]
         cur_len = input_ids.shape[-1]
-        banned_batch_tokens = _calc_banned_ngram_tokens(self.ngram_size, input_ids, num_batch_hypotheses, cur_len)
-
-        for i, banned_tokens in enumerate(banned_batch_tokens):
-            scores[i, banned_tokens] = -float("inf")
+        if cur_len < self.ngram_size:
+            # no banned tokens if we haven't generated `ngram_size` tokens yet
+            return scores
 
-        return scores
+        # The n-grams of the whole prefix are compared at every step, rather than kept across steps and extended with
+        # the newest one: the processor is called on beams reordered at every step, on the slices of the beam groups,
+        # on batches compacted during generation and on prefixes that shrink in assisted decoding, so n-grams cached
+        # per row would go stale. All the rows are compared in a single tensor op instead.
+        ngrams = _get_ngrams(self.ngram_size, input_ids)
+        prev_tokens = input_ids[:, cur_len + 1 - self.ngram_size :]
+        return _ban_ngram_completions(scores, ngrams, prev_tokens)
 
 
 class EncoderNoRepeatNGramLogitsProcessor(LogitsProcessor):
@@ -356,30 +366,91 @@ class EncoderNoRepeatNGramLogitsProcessor(LogitsProcessor):
         if len(encoder_input_ids.shape) == 1:
             encoder_input_ids = encoder_input_ids.unsqueeze(0)
         self.batch_size = encoder_input_ids.shape[0]
-        self.generated_ngrams = _get_ngrams(encoder_ngram_size, encoder_input_ids, self.batch_size)
+        # the n-grams of the encoder input ids are computed once, as they don't change during generation
+        if encoder_input_ids.shape[-1] >= encoder_ngram_size:
+            self.generated_ngrams = _get_ngrams(encoder_ngram_size, encoder_input_ids)
+        else:
+            self.generated_ngrams = encoder_input_ids.new_zeros((self.batch_size, 0, encoder_ngram_size))
 
     def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
         # B x num_beams
         num_hypos = scores.shape[0]
         num_beams = num_hypos // self.batch_size
         cur_len = input_ids.shape[-1]
-        banned_batch_tokens = [
-            _get_generated_ngrams(
-                self.generated_ngrams[hypo_idx // num_beams], input_ids[hypo_idx], self.ngram_size, cur_len
-            )
-            for hypo_idx in range(num_hypos)
-        ]
+        if cur_len + 1 < self.ngram_size:
+            return scores
 
-        for i, banned_tokens in enumerate(banned_batch_tokens):
-            scores[i, banned_tokens] = -float("inf")
+        ngrams = self.generated_ngrams.to(input_ids.device).repeat_interleave(num_beams, dim=0)
+        prev_tokens = input_ids[:, cur_len + 1 - self.ngram_size :]
+        return _ban_ngram_completions(scores, ngrams, prev_tokens)
 
-        return scores
+
+class _BadWordsAutomaton:
+    """
+    Aho-Corasick automaton over token ids, built from a list of banned token sequences.
+
+    The states of the automaton are the prefixes of the banned sequences (without their last token). After consuming
+    the tokens of a hypothesis, the automaton is in the state of the longest suffix of the hypothesis that is such a
+    prefix, and the tokens completing a banned sequence from there are precomputed for each state. The cost of finding
+    the banned tokens of a hypothesis thus depends on the length of the banned sequences, not on their number.
+    """
+
+    def __init__(self, bad_words_ids: List[List[int]]):
+        # the trie of the prefixes of the banned sequences, with the last tokens of the sequences ending at each node
+        self.children: List[Dict[int, int]] = [{}]
+        completions: List[Set[int]] = [set()]
+        for bad_word_ids in bad_words_ids:
+            state = 0
+            for token_id in bad_word_ids[:-1]:
+                if token_id not in self.children[state]:
+                    self.children[state][token_id] = len(self.children)
+                    self.children.append({})
+                    completions.append(set())
+                state = self.children[state][token_id]
+            completions[state].add(bad_word_ids[-1])
+        # the number of previous tokens that can be part of a banned sequence
+        self.max_prefix_length = max([len(bad_word_ids) - 1 for bad_word_ids in bad_words_ids], default=0)
+
+        # the sequences of a single token are banned in every state, they are stored apart
+        self.static_banned_tokens = sorted(completions[0])
+
+        # failure links and banned tokens of each state, computed breadth-first so that the states of shorter
+        # prefixes are always complete before being used
+        self.failures = [0] * len(self.children)
+        banned_tokens: List[Set[int]] = [set() for _ in self.children]
+        queue = deque(self.children[0].values())
+        while queue:
+            state = queue.popleft()
+            banned_tokens[state] = completions[state] | banned_tokens[self.failures[state]]
+            for token_id, child in self.children[state].items():
+                self.failures[child] = self.next_state(self.failures[state], token_id)
+                queue.append(child)
+        self.banned_tokens = [sorted(state_banned_tokens) for state_banned_tokens in banned_tokens]
+
+    def next_state(self, state: int, token_id: int) -> int:
+        """Returns the state reached from `state` after consuming `token_id`."""
+        while state != 0 and token_id not in self.children[state]:
+            state = self.failures[state]
+        return self.children[state].get(token_id, 0)
+
+    def walk(self, token_ids: List[int]) -> int:
+        """Returns the state reached from the initial state after consuming `token_ids`."""
+        state = 0
+        for token_id in token_ids:
+            state = self.next_state(state, token_id)
+        return state
 
 
 class NoBadWordsLogitsProcessor(LogitsProcessor):
     """
     [`LogitsProcessor`] that enforces that specified sequences will never be sampled.
 
+    The banned sequences are compiled into an Aho-Corasick automaton over token ids, and the state of each hypothesis
+    is kept from one step to the next, so that the cost of each step depends on the number of hypotheses and not on
+    the number of banned sequences. The states are keyed by the last tokens of the hypotheses rather than by their
+    position in the batch, so that they remain valid when hypotheses are reordered or processed in groups, as in beam
+    search or with [`PrefixConstrainedLogitsProcessor`].
+
     Args:
         bad_words_ids (`List[List[int]]`):
             List of list of token ids that are not allowed to be generated. In order to get the token ids of the words
@@ -402,106 +473,102 @@ class NoBadWordsLogitsProcessor(LogitsProcessor):
             raise ValueError(
                 f"Each list in `bad_words_ids` has to be a list of positive integers, but is {bad_words_ids}."
             )
+        if any(len(bad_word_ids) == 0 for bad_word_ids in bad_words_ids):
+            raise ValueError(f"Banned words token sequences {bad_words_ids} cannot have an empty list")
 
-        bad_words_ids = list(filter(lambda bad_token_seq: bad_token_seq != [eos_token_id], bad_words_ids))
-        self.bad_words_id_length_1 = []
-        self.bad_words_id_length_greater_than_1 = []
-        for word in bad_words_ids:
-            if len(word) == 1:
-                self.bad_words_id_length_1.append(word[0])
-            else:
-                self.bad_words_id_length_greater_than_1.append(word)
-
-        self.static_bad_words_mask: Optional[torch.LongTensor] = None
+        self.bad_words_ids = [
+            [int(token_id) for token_id in bad_word_ids]
+            for bad_word_ids in bad_words_ids
+            if bad_word_ids != [eos_token_id]
+        ]
+        self.automaton = _BadWordsAutomaton(self.bad_words_ids)
 
-        for banned_token_seq in self.bad_words_id_length_greater_than_1:
-            if len(banned_token_seq) == 0:
-                raise ValueError(f"Banned words token sequences {bad_words_ids} cannot have an empty list")
+        self.static_bad_words_mask: Optional[torch.BoolTensor] = None
+        # the states of the hypotheses at the previous step, keyed by their last `max_prefix_length` tokens
+        self._states: Dict[Tuple[int, ...], int] = {}
 
     def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
-        if self.static_bad_words_mask is None and len(self.bad_words_id_length_1) > 0:
-            self.static_bad_words_mask = self._calc_static_bad_word_mask(scores)
-
-        dynamic_banned_tokens = self._calc_banned_bad_words_ids(input_ids.tolist())
-        scores = self._set_scores_to_inf_for_banned_tokens(scores, dynamic_banned_tokens)
+        if self.static_bad_words_mask is None:
+            self._init_static_bad_words_mask(scores)
+
+        if self.automaton.max_prefix_length > 0:
+            states = self._get_states(input_ids)
+            banned_tokens = [self.automaton.banned_tokens[state] for state in states]
+            max_num_banned_tokens = max(len(row_banned_tokens) for row_banned_tokens in banned_tokens)
+            if max_num_banned_tokens > 0:
+                padding = [
+                    [0] * (max_num_banned_tokens - len(row_banned_tokens)) for row_banned_tokens in banned_tokens
+                ]
+                tokens = torch.tensor(
+                    [
+                        row_banned_tokens + row_padding
+                        for row_banned_tokens, row_padding in zip(banned_tokens, padding)
+                    ],
+                    dtype=torch.long,
+                    device=scores.device,
+                )
+                is_banned = torch.tensor(
+                    [
+                        [True] * len(row_banned_tokens) + [False] * len(row_padding)
+                        for row_banned_tokens, row_padding in zip(banned_tokens, padding)
+                    ],
+                    device=scores.device,
+                )
+                scores = _scatter_banned_tokens(scores, tokens, is_banned)
 
+        if self.static_bad_words_mask.any():
+            scores = scores.masked_fill_(self.static_bad_words_mask, -float("inf"))
         return scores
 
-    def _calc_static_bad_word_mask(self, scores: torch.FloatTensor) -> torch.BoolTensor:
-        static_bad_words_mask = torch.zeros(scores.shape[1])
-        static_bad_words_mask[self.bad_words_id_length_1] = 1
-        return static_bad_words_mask.unsqueeze(0).to(scores.device).bool()
-
-    def _tokens_match(self, prev_tokens: List[int], tokens: List[int]) -> bool:
-        if len(tokens) == 0:
-            # if bad word tokens is just one token always ban it
-            return True
-        elif len(tokens) > len(prev_tokens):
-            # if bad word tokens are longer then prev input_ids they can't be equal
-            return False
-        else:
-            return prev_tokens[-len(tokens) :] == tokens
-
-    def _calc_banned_bad_words_ids(self, prev_input_ids: List[List[int]]) -> Iterable[int]:
-        banned_tokens = []
-        for prev_input_ids_slice in prev_input_ids:
-            banned_tokens_slice = []
-            for banned_token_seq in self.bad_words_id_length_greater_than_1:
-                if self._tokens_match(prev_input_ids_slice, banned_token_seq[:-1]):
-                    banned_tokens_slice.append(banned_token_seq[-1])
-
-            banned_tokens.append(banned_tokens_slice)
-
-        return banned_tokens
-
-    def _set_scores_to_inf_for_banned_tokens(
-        self, scores: torch.Tensor, banned_tokens: List[List[int]]
-    ) -> torch.Tensor:
+    def get_banned_tokens(self, prev_input_ids: List[int]) -> List[int]:
         """
-        Modifies the scores in place by setting the banned token positions to `-inf`. Banned token is expected to be a
-        list of list of banned tokens to ban in the format [[batch index, vocabulary position],...
-
-        Args:
-            scores: logits distribution of shape (batch size, vocabulary size)
-            banned_tokens: list of list of tokens to ban of length (batch_size)
+        Returns the tokens that cannot follow `prev_input_ids`, for instance to exclude them from the allowed tokens of
+        a `prefix_allowed_tokens_fn`.
         """
-        banned_mask_list = []
-        for idx, batch_banned_tokens in enumerate(banned_tokens):
-            for token in batch_banned_tokens:
-                # Eliminates invalid bad word IDs that are over the vocabulary size.
-                if token <= scores.shape[1]:
-                    banned_mask_list.append([idx, token])
-                else:
-                    logger.error(
-                        f"An invalid bad word ID is defined: {token}. This ID is not contained in the "
-                        "vocabulary, and is therefore ignored."
-                    )
-        if not banned_mask_list and self.static_bad_words_mask is None:
-            return scores
+        history = prev_input_ids[len(prev_input_ids) - self.automaton.max_prefix_length :]
+        state = self.automaton.walk(history) if self.automaton.max_prefix_length > 0 else 0
+        return sorted(set(self.automaton.static_banned_tokens) | set(self.automaton.banned_tokens[state]))
+
+    def _get_states(self, input_ids: torch.LongTensor) -> List[int]:
+        history_length = self.automaton.max_prefix_length
+        # the last `history_length` tokens of each hypothesis, plus the one before to find its previous state
+        prev_input_ids = input_ids[:, max(input_ids.shape[-1] - history_length - 1, 0) :].tolist()
+
+        states = []
+        new_states = {}
+        for row_input_ids in prev_input_ids:
+            key = tuple(row_input_ids[-history_length:])
+            if key in new_states:
+                state = new_states[key]
+            elif len(row_input_ids) > 0 and tuple(row_input_ids[:-1]) in self._states:
+                # advances the state of the hypothesis at the previous step by the new token
+                state = self.automaton.next_state(self._states[tuple(row_input_ids[:-1])], row_input_ids[-1])
+            else:
+                state = self.automaton.walk(row_input_ids[-history_length:])
+            new_states[key] = state
+            states.append(state)
 
-        else:
-            if banned_mask_list:
-                banned_mask = torch.LongTensor(banned_mask_list)
-                indices = torch.ones(len(banned_mask))
-                # A sparse tensor is generated from a list of coordinates: [[0, 1], [0, 2], [2, 0]]. A conversion to dense tensor generates:
-                # [ 0  1  1 ]
-                # [ 0  0  0 ]
-                # [ 1  0  0 ]
-
-                banned_mask = (
-                    torch.sparse.LongTensor(banned_mask.t(), indices, scores.size())
-                    .to(scores.device)
-                    .to_dense()
-                    .bool()
-                )
+        self._states = new_states
+        return states
 
-                if self.static_bad_words_mask is not None:
-                    banned_mask = torch.bitwise_or(banned_mask, self.static_bad_words_mask)
-            else:
-                banned_mask = self.static_bad_words_mask
+    def _init_static_bad_words_mask(self, scores: torch.FloatTensor):
+        vocab_size = scores.shape[-1]
+        invalid_token_ids = {bad_word_ids[-1] for bad_word_ids in self.bad_words_ids if bad_word_ids[-1] >= vocab_size}
+        if len(invalid_token_ids) > 0:
+            # Eliminates invalid bad word IDs that are over the vocabulary size.
+            for token_id in sorted(invalid_token_ids):
+                logger.error(
+                    f"An invalid bad word ID is defined: {token_id}. This ID is not contained in the "
+                    "vocabulary, and is therefore ignored."
+                )
+            self.bad_words_ids = [
+                bad_word_ids for bad_word_ids in self.bad_words_ids if bad_word_ids[-1] not in invalid_token_ids
+            ]
+            self.automaton = _BadWordsAutomaton(self.bad_words_ids)
 
-            scores = scores.masked_fill(banned_mask, -float("inf"))
-            return scores
+        static_bad_words_mask = torch.zeros(vocab_size, dtype=torch.bool, device=scores.device)
+        static_bad_words_mask[self.automaton.static_banned_tokens] = True
+        self.static_bad_words_mask = static_bad_words_mask.unsqueeze(0)
 
 
 class PrefixConstrainedLogitsProcessor(LogitsProcessor):
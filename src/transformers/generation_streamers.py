@@ -0,0 +1,183 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Streamers receiving the tokens of [`~generation_utils.GenerationMixin.generate`] as soon as they are generated."""
+
+from queue import Queue
+from typing import TYPE_CHECKING, Optional
+
+from .tokenization_utils_base import IncrementalDecoder
+
+
+if TYPE_CHECKING:
+    from .tokenization_utils_base import PreTrainedTokenizerBase
+
+
+class BaseStreamer:
+    """
+    Base class from which the streamers passed to [`~generation_utils.GenerationMixin.generate`] should inherit.
+    """
+
+    def put(self, value):
+        """Function that is called by `.generate()` to push new tokens"""
+        raise NotImplementedError(
+            f"{self.__class__} is an abstract class. Only classes inheriting this class can be called."
+        )
+
+    def end(self):
+        """Function that is called by `.generate()` to signal the end of generation"""
+        raise NotImplementedError(
+            f"{self.__class__} is an abstract class. Only classes inheriting this class can be called."
+        )
+
+
+class TextStreamer(BaseStreamer):
+    """
+    Simple text streamer that prints the token(s) to stdout as soon as their text is final.
+
+    The tokens are decoded as they come by an [`IncrementalDecoder`], which only decodes the last few tokens, and
+    holds back the text that may still change, such as an incomplete multi-byte character (decoded as `"�"` by
+    byte-level BPE tokenizers).
+
+    Parameters:
+        tokenizer (`PreTrainedTokenizerBase`):
+            The tokenizer used to decode the tokens.
+        skip_prompt (`bool`, *optional*, defaults to `False`):
+            Whether to skip the prompt passed to `.generate()`, which is the first value received by the streamer.
+        decode_kwargs:
+            Additional keyword arguments passed to the [`IncrementalDecoder`], such as `skip_special_tokens`.
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoModelForCausalLM, AutoTokenizer, TextStreamer
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+    >>> inputs = tokenizer(["An increasing sequence: one,"], return_tensors="pt")
+    >>> streamer = TextStreamer(tokenizer)
+
+    >>> # Despite returning the usual output, the streamer will also print the generated text to stdout.
+    >>> _ = model.generate(**inputs, streamer=streamer, max_new_tokens=20)
+    ```
+    """
+
+    def __init__(self, tokenizer: "PreTrainedTokenizerBase", skip_prompt: bool = False, **decode_kwargs):
+        self.tokenizer = tokenizer
+        self.skip_prompt = skip_prompt
+        self.decode_kwargs = decode_kwargs
+
+        # variables used in the streaming process
+        self.decoder = IncrementalDecoder(tokenizer, **decode_kwargs)
+        self.next_tokens_are_prompt = True
+
+    def put(self, value):
+        """
+        Receives tokens, decodes them, and prints their text to stdout as soon as it is final.
+
+        Args:
+            value (`torch.Tensor` of shape `(1, num_tokens)` or `(num_tokens,)`):
+                The new tokens.
+        """
+        if len(value.shape) > 1 and value.shape[0] > 1:
+            raise ValueError(f"{self.__class__.__name__} only supports a batch size of 1.")
+        elif len(value.shape) > 1:
+            value = value[0]
+
+        if self.skip_prompt and self.next_tokens_are_prompt:
+            self.next_tokens_are_prompt = False
+            return
+        self.next_tokens_are_prompt = False
+
+        printable_text = self.decoder.add(value.tolist())
+        self.on_finalized_text(printable_text)
+
+    def end(self):
+        """Flushes the text held back and prints a newline to stdout."""
+        printable_text = self.decoder.flush()
+        self.next_tokens_are_prompt = True
+        self.on_finalized_text(printable_text, stream_end=True)
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        """Prints the new text to stdout. If the stream is ending, also prints a newline."""
+        print(text, flush=True, end="" if not stream_end else None)
+
+
+class TextIteratorStreamer(TextStreamer):
+    """
+    Streamer that stores printable text in a queue, to be used by a downstream application as an iterator. This is
+    useful for applications that benefit from accessing the generated text in a non-blocking way, such as a web server
+    generating in a separate thread.
+
+    Parameters:
+        tokenizer (`PreTrainedTokenizerBase`):
+            The tokenizer used to decode the tokens.
+        skip_prompt (`bool`, *optional*, defaults to `False`):
+            Whether to skip the prompt passed to `.generate()`, which is the first value received by the streamer.
+        timeout (`float`, *optional*):
+            The timeout in seconds for the text queue. If `None`, the iterator blocks until new text is available.
+        decode_kwargs:
+            Additional keyword arguments passed to the `decode` method of the tokenizer, such as
+            `skip_special_tokens`.
+
+    Examples:
+
+    ```python
+    >>> from transformers import AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer
+    >>> from threading import Thread
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> model = AutoModelForCausalLM.from_pretrained("gpt2")
+    >>> inputs = tokenizer(["An increasing sequence: one,"], return_tensors="pt")
+    >>> streamer = TextIteratorStreamer(tokenizer, skip_prompt=True)
+
+    >>> # Run the generation in a separate thread, so that we can fetch the generated text in a non-blocking way.
+    >>> generation_kwargs = dict(inputs, streamer=streamer, max_new_tokens=20)
+    >>> thread = Thread(target=model.generate, kwargs=generation_kwargs)
+    >>> thread.start()
+    >>> generated_text = ""
+    >>> for new_text in streamer:
+    ...     generated_text += new_text
+    >>> thread.join()
+    ```
+    """
+
+    def __init__(
+        self,
+        tokenizer: "PreTrainedTokenizerBase",
+        skip_prompt: bool = False,
+        timeout: Optional[float] = None,
+        **decode_kwargs
+    ):
+        super().__init__(tokenizer, skip_prompt, **decode_kwargs)
+        self.text_queue = Queue()
+        self.stop_signal = None
+        self.timeout = timeout
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        """Puts the new text in the queue. If the stream is ending, also puts a stop signal in the queue."""
+        if len(text) > 0:
+            self.text_queue.put(text, timeout=self.timeout)
+        if stream_end:
+            self.text_queue.put(self.stop_signal, timeout=self.timeout)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        value = self.text_queue.get(timeout=self.timeout)
+        if value is self.stop_signal:
+            raise StopIteration()
+        else:
+            return value
@@ -17,14 +17,16 @@
 import inspect
 import warnings
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import torch
 import torch.distributed as dist
 from torch import nn
 
+from .cache_utils import PromptCache, StaticCache
 from .generation_beam_constraints import Constraint, DisjunctiveConstraint, PhrasalConstraint
-from .generation_beam_search import BeamScorer, BeamSearchScorer, ConstrainedBeamSearchScorer
+from .generation_beam_search import BeamScorer, ConstrainedBeamSearchScorer, VectorizedBeamSearchScorer
+from .generation_fixed_shape import FixedShapeDecodingStep
 from .generation_logits_process import (
     EncoderNoRepeatNGramLogitsProcessor,
     ExponentialDecayLengthPenalty,
@@ -55,6 +57,10 @@ from .pytorch_utils import torch_int_div
 from .utils import ModelOutput, logging
 
 
+if TYPE_CHECKING:
+    from .generation_streamers import BaseStreamer
+    from .modeling_utils import PreTrainedModel
+
 logger = logging.get_logger(__name__)
 
 
@@ -590,6 +596,13 @@ class GenerationMixin:
         if attention_mask is not None:
             model_kwargs["attention_mask"] = attention_mask.index_select(0, expanded_return_idx)
 
+        # the keys and values of the prompt, as filled by a `PromptCache`
+        if not is_encoder_decoder and isinstance(model_kwargs.get("past", None), tuple) and expand_size > 1:
+            model_kwargs["past"] = tuple(
+                tuple(past_state.index_select(0, expanded_return_idx) for past_state in layer_past)
+                for layer_past in model_kwargs["past"]
+            )
+
         if is_encoder_decoder:
             if encoder_outputs is None:
                 raise ValueError("If `is_encoder_decoder` is True, make sure that `encoder_outputs` is defined.")
@@ -801,6 +814,162 @@ class GenerationMixin:
         default_list.extend(custom_list)
         return default_list
 
+    def _get_fixed_shape_decoding_step(
+        self,
+        fixed_shape_decoding: Union[str, FixedShapeDecodingStep],
+        input_ids: torch.LongTensor,
+        stopping_criteria: StoppingCriteriaList,
+        model_kwargs: Dict[str, Any],
+    ) -> FixedShapeDecodingStep:
+        if stopping_criteria.max_length is None:
+            raise ValueError("`max_length` needs to be a stopping_criteria for `fixed_shape_decoding`.")
+        batch_size, max_length = input_ids.shape[0], stopping_criteria.max_length
+
+        if isinstance(fixed_shape_decoding, FixedShapeDecodingStep):
+            if fixed_shape_decoding.model is not self:
+                raise ValueError("The `FixedShapeDecodingStep` passed as `fixed_shape_decoding` wraps another model.")
+            if fixed_shape_decoding.batch_size != batch_size or fixed_shape_decoding.max_length < max_length:
+                raise ValueError(
+                    f"The `FixedShapeDecodingStep` was allocated for a batch size of {fixed_shape_decoding.batch_size}"
+                    f" and {fixed_shape_decoding.max_length} positions, but generation needs a batch size of"
+                    f" {batch_size} and {max_length} positions."
+                )
+            fixed_shape_decoding.reset()
+            return fixed_shape_decoding
+
+        if fixed_shape_decoding not in ("eager", "cuda_graph"):
+            raise ValueError(
+                "`fixed_shape_decoding` has to be `'eager'`, `'cuda_graph'` or a `FixedShapeDecodingStep`, but is"
+                f" {fixed_shape_decoding}."
+            )
+        # a preallocated cache passed by the user is reused
+        cache = model_kwargs.get("past", None)
+        if cache is not None and not isinstance(cache, StaticCache):
+            raise ValueError("`fixed_shape_decoding` only supports a `StaticCache` as `past`.")
+        return FixedShapeDecodingStep(
+            self,
+            batch_size=batch_size,
+            max_length=max_length,
+            use_cuda_graph=fixed_shape_decoding == "cuda_graph",
+            cache=cache,
+        )
+
+    def _compact_finished_sequences(
+        self,
+        compaction_threshold: float,
+        input_ids: torch.LongTensor,
+        unfinished_sequences: torch.LongTensor,
+        batch_idx: torch.LongTensor,
+        finished_sequences: List[Tuple[torch.LongTensor, torch.LongTensor]],
+        model_kwargs: Dict[str, Any],
+    ) -> Tuple[torch.LongTensor, torch.LongTensor, torch.LongTensor, Dict[str, Any]]:
+        num_sequences = unfinished_sequences.shape[0]
+        num_finished = num_sequences - unfinished_sequences.sum().item()
+        if num_finished == 0 or num_finished < compaction_threshold * num_sequences:
+            return input_ids, unfinished_sequences, batch_idx, model_kwargs
+
+        finished_idx = (unfinished_sequences == 0).nonzero().view(-1)
+        finished_sequences.append((batch_idx[finished_idx], input_ids[finished_idx]))
+
+        unfinished_idx = unfinished_sequences.nonzero().view(-1)
+        for key in ("attention_mask", "token_type_ids", "decoder_attention_mask"):
+            if model_kwargs.get(key, None) is not None:
+                model_kwargs[key] = model_kwargs[key].index_select(0, unfinished_idx)
+        encoder_outputs = model_kwargs.get("encoder_outputs", None)
+        if encoder_outputs is not None:
+            encoder_outputs["last_hidden_state"] = encoder_outputs.last_hidden_state.index_select(
+                0, unfinished_idx.to(encoder_outputs.last_hidden_state.device)
+            )
+        past = model_kwargs.get("past", None)
+        if past is not None:
+            # the self-attention and cross-attention states of each layer have the batch as first dimension
+            if not (isinstance(past, tuple) and all(isinstance(layer_past, tuple) for layer_past in past)):
+                raise ValueError(
+                    f"`compaction_threshold` is not supported by {self.__class__.__name__}, whose cache is a"
+                    f" {past.__class__.__name__} and not a tuple of key and value states."
+                )
+            model_kwargs["past"] = tuple(
+                tuple(past_state.index_select(0, unfinished_idx.to(past_state.device)) for past_state in layer_past)
+                for layer_past in past
+            )
+
+        return input_ids[unfinished_idx], unfinished_sequences[unfinished_idx], batch_idx[unfinished_idx], model_kwargs
+
+    @staticmethod
+    def _restore_finished_sequences(
+        input_ids: torch.LongTensor,
+        batch_idx: torch.LongTensor,
+        finished_sequences: List[Tuple[torch.LongTensor, torch.LongTensor]],
+        pad_token_id: int,
+    ) -> torch.LongTensor:
+        # puts the removed sequences back at their position, padded as if they had stayed in the batch
+        batch_size = batch_idx.shape[0] + sum(idx.shape[0] for idx, _ in finished_sequences)
+        sequences = input_ids.new_full((batch_size, input_ids.shape[-1]), pad_token_id)
+        sequences[batch_idx] = input_ids
+        for idx, finished_input_ids in finished_sequences:
+            sequences[idx, : finished_input_ids.shape[-1]] = finished_input_ids
+        return sequences
+
+    def _prefill_from_prompt_cache(
+        self, prompt_cache: PromptCache, input_ids: torch.LongTensor, model_kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # the cache holds all the prompt tokens but the last one, which is fed to the model by the first decoding step
+        prefix_ids = input_ids[:, :-1]
+        prefix_length = prefix_ids.shape[-1]
+        attention_mask = model_kwargs.get("attention_mask", None)
+        if prefix_length == 0 or (attention_mask is not None and not bool(attention_mask.all())):
+            # the tokens of left-padded prompts are not at the same positions as in the cache
+            return model_kwargs
+
+        # BLOOM caches its keys and values with the sequence as second dimension
+        seq_dim = 1 if self.config.model_type == "bloom" else -2
+        prefixes = [tuple(row) for row in prefix_ids.tolist()]
+        cached = [prompt_cache.get(prefix) for prefix in prefixes]
+        cached_length = min(length for length, _ in cached)
+
+        past = None
+        if cached_length > 0:
+            num_layers = len(cached[0][1])
+            past = tuple(
+                tuple(
+                    torch.cat(
+                        [
+                            cached_past[layer_idx][state_idx].narrow(seq_dim, 0, cached_length)
+                            for _, cached_past in cached
+                        ]
+                    )
+                    for state_idx in range(len(cached[0][1][layer_idx]))
+                )
+                for layer_idx in range(num_layers)
+            )
+
+        if cached_length < prefix_length:
+            model_inputs = {
+                "input_ids": prefix_ids[:, cached_length:],
+                "past_key_values": past,
+                "attention_mask": torch.ones_like(prefix_ids),
+                "use_cache": True,
+                "return_dict": True,
+            }
+            if "position_ids" in set(inspect.signature(self.forward).parameters.keys()):
+                position_ids = torch.arange(cached_length, prefix_length, device=input_ids.device)
+                model_inputs["position_ids"] = position_ids.unsqueeze(0).expand(prefix_ids.shape[0], -1)
+            past = self(**model_inputs).past_key_values
+
+            for batch_idx, prefix in enumerate(prefixes):
+                if cached[batch_idx][0] < prefix_length:
+                    prompt_cache.put(
+                        prefix,
+                        tuple(
+                            tuple(past_state[batch_idx : batch_idx + 1] for past_state in layer_past)
+                            for layer_past in past
+                        ),
+                        seq_dim=seq_dim,
+                    )
+
+        model_kwargs["past"] = past
+        return model_kwargs
+
     def compute_transition_beam_scores(
         self,
         sequences: torch.Tensor,
@@ -884,6 +1053,12 @@ class GenerationMixin:
         remove_invalid_values: Optional[bool] = None,
         synced_gpus: Optional[bool] = False,
         exponential_decay_length_penalty: Optional[Tuple[Union[int, float]]] = None,
+        assistant_model: Optional["PreTrainedModel"] = None,
+        num_assistant_tokens: Optional[int] = None,
+        streamer: Optional["BaseStreamer"] = None,
+        fixed_shape_decoding: Optional[Union[str, FixedShapeDecodingStep]] = None,
+        prompt_cache: Optional[PromptCache] = None,
+        compaction_threshold: Optional[float] = None,
         **model_kwargs,
     ) -> Union[GreedySearchOutput, SampleOutput, BeamSearchOutput, BeamSampleOutput, torch.LongTensor]:
         r"""
@@ -904,6 +1079,8 @@ class GenerationMixin:
             - *constrained beam-search decoding* by calling
               [`~generation_utils.GenerationMixin.constrained_beam_search`], if `constraints!=None` or
               `force_words_ids!=None`.
+            - *assisted decoding* by calling [`~generation_utils.GenerationMixin.assisted_decoding`], if
+              `assistant_model` is passed.
 
         <Tip warning={true}>
 
@@ -1041,6 +1218,36 @@ class GenerationMixin:
                 This Tuple adds an exponentially increasing length penalty, after a certain amount of tokens have been
                 generated. The tuple shall consist of: `(start_index, decay_factor)` where `start_index` indicates
                 where penalty starts and `decay_factor` represents the factor of exponential decay
+            assistant_model (`PreTrainedModel`, *optional*):
+                A smaller model sharing the vocabulary of the model, used to draft the next tokens that the model then
+                verifies in a single forward pass. Greedy decoding returns the same tokens as without an assistant,
+                and sampling draws from the same distribution. Only supported for decoder-only models, with a batch
+                size of 1 and `num_beams=1`.
+            num_assistant_tokens (`int`, *optional*, defaults to 5):
+                The number of tokens drafted by `assistant_model` before each forward pass of the model.
+            streamer (`BaseStreamer`, *optional*):
+                Streamer object that will be used to stream the generated sequences, such as a [`TextStreamer`] or a
+                [`TextIteratorStreamer`]. The prompt is passed to `streamer.put(token_ids)` first, then the generated
+                tokens as soon as they are final, and `streamer.end()` is called once generation is done. Only
+                supported with a batch size of 1, for greedy search, sampling, beam search and assisted decoding.
+            fixed_shape_decoding (`str` or [`FixedShapeDecodingStep`], *optional*):
+                Runs the decoding steps on tensors whose shapes do not change from one step to the next, with a
+                [`FixedShapeDecodingStep`]. Can be `"eager"` to run them as usual, `"cuda_graph"` to capture the first
+                of them in a CUDA graph and replay it for the following ones, or a [`FixedShapeDecodingStep`] to reuse
+                across calls. Only supported for greedy search and sampling, by models with
+                `supports_fixed_shape_decoding = True`.
+            prompt_cache ([`PromptCache`], *optional*):
+                A cache of the keys and values of previous prompts. The keys and values of the longest stored prefix of
+                the prompt are reused, so that the model only runs on the tokens after it, and the keys and values of
+                the prompt are stored for the next calls. Only supported by decoder-only models with
+                `supports_prompt_cache = True`. Left-padded prompts are neither looked up nor stored.
+            compaction_threshold (`float`, *optional*):
+                When set, the finished sequences are removed from the batch as soon as they make up at least this
+                fraction of the sequences still in it, so that the next decoding steps only run the model on the
+                unfinished ones. Greedy search returns the same sequences, and sampling draws from the same
+                distribution. Only supported for greedy search and sampling, without `output_scores`,
+                `output_attentions`, `output_hidden_states`, `synced_gpus`, `encoder_no_repeat_ngram_size` and
+                `prefix_allowed_tokens_fn`.
 
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the `forward` function of the model. If the model
@@ -1168,6 +1375,10 @@ class GenerationMixin:
         model_kwargs["output_hidden_states"] = output_hidden_states
         model_kwargs["use_cache"] = use_cache
 
+        # a preallocated cache can be passed as `past_key_values`, as for the `forward` of the model
+        if isinstance(model_kwargs.get("past_key_values", None), StaticCache):
+            model_kwargs["past"] = model_kwargs.pop("past_key_values")
+
         accepts_attention_mask = "attention_mask" in set(inspect.signature(self.forward).parameters.keys())
         requires_attention_mask = "encoder_outputs" not in model_kwargs
 
@@ -1234,11 +1445,20 @@ class GenerationMixin:
 
         # 6. determine generation mode
         is_constraint_gen_mode = constraints is not None or force_words_ids is not None
+        is_assisted_gen_mode = assistant_model is not None
         is_greedy_gen_mode = (
-            (num_beams == 1) and (num_beam_groups == 1) and do_sample is False and not is_constraint_gen_mode
+            (num_beams == 1)
+            and (num_beam_groups == 1)
+            and do_sample is False
+            and not is_constraint_gen_mode
+            and not is_assisted_gen_mode
         )
         is_sample_gen_mode = (
-            (num_beams == 1) and (num_beam_groups == 1) and do_sample is True and not is_constraint_gen_mode
+            (num_beams == 1)
+            and (num_beam_groups == 1)
+            and do_sample is True
+            and not is_constraint_gen_mode
+            and not is_assisted_gen_mode
         )
         is_beam_gen_mode = (
             (num_beams > 1) and (num_beam_groups == 1) and do_sample is False and not is_constraint_gen_mode
@@ -1254,6 +1474,76 @@ class GenerationMixin:
             raise ValueError(
                 "Diverse beam search cannot be used in sampling mode. Make sure that `do_sample` is set to `False`."
             )
+        if streamer is not None:
+            if not (is_greedy_gen_mode or is_sample_gen_mode or is_beam_gen_mode or is_assisted_gen_mode):
+                raise ValueError(
+                    "`streamer` is only supported for greedy search, sampling, beam search and assisted decoding."
+                )
+            if batch_size > 1 or num_return_sequences > 1:
+                raise ValueError("`streamer` requires a batch size of 1 and `num_return_sequences=1`.")
+        if is_assisted_gen_mode:
+            if num_beams > 1 or is_constraint_gen_mode:
+                raise ValueError("Assisted decoding only supports greedy search and sampling, with `num_beams=1`.")
+            if self.config.is_encoder_decoder:
+                raise ValueError("Assisted decoding is only supported for decoder-only models.")
+            if batch_size > 1:
+                raise ValueError(
+                    f"Assisted decoding requires a batch size of 1, but got a batch size of {batch_size}."
+                )
+            if num_return_sequences > 1:
+                raise ValueError(
+                    f"num_return_sequences has to be 1, but is {num_return_sequences} when doing assisted decoding."
+                )
+
+        if fixed_shape_decoding is not None:
+            if not (is_greedy_gen_mode or is_sample_gen_mode):
+                raise ValueError("`fixed_shape_decoding` is only supported for greedy search and sampling.")
+            if self.config.is_encoder_decoder:
+                raise ValueError("`fixed_shape_decoding` is only supported for decoder-only models.")
+            if output_attentions or output_hidden_states or synced_gpus:
+                raise ValueError(
+                    "`fixed_shape_decoding` does not support `output_attentions`, `output_hidden_states` and"
+                    " `synced_gpus`."
+                )
+
+        if compaction_threshold is not None:
+            if not (is_greedy_gen_mode or is_sample_gen_mode):
+                raise ValueError("`compaction_threshold` is only supported for greedy search and sampling.")
+            if not 0.0 < compaction_threshold <= 1.0:
+                raise ValueError(f"`compaction_threshold` has to be in ]0, 1], but is {compaction_threshold}.")
+            if output_scores or output_attentions or output_hidden_states or synced_gpus:
+                raise ValueError(
+                    "`compaction_threshold` does not support `output_scores`, `output_attentions`,"
+                    " `output_hidden_states` and `synced_gpus`."
+                )
+            if fixed_shape_decoding is not None:
+                raise ValueError("`compaction_threshold` cannot be used with `fixed_shape_decoding`.")
+            # these processors find the batch index of a row from its position, which changes when the batch is
+            # compacted
+            encoder_no_repeat_ngram_size = (
+                encoder_no_repeat_ngram_size
+                if encoder_no_repeat_ngram_size is not None
+                else self.config.encoder_no_repeat_ngram_size
+            )
+            if (
+                (self.config.is_encoder_decoder and encoder_no_repeat_ngram_size)
+                or prefix_allowed_tokens_fn is not None
+                or any(
+                    isinstance(processor, (EncoderNoRepeatNGramLogitsProcessor, PrefixConstrainedLogitsProcessor))
+                    for processor in logits_processor
+                )
+            ):
+                raise ValueError(
+                    "`compaction_threshold` cannot be used with `encoder_no_repeat_ngram_size` and"
+                    " `prefix_allowed_tokens_fn`."
+                )
+
+        if prompt_cache is not None:
+            if not getattr(self, "supports_prompt_cache", False):
+                raise ValueError(f"{self.__class__.__name__} does not support `prompt_cache` yet.")
+            if model_kwargs.get("past", None) is not None or fixed_shape_decoding is not None:
+                raise ValueError("`prompt_cache` cannot be used with `past` or `fixed_shape_decoding`.")
+            model_kwargs = self._prefill_from_prompt_cache(prompt_cache, input_ids, model_kwargs)
 
         # 7. prepare distribution pre_processing samplers
         logits_processor = self._get_logits_processor(
@@ -1284,12 +1574,57 @@ class GenerationMixin:
         )
 
         # 9. go into different generation modes
-        if is_greedy_gen_mode:
+        if is_assisted_gen_mode:
+            # 10. prepare logits warper
+            logits_warper = (
+                self._get_logits_warper(
+                    top_k=top_k,
+                    top_p=top_p,
+                    typical_p=typical_p,
+                    temperature=temperature,
+                    num_beams=num_beams,
+                    renormalize_logits=renormalize_logits,
+                )
+                if do_sample
+                else None
+            )
+
+            if streamer is not None:
+                streamer.put(input_ids.cpu())
+
+            # 11. run assisted decoding
+            return self.assisted_decoding(
+                input_ids,
+                assistant_model=assistant_model,
+                num_assistant_tokens=num_assistant_tokens,
+                do_sample=do_sample,
+                logits_processor=logits_processor,
+                logits_warper=logits_warper,
+                stopping_criteria=stopping_criteria,
+                pad_token_id=pad_token_id,
+                eos_token_id=eos_token_id,
+                output_scores=output_scores,
+                return_dict_in_generate=return_dict_in_generate,
+                synced_gpus=synced_gpus,
+                streamer=streamer,
+                **model_kwargs,
+            )
+
+        elif is_greedy_gen_mode:
             if num_return_sequences > 1:
                 raise ValueError(
                     f"num_return_sequences has to be 1, but is {num_return_sequences} when doing greedy search."
                 )
 
+            decoding_step = None
+            if fixed_shape_decoding is not None:
+                decoding_step = self._get_fixed_shape_decoding_step(
+                    fixed_shape_decoding, input_ids, stopping_criteria, model_kwargs
+                )
+
+            if streamer is not None:
+                streamer.put(input_ids.cpu())
+
             # 10. run greedy search
             return self.greedy_search(
                 input_ids,
@@ -1300,6 +1635,9 @@ class GenerationMixin:
                 output_scores=output_scores,
                 return_dict_in_generate=return_dict_in_generate,
                 synced_gpus=synced_gpus,
+                streamer=streamer,
+                decoding_step=decoding_step,
+                compaction_threshold=compaction_threshold,
                 **model_kwargs,
             )
 
@@ -1322,6 +1660,15 @@ class GenerationMixin:
                 **model_kwargs,
             )
 
+            decoding_step = None
+            if fixed_shape_decoding is not None:
+                decoding_step = self._get_fixed_shape_decoding_step(
+                    fixed_shape_decoding, input_ids, stopping_criteria, model_kwargs
+                )
+
+            if streamer is not None:
+                streamer.put(input_ids.cpu())
+
             # 12. run sample
             return self.sample(
                 input_ids,
@@ -1333,6 +1680,9 @@ class GenerationMixin:
                 output_scores=output_scores,
                 return_dict_in_generate=return_dict_in_generate,
                 synced_gpus=synced_gpus,
+                streamer=streamer,
+                decoding_step=decoding_step,
+                compaction_threshold=compaction_threshold,
                 **model_kwargs,
             )
 
@@ -1344,7 +1694,7 @@ class GenerationMixin:
                 raise ValueError("`max_length` needs to be a stopping_criteria for now.")
 
             # 10. prepare beam search scorer
-            beam_scorer = BeamSearchScorer(
+            beam_scorer = VectorizedBeamSearchScorer(
                 batch_size=batch_size,
                 num_beams=num_beams,
                 device=inputs_tensor.device,
@@ -1352,6 +1702,8 @@ class GenerationMixin:
                 do_early_stopping=early_stopping,
                 num_beam_hyps_to_keep=num_return_sequences,
             )
+            if streamer is not None:
+                streamer.put(input_ids.cpu())
             # 11. interleave input_ids with `num_beams` additional sequences per batch
             input_ids, model_kwargs = self._expand_inputs_for_generation(
                 input_ids, expand_size=num_beams, is_encoder_decoder=self.config.is_encoder_decoder, **model_kwargs
@@ -1367,6 +1719,7 @@ class GenerationMixin:
                 output_scores=output_scores,
                 return_dict_in_generate=return_dict_in_generate,
                 synced_gpus=synced_gpus,
+                streamer=streamer,
                 **model_kwargs,
             )
 
@@ -1384,7 +1737,7 @@ class GenerationMixin:
             if stopping_criteria.max_length is None:
                 raise ValueError("`max_length` needs to be a stopping_criteria for now.")
             # 11. prepare beam search scorer
-            beam_scorer = BeamSearchScorer(
+            beam_scorer = VectorizedBeamSearchScorer(
                 batch_size=batch_size * num_return_sequences,
                 num_beams=num_beams,
                 device=inputs_tensor.device,
@@ -1426,7 +1779,7 @@ class GenerationMixin:
                 raise ValueError("`max_length` needs to be a stopping_criteria for now.")
 
             # 10. prepare beam search scorer
-            beam_scorer = BeamSearchScorer(
+            beam_scorer = VectorizedBeamSearchScorer(
                 batch_size=batch_size,
                 num_beams=num_beams,
                 max_length=stopping_criteria.max_length,
@@ -1548,6 +1901,9 @@ class GenerationMixin:
         output_scores: Optional[bool] = None,
         return_dict_in_generate: Optional[bool] = None,
         synced_gpus: Optional[bool] = False,
+        streamer: Optional["BaseStreamer"] = None,
+        decoding_step: Optional[FixedShapeDecodingStep] = None,
+        compaction_threshold: Optional[float] = None,
         **model_kwargs,
     ) -> Union[GreedySearchOutput, torch.LongTensor]:
         r"""
@@ -1584,6 +1940,17 @@ class GenerationMixin:
                 Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
             synced_gpus (`bool`, *optional*, defaults to `False`):
                 Whether to continue running the while loop until max_length (needed for ZeRO stage 3)
+            streamer (`BaseStreamer`, *optional*):
+                Streamer object that will be used to stream the generated sequences. Generated tokens are passed
+                through `streamer.put(token_ids)` and the streamer is responsible for any further processing.
+            decoding_step ([`FixedShapeDecodingStep`], *optional*):
+                A decoding step computing the logits of the next tokens on tensors of fixed shapes, in place of the
+                forward pass of the model. It keeps its own cache and attention mask, and does not support
+                `output_attentions` and `output_hidden_states`.
+            compaction_threshold (`float`, *optional*):
+                When set, the finished sequences are removed from the batch as soon as they make up at least this
+                fraction of the sequences still in it, and put back at their position in the returned sequences. Does
+                not support `output_scores`, `output_attentions`, `output_hidden_states` and `synced_gpus`.
             model_kwargs:
                 Additional model specific keyword arguments will be forwarded to the `forward` function of the model.
                 If model is an encoder-decoder model the kwargs should include `encoder_outputs`.
@@ -1669,6 +2036,10 @@ class GenerationMixin:
         unfinished_sequences = input_ids.new(input_ids.shape[0]).fill_(1)
         cur_len = input_ids.shape[-1]
 
+        # with `compaction_threshold`, the position of the sequences left in the batch, and the removed sequences
+        batch_idx = torch.arange(input_ids.shape[0], device=input_ids.device)
+        finished_sequences = []
+
         this_peer_finished = False  # used by synced_gpus only
         while True:
 
@@ -1682,23 +2053,27 @@ class GenerationMixin:
                 if this_peer_finished_flag.item() == 0.0:
                     break
 
-            # prepare model inputs
-            model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
-
-            # forward pass to get next token
-            outputs = self(
-                **model_inputs,
-                return_dict=True,
-                output_attentions=output_attentions,
-                output_hidden_states=output_hidden_states,
-            )
+            if decoding_step is not None:
+                # the decoding step keeps its own cache and attention mask
+                outputs = None
+                next_token_logits = decoding_step(input_ids, attention_mask=model_kwargs.get("attention_mask"))
+            else:
+                # prepare model inputs
+                model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+
+                # forward pass to get next token
+                outputs = self(
+                    **model_inputs,
+                    return_dict=True,
+                    output_attentions=output_attentions,
+                    output_hidden_states=output_hidden_states,
+                )
+                next_token_logits = outputs.logits[:, -1, :]
 
             if synced_gpus and this_peer_finished:
                 cur_len = cur_len + 1
                 continue  # don't waste resources running the code we don't need
 
-            next_token_logits = outputs.logits[:, -1, :]
-
             # pre-process distribution
             next_tokens_scores = logits_processor(input_ids, next_token_logits)
 
@@ -1731,9 +2106,12 @@ class GenerationMixin:
 
             # update generated ids, model inputs, and length for next step
             input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
-            model_kwargs = self._update_model_kwargs_for_generation(
-                outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
-            )
+            if streamer is not None:
+                streamer.put(next_tokens.cpu())
+            if decoding_step is None:
+                model_kwargs = self._update_model_kwargs_for_generation(
+                    outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
+                )
             cur_len = cur_len + 1
 
             # if eos_token was found in one sentence, set sentence to finished
@@ -1747,6 +2125,18 @@ class GenerationMixin:
                 else:
                     this_peer_finished = True
 
+            # remove the finished sequences from the batch once there are enough of them
+            if compaction_threshold is not None:
+                input_ids, unfinished_sequences, batch_idx, model_kwargs = self._compact_finished_sequences(
+                    compaction_threshold, input_ids, unfinished_sequences, batch_idx, finished_sequences, model_kwargs
+                )
+
+        if streamer is not None:
+            streamer.end()
+
+        if len(finished_sequences) > 0:
+            input_ids = self._restore_finished_sequences(input_ids, batch_idx, finished_sequences, pad_token_id)
+
         if return_dict_in_generate:
             if self.config.is_encoder_decoder:
                 return GreedySearchEncoderDecoderOutput(
@@ -1782,6 +2172,9 @@ class GenerationMixin:
         output_scores: Optional[bool] = None,
         return_dict_in_generate: Optional[bool] = None,
         synced_gpus: Optional[bool] = False,
+        streamer: Optional["BaseStreamer"] = None,
+        decoding_step: Optional[FixedShapeDecodingStep] = None,
+        compaction_threshold: Optional[float] = None,
         **model_kwargs,
     ) -> Union[SampleOutput, torch.LongTensor]:
         r"""
@@ -1821,6 +2214,17 @@ class GenerationMixin:
                 Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
             synced_gpus (`bool`, *optional*, defaults to `False`):
                 Whether to continue running the while loop until max_length (needed for ZeRO stage 3)
+            streamer (`BaseStreamer`, *optional*):
+                Streamer object that will be used to stream the generated sequences. Generated tokens are passed
+                through `streamer.put(token_ids)` and the streamer is responsible for any further processing.
+            decoding_step ([`FixedShapeDecodingStep`], *optional*):
+                A decoding step computing the logits of the next tokens on tensors of fixed shapes, in place of the
+                forward pass of the model. It keeps its own cache and attention mask, and does not support
+                `output_attentions` and `output_hidden_states`.
+            compaction_threshold (`float`, *optional*):
+                When set, the finished sequences are removed from the batch as soon as they make up at least this
+                fraction of the sequences still in it, and put back at their position in the returned sequences. Does
+                not support `output_scores`, `output_attentions`, `output_hidden_states` and `synced_gpus`.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the `forward` function of the model. If model is
                 an encoder-decoder model the kwargs should include `encoder_outputs`.
@@ -1923,6 +2327,10 @@ class GenerationMixin:
         unfinished_sequences = input_ids.new(input_ids.shape[0]).fill_(1)
         cur_len = input_ids.shape[-1]
 
+        # with `compaction_threshold`, the position of the sequences left in the batch, and the removed sequences
+        batch_idx = torch.arange(input_ids.shape[0], device=input_ids.device)
+        finished_sequences = []
+
         this_peer_finished = False  # used by synced_gpus only
         # auto-regressive generation
         while True:
@@ -1937,23 +2345,27 @@ class GenerationMixin:
                 if this_peer_finished_flag.item() == 0.0:
                     break
 
-            # prepare model inputs
-            model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
-
-            # forward pass to get next token
-            outputs = self(
-                **model_inputs,
-                return_dict=True,
-                output_attentions=output_attentions,
-                output_hidden_states=output_hidden_states,
-            )
+            if decoding_step is not None:
+                # the decoding step keeps its own cache and attention mask
+                outputs = None
+                next_token_logits = decoding_step(input_ids, attention_mask=model_kwargs.get("attention_mask"))
+            else:
+                # prepare model inputs
+                model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+
+                # forward pass to get next token
+                outputs = self(
+                    **model_inputs,
+                    return_dict=True,
+                    output_attentions=output_attentions,
+                    output_hidden_states=output_hidden_states,
+                )
+                next_token_logits = outputs.logits[:, -1, :]
 
             if synced_gpus and this_peer_finished:
                 cur_len = cur_len + 1
                 continue  # don't waste resources running the code we don't need
 
-            next_token_logits = outputs.logits[:, -1, :]
-
             # pre-process distribution
             next_token_scores = logits_processor(input_ids, next_token_logits)
             next_token_scores = logits_warper(input_ids, next_token_scores)
@@ -1988,9 +2400,12 @@ class GenerationMixin:
 
             # update generated ids, model inputs, and length for next step
             input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
-            model_kwargs = self._update_model_kwargs_for_generation(
-                outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
-            )
+            if streamer is not None:
+                streamer.put(next_tokens.cpu())
+            if decoding_step is None:
+                model_kwargs = self._update_model_kwargs_for_generation(
+                    outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
+                )
             cur_len = cur_len + 1
 
             # if eos_token was found in one sentence, set sentence to finished
@@ -2004,6 +2419,18 @@ class GenerationMixin:
                 else:
                     this_peer_finished = True
 
+            # remove the finished sequences from the batch once there are enough of them
+            if compaction_threshold is not None:
+                input_ids, unfinished_sequences, batch_idx, model_kwargs = self._compact_finished_sequences(
+                    compaction_threshold, input_ids, unfinished_sequences, batch_idx, finished_sequences, model_kwargs
+                )
+
+        if streamer is not None:
+            streamer.end()
+
+        if len(finished_sequences) > 0:
+            input_ids = self._restore_finished_sequences(input_ids, batch_idx, finished_sequences, pad_token_id)
+
         if return_dict_in_generate:
             if self.config.is_encoder_decoder:
                 return SampleEncoderDecoderOutput(
@@ -2039,6 +2466,7 @@ class GenerationMixin:
         output_scores: Optional[bool] = None,
         return_dict_in_generate: Optional[bool] = None,
         synced_gpus: Optional[bool] = False,
+        streamer: Optional["BaseStreamer"] = None,
         **model_kwargs,
     ) -> Union[BeamSearchOutput, torch.LongTensor]:
         r"""
@@ -2077,6 +2505,9 @@ class GenerationMixin:
                 Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
             synced_gpus (`bool`, *optional*, defaults to `False`):
                 Whether to continue running the while loop until max_length (needed for ZeRO stage 3)
+            streamer (`BaseStreamer`, *optional*):
+                Streamer object that will be used to stream the generated sequences. Generated tokens are passed
+                through `streamer.put(token_ids)` and the streamer is responsible for any further processing.
             model_kwargs:
                 Additional model specific kwargs will be forwarded to the `forward` function of the model. If model is
                 an encoder-decoder model the kwargs should include `encoder_outputs`.
@@ -2193,6 +2624,9 @@ class GenerationMixin:
         beam_scores[:, 1:] = -1e9
         beam_scores = beam_scores.view((batch_size * num_beams,))
 
+        # the streamer receives the tokens shared by all the beams and finished hypotheses, which can no longer change
+        streamed_length = input_ids.shape[-1]
+
         this_peer_finished = False  # used by synced_gpus only
         while True:
 
@@ -2288,6 +2722,12 @@ class GenerationMixin:
             # increase cur_len
             cur_len = cur_len + 1
 
+            if streamer is not None:
+                committed_length = _beam_search_committed_length(input_ids, beam_scorer)
+                if committed_length > streamed_length:
+                    streamer.put(input_ids[0, streamed_length:committed_length].cpu())
+                    streamed_length = committed_length
+
             if beam_scorer.is_done or stopping_criteria(input_ids, scores):
                 if not synced_gpus:
                     break
@@ -2305,6 +2745,10 @@ class GenerationMixin:
             beam_indices=beam_indices,
         )
 
+        if streamer is not None:
+            streamer.put(sequence_outputs["sequences"][0, streamed_length:].cpu())
+            streamer.end()
+
         if return_dict_in_generate:
             if not output_scores:
                 sequence_outputs["sequence_scores"] = None
@@ -3324,6 +3768,269 @@ class GenerationMixin:
         else:
             return sequence_outputs["sequences"]
 
+    def assisted_decoding(
+        self,
+        input_ids: torch.LongTensor,
+        assistant_model: "PreTrainedModel",
+        num_assistant_tokens: Optional[int] = None,
+        do_sample: bool = False,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        logits_warper: Optional[LogitsProcessorList] = None,
+        stopping_criteria: Optional[StoppingCriteriaList] = None,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[int] = None,
+        output_scores: Optional[bool] = None,
+        return_dict_in_generate: Optional[bool] = None,
+        synced_gpus: Optional[bool] = False,
+        streamer: Optional["BaseStreamer"] = None,
+        **model_kwargs,
+    ) -> Union[GreedySearchOutput, SampleOutput, torch.LongTensor]:
+        r"""
+        Generates sequences of token ids for decoder-only models with a language modeling head using **assisted
+        decoding**: a smaller assistant model drafts `num_assistant_tokens` tokens one by one, and the model scores all
+        of them in a single forward pass. The longest prefix of the draft agreeing with the model is accepted, followed
+        by one token coming from the model itself, so that every forward pass of the model yields between one and
+        `num_assistant_tokens + 1` tokens.
+
+        With greedy decoding, a drafted token is accepted if it is the token the model would have picked, so the output
+        is the same as [`~generation_utils.GenerationMixin.greedy_search`]. With sampling, a drafted token is accepted
+        with probability `min(1, p / q)`, where `p` and `q` are the probabilities of the token under the model and the
+        assistant, and a rejected token is resampled from the normalized `max(0, p - q)`, so that the tokens follow the
+        distribution of [`~generation_utils.GenerationMixin.sample`].
+
+        Parameters:
+
+            input_ids (`torch.LongTensor` of shape `(1, sequence_length)`):
+                The sequence used as a prompt for the generation.
+            assistant_model (`PreTrainedModel`):
+                A decoder-only model sharing the vocabulary of the model, used to draft the candidate tokens. It should
+                be much faster than the model for assisted decoding to pay off.
+            num_assistant_tokens (`int`, *optional*, defaults to 5):
+                The number of tokens drafted by the assistant before each forward pass of the model.
+            do_sample (`bool`, *optional*, defaults to `False`):
+                Whether or not to use sampling ; use greedy decoding otherwise.
+            logits_processor (`LogitsProcessorList`, *optional*):
+                An instance of [`LogitsProcessorList`]. List of instances of class derived from [`LogitsProcessor`]
+                used to modify the prediction scores of the language modeling head applied at each generation step.
+                It is applied to the scores of both the model and the assistant.
+            logits_warper (`LogitsProcessorList`, *optional*):
+                An instance of [`LogitsProcessorList`]. List of instances of class derived from [`LogitsWarper`] used
+                to warp the prediction score distribution of the language modeling head applied before multinomial
+                sampling at each generation step. Only used if `do_sample=True`.
+            stopping_criteria (`StoppingCriteriaList`, *optional*):
+                An instance of [`StoppingCriteriaList`]. List of instances of class derived from [`StoppingCriteria`]
+                used to tell if the generation loop should stop.
+            pad_token_id (`int`, *optional*):
+                The id of the *padding* token.
+            eos_token_id (`int`, *optional*):
+                The id of the *end-of-sequence* token.
+            output_scores (`bool`, *optional*, defaults to `False`):
+                Whether or not to return the prediction scores. See `scores` under returned tensors for more details.
+            return_dict_in_generate (`bool`, *optional*, defaults to `False`):
+                Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
+            synced_gpus (`bool`, *optional*, defaults to `False`):
+                Not supported by assisted decoding.
+            streamer (`BaseStreamer`, *optional*):
+                Streamer object that will be used to stream the generated sequences. Generated tokens are passed
+                through `streamer.put(token_ids)` and the streamer is responsible for any further processing.
+            model_kwargs:
+                Additional model specific keyword arguments. Only `attention_mask` and `past` are supported.
+
+        Return:
+            [`~generation_utils.GreedySearchDecoderOnlyOutput`], [`~generation_utils.SampleDecoderOnlyOutput`] or
+            `torch.LongTensor`: A `torch.LongTensor` containing the generated tokens (default behaviour) or a
+            [`~generation_utils.GreedySearchDecoderOnlyOutput`] (respectively a
+            [`~generation_utils.SampleDecoderOnlyOutput`] if `do_sample=True`) if `return_dict_in_generate=True`.
+
+        Examples:
+
+        ```python
+        >>> from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        >>> tokenizer = AutoTokenizer.from_pretrained("gpt2-large")
+        >>> model = AutoModelForCausalLM.from_pretrained("gpt2-large")
+        >>> assistant_model = AutoModelForCausalLM.from_pretrained("distilgpt2")
+
+        >>> input_ids = tokenizer("It might be possible to", return_tensors="pt").input_ids
+        >>> outputs = model.generate(input_ids, assistant_model=assistant_model, max_new_tokens=20)
+        ```"""
+        # init values
+        logits_processor = logits_processor if logits_processor is not None else LogitsProcessorList()
+        logits_warper = logits_warper if logits_warper is not None else LogitsProcessorList()
+        stopping_criteria = stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+        num_assistant_tokens = num_assistant_tokens if num_assistant_tokens is not None else 5
+        eos_token_id = eos_token_id if eos_token_id is not None else self.config.eos_token_id
+        output_scores = output_scores if output_scores is not None else self.config.output_scores
+        return_dict_in_generate = (
+            return_dict_in_generate if return_dict_in_generate is not None else self.config.return_dict_in_generate
+        )
+
+        if synced_gpus:
+            raise ValueError("Assisted decoding does not support `synced_gpus=True`.")
+        if input_ids.shape[0] != 1:
+            raise ValueError(f"Assisted decoding requires a batch size of 1, but got {input_ids.shape[0]}.")
+        if model_kwargs.pop("output_attentions", None) or model_kwargs.pop("output_hidden_states", None):
+            raise ValueError("Assisted decoding does not return attentions nor hidden states.")
+        model_kwargs.pop("use_cache", None)
+        past = model_kwargs.pop("past", None)
+        attention_mask = model_kwargs.pop("attention_mask", None)
+        unsupported_kwargs = [key for key, value in model_kwargs.items() if value is not None]
+        if len(unsupported_kwargs) > 0:
+            raise ValueError(f"Assisted decoding does not support the model kwargs {unsupported_kwargs}.")
+
+        def get_attention_mask(length):
+            if attention_mask is None:
+                return None
+            return torch.cat([attention_mask, attention_mask.new_ones((1, length - attention_mask.shape[-1]))], dim=-1)
+
+        # init scores tuple
+        scores = () if (return_dict_in_generate and output_scores) else None
+
+        max_length = stopping_criteria.max_length
+        cur_len = input_ids.shape[-1]
+        # the number of positions already in the caches of the model and of the assistant
+        past_length = cur_len - 1 if past else 0
+        assistant_past = None
+        assistant_past_length = 0
+
+        while True:
+            # 1. draft candidate tokens with the assistant, leaving room for the token picked by the model
+            num_candidates = num_assistant_tokens
+            if max_length is not None:
+                num_candidates = min(num_candidates, max_length - cur_len - 1)
+
+            candidate_input_ids = input_ids
+            draft_probs = []
+            for _ in range(num_candidates):
+                assistant_outputs = assistant_model(
+                    candidate_input_ids[:, assistant_past_length:],
+                    attention_mask=get_attention_mask(candidate_input_ids.shape[-1]),
+                    past_key_values=assistant_past,
+                    use_cache=True,
+                    return_dict=True,
+                )
+                assistant_past = assistant_outputs.past_key_values
+                assistant_past_length = candidate_input_ids.shape[-1]
+
+                draft_scores = logits_processor(candidate_input_ids, assistant_outputs.logits[:, -1, :])
+                if do_sample:
+                    probs = nn.functional.softmax(logits_warper(candidate_input_ids, draft_scores), dim=-1)
+                    draft_token = torch.multinomial(probs, num_samples=1)
+                    draft_probs.append(probs)
+                else:
+                    draft_token = torch.argmax(draft_scores, dim=-1, keepdim=True)
+                candidate_input_ids = torch.cat([candidate_input_ids, draft_token], dim=-1)
+
+                if eos_token_id is not None and draft_token[0, 0] == eos_token_id:
+                    break
+            candidate_length = candidate_input_ids.shape[-1] - cur_len
+
+            # 2. score all the candidates with a single forward pass of the model
+            outputs = self(
+                candidate_input_ids[:, past_length:],
+                attention_mask=get_attention_mask(candidate_input_ids.shape[-1]),
+                past_key_values=past,
+                use_cache=True,
+                return_dict=True,
+            )
+            past = outputs.past_key_values
+            # the logits predicting each candidate, plus the ones predicting the token after the last candidate
+            logits = outputs.logits[:, -candidate_length - 1 :, :]
+
+            # 3. accept the candidates agreeing with the model, then pick the next token with the model
+            num_matches = 0
+            step_scores = []
+            for i in range(candidate_length + 1):
+                prefix = candidate_input_ids[:, : cur_len + i]
+                next_token_scores = logits_processor(prefix, logits[:, i, :])
+                step_scores.append(next_token_scores)
+                is_candidate = i < candidate_length
+                if do_sample:
+                    probs = nn.functional.softmax(logits_warper(prefix, next_token_scores), dim=-1)
+                    if is_candidate:
+                        candidate_token = candidate_input_ids[0, cur_len + i]
+                        # accept the candidate with probability min(1, p / q)
+                        draft_prob = draft_probs[i][0, candidate_token]
+                        if torch.rand(1, device=probs.device) * draft_prob < probs[0, candidate_token]:
+                            num_matches += 1
+                            continue
+                        # otherwise sample from the residual distribution max(0, p - q)
+                        residual_probs = (probs - draft_probs[i]).clamp(min=0)
+                        if residual_probs.sum() > 0:
+                            probs = residual_probs
+                    next_token = torch.multinomial(probs, num_samples=1)
+                else:
+                    next_token = torch.argmax(next_token_scores, dim=-1, keepdim=True)
+                    if is_candidate and next_token[0, 0] == candidate_input_ids[0, cur_len + i]:
+                        num_matches += 1
+                        continue
+                break
+
+            # 4. append the new tokens one by one, to stop exactly where the other generation methods would
+            new_input_ids = torch.cat([candidate_input_ids[:, : cur_len + num_matches], next_token], dim=-1)
+            finished = False
+            for i in range(num_matches + 1):
+                input_ids = new_input_ids[:, : cur_len + i + 1]
+                if scores is not None:
+                    scores += (step_scores[i],)
+                if eos_token_id is not None and input_ids[0, -1] == eos_token_id:
+                    finished = True
+                if finished or stopping_criteria(input_ids, scores):
+                    finished = True
+                    break
+            if streamer is not None:
+                streamer.put(input_ids[:, cur_len:].cpu())
+            if finished:
+                break
+
+            # 5. drop the cache of the rejected candidates, the last token is fed at the next iteration
+            cur_len = input_ids.shape[-1]
+            past_length = cur_len - 1
+            past = _crop_past_key_values(self, past, past_length)
+            assistant_past_length = min(assistant_past_length, past_length)
+            assistant_past = _crop_past_key_values(assistant_model, assistant_past, assistant_past_length)
+
+        if streamer is not None:
+            streamer.end()
+
+        if return_dict_in_generate:
+            if do_sample:
+                return SampleDecoderOnlyOutput(sequences=input_ids, scores=scores)
+            return GreedySearchDecoderOnlyOutput(sequences=input_ids, scores=scores)
+        else:
+            return input_ids
+
+
+def _beam_search_committed_length(input_ids: torch.LongTensor, beam_scorer: BeamScorer) -> int:
+    """
+    Returns the length of the prefix shared by all the beams and all the finished hypotheses of the first batch item of
+    a beam search, which is part of the final output whatever the next steps of the search.
+    """
+    beam_hyps = getattr(beam_scorer, "_beam_hyps", None)
+    if beam_hyps is None:
+        # a custom beam scorer, its finished hypotheses are unknown
+        return 0
+    reference = input_ids[0]
+    committed_length = input_ids.shape[-1]
+    for sequences in [input_ids] + [hyp[None] for _, hyp, _ in beam_hyps[0].beams]:
+        length = min(committed_length, sequences.shape[-1])
+        is_shared = (sequences[:, :length] == reference[:length]).all(dim=0)
+        committed_length = length if is_shared.all() else int(is_shared.long().argmin())
+    return committed_length
+
+
+def _crop_past_key_values(model, past_key_values, max_length):
+    """Crops the cache of `model` to its first `max_length` positions."""
+    if past_key_values is None:
+        return None
+    if isinstance(past_key_values, StaticCache):
+        return past_key_values.crop(max_length)
+    # BLOOM caches its keys and values with the sequence as second dimension
+    seq_dim = 1 if model.config.model_type == "bloom" else -2
+    return tuple(
+        tuple(past_state.narrow(seq_dim, 0, max_length) for past_state in layer_past) for layer_past in past_key_values
+    )
+
 
 def top_k_top_p_filtering(
     logits: torch.FloatTensor,
@@ -14,13 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import gc
+import heapq
 import json
 import os
 import re
 import shutil
 import tempfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import partial
@@ -44,14 +47,18 @@ from .pytorch_utils import (  # noqa: F401
     Conv1D,
     apply_chunking_to_forward,
     find_pruneable_heads_and_indices,
+    load_safetensors_file,
     prune_conv1d_layer,
     prune_layer,
     prune_linear_layer,
+    save_safetensors_file,
 )
 from .utils import (
     DUMMY_INPUTS,
     FLAX_WEIGHTS_NAME,
     HUGGINGFACE_CO_RESOLVE_ENDPOINT,
+    SAFE_WEIGHTS_INDEX_NAME,
+    SAFE_WEIGHTS_NAME,
     TF2_WEIGHTS_NAME,
     TF_WEIGHTS_NAME,
     WEIGHTS_INDEX_NAME,
@@ -243,20 +250,24 @@ def dtype_byte_size(dtype):
     return bit_size // 8
 
 
-def shard_checkpoint(state_dict: Dict[str, torch.Tensor], max_shard_size: Union[int, str] = "10GB"):
+def shard_checkpoint(
+    state_dict: Dict[str, torch.Tensor], max_shard_size: Union[int, str] = "10GB", weights_name: str = WEIGHTS_NAME
+):
     """
     Splits a model state dictionary in sub-checkpoints so that the final size of each sub-checkpoint does not exceed a
     given size.
 
-    The sub-checkpoints are determined by iterating through the `state_dict` in the order of its keys, so there is no
-    optimization made to make each sub-checkpoint as close as possible to the maximum size passed. For example, if the
-    limit is 10GB and we have weights of sizes [6GB, 6GB, 2GB, 6GB, 2GB, 2GB] they will get sharded as [6GB], [6+2GB],
-    [6+2+2GB] and not [6+2+2GB], [6+2GB], [6GB].
+    The weights of a same block (the weights sharing a prefix up to a layer index, like `"encoder.layer.3."`) are kept
+    in the same sub-checkpoint, as are the weights of a same module outside of blocks, so that loading part of a model
+    only needs the sub-checkpoints of its blocks. Those groups are then spread over as few sub-checkpoints as possible,
+    biggest first and each one in the least filled sub-checkpoint, to balance their sizes. For example, if the limit is
+    10GB and we have weights of sizes [6GB, 6GB, 2GB, 6GB, 2GB, 2GB] they will get sharded as [6+2GB], [6+2GB],
+    [6+2GB].
 
     <Tip warning={true}>
 
-    If one of the model's weight is bigger that `max_sahrd_size`, it will end up in its own sub-checkpoint which will
-    have a size greater than `max_shard_size`.
+    If one of the model's weight is bigger that `max_shard_size`, it will end up in its own sub-checkpoint which will
+    have a size greater than `max_shard_size`. Blocks bigger than `max_shard_size` are split.
 
     </Tip>
 
@@ -265,39 +276,64 @@ def shard_checkpoint(state_dict: Dict[str, torch.Tensor], max_shard_size: Union[
         max_shard_size (`int` or `str`, *optional*, defaults to `"10GB"`):
             The maximum size of each sub-checkpoint. If expressed as a string, needs to be digits followed by a unit
             (like `"5MB"`).
+        weights_name (`str`, *optional*, defaults to `"pytorch_model.bin"`):
+            The name of the checkpoint file, from which the names of the sub-checkpoints are derived.
     """
     max_shard_size = convert_file_size_to_int(max_shard_size)
 
-    sharded_state_dicts = []
-    current_block = {}
-    current_block_size = 0
-    total_size = 0
-
-    for key, weight in state_dict.items():
-        weight_size = weight.numel() * dtype_byte_size(weight.dtype)
-
-        # If this weight is going to tip up over the maximal size, we split.
-        if current_block_size + weight_size > max_shard_size:
-            sharded_state_dicts.append(current_block)
-            current_block = {}
-            current_block_size = 0
+    weight_sizes = {key: weight.numel() * dtype_byte_size(weight.dtype) for key, weight in state_dict.items()}
+    total_size = sum(weight_sizes.values())
 
-        current_block[key] = weight
-        current_block_size += weight_size
-        total_size += weight_size
+    groups = collections.OrderedDict()
+    for key in state_dict.keys():
+        block_match = re.match(r"((?:.*?\.)?\d+)\.", key)
+        group = block_match.group(1) if block_match is not None else key.rsplit(".", 1)[0]
+        groups.setdefault(group, []).append(key)
+
+    items = []
+    for keys in groups.values():
+        size = sum(weight_sizes[key] for key in keys)
+        if size > max_shard_size and len(keys) > 1:
+            items.extend(([key], weight_sizes[key]) for key in keys)
+        else:
+            items.append((keys, size))
+    # Python sorts are stable, so items of the same size stay in the order of the state dict.
+    items.sort(key=lambda item: item[1], reverse=True)
+
+    # Items bigger than the limit need their own sub-checkpoint, the others need at least enough to fit their total
+    # size. We add sub-checkpoints one at a time until everything fits.
+    oversized_items = [size for _, size in items if size > max_shard_size]
+    remaining_size = total_size - sum(oversized_items)
+    num_shards = max(len(oversized_items) + (remaining_size + max_shard_size - 1) // max_shard_size, 1)
+    while True:
+        shard_keys = [[] for _ in range(num_shards)]
+        shard_sizes = [(0, idx) for idx in range(num_shards)]
+        for keys, size in items:
+            shard_size, idx = heapq.heappop(shard_sizes)
+            if shard_size > 0 and shard_size + size > max_shard_size:
+                break
+            shard_keys[idx].extend(keys)
+            heapq.heappush(shard_sizes, (shard_size + size, idx))
+        else:
+            break
+        num_shards += 1
 
-    # Add the last block
-    sharded_state_dicts.append(current_block)
+    # Sub-checkpoints, and the weights inside them, follow the order of the state dict.
+    key_order = {key: idx for idx, key in enumerate(state_dict.keys())}
+    shard_keys = [sorted(keys, key=key_order.get) for keys in shard_keys if len(keys) > 0]
+    shard_keys.sort(key=lambda keys: key_order[keys[0]])
+    sharded_state_dicts = [{key: state_dict[key] for key in keys} for keys in shard_keys]
 
     # If we only have one shard, we return it
-    if len(sharded_state_dicts) == 1:
-        return {WEIGHTS_NAME: sharded_state_dicts[0]}, None
+    if len(sharded_state_dicts) <= 1:
+        return {weights_name: dict(state_dict)}, None
 
     # Otherwise, let's build the index
     weight_map = {}
     shards = {}
+    weights_prefix, weights_ext = os.path.splitext(weights_name)
     for idx, shard in enumerate(sharded_state_dicts):
-        shard_file = WEIGHTS_NAME.replace(".bin", f"-{idx+1:05d}-of-{len(sharded_state_dicts):05d}.bin")
+        shard_file = f"{weights_prefix}-{idx+1:05d}-of-{len(sharded_state_dicts):05d}{weights_ext}"
         shards[shard_file] = shard
         for key in shard.keys():
             weight_map[key] = shard_file
@@ -308,20 +344,29 @@ def shard_checkpoint(state_dict: Dict[str, torch.Tensor], max_shard_size: Union[
     return shards, index
 
 
-def load_sharded_checkpoint(model, folder, strict=True):
+def load_sharded_checkpoint(
+    model, folder, strict=True, shard_loading_workers=1, shard_loading_max_memory: Optional[Union[int, str]] = None
+):
     """
     This is the same as
     [`torch.nn.Module.load_state_dict`](https://pytorch.org/docs/stable/generated/torch.nn.Module.html?highlight=load_state_dict#torch.nn.Module.load_state_dict)
     but for a sharded checkpoint.
 
     This load is performed efficiently: each checkpoint shard is loaded one by one in RAM and deleted after being
-    loaded in the model.
+    loaded in the model. With `shard_loading_workers > 1`, the next shards are read in parallel while the current one
+    is loaded in the model.
 
     Args:
         model (`torch.nn.Module`): The model in which to load the checkpoint.
         folder (`str` or `os.PathLike`): A path to a folder containing the sharded checkpoint.
         strict (`bool`, *optional`, defaults to `True`):
             Whether to strictly enforce that the keys in the model state dict match the keys in the sharded checkpoint.
+        shard_loading_workers (`int`, *optional*, defaults to 1):
+            The number of threads reading checkpoint shards ahead of the one being loaded in the model.
+        shard_loading_max_memory (`int` or `str`, *optional*):
+            The maximum total size of the checkpoint shards held in memory at once when `shard_loading_workers > 1`
+            (like `"20GB"`). A shard is always read if no other one is held in memory. Defaults to no limit other
+            than the number of workers.
 
     Returns:
         `NamedTuple`: A named tuple with `missing_keys` and `unexpected_keys` fields
@@ -331,12 +376,16 @@ def load_sharded_checkpoint(model, folder, strict=True):
     # Load the index
     index_file = os.path.join(folder, WEIGHTS_INDEX_NAME)
     if not os.path.isfile(index_file):
-        raise ValueError(f"Can't find a checkpoint index ({WEIGHTS_INDEX_NAME}) in {folder}.")
+        index_file = os.path.join(folder, SAFE_WEIGHTS_INDEX_NAME)
+    if not os.path.isfile(index_file):
+        raise ValueError(
+            f"Can't find a checkpoint index ({WEIGHTS_INDEX_NAME} or {SAFE_WEIGHTS_INDEX_NAME}) in {folder}."
+        )
 
     with open(index_file, "r", encoding="utf-8") as f:
         index = json.load(f)
 
-    shard_files = list(set(index["weight_map"].values()))
+    shard_files = sorted(set(index["weight_map"].values()))
 
     # If strict=True, error before loading any of the state dicts.
     loaded_keys = index["weight_map"].keys()
@@ -353,8 +402,8 @@ def load_sharded_checkpoint(model, folder, strict=True):
             error_message += f"\nMissing key(s): {str_unexpected_keys}."
         raise RuntimeError(error_message)
 
-    for shard_file in shard_files:
-        state_dict = torch.load(os.path.join(folder, shard_file))
+    shard_files = [os.path.join(folder, shard_file) for shard_file in shard_files]
+    for state_dict in load_state_dicts(shard_files, shard_loading_workers, shard_loading_max_memory):
         model.load_state_dict(state_dict, strict=False)
 
         # Make sure memory is fred before we load the next state dict.
@@ -367,8 +416,17 @@ def load_sharded_checkpoint(model, folder, strict=True):
 
 def load_state_dict(checkpoint_file: Union[str, os.PathLike]):
     """
-    Reads a PyTorch checkpoint file, returning properly formatted errors if they arise.
+    Reads a PyTorch checkpoint file, returning properly formatted errors if they arise. Checkpoints in the safetensors
+    format are memory-mapped instead of being read in RAM.
     """
+    if str(checkpoint_file).endswith(".safetensors"):
+        try:
+            return load_safetensors_file(checkpoint_file)
+        except Exception as e:
+            raise OSError(
+                f"Unable to load weights from safetensors checkpoint file '{checkpoint_file}'. Make sure you have "
+                "saved the model properly."
+            ) from e
     try:
         return torch.load(checkpoint_file, map_location="cpu")
     except Exception as e:
@@ -393,6 +451,59 @@ def load_state_dict(checkpoint_file: Union[str, os.PathLike]):
             )
 
 
+def load_state_dicts(
+    checkpoint_files: List[Union[str, os.PathLike]], num_workers: int = 1, max_memory: Optional[Union[int, str]] = None
+):
+    """
+    Reads the checkpoint files one after the other with [`load_state_dict`], yielding their state dicts in order. With
+    `num_workers > 1`, up to `num_workers` of the next files are read by a thread pool while the current state dict is
+    used, as long as the total size of the files held in memory stays under `max_memory`.
+
+    Args:
+        checkpoint_files (`List[str]` or `List[os.PathLike]`): The checkpoint files to read.
+        num_workers (`int`, *optional*, defaults to 1): The number of files read ahead of the one being used.
+        max_memory (`int` or `str`, *optional*):
+            The maximum total size of the files held in memory at once (like `"20GB"`). A file is always read if no
+            other one is held in memory.
+    """
+    if num_workers <= 1 or len(checkpoint_files) <= 1:
+        for checkpoint_file in checkpoint_files:
+            yield load_state_dict(checkpoint_file)
+        return
+
+    max_memory = None if max_memory is None else convert_file_size_to_int(max_memory)
+    sizes = [os.path.getsize(checkpoint_file) for checkpoint_file in checkpoint_files]
+    futures = collections.deque()
+    # Size of the files read or being read, including the one being used.
+    held_size = 0
+    next_idx = 0
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        try:
+            for idx in range(len(checkpoint_files)):
+                if len(futures) == 0:
+                    futures.append(executor.submit(load_state_dict, checkpoint_files[next_idx]))
+                    held_size += sizes[next_idx]
+                    next_idx += 1
+                future = futures.popleft()
+                while (
+                    next_idx < len(checkpoint_files)
+                    and len(futures) < num_workers
+                    and (max_memory is None or held_size + sizes[next_idx] <= max_memory)
+                ):
+                    futures.append(executor.submit(load_state_dict, checkpoint_files[next_idx]))
+                    held_size += sizes[next_idx]
+                    next_idx += 1
+
+                state_dict = future.result()
+                del future
+                yield state_dict
+                del state_dict
+                held_size -= sizes[idx]
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 def _load_state_dict_into_model(model_to_load, state_dict, start_prefix):
     # Convert old format to new format if needed from a PyTorch state_dict
     old_keys = []
@@ -747,6 +858,43 @@ class ModuleUtilsMixin:
         extended_attention_mask = (1.0 - extended_attention_mask) * torch.finfo(dtype).min
         return extended_attention_mask
 
+    def get_document_attention_mask(
+        self,
+        extended_attention_mask: Optional[Tensor],
+        document_ids: Tensor,
+        key_document_ids: Optional[Tensor] = None,
+        dtype: torch.float = None,
+    ) -> Tensor:
+        """
+        Masks the attention between the tokens of different documents packed in the same sequences, turning the
+        attention mask into a block-diagonal one.
+
+        Arguments:
+            extended_attention_mask (`torch.Tensor`, *optional*):
+                An extended attention mask, as returned by [`~ModuleUtilsMixin.get_extended_attention_mask`] or
+                [`~ModuleUtilsMixin.invert_attention_mask`], broadcastable to `[batch_size, num_heads,
+                query_length, key_length]`.
+            document_ids (`torch.Tensor` of shape `[batch_size, query_length]`):
+                Index of the document of each query token, as returned by [`DataCollatorWithPacking`].
+            key_document_ids (`torch.Tensor` of shape `[batch_size, key_length]`, *optional*):
+                Index of the document of each key token. Defaults to `document_ids`, as in self-attention.
+
+        Returns:
+            `torch.Tensor` of shape `[batch_size, 1, query_length, key_length]`: The extended attention mask, in which
+            tokens only attend to the tokens of their own document.
+        """
+        if dtype is None:
+            dtype = self.dtype if extended_attention_mask is None else extended_attention_mask.dtype
+        if key_document_ids is None:
+            key_document_ids = document_ids
+
+        same_document = document_ids[:, None, :, None] == key_document_ids[:, None, None, :]
+        if extended_attention_mask is None:
+            extended_attention_mask = torch.zeros((), dtype=dtype, device=same_document.device)
+        # `torch.where` rather than an addition, which would overflow masked positions to -inf in half precision
+        min_value = torch.tensor(torch.finfo(dtype).min, dtype=dtype, device=same_document.device)
+        return torch.where(same_document, extended_attention_mask.to(dtype), min_value)
+
     def get_head_mask(
         self, head_mask: Optional[Tensor], num_hidden_layers: int, is_attention_chunked: bool = False
     ) -> Tensor:
@@ -1452,6 +1600,7 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
         save_function: Callable = torch.save,
         push_to_hub: bool = False,
         max_shard_size: Union[int, str] = "10GB",
+        safe_serialization: bool = False,
         **kwargs,
     ):
         """
@@ -1487,6 +1636,10 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
 
                 </Tip>
 
+            safe_serialization (`bool`, *optional*, defaults to `False`):
+                Whether to save the model in the safetensors format (a JSON header followed by the raw buffers of the
+                weights) instead of pickling it with `save_function`. Such checkpoints are memory-mapped by
+                [`~PreTrainedModel.from_pretrained`] instead of being read in RAM.
             kwargs:
                 Additional key word arguments passed along to the [`~utils.PushToHubMixin.push_to_hub`] method.
         """
@@ -1543,16 +1696,34 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 if ignore_key in state_dict.keys():
                     del state_dict[ignore_key]
 
-        # Shard the model if it is too big.
-        shards, index = shard_checkpoint(state_dict, max_shard_size=max_shard_size)
+        if safe_serialization:
+            # The safetensors format has no notion of shared tensors: tied weights the model knows how to rebuild are
+            # not saved, the others are saved as copies.
+            ptrs = set()
+            for key in list(state_dict.keys()):
+                ptr = state_dict[key].data_ptr()
+                if ptr in ptrs and any(re.search(pat, key) for pat in self._keys_to_ignore_on_load_missing or []):
+                    del state_dict[key]
+                ptrs.add(ptr)
 
-        # Clean the folder from a previous save
+        # Shard the model if it is too big.
+        weights_name = SAFE_WEIGHTS_NAME if safe_serialization else WEIGHTS_NAME
+        shards, index = shard_checkpoint(state_dict, max_shard_size=max_shard_size, weights_name=weights_name)
+
+        # Clean the folder from a previous save, in both formats since a stale safetensors checkpoint would be loaded
+        # in priority.
+        weights_file_pattern = re.compile(
+            "|".join(
+                rf"{re.escape(prefix)}(-\d{{5}}-of-\d{{5}})?{re.escape(ext)}(\.index\.json)?"
+                for prefix, ext in (os.path.splitext(name) for name in [WEIGHTS_NAME, SAFE_WEIGHTS_NAME])
+            )
+        )
         for filename in os.listdir(save_directory):
             full_filename = os.path.join(save_directory, filename)
             # If we have a shard file that is not going to be replaced, we delete it, but only from the main process
             # in distributed settings to avoid race conditions.
             if (
-                filename.startswith(WEIGHTS_NAME[:-4])
+                weights_file_pattern.fullmatch(filename) is not None
                 and os.path.isfile(full_filename)
                 and filename not in shards.keys()
                 and is_main_process
@@ -1560,13 +1731,24 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 os.remove(full_filename)
 
         # Save the model
+        weight_offsets = {}
         for shard_file, shard in shards.items():
-            save_function(shard, os.path.join(save_directory, shard_file))
+            if safe_serialization:
+                weight_offsets.update(
+                    save_safetensors_file(shard, os.path.join(save_directory, shard_file), metadata={"format": "pt"})
+                )
+            else:
+                save_function(shard, os.path.join(save_directory, shard_file))
 
         if index is None:
-            logger.info(f"Model weights saved in {os.path.join(save_directory, WEIGHTS_NAME)}")
+            logger.info(f"Model weights saved in {os.path.join(save_directory, weights_name)}")
         else:
-            save_index_file = os.path.join(save_directory, WEIGHTS_INDEX_NAME)
+            save_index_file = os.path.join(
+                save_directory, SAFE_WEIGHTS_INDEX_NAME if safe_serialization else WEIGHTS_INDEX_NAME
+            )
+            if safe_serialization:
+                # Where each weight lies in its shard, so it can be read without going through the shard header.
+                index["weight_offsets"] = {key: list(offsets) for key, offsets in weight_offsets.items()}
             # Save the index as well
             with open(save_index_file, "w", encoding="utf-8") as f:
                 content = json.dumps(index, indent=2, sort_keys=True) + "\n"
@@ -1711,6 +1893,13 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 If `True`, will temporarily offload the CPU state dict to the hard drive to avoid getting out of CPU
                 RAM if the weight of the CPU state dict + the biggest shard of the checkpoint does not fit. Defaults to
                 `True` when there is some disk offload.
+            shard_loading_workers (`int`, *optional*, defaults to 1):
+                For sharded checkpoints, the number of threads reading checkpoint shards ahead of the one being loaded
+                in the model.
+            shard_loading_max_memory (`int` or `str`, *optional*):
+                The maximum total size of the checkpoint shards held in memory at once when `shard_loading_workers >
+                1` (like `"20GB"`). A shard is always read if no other one is held in memory. Defaults to no limit
+                other than the number of workers.
             subfolder (`str`, *optional*, defaults to `""`):
                 In case the relevant files are located inside a subfolder of the model repo on huggingface.co, you can
                 specify the folder name here.
@@ -1800,6 +1989,8 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
         max_memory = kwargs.pop("max_memory", None)
         offload_folder = kwargs.pop("offload_folder", None)
         offload_state_dict = kwargs.pop("offload_state_dict", None)
+        shard_loading_workers = kwargs.pop("shard_loading_workers", 1)
+        shard_loading_max_memory = kwargs.pop("shard_loading_max_memory", None)
         subfolder = kwargs.pop("subfolder", "")
 
         if device_map is not None:
@@ -1877,6 +2068,13 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 ):
                     # Load from a Flax checkpoint in priority if from_flax
                     archive_file = os.path.join(pretrained_model_name_or_path, subfolder, FLAX_WEIGHTS_NAME)
+                elif os.path.isfile(os.path.join(pretrained_model_name_or_path, subfolder, SAFE_WEIGHTS_NAME)):
+                    # Load from a safetensors checkpoint in priority since it can be memory-mapped
+                    archive_file = os.path.join(pretrained_model_name_or_path, subfolder, SAFE_WEIGHTS_NAME)
+                elif os.path.isfile(os.path.join(pretrained_model_name_or_path, subfolder, SAFE_WEIGHTS_INDEX_NAME)):
+                    # Load from a sharded safetensors checkpoint
+                    archive_file = os.path.join(pretrained_model_name_or_path, subfolder, SAFE_WEIGHTS_INDEX_NAME)
+                    is_sharded = True
                 elif os.path.isfile(os.path.join(pretrained_model_name_or_path, subfolder, WEIGHTS_NAME)):
                     # Load from a PyTorch checkpoint
                     archive_file = os.path.join(pretrained_model_name_or_path, subfolder, WEIGHTS_NAME)
@@ -1901,8 +2099,9 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                     )
                 else:
                     raise EnvironmentError(
-                        f"Error no file named {WEIGHTS_NAME}, {TF2_WEIGHTS_NAME}, {TF_WEIGHTS_NAME + '.index'} or "
-                        f"{FLAX_WEIGHTS_NAME} found in directory {pretrained_model_name_or_path}."
+                        f"Error no file named {WEIGHTS_NAME}, {SAFE_WEIGHTS_NAME}, {TF2_WEIGHTS_NAME}, "
+                        f"{TF_WEIGHTS_NAME + '.index'} or {FLAX_WEIGHTS_NAME} found in directory "
+                        f"{pretrained_model_name_or_path}."
                     )
             elif os.path.isfile(os.path.join(subfolder, pretrained_model_name_or_path)) or is_remote_url(
                 pretrained_model_name_or_path
@@ -1960,27 +2159,33 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 )
             except EntryNotFoundError:
                 if filename == WEIGHTS_NAME:
-                    try:
-                        # Maybe the checkpoint is sharded, we try to grab the index name in this case.
+                    # Maybe the checkpoint is sharded or in the safetensors format, we try to grab those files in this
+                    # case.
+                    resolved_archive_file = None
+                    for fallback_filename in [WEIGHTS_INDEX_NAME, SAFE_WEIGHTS_NAME, SAFE_WEIGHTS_INDEX_NAME]:
                         archive_file = hf_bucket_url(
                             pretrained_model_name_or_path,
-                            filename=WEIGHTS_INDEX_NAME,
+                            filename=fallback_filename,
                             revision=revision,
                             mirror=mirror,
                             subfolder=subfolder if len(subfolder) > 0 else None,
                         )
-                        resolved_archive_file = cached_path(
-                            archive_file,
-                            cache_dir=cache_dir,
-                            force_download=force_download,
-                            proxies=proxies,
-                            resume_download=resume_download,
-                            local_files_only=local_files_only,
-                            use_auth_token=use_auth_token,
-                            user_agent=user_agent,
-                        )
-                        is_sharded = True
-                    except EntryNotFoundError:
+                        try:
+                            resolved_archive_file = cached_path(
+                                archive_file,
+                                cache_dir=cache_dir,
+                                force_download=force_download,
+                                proxies=proxies,
+                                resume_download=resume_download,
+                                local_files_only=local_files_only,
+                                use_auth_token=use_auth_token,
+                                user_agent=user_agent,
+                            )
+                        except EntryNotFoundError:
+                            continue
+                        is_sharded = fallback_filename.endswith(".index.json")
+                        break
+                    if resolved_archive_file is None:
                         # Otherwise, maybe there is a TF or Flax model file.  We try those to give a helpful error
                         # message.
                         has_file_kwargs = {
@@ -2185,6 +2390,8 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 offload_folder=offload_folder,
                 offload_state_dict=offload_state_dict,
                 dtype=torch_dtype,
+                shard_loading_workers=shard_loading_workers,
+                shard_loading_max_memory=shard_loading_max_memory,
             )
 
         # make sure token embedding weights are still tied if needed
@@ -2225,6 +2432,8 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
         offload_folder=None,
         offload_state_dict=None,
         dtype=None,
+        shard_loading_workers=1,
+        shard_loading_max_memory=None,
     ):
         if device_map is not None and "disk" in device_map.values():
             if offload_folder is None:
@@ -2372,9 +2581,7 @@ class PreTrainedModel(nn.Module, ModuleUtilsMixin, GenerationMixin, PushToHubMix
                 state_dict_folder = None
                 state_dict_index = None
 
-            for shard_file in resolved_archive_file:
-                state_dict = load_state_dict(shard_file)
-
+            for state_dict in load_state_dicts(resolved_archive_file, shard_loading_workers, shard_loading_max_memory):
                 # Mistmatched keys contains tuples key/shape1/shape2 of weights in the checkpoint that have a shape not
                 # matching the weights in the model.
                 mismatched_keys += _find_mismatched_keys(
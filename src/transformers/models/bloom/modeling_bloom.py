@@ -23,6 +23,7 @@ import torch.utils.checkpoint
 from torch import nn
 from torch.nn import BCEWithLogitsLoss, CrossEntropyLoss, LayerNorm, MSELoss
 
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...file_utils import add_code_sample_docstrings, add_start_docstrings, add_start_docstrings_to_model_forward
 from ...modeling_outputs import (
     BaseModelOutputWithPastAndCrossAttentions,
@@ -279,14 +280,18 @@ class BloomAttention(nn.Module):
         # 3 x [batch_size, seq_length, num_heads, head_dim]
         (query_layer, key_layer, value_layer) = self._split_heads(fused_qkv)
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            # the static cache is laid out as [batch_size, num_heads, max_length, head_dim]
+            key_layer, value_layer = layer_past.update(key_layer.transpose(1, 2), value_layer.transpose(1, 2))
+            key_layer, value_layer = key_layer.transpose(1, 2), value_layer.transpose(1, 2)
+        elif layer_past is not None:
             past_key, past_value = layer_past
             # concatenate along seq_length dimension -> [batch_size, qk_length, num_heads, head_dim]
             key_layer = torch.cat((past_key.type_as(key_layer), key_layer), dim=1)
             value_layer = torch.cat((past_value.type_as(value_layer), value_layer), dim=1)
 
         if use_cache is True:
-            present = (key_layer, value_layer)
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key_layer, value_layer)
         else:
             present = None
 
@@ -457,6 +462,9 @@ class BloomPreTrainedModel(PreTrainedModel):
     config_class = BloomConfig
     base_model_prefix = "transformer"
     supports_gradient_checkpointing = True
+    supports_static_cache = True
+    supports_prompt_cache = True
+    supports_fixed_shape_decoding = True
     _no_split_modules = ["BloomBlock"]
 
     def __init__(self, *inputs, **kwargs):
@@ -671,7 +679,10 @@ class BloomModel(BloomPreTrainedModel):
         # Compute alibi tensor: check build_alibi_tensor documentation
         current_sequence_length = hidden_states.shape[1]
         past_key_values_length = 0
-        if past_key_values[0] is not None:
+        if isinstance(past_key_values, StaticCache):
+            past_key_values_length = past_key_values.get_seq_length()
+            current_sequence_length += past_key_values_length
+        elif past_key_values[0] is not None:
             past_key_values_length = past_key_values[0][0].shape[1]
             current_sequence_length += past_key_values_length
 
@@ -737,6 +748,10 @@ class BloomModel(BloomPreTrainedModel):
 
         hidden_states = hidden_states.view(output_shape)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(v for v in [hidden_states, presents, all_hidden_states, all_self_attentions] if v is not None)
 
@@ -868,6 +883,8 @@ class BloomForCausalLM(BloomPreTrainedModel):
         [`~PreTrainedModel.beam_sample`] is called. This is required to match `past_key_values` with the correct
         beam_idx at every generation step.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(
             tuple(past_state.index_select(0, beam_idx.to(past_state.device)) for past_state in layer_past)
             for layer_past in past
@@ -22,7 +22,7 @@ from typing import List, Optional, Tuple
 import regex as re
 from transformers.models.bert.tokenization_bert import BasicTokenizer
 
-from ...tokenization_utils import AddedToken, PreTrainedTokenizer
+from ...tokenization_utils import AddedToken, LRUCache, PreTrainedTokenizer, bpe_merge
 from ...utils import logging
 
 
@@ -169,7 +169,9 @@ class CLIPTokenizer(PreTrainedTokenizer):
             bpe_merges = merges_handle.read().strip().split("\n")[1 : 49152 - 256 - 2 + 1]
         bpe_merges = [tuple(merge.split()) for merge in bpe_merges]
         self.bpe_ranks = dict(zip(bpe_merges, range(len(bpe_merges))))
-        self.cache = {"<|startoftext|>": "<|startoftext|>", "<|endoftext|>": "<|endoftext|>"}
+        self.cache = LRUCache()
+        # the special tokens are never split, whatever the size of the cache
+        self.unmerged_tokens = {"<|startoftext|>", "<|endoftext|>"}
 
         self.pat = re.compile(
             r"""<\|startoftext\|>|<\|endoftext\|>|'s|'t|'re|'ve|'m|'ll|'d|[\p{L}]+|[\p{N}]|[^\s\p{L}\p{N}]+""",
@@ -262,43 +264,16 @@ class CLIPTokenizer(PreTrainedTokenizer):
         return len(bos_token + token_ids_0 + eos_token + eos_token + token_ids_1 + eos_token) * [0]
 
     def bpe(self, token):
-        if token in self.cache:
-            return self.cache[token]
+        if token in self.unmerged_tokens:
+            return token
+        word = self.cache.get(token)
+        if word is not None:
+            return word
         word = tuple(token[:-1]) + (token[-1] + "</w>",)
-        pairs = get_pairs(word)
-
-        if not pairs:
+        if len(word) < 2:
             return token + "</w>"
 
-        while True:
-            bigram = min(pairs, key=lambda pair: self.bpe_ranks.get(pair, float("inf")))
-            if bigram not in self.bpe_ranks:
-                break
-            first, second = bigram
-            new_word = []
-            i = 0
-            while i < len(word):
-                try:
-                    j = word.index(first, i)
-                except ValueError:
-                    new_word.extend(word[i:])
-                    break
-                else:
-                    new_word.extend(word[i:j])
-                    i = j
-
-                if word[i] == first and i < len(word) - 1 and word[i + 1] == second:
-                    new_word.append(first + second)
-                    i += 2
-                else:
-                    new_word.append(word[i])
-                    i += 1
-            new_word = tuple(new_word)
-            word = new_word
-            if len(word) == 1:
-                break
-            else:
-                pairs = get_pairs(word)
+        word = bpe_merge(word, self.bpe_ranks)
         word = " ".join(word)
         self.cache[token] = word
         return word
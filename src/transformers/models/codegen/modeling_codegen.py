@@ -22,6 +22,7 @@ from torch import nn
 from torch.nn import CrossEntropyLoss
 
 from ...activations import ACT2FN
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...modeling_outputs import BaseModelOutputWithPast, CausalLMOutputWithPast
 from ...modeling_utils import PreTrainedModel
 from ...utils import add_code_sample_docstrings, add_start_docstrings, add_start_docstrings_to_model_forward, logging
@@ -211,7 +212,10 @@ class CodeGenAttention(nn.Module):
         seq_len = key.shape[1]
         offset = 0
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            offset = layer_past.get_seq_length()
+            seq_len += offset
+        elif layer_past is not None:
             offset = layer_past[0].shape[-2]
             seq_len += offset
 
@@ -236,14 +240,16 @@ class CodeGenAttention(nn.Module):
         key = key.permute(0, 2, 1, 3)
         query = query.permute(0, 2, 1, 3)
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            key, value = layer_past.update(key, value)
+        elif layer_past is not None:
             past_key = layer_past[0]
             past_value = layer_past[1]
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
 
         if use_cache is True:
-            present = (key, value)
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key, value)
         else:
             present = None
 
@@ -332,6 +338,8 @@ class CodeGenPreTrainedModel(PreTrainedModel):
     config_class = CodeGenConfig
     base_model_prefix = "transformer"
     supports_gradient_checkpointing = True
+    supports_static_cache = True
+    supports_prompt_cache = True
     _no_split_modules = ["CodeGenBlock"]
 
     def __init__(self, *inputs, **kwargs):
@@ -497,6 +505,8 @@ class CodeGenModel(CodeGenPreTrainedModel):
         if past_key_values is None:
             past_length = 0
             past_key_values = tuple([None] * len(self.h))
+        elif isinstance(past_key_values, StaticCache):
+            past_length = past_key_values.get_seq_length()
         else:
             past_length = past_key_values[0][0].size(-2)
 
@@ -598,6 +608,10 @@ class CodeGenModel(CodeGenPreTrainedModel):
         if output_hidden_states:
             all_hidden_states = all_hidden_states + (hidden_states,)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(v for v in [hidden_states, presents, all_hidden_states, all_self_attentions] if v is not None)
 
@@ -740,6 +754,8 @@ class CodeGenForCausalLM(CodeGenPreTrainedModel):
         [`~PretrainedModel.beam_sample`] is called. This is required to match `past_key_values` with the correct
         beam_idx at every generation step.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(
             tuple(past_state.index_select(0, beam_idx.to(past_state.device)) for past_state in layer_past)
             for layer_past in past
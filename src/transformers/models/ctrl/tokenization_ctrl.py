@@ -21,7 +21,7 @@ from typing import Optional, Tuple
 
 import regex as re
 
-from ...tokenization_utils import PreTrainedTokenizer
+from ...tokenization_utils import LRUCache, PreTrainedTokenizer, bpe_merge
 from ...utils import logging
 
 
@@ -148,7 +148,7 @@ class CTRLTokenizer(PreTrainedTokenizer):
             merges = merges_handle.read().split("\n")[1:-1]
         merges = [tuple(merge.split()) for merge in merges]
         self.bpe_ranks = dict(zip(merges, range(len(merges))))
-        self.cache = {}
+        self.cache = LRUCache()
 
     @property
     def vocab_size(self):
@@ -158,44 +158,15 @@ class CTRLTokenizer(PreTrainedTokenizer):
         return dict(self.encoder, **self.added_tokens_encoder)
 
     def bpe(self, token):
-        if token in self.cache:
-            return self.cache[token]
+        word = self.cache.get(token)
+        if word is not None:
+            return word
         word = tuple(token)
         word = tuple(list(word[:-1]) + [word[-1] + "</w>"])
-        pairs = get_pairs(word)
-
-        if not pairs:
+        if len(word) < 2:
             return token
 
-        while True:
-            bigram = min(pairs, key=lambda pair: self.bpe_ranks.get(pair, float("inf")))
-            if bigram not in self.bpe_ranks:
-                break
-            first, second = bigram
-            new_word = []
-            i = 0
-            while i < len(word):
-                try:
-                    j = word.index(first, i)
-                except ValueError:
-                    new_word.extend(word[i:])
-                    break
-                else:
-                    new_word.extend(word[i:j])
-                    i = j
-
-                if word[i] == first and i < len(word) - 1 and word[i + 1] == second:
-                    new_word.append(first + second)
-                    i += 2
-                else:
-                    new_word.append(word[i])
-                    i += 1
-            new_word = tuple(new_word)
-            word = new_word
-            if len(word) == 1:
-                break
-            else:
-                pairs = get_pairs(word)
+        word = bpe_merge(word, self.bpe_ranks)
         word = "@@ ".join(word)
         word = word[:-4]
         self.cache[token] = word
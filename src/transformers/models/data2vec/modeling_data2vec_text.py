@@ -761,6 +761,7 @@ class Data2VecTextModel(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple[torch.Tensor], BaseModelOutputWithPoolingAndCrossAttentions]:
         r"""
         encoder_hidden_states  (`torch.FloatTensor` of shape `(batch_size, sequence_length, hidden_size)`, *optional*):
@@ -781,6 +782,9 @@ class Data2VecTextModel(Data2VecTextPreTrainedModel):
         use_cache (`bool`, *optional*):
             If set to `True`, `past_key_values` key value states are returned and can be used to speed up decoding (see
             `past_key_values`).
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         output_attentions = output_attentions if output_attentions is not None else self.config.output_attentions
         output_hidden_states = (
@@ -822,6 +826,10 @@ class Data2VecTextModel(Data2VecTextPreTrainedModel):
         # We can provide a self-attention mask of dimensions [batch_size, from_seq_length, to_seq_length]
         # ourselves in which case we just need to make it broadcastable to all heads.
         extended_attention_mask: torch.Tensor = self.get_extended_attention_mask(attention_mask, input_shape)
+        if document_ids is not None:
+            extended_attention_mask = self.get_document_attention_mask(
+                extended_attention_mask, document_ids[:, -seq_length:], document_ids
+            )
 
         # If a 2D or 3D attention mask is provided for the cross-attention
         # we need to make broadcastable to [batch_size, num_heads, seq_length, seq_length]
@@ -923,6 +931,7 @@ class Data2VecTextForCausalLM(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, CausalLMOutputWithCrossAttentions]:
         r"""
         encoder_hidden_states  (`torch.FloatTensor` of shape `(batch_size, sequence_length, hidden_size)`, *optional*):
@@ -949,6 +958,10 @@ class Data2VecTextForCausalLM(Data2VecTextPreTrainedModel):
             If set to `True`, `past_key_values` key value states are returned and can be used to speed up decoding (see
             `past_key_values`).
 
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
+
         Returns:
 
         Example:
@@ -985,6 +998,7 @@ class Data2VecTextForCausalLM(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
@@ -1082,6 +1096,7 @@ class Data2VecTextForMaskedLM(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, MaskedLMOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
@@ -1090,6 +1105,9 @@ class Data2VecTextForMaskedLM(Data2VecTextPreTrainedModel):
             loss is only computed for the tokens with labels in `[0, ..., config.vocab_size]`
         kwargs (`Dict[str, any]`, optional, defaults to *{}*):
             Used to hide legacy arguments that have been deprecated.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1105,6 +1123,7 @@ class Data2VecTextForMaskedLM(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
         sequence_output = outputs[0]
         prediction_scores = self.lm_head(sequence_output)
@@ -1194,12 +1213,16 @@ class Data2VecTextForSequenceClassification(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, SequenceClassifierOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
             Labels for computing the sequence classification/regression loss. Indices should be in `[0, ...,
             config.num_labels - 1]`. If `config.num_labels == 1` a regression loss is computed (Mean-Square loss), If
             `config.num_labels > 1` a classification loss is computed (Cross-Entropy).
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1213,6 +1236,7 @@ class Data2VecTextForSequenceClassification(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
         sequence_output = outputs[0]
         logits = self.classifier(sequence_output)
@@ -1293,18 +1317,23 @@ class Data2VecTextForMultipleChoice(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, MultipleChoiceModelOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
             Labels for computing the multiple choice classification loss. Indices should be in `[0, ...,
             num_choices-1]` where `num_choices` is the size of the second dimension of the input tensors. (See
             `input_ids` above)
+        document_ids (`torch.LongTensor` of shape `(batch_size, num_choices, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
         num_choices = input_ids.shape[1] if input_ids is not None else inputs_embeds.shape[1]
 
         flat_input_ids = input_ids.view(-1, input_ids.size(-1)) if input_ids is not None else None
         flat_position_ids = position_ids.view(-1, position_ids.size(-1)) if position_ids is not None else None
+        flat_document_ids = document_ids.view(-1, document_ids.size(-1)) if document_ids is not None else None
         flat_token_type_ids = token_type_ids.view(-1, token_type_ids.size(-1)) if token_type_ids is not None else None
         flat_attention_mask = attention_mask.view(-1, attention_mask.size(-1)) if attention_mask is not None else None
         flat_inputs_embeds = (
@@ -1323,6 +1352,7 @@ class Data2VecTextForMultipleChoice(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=flat_document_ids,
         )
         pooled_output = outputs[1]
 
@@ -1391,10 +1421,14 @@ class Data2VecTextForTokenClassification(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, TokenClassifierOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
             Labels for computing the token classification loss. Indices should be in `[0, ..., config.num_labels - 1]`.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1408,6 +1442,7 @@ class Data2VecTextForTokenClassification(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
@@ -1496,6 +1531,7 @@ class Data2VecTextForQuestionAnswering(Data2VecTextPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, QuestionAnsweringModelOutput]:
         r"""
         start_positions (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
@@ -1506,6 +1542,9 @@ class Data2VecTextForQuestionAnswering(Data2VecTextPreTrainedModel):
             Labels for position (index) of the end of the labelled span for computing the token classification loss.
             Positions are clamped to the length of the sequence (`sequence_length`). Position outside of the sequence
             are not taken into account for computing the loss.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1519,6 +1558,7 @@ class Data2VecTextForQuestionAnswering(Data2VecTextPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
@@ -25,6 +25,7 @@ from packaging import version
 from torch import nn
 
 from ...activations import ACT2FN
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...modeling_utils import PreTrainedModel
 from ...pytorch_utils import Conv1D, find_pruneable_heads_and_indices, prune_conv1d_layer
 from ...utils import (
@@ -315,13 +316,15 @@ class DecisionTransformerGPT2Attention(nn.Module):
         key = self._split_heads(key, self.num_heads, self.head_dim)
         value = self._split_heads(value, self.num_heads, self.head_dim)
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            key, value = layer_past.update(key, value)
+        elif layer_past is not None:
             past_key, past_value = layer_past
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
 
         if use_cache is True:
-            present = (key, value)
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key, value)
         else:
             present = None
 
@@ -534,6 +537,7 @@ class DecisionTransformerGPT2Model(DecisionTransformerGPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, BaseModelOutputWithPastAndCrossAttentions]:
         output_attentions = output_attentions if output_attentions is not None else self.config.output_attentions
         output_hidden_states = (
@@ -564,6 +568,8 @@ class DecisionTransformerGPT2Model(DecisionTransformerGPT2PreTrainedModel):
         if past_key_values is None:
             past_length = 0
             past_key_values = tuple([None] * len(self.h))
+        elif isinstance(past_key_values, StaticCache):
+            past_length = past_key_values.get_seq_length()
         else:
             past_length = past_key_values[0][0].size(-2)
         if position_ids is None:
@@ -590,6 +596,13 @@ class DecisionTransformerGPT2Model(DecisionTransformerGPT2PreTrainedModel):
             attention_mask = attention_mask.to(dtype=self.dtype)  # fp16 compatibility
             attention_mask = (1.0 - attention_mask) * torch.finfo(self.dtype).min
 
+        # Packed documents only attend to themselves: [batch_size, 1, from_seq_length, to_seq_length]
+        if document_ids is not None:
+            document_ids = document_ids.view(batch_size, -1)
+            attention_mask = self.get_document_attention_mask(
+                attention_mask, document_ids[:, -input_shape[-1] :], document_ids
+            )
+
         # If a 2D or 3D attention mask is provided for the cross-attention
         # we need to make broadcastable to [batch_size, num_heads, seq_length, seq_length]
         if self.config.add_cross_attention and encoder_hidden_states is not None:
@@ -630,7 +643,7 @@ class DecisionTransformerGPT2Model(DecisionTransformerGPT2PreTrainedModel):
             if self.model_parallel:
                 torch.cuda.set_device(hidden_states.device)
                 # Ensure layer_past is on same device as hidden_states (might not be correct)
-                if layer_past is not None:
+                if layer_past is not None and not isinstance(layer_past, StaticLayerCache):
                     layer_past = tuple(past_state.to(hidden_states.device) for past_state in layer_past)
                 # Ensure that attention_mask is always on the same device as hidden_states
                 if attention_mask is not None:
@@ -698,6 +711,10 @@ class DecisionTransformerGPT2Model(DecisionTransformerGPT2PreTrainedModel):
         if output_hidden_states:
             all_hidden_states = all_hidden_states + (hidden_states,)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(
                 v
@@ -21,7 +21,7 @@ import re
 import unicodedata
 from typing import Dict, List, Optional, Tuple
 
-from ...tokenization_utils import PreTrainedTokenizer
+from ...tokenization_utils import LRUCache, PreTrainedTokenizer, bpe_merge
 from ...utils import logging
 
 
@@ -249,7 +249,7 @@ class FSMTTokenizer(PreTrainedTokenizer):
             merges = merges_handle.read().split("\n")[:-1]
         merges = [tuple(merge.split()[:2]) for merge in merges]
         self.bpe_ranks = dict(zip(merges, range(len(merges))))
-        self.cache = {}
+        self.cache = LRUCache()
 
     # hack override
     def get_vocab(self) -> Dict[str, int]:
@@ -301,43 +301,14 @@ class FSMTTokenizer(PreTrainedTokenizer):
         return dict(self.decoder, **self.added_tokens_decoder)
 
     def bpe(self, token):
+        word = self.cache.get(token)
+        if word is not None:
+            return word
         word = tuple(token[:-1]) + (token[-1] + "</w>",)
-        if token in self.cache:
-            return self.cache[token]
-        pairs = get_pairs(word)
-
-        if not pairs:
+        if len(word) < 2:
             return token + "</w>"
 
-        while True:
-            bigram = min(pairs, key=lambda pair: self.bpe_ranks.get(pair, float("inf")))
-            if bigram not in self.bpe_ranks:
-                break
-            first, second = bigram
-            new_word = []
-            i = 0
-            while i < len(word):
-                try:
-                    j = word.index(first, i)
-                except ValueError:
-                    new_word.extend(word[i:])
-                    break
-                else:
-                    new_word.extend(word[i:j])
-                    i = j
-
-                if word[i] == first and i < len(word) - 1 and word[i + 1] == second:
-                    new_word.append(first + second)
-                    i += 2
-                else:
-                    new_word.append(word[i])
-                    i += 1
-            new_word = tuple(new_word)
-            word = new_word
-            if len(word) == 1:
-                break
-            else:
-                pairs = get_pairs(word)
+        word = bpe_merge(word, self.bpe_ranks)
         word = " ".join(word)
         if word == "\n  </w>":
             word = "\n</w>"
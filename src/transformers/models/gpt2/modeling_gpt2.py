@@ -34,6 +34,7 @@ else:
     is_amp_available = False
 
 from ...activations import ACT2FN
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...modeling_outputs import (
     BaseModelOutputWithPastAndCrossAttentions,
     CausalLMOutputWithCrossAttentions,
@@ -326,13 +327,15 @@ class GPT2Attention(nn.Module):
         key = self._split_heads(key, self.num_heads, self.head_dim)
         value = self._split_heads(value, self.num_heads, self.head_dim)
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            key, value = layer_past.update(key, value)
+        elif layer_past is not None:
             past_key, past_value = layer_past
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
 
         if use_cache is True:
-            present = (key, value)
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key, value)
         else:
             present = None
 
@@ -458,6 +461,9 @@ class GPT2PreTrainedModel(PreTrainedModel):
     base_model_prefix = "transformer"
     is_parallelizable = True
     supports_gradient_checkpointing = True
+    supports_static_cache = True
+    supports_prompt_cache = True
+    supports_fixed_shape_decoding = True
     _no_split_modules = ["GPT2Block"]
 
     def __init__(self, *inputs, **kwargs):
@@ -567,10 +573,13 @@ GPT2_INPUTS_DOCSTRING = r"""
             [`PreTrainedTokenizer.__call__`] for details.
 
             [What are input IDs?](../glossary#input-ids)
-        past_key_values (`Tuple[Tuple[torch.Tensor]]` of length `config.n_layers`):
+        past_key_values (`Tuple[Tuple[torch.Tensor]]` of length `config.n_layers` or [`StaticCache`]):
             Contains precomputed hidden-states (key and values in the attention blocks) as computed by the model (see
             `past_key_values` output below). Can be used to speed up sequential decoding. The `input_ids` which have
             their past given to this model should not be passed as `input_ids` as they have already been computed.
+
+            A preallocated [`StaticCache`] can also be passed, in which case the new key and value states are written
+            in place in the cache and the same object is returned as `past_key_values`.
         attention_mask (`torch.FloatTensor` of shape `(batch_size, sequence_length)`, *optional*):
             Mask to avoid performing attention on padding token indices. Mask values selected in `[0, 1]`:
 
@@ -619,6 +628,10 @@ GPT2_INPUTS_DOCSTRING = r"""
             more detail.
         return_dict (`bool`, *optional*):
             Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document. Like the `attention_mask`, it covers the positions in
+            `past_key_values` too.
 """
 PARALLELIZE_DOCSTRING = r"""
     This is an experimental feature and is a subject to change at a moment's notice.
@@ -767,6 +780,7 @@ class GPT2Model(GPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, BaseModelOutputWithPastAndCrossAttentions]:
         output_attentions = output_attentions if output_attentions is not None else self.config.output_attentions
         output_hidden_states = (
@@ -797,6 +811,8 @@ class GPT2Model(GPT2PreTrainedModel):
         if past_key_values is None:
             past_length = 0
             past_key_values = tuple([None] * len(self.h))
+        elif isinstance(past_key_values, StaticCache):
+            past_length = past_key_values.get_seq_length()
         else:
             past_length = past_key_values[0][0].size(-2)
         if position_ids is None:
@@ -823,6 +839,13 @@ class GPT2Model(GPT2PreTrainedModel):
             attention_mask = attention_mask.to(dtype=self.dtype)  # fp16 compatibility
             attention_mask = (1.0 - attention_mask) * torch.finfo(self.dtype).min
 
+        # Packed documents only attend to themselves: [batch_size, 1, from_seq_length, to_seq_length]
+        if document_ids is not None:
+            document_ids = document_ids.view(batch_size, -1)
+            attention_mask = self.get_document_attention_mask(
+                attention_mask, document_ids[:, -input_shape[-1] :], document_ids
+            )
+
         # If a 2D or 3D attention mask is provided for the cross-attention
         # we need to make broadcastable to [batch_size, num_heads, seq_length, seq_length]
         if self.config.add_cross_attention and encoder_hidden_states is not None:
@@ -863,7 +886,7 @@ class GPT2Model(GPT2PreTrainedModel):
             if self.model_parallel:
                 torch.cuda.set_device(hidden_states.device)
                 # Ensure layer_past is on same device as hidden_states (might not be correct)
-                if layer_past is not None:
+                if layer_past is not None and not isinstance(layer_past, StaticLayerCache):
                     layer_past = tuple(past_state.to(hidden_states.device) for past_state in layer_past)
                 # Ensure that attention_mask is always on the same device as hidden_states
                 if attention_mask is not None:
@@ -931,6 +954,10 @@ class GPT2Model(GPT2PreTrainedModel):
         if output_hidden_states:
             all_hidden_states = all_hidden_states + (hidden_states,)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(
                 v
@@ -1046,6 +1073,7 @@ class GPT2LMHeadModel(GPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, CausalLMOutputWithCrossAttentions]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
@@ -1069,6 +1097,7 @@ class GPT2LMHeadModel(GPT2PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
         hidden_states = transformer_outputs[0]
 
@@ -1108,6 +1137,8 @@ class GPT2LMHeadModel(GPT2PreTrainedModel):
         [`~PreTrainedModel.beam_sample`] is called. This is required to match `past_key_values` with the correct
         beam_idx at every generation step.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(
             tuple(past_state.index_select(0, beam_idx.to(past_state.device)) for past_state in layer_past)
             for layer_past in past
@@ -1215,6 +1246,7 @@ class GPT2DoubleHeadsModel(GPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
         **kwargs,
     ) -> Union[Tuple, GPT2DoubleHeadsModelOutput]:
         r"""
@@ -1270,6 +1302,7 @@ class GPT2DoubleHeadsModel(GPT2PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         hidden_states = transformer_outputs[0]
@@ -1316,6 +1349,8 @@ class GPT2DoubleHeadsModel(GPT2PreTrainedModel):
         [`~PreTrainedModel.beam_sample`] is called. This is required to match `past_key_values` with the correct
         beam_idx at every generation step.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(
             tuple(past_state.index_select(0, beam_idx.to(past_state.device)) for past_state in layer_past)
             for layer_past in past
@@ -1376,6 +1411,7 @@ class GPT2ForSequenceClassification(GPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, SequenceClassifierOutputWithPast]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
@@ -1397,6 +1433,7 @@ class GPT2ForSequenceClassification(GPT2PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
         hidden_states = transformer_outputs[0]
         logits = self.score(hidden_states)
@@ -1512,6 +1549,7 @@ class GPT2ForTokenClassification(GPT2PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, TokenClassifierOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
@@ -1533,6 +1571,7 @@ class GPT2ForTokenClassification(GPT2PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         hidden_states = transformer_outputs[0]
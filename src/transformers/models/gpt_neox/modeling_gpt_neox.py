@@ -22,6 +22,7 @@ from torch import nn
 from torch.nn import CrossEntropyLoss
 
 from ...activations import ACT2FN
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...file_utils import (
     add_code_sample_docstrings,
     add_start_docstrings,
@@ -55,6 +56,7 @@ class GPTNeoXPreTrainedModel(PreTrainedModel):
     config_class = GPTNeoXConfig
     base_model_prefix = "gpt_neox"
     supports_gradient_checkpointing = True
+    supports_static_cache = True
     _no_split_modules = ["GPTNeoXLayer"]
 
     def _init_weights(self, module):
@@ -106,6 +108,7 @@ class GPTNeoXAttention(nn.Module):
         layer_past=None,
         use_cache=False,
         output_attentions=False,
+        position_ids=None,
     ):
         has_layer_past = layer_past is not None
 
@@ -133,21 +136,29 @@ class GPTNeoXAttention(nn.Module):
         # Compute token offset for rotary embeddings (when decoding)
         seq_len = key.shape[-2]
         offset = 0
-        if has_layer_past:
+        if isinstance(layer_past, StaticLayerCache):
+            offset = layer_past.get_seq_length()
+            seq_len += offset
+        elif has_layer_past:
             offset = layer_past[0].shape[-2]
             seq_len += offset
         cos, sin = self.rotary_emb(value, seq_len=seq_len)
-        query, key = apply_rotary_pos_emb(query_rot, key_rot, cos, sin, offset=offset)
+        query, key = apply_rotary_pos_emb(query_rot, key_rot, cos, sin, offset=offset, position_ids=position_ids)
         query = torch.cat((query, query_pass), dim=-1)
         key = torch.cat((key, key_pass), dim=-1)
 
         # Cache QKV values
-        if has_layer_past:
+        if isinstance(layer_past, StaticLayerCache):
+            key, value = layer_past.update(key, value)
+        elif has_layer_past:
             past_key = layer_past[0]
             past_value = layer_past[1]
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
-        present = (key, value) if use_cache else None
+        if use_cache:
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key, value)
+        else:
+            present = None
 
         # Compute attention
         attn_output, attn_weights = self._attn(query, key, value, attention_mask, head_mask)
@@ -275,9 +286,14 @@ def rotate_half(x):
     return torch.cat((-x2, x1), dim=-1)
 
 
-def apply_rotary_pos_emb(q, k, cos, sin, offset: int = 0):
-    cos = cos[..., offset : q.shape[-2] + offset, :]
-    sin = sin[..., offset : q.shape[-2] + offset, :]
+def apply_rotary_pos_emb(q, k, cos, sin, offset: int = 0, position_ids=None):
+    if position_ids is None:
+        cos = cos[..., offset : q.shape[-2] + offset, :]
+        sin = sin[..., offset : q.shape[-2] + offset, :]
+    else:
+        # [1, 1, max_seq_len, dim] -> [bs, 1, seq_len, dim]
+        cos = cos[0, 0][position_ids].unsqueeze(1)
+        sin = sin[0, 0][position_ids].unsqueeze(1)
     q_embed = (q * cos) + (rotate_half(q) * sin)
     k_embed = (k * cos) + (rotate_half(k) * sin)
     return q_embed, k_embed
@@ -313,6 +329,7 @@ class GPTNeoXLayer(nn.Module):
         use_cache=False,
         layer_past=None,
         output_attentions=False,
+        position_ids=None,
     ):
         residual = hidden_states
         ln_out = self.input_layernorm(hidden_states)
@@ -323,6 +340,7 @@ class GPTNeoXLayer(nn.Module):
             head_mask=head_mask,
             use_cache=use_cache,
             output_attentions=output_attentions,
+            position_ids=position_ids,
         )
         attn_output = attention_layer_outputs[0]  # output_attn: a, present, (attentions)
         outputs = attention_layer_outputs[1:]
@@ -396,6 +414,9 @@ GPT_NEOX_INPUTS_DOCSTRING = r"""
             more detail.
         return_dict (`bool`, *optional*):
             Whether or not to return a [`~file_utils.ModelOutput`] instead of a plain tuple.
+        document_ids (`torch.LongTensor` of shape `({0})`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
 """
 
 
@@ -439,6 +460,8 @@ class GPTNeoXModel(GPTNeoXPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        position_ids: Optional[torch.LongTensor] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, BaseModelOutputWithPast]:
         r"""
         past_key_values (`tuple(tuple(torch.FloatTensor))` of length `config.n_layers` with each tuple having 4 tensors of shape `(batch_size, num_heads, sequence_length - 1, embed_size_per_head)`):
@@ -490,6 +513,13 @@ class GPTNeoXModel(GPTNeoXPreTrainedModel):
             attention_mask = attention_mask.to(dtype=self.dtype)  # fp16 compatibility
             attention_mask = (1.0 - attention_mask) * torch.finfo(self.dtype).min
 
+        # Packed documents only attend to themselves: [batch_size, 1, from_seq_length, to_seq_length]
+        if document_ids is not None:
+            document_ids = document_ids.view(batch_size, -1)
+            attention_mask = self.get_document_attention_mask(
+                attention_mask, document_ids[:, -seq_length:], document_ids
+            )
+
         # Prepare head mask if needed
         # 1.0 in head_mask indicate we keep the head
         # attention_probs has shape bsz x n_heads x N x N
@@ -515,6 +545,7 @@ class GPTNeoXModel(GPTNeoXPreTrainedModel):
                 layer_past=layer_past,
                 use_cache=use_cache,
                 output_attentions=output_attentions,
+                position_ids=position_ids,
             )
             hidden_states = outputs[0]
             if use_cache is True:
@@ -527,6 +558,10 @@ class GPTNeoXModel(GPTNeoXPreTrainedModel):
         if output_hidden_states:
             all_hidden_states = all_hidden_states + (hidden_states,)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(v for v in [hidden_states, presents, all_hidden_states, all_attentions] if v is not None)
 
@@ -574,6 +609,8 @@ class GPTNeoXForCausalLM(GPTNeoXPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        position_ids: Optional[torch.LongTensor] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple, CausalLMOutputWithPast]:
         r"""
         past_key_values (`tuple(tuple(torch.FloatTensor))`, *optional*, returned when `use_cache=True` is passed or when `config.use_cache=True`):
@@ -626,6 +663,8 @@ class GPTNeoXForCausalLM(GPTNeoXPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            position_ids=position_ids,
+            document_ids=document_ids,
         )
 
         hidden_states = outputs[0]
@@ -665,6 +704,8 @@ class GPTNeoXForCausalLM(GPTNeoXPreTrainedModel):
         return {"input_ids": input_ids, "attention_mask": attention_mask, "past_key_values": past}
 
     def _reorder_cache(self, past, beam_idx):
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         reordered_past = ()
         for layer_past in past:
             reordered_past += (
@@ -22,6 +22,7 @@ from torch import nn
 from torch.nn import BCEWithLogitsLoss, CrossEntropyLoss, MSELoss
 
 from ...activations import ACT2FN
+from ...cache_utils import StaticCache, StaticLayerCache
 from ...modeling_outputs import (
     BaseModelOutputWithPast,
     CausalLMOutputWithPast,
@@ -219,7 +220,10 @@ class GPTJAttention(nn.Module):
         seq_len = key.shape[1]
         offset = 0
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            offset = layer_past.get_seq_length()
+            seq_len += offset
+        elif layer_past is not None:
             offset = layer_past[0].shape[-2]
             seq_len += offset
 
@@ -244,14 +248,16 @@ class GPTJAttention(nn.Module):
         key = key.permute(0, 2, 1, 3)
         query = query.permute(0, 2, 1, 3)
 
-        if layer_past is not None:
+        if isinstance(layer_past, StaticLayerCache):
+            key, value = layer_past.update(key, value)
+        elif layer_past is not None:
             past_key = layer_past[0]
             past_value = layer_past[1]
             key = torch.cat((past_key, key), dim=-2)
             value = torch.cat((past_value, value), dim=-2)
 
         if use_cache is True:
-            present = (key, value)
+            present = layer_past if isinstance(layer_past, StaticLayerCache) else (key, value)
         else:
             present = None
 
@@ -339,6 +345,8 @@ class GPTJPreTrainedModel(PreTrainedModel):
     base_model_prefix = "transformer"
     is_parallelizable = True
     supports_gradient_checkpointing = True
+    supports_static_cache = True
+    supports_prompt_cache = True
     _no_split_modules = ["GPTJBlock"]
 
     def __init__(self, *inputs, **kwargs):
@@ -585,6 +593,8 @@ class GPTJModel(GPTJPreTrainedModel):
         if past_key_values is None:
             past_length = 0
             past_key_values = tuple([None] * len(self.h))
+        elif isinstance(past_key_values, StaticCache):
+            past_length = past_key_values.get_seq_length()
         else:
             past_length = past_key_values[0][0].size(-2)
 
@@ -640,7 +650,7 @@ class GPTJModel(GPTJPreTrainedModel):
             if self.model_parallel:
                 torch.cuda.set_device(hidden_states.device)
                 # Ensure layer_past is on same device as hidden_states (might not be correct)
-                if layer_past is not None:
+                if layer_past is not None and not isinstance(layer_past, StaticLayerCache):
                     layer_past = tuple(past_state.to(hidden_states.device) for past_state in layer_past)
                 # Ensure that attention_mask is always on the same device as hidden_states
                 if attention_mask is not None:
@@ -702,6 +712,10 @@ class GPTJModel(GPTJPreTrainedModel):
         if output_hidden_states:
             all_hidden_states = all_hidden_states + (hidden_states,)
 
+        # a static cache is updated in place and returned as is
+        if presents is not None and isinstance(past_key_values, StaticCache):
+            presents = past_key_values
+
         if not return_dict:
             return tuple(v for v in [hidden_states, presents, all_hidden_states, all_self_attentions] if v is not None)
 
@@ -873,6 +887,8 @@ class GPTJForCausalLM(GPTJPreTrainedModel):
         [`~PretrainedModel.beam_sample`] is called. This is required to match `past_key_values` with the correct
         beam_idx at every generation step.
         """
+        if isinstance(past, StaticCache):
+            return past.reorder_cache(beam_idx)
         return tuple(
             tuple(past_state.index_select(0, beam_idx.to(past_state.device)) for past_state in layer_past)
             for layer_past in past
@@ -379,6 +379,8 @@ class LukeTokenizer(RobertaTokenizer):
                 **kwargs,
             )
         else:
+            # a single sequence is always encoded in the current process
+            kwargs.pop("num_proc", None)
             return self.encode_plus(
                 text=text,
                 text_pair=text_pair,
@@ -511,6 +513,7 @@ class LukeTokenizer(RobertaTokenizer):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         if return_offsets_mapping:
@@ -523,6 +526,39 @@ class LukeTokenizer(RobertaTokenizer):
         if is_split_into_words:
             raise NotImplementedError("is_split_into_words is not supported in this tokenizer.")
 
+        if num_proc is not None and num_proc > 1 and len(batch_text_or_text_pairs) > 1:
+            return self._parallel_batch_encode(
+                num_proc,
+                "_batch_encode_plus",
+                batched_kwargs={
+                    "batch_text_or_text_pairs": batch_text_or_text_pairs,
+                    "batch_entity_spans_or_entity_spans_pairs": batch_entity_spans_or_entity_spans_pairs,
+                    "batch_entities_or_entities_pairs": batch_entities_or_entities_pairs,
+                },
+                kwargs={
+                    "add_special_tokens": add_special_tokens,
+                    "padding_strategy": PaddingStrategy.DO_NOT_PAD,  # we pad in batch afterward
+                    "truncation_strategy": truncation_strategy,
+                    "max_length": max_length,
+                    "max_entity_length": max_entity_length,
+                    "stride": stride,
+                    "return_token_type_ids": return_token_type_ids,
+                    "return_attention_mask": False,  # we pad in batch afterward
+                    "return_overflowing_tokens": return_overflowing_tokens,
+                    "return_special_tokens_mask": return_special_tokens_mask,
+                    "return_length": return_length,
+                    "verbose": verbose,
+                    **kwargs,
+                },
+                pad_kwargs={
+                    "padding": padding_strategy.value,
+                    "max_length": max_length,
+                    "pad_to_multiple_of": pad_to_multiple_of,
+                    "return_attention_mask": return_attention_mask,
+                },
+                return_tensors=return_tensors,
+            )
+
         # input_ids is a list of tuples (one for each example in the batch)
         input_ids = []
         entity_ids = []
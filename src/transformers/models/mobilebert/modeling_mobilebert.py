@@ -200,6 +200,7 @@ class MobileBertEmbeddings(nn.Module):
         token_type_ids: Optional[torch.LongTensor] = None,
         position_ids: Optional[torch.LongTensor] = None,
         inputs_embeds: Optional[torch.FloatTensor] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> torch.Tensor:
         if input_ids is not None:
             input_shape = input_ids.size()
@@ -224,11 +225,18 @@ class MobileBertEmbeddings(nn.Module):
             # the embedding layer, we reduce the embedding dimension to 128 in MobileBERT.
             # Then, we apply a 1D convolution with kernel size 3 on the raw token embedding to produce a 512
             # dimensional output.
+            next_embeds = inputs_embeds[:, 1:]
+            previous_embeds = inputs_embeds[:, :-1]
+            if document_ids is not None:
+                # the tokens of packed documents do not see the neighboring documents, as at the ends of a sequence
+                same_document = (document_ids[:, 1:] == document_ids[:, :-1]).unsqueeze(-1).to(inputs_embeds.dtype)
+                next_embeds = next_embeds * same_document
+                previous_embeds = previous_embeds * same_document
             inputs_embeds = torch.cat(
                 [
-                    nn.functional.pad(inputs_embeds[:, 1:], [0, 0, 0, 1, 0, 0], value=0.0),
+                    nn.functional.pad(next_embeds, [0, 0, 0, 1, 0, 0], value=0.0),
                     inputs_embeds,
-                    nn.functional.pad(inputs_embeds[:, :-1], [0, 0, 1, 0, 0, 0], value=0.0),
+                    nn.functional.pad(previous_embeds, [0, 0, 1, 0, 0, 0], value=0.0),
                 ],
                 dim=2,
             )
@@ -858,7 +866,13 @@ class MobileBertModel(MobileBertPreTrainedModel):
         output_hidden_states: Optional[bool] = None,
         output_attentions: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, BaseModelOutputWithPooling]:
+        r"""
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
+        """
         output_attentions = output_attentions if output_attentions is not None else self.config.output_attentions
         output_hidden_states = (
             output_hidden_states if output_hidden_states is not None else self.config.output_hidden_states
@@ -884,6 +898,8 @@ class MobileBertModel(MobileBertPreTrainedModel):
         # We can provide a self-attention mask of dimensions [batch_size, from_seq_length, to_seq_length]
         # ourselves in which case we just need to make it broadcastable to all heads.
         extended_attention_mask: torch.Tensor = self.get_extended_attention_mask(attention_mask, input_shape)
+        if document_ids is not None:
+            extended_attention_mask = self.get_document_attention_mask(extended_attention_mask, document_ids)
 
         # Prepare head mask if needed
         # 1.0 in head_mask indicate we keep the head
@@ -893,7 +909,11 @@ class MobileBertModel(MobileBertPreTrainedModel):
         head_mask = self.get_head_mask(head_mask, self.config.num_hidden_layers)
 
         embedding_output = self.embeddings(
-            input_ids=input_ids, position_ids=position_ids, token_type_ids=token_type_ids, inputs_embeds=inputs_embeds
+            input_ids=input_ids,
+            position_ids=position_ids,
+            token_type_ids=token_type_ids,
+            inputs_embeds=inputs_embeds,
+            document_ids=document_ids,
         )
         encoder_outputs = self.encoder(
             embedding_output,
@@ -962,6 +982,7 @@ class MobileBertForPreTraining(MobileBertPreTrainedModel):
         output_attentions: Optional[torch.FloatTensor] = None,
         output_hidden_states: Optional[torch.FloatTensor] = None,
         return_dict: Optional[torch.FloatTensor] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, MobileBertForPreTrainingOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
@@ -975,6 +996,10 @@ class MobileBertForPreTraining(MobileBertPreTrainedModel):
             - 0 indicates sequence B is a continuation of sequence A,
             - 1 indicates sequence B is a random sequence.
 
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
+
         Returns:
 
         Examples:
@@ -1005,6 +1030,7 @@ class MobileBertForPreTraining(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
         sequence_output, pooled_output = outputs[:2]
         prediction_scores, seq_relationship_score = self.cls(sequence_output, pooled_output)
@@ -1077,12 +1103,16 @@ class MobileBertForMaskedLM(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple, MaskedLMOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
             Labels for computing the masked language modeling loss. Indices should be in `[-100, 0, ...,
             config.vocab_size]` (see `input_ids` docstring) Tokens with indices set to `-100` are ignored (masked), the
             loss is only computed for the tokens with labels in `[0, ..., config.vocab_size]`
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1096,6 +1126,7 @@ class MobileBertForMaskedLM(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
@@ -1156,6 +1187,7 @@ class MobileBertForNextSentencePrediction(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
         **kwargs,
     ) -> Union[Tuple, NextSentencePredictorOutput]:
         r"""
@@ -1166,6 +1198,10 @@ class MobileBertForNextSentencePrediction(MobileBertPreTrainedModel):
             - 0 indicates sequence B is a continuation of sequence A,
             - 1 indicates sequence B is a random sequence.
 
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
+
         Returns:
 
         Examples:
@@ -1206,6 +1242,7 @@ class MobileBertForNextSentencePrediction(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         pooled_output = outputs[1]
@@ -1273,12 +1310,16 @@ class MobileBertForSequenceClassification(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple[torch.Tensor], SequenceClassifierOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
             Labels for computing the sequence classification/regression loss. Indices should be in `[0, ...,
             config.num_labels - 1]`. If `config.num_labels == 1` a regression loss is computed (Mean-Square loss), If
             `config.num_labels > 1` a classification loss is computed (Cross-Entropy).
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1292,6 +1333,7 @@ class MobileBertForSequenceClassification(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         pooled_output = outputs[1]
@@ -1379,6 +1421,7 @@ class MobileBertForQuestionAnswering(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple[torch.Tensor], QuestionAnsweringModelOutput]:
         r"""
         start_positions (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
@@ -1389,6 +1432,9 @@ class MobileBertForQuestionAnswering(MobileBertPreTrainedModel):
             Labels for position (index) of the end of the labelled span for computing the token classification loss.
             Positions are clamped to the length of the sequence (`sequence_length`). Position outside of the sequence
             are not taken into account for computing the loss.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1402,6 +1448,7 @@ class MobileBertForQuestionAnswering(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
@@ -1484,12 +1531,16 @@ class MobileBertForMultipleChoice(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple[torch.Tensor], MultipleChoiceModelOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
             Labels for computing the multiple choice classification loss. Indices should be in `[0, ...,
             num_choices-1]` where `num_choices` is the size of the second dimension of the input tensors. (See
             `input_ids` above)
+        document_ids (`torch.LongTensor` of shape `(batch_size, num_choices, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
         num_choices = input_ids.shape[1] if input_ids is not None else inputs_embeds.shape[1]
@@ -1498,6 +1549,7 @@ class MobileBertForMultipleChoice(MobileBertPreTrainedModel):
         attention_mask = attention_mask.view(-1, attention_mask.size(-1)) if attention_mask is not None else None
         token_type_ids = token_type_ids.view(-1, token_type_ids.size(-1)) if token_type_ids is not None else None
         position_ids = position_ids.view(-1, position_ids.size(-1)) if position_ids is not None else None
+        document_ids = document_ids.view(-1, document_ids.size(-1)) if document_ids is not None else None
         inputs_embeds = (
             inputs_embeds.view(-1, inputs_embeds.size(-2), inputs_embeds.size(-1))
             if inputs_embeds is not None
@@ -1514,6 +1566,7 @@ class MobileBertForMultipleChoice(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         pooled_output = outputs[1]
@@ -1586,10 +1639,14 @@ class MobileBertForTokenClassification(MobileBertPreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.Tensor] = None,
     ) -> Union[Tuple[torch.Tensor], TokenClassifierOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
             Labels for computing the token classification loss. Indices should be in `[0, ..., config.num_labels - 1]`.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each sequence, as returned by [`DataCollatorWithPacking`]. Tokens only
+            attend to the tokens of the same document.
         """
         return_dict = return_dict if return_dict is not None else self.config.use_return_dict
 
@@ -1603,6 +1660,7 @@ class MobileBertForTokenClassification(MobileBertPreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         sequence_output = outputs[0]
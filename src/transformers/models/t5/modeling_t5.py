@@ -903,6 +903,8 @@ class T5Stack(T5PreTrainedModel):
         output_attentions=None,
         output_hidden_states=None,
         return_dict=None,
+        document_ids=None,
+        encoder_document_ids=None,
     ):
         # Model parallel
         if self.model_parallel:
@@ -956,6 +958,11 @@ class T5Stack(T5PreTrainedModel):
         # We can provide a self-attention mask of dimensions [batch_size, from_seq_length, to_seq_length]
         # ourselves in which case we just need to make it broadcastable to all heads.
         extended_attention_mask = self.get_extended_attention_mask(attention_mask, input_shape)
+        # Packed documents only attend to themselves, as with the sequence ids of Mesh TensorFlow
+        if document_ids is not None:
+            extended_attention_mask = self.get_document_attention_mask(
+                extended_attention_mask, document_ids[:, -seq_length:], document_ids
+            )
 
         # If a 2D or 3D attention mask is provided for the cross-attention
         # we need to make broadcastable to [batch_size, num_heads, seq_length, seq_length]
@@ -965,6 +972,10 @@ class T5Stack(T5PreTrainedModel):
             if encoder_attention_mask is None:
                 encoder_attention_mask = torch.ones(encoder_hidden_shape, device=inputs_embeds.device)
             encoder_extended_attention_mask = self.invert_attention_mask(encoder_attention_mask)
+            if document_ids is not None and encoder_document_ids is not None:
+                encoder_extended_attention_mask = self.get_document_attention_mask(
+                    encoder_extended_attention_mask, document_ids[:, -seq_length:], encoder_document_ids
+                )
         else:
             encoder_extended_attention_mask = None
 
@@ -1212,6 +1223,13 @@ T5_INPUTS_DOCSTRING = r"""
             more detail.
         return_dict (`bool`, *optional*):
             Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each input sequence, as returned by [`DataCollatorWithPacking`]. Tokens
+            only attend to the tokens of the same document.
+        decoder_document_ids (`torch.LongTensor` of shape `(batch_size, target_sequence_length)`, *optional*):
+            Indices of the documents packed in each target sequence, as returned by [`DataCollatorWithPacking`].
+            Decoder tokens only attend to the decoder and encoder tokens of the same document. When the
+            `decoder_input_ids` are created from the `labels`, each document starts with the decoder start token.
 """
 
 T5_ENCODER_INPUTS_DOCSTRING = r"""
@@ -1249,6 +1267,9 @@ T5_ENCODER_INPUTS_DOCSTRING = r"""
             more detail.
         return_dict (`bool`, *optional*):
             Whether or not to return a [`~utils.ModelOutput`] instead of a plain tuple.
+        document_ids (`torch.LongTensor` of shape `(batch_size, sequence_length)`, *optional*):
+            Indices of the documents packed in each input sequence, as returned by [`DataCollatorWithPacking`]. Tokens
+            only attend to the tokens of the same document.
 """
 
 # Warning message for FutureWarning: head_mask was separated into two input args - head_mask, decoder_head_mask
@@ -1359,6 +1380,8 @@ class T5Model(T5PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
+        decoder_document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple[torch.FloatTensor], Seq2SeqModelOutput]:
         r"""
         Returns:
@@ -1399,6 +1422,7 @@ class T5Model(T5PreTrainedModel):
                 output_attentions=output_attentions,
                 output_hidden_states=output_hidden_states,
                 return_dict=return_dict,
+                document_ids=document_ids,
             )
         elif return_dict and not isinstance(encoder_outputs, BaseModelOutput):
             encoder_outputs = BaseModelOutput(
@@ -1434,6 +1458,8 @@ class T5Model(T5PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=decoder_document_ids,
+            encoder_document_ids=document_ids,
         )
 
         if not return_dict:
@@ -1553,6 +1579,8 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
+        decoder_document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple[torch.FloatTensor], Seq2SeqLMOutput]:
         r"""
         labels (`torch.LongTensor` of shape `(batch_size,)`, *optional*):
@@ -1605,6 +1633,7 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
                 output_attentions=output_attentions,
                 output_hidden_states=output_hidden_states,
                 return_dict=return_dict,
+                document_ids=document_ids,
             )
         elif return_dict and not isinstance(encoder_outputs, BaseModelOutput):
             encoder_outputs = BaseModelOutput(
@@ -1621,6 +1650,11 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
         if labels is not None and decoder_input_ids is None and decoder_inputs_embeds is None:
             # get decoder inputs from shifting lm labels to the right
             decoder_input_ids = self._shift_right(labels)
+            if decoder_document_ids is not None:
+                # each packed document starts with the decoder start token, not the last label of the previous one
+                document_starts = torch.ones_like(decoder_document_ids, dtype=torch.bool)
+                document_starts[:, 1:] = decoder_document_ids[:, 1:] != decoder_document_ids[:, :-1]
+                decoder_input_ids = decoder_input_ids.masked_fill(document_starts, self.config.decoder_start_token_id)
 
         # Set device for model parallelism
         if self.model_parallel:
@@ -1647,6 +1681,8 @@ class T5ForConditionalGeneration(T5PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=decoder_document_ids,
+            encoder_document_ids=document_ids,
         )
 
         sequence_output = decoder_outputs[0]
@@ -1815,6 +1851,7 @@ class T5EncoderModel(T5PreTrainedModel):
         output_attentions: Optional[bool] = None,
         output_hidden_states: Optional[bool] = None,
         return_dict: Optional[bool] = None,
+        document_ids: Optional[torch.LongTensor] = None,
     ) -> Union[Tuple[torch.FloatTensor], BaseModelOutput]:
         r"""
         Returns:
@@ -1842,6 +1879,7 @@ class T5EncoderModel(T5PreTrainedModel):
             output_attentions=output_attentions,
             output_hidden_states=output_hidden_states,
             return_dict=return_dict,
+            document_ids=document_ids,
         )
 
         return encoder_outputs
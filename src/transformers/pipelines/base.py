@@ -34,6 +34,7 @@ from ..feature_extraction_utils import PreTrainedFeatureExtractor
 from ..modelcard import ModelCard
 from ..models.auto.configuration_auto import AutoConfig
 from ..tokenization_utils import PreTrainedTokenizer
+from ..tokenization_utils_base import RaggedArray
 from ..utils import ModelOutput, add_end_docstrings, is_tf_available, is_torch_available, logging
 
 
@@ -89,6 +90,10 @@ def _pad(items, key, padding_value, padding_side):
                 # Bypass for `ImageGPT` which doesn't provide a padding value, yet
                 # we can consistently pad since the size should be matching
                 return torch.cat([item[key] for item in items], dim=0)
+            if dtype != torch.bfloat16:
+                # The rows are gathered in a single ragged array, padded in one copy and shared with PyTorch
+                rows = RaggedArray.from_lists([item[key][0].numpy() for item in items])
+                return torch.from_numpy(rows.to_padded(padding_value, max_length, padding_side=padding_side))
             tensor = torch.zeros((batch_size, max_length), dtype=dtype) + padding_value
         elif dim == 3:
             tensor = torch.zeros((batch_size, max_length, shape[-1]), dtype=dtype) + padding_value
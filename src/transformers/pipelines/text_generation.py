@@ -161,6 +161,10 @@ class TextGenerationPipeline(Pipeline):
                 - `None` : default strategy where nothing in particular happens
                 - `"hole"`: Truncates left of input, and leaves a gap wide enough to let generation happen (might
                   truncate a lot of the prompt and not suitable when generation exceed the model capacity)
+            streamer (`BaseStreamer`, *optional*):
+                A streamer receiving the tokens as soon as they are generated, such as a [`TextStreamer`] or a
+                [`TextIteratorStreamer`] consumed from another thread. Only supported for a single prompt with PyTorch
+                models.
 
             generate_kwargs:
                 Additional keyword arguments to pass along to the generate method of the model (see the generate method
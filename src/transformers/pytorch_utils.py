@@ -12,8 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import inspect
-from typing import Callable, List, Optional, Set, Tuple, Union
+import json
+import os
+import struct
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
+import numpy as np
 import torch
 from packaging import version
 from torch import _softmax_backward_data, nn
@@ -267,3 +271,136 @@ def find_pruneable_heads_and_indices(
     mask = mask.view(-1).contiguous().eq(1)
     index: torch.LongTensor = torch.arange(len(mask))[mask].long()
     return heads, index
+
+
+# Names of the dtypes in the header of a safetensors file, and the numpy dtype used to read their buffers. bfloat16 has
+# no numpy equivalent, so its buffers are read as int16 and reinterpreted by torch.
+_SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+_SAFETENSORS_NUMPY_DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "BF16": np.int16,
+    "I64": np.int64,
+    "I32": np.int32,
+    "I16": np.int16,
+    "I8": np.int8,
+    "U8": np.uint8,
+    "BOOL": np.bool_,
+}
+
+
+def save_safetensors_file(
+    state_dict: Dict[str, torch.Tensor], filename: Union[str, os.PathLike], metadata: Optional[Dict[str, str]] = None
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Saves a state dictionary in the safetensors format: an 8-byte little-endian header size, a JSON header giving the
+    dtype, shape and byte offsets of each tensor, then the raw buffers of all tensors. Such a file can be memory-mapped
+    by [`load_safetensors_file`] without any deserialization.
+
+    The file is written to a temporary path first and then moved in place, so that tensors still mapped from a previous
+    version of the file are left untouched.
+
+    Args:
+        state_dict (`Dict[str, torch.Tensor]`): The state dictionary to save. Tensors sharing memory are saved as copies.
+        filename (`str` or `os.PathLike`): The file in which to save the state dictionary.
+        metadata (`Dict[str, str]`, *optional*): Additional metadata to store in the header.
+
+    Returns:
+        `Dict[str, Tuple[int, int]]`: The byte offsets of the start and end of each tensor in the file.
+    """
+    tensors = {}
+    for name, tensor in state_dict.items():
+        if tensor.dtype not in _SAFETENSORS_DTYPES:
+            raise ValueError(f"Tensor {name} has dtype {tensor.dtype} which can't be saved in the safetensors format.")
+        tensors[name] = tensor.detach().cpu().contiguous()
+
+    # Biggest dtypes go first so that every buffer is aligned on its element size as long as the data starts at a
+    # multiple of 8.
+    names = sorted(tensors, key=lambda name: (-tensors[name].element_size(), name))
+    header = {} if metadata is None else {"__metadata__": metadata}
+    offsets = {}
+    offset = 0
+    for name in names:
+        tensor = tensors[name]
+        offsets[name] = (offset, offset + tensor.numel() * tensor.element_size())
+        header[name] = {
+            "dtype": _SAFETENSORS_DTYPES[tensor.dtype],
+            "shape": list(tensor.shape),
+            "data_offsets": list(offsets[name]),
+        }
+        offset = offsets[name][1]
+    header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-len(header) % 8)
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name in names:
+            tensor = tensors[name]
+            if tensor.dtype == torch.bfloat16:
+                tensor = tensor.view(torch.int16)
+            f.write(tensor.numpy().reshape(-1).view(np.uint8).data)
+    os.replace(tmp_filename, filename)
+
+    data_start = 8 + len(header)
+    return {name: (data_start + begin, data_start + end) for name, (begin, end) in offsets.items()}
+
+
+def load_safetensors_file(filename: Union[str, os.PathLike]) -> Dict[str, torch.Tensor]:
+    """
+    Loads a file saved in the safetensors format. The file is memory-mapped and the returned tensors are views on the
+    mapped buffers, so nothing is read from disk until the tensors are used. The mapping is copy-on-write: modifying a
+    tensor does not change the file.
+
+    Args:
+        filename (`str` or `os.PathLike`): The file to load.
+
+    Returns:
+        `Dict[str, torch.Tensor]`: The state dictionary stored in the file.
+    """
+    with open(filename, "rb") as f:
+        header_size = f.read(8)
+        if len(header_size) < 8:
+            raise ValueError(f"{filename} is not a valid safetensors file.")
+        header_size = struct.unpack("<Q", header_size)[0]
+        header = f.read(header_size)
+        file_size = os.fstat(f.fileno()).st_size
+    if len(header) < header_size:
+        raise ValueError(f"{filename} is not a valid safetensors file.")
+    header = json.loads(header)
+    header.pop("__metadata__", None)
+
+    data_start = 8 + header_size
+    if file_size > data_start:
+        buffer = np.memmap(filename, dtype=np.uint8, mode="c", offset=data_start)
+    else:
+        buffer = np.empty(0, dtype=np.uint8)
+
+    state_dict = {}
+    for name, info in header.items():
+        np_dtype = np.dtype(_SAFETENSORS_NUMPY_DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        if end > len(buffer):
+            raise ValueError(f"{filename} is truncated: the buffer of {name} goes past the end of the file.")
+        array = buffer[begin:end]
+        if (data_start + begin) % np_dtype.itemsize != 0:
+            # Misaligned buffers can't be viewed with their dtype, so this tensor is copied out of the mapping.
+            array = array.copy()
+        tensor = torch.from_numpy(array.view(np_dtype).reshape(info["shape"]))
+        if info["dtype"] == "BF16":
+            tensor = tensor.view(torch.bfloat16)
+        state_dict[name] = tensor
+    return state_dict
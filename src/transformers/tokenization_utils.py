@@ -17,13 +17,18 @@
  tokenization_utils_fast.py
 """
 import bisect
+import collections
+import heapq
 import itertools
+import pickle
 import re
 import unicodedata
-from collections import OrderedDict
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple, Union, overload
 
-from .tokenization_utils_base import (
+from .tokenization_utils_base import (  # noqa: F401
+    BPE_CACHE_MAX_BYTES,
     ENCODE_KWARGS_DOCSTRING,
     ENCODE_PLUS_ADDITIONAL_KWARGS_DOCSTRING,
     INIT_TOKENIZER_DOCSTRING,
@@ -31,6 +36,7 @@ from .tokenization_utils_base import (
     BatchEncoding,
     EncodedInput,
     EncodedInputPair,
+    LRUCache,
     PreTokenizedInput,
     PreTokenizedInputPair,
     PreTrainedTokenizerBase,
@@ -53,10 +59,35 @@ class Trie:
     """
     Trie in Python. Creates a Trie out of a list of words. The trie is used to split on `added_tokens` in one pass
     Loose reference https://en.wikipedia.org/wiki/Trie
+
+    The words are also compiled in an Aho-Corasick automaton (https://en.wikipedia.org/wiki/Aho-Corasick_algorithm),
+    stored in flat lists indexed by state, whose failure links give at each position of the text all the partial
+    matches ending there. [`~Trie.split`] then reads each character of the text once, whatever the number of words.
+
+    Adding words only extends the automaton: the transitions of each state are kept in a dict, where the new states are
+    added in place, rather than in a single table keyed by state and character, which would build a tuple for every
+    character read. The failure links are not updated by [`~Trie.add`], as a new word can change the failure links of
+    existing states anywhere in the automaton. They are all recomputed on the next split instead, in a time linear in
+    the total length of the words, once for all the tokens added by a call to `add_tokens`.
+
+    Since v4.22, a partial match abandoned on a character no longer hides the words found inside it: with `"B"` and
+    `"ABD"` added, `"ABCD"` is split into `["A", "B", "CD"]`, where it used to be left whole.
     """
 
     def __init__(self):
         self.data = {}
+        self._words = set()
+        # the automaton: transitions, failure link, depth, whether a word ends at the state, and whether a word ends
+        # at the state or at one of the states of its failure links
+        self._goto = [{}]
+        self._fail = [0]
+        self._depth = [0]
+        self._is_word = [False]
+        self._has_output = [False]
+        self._compiled = True
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._words
 
     def add(self, word: str):
         """
@@ -87,6 +118,43 @@ class Trie:
             ref = ref[char]
         ref[""] = 1
 
+        if word in self._words:
+            return
+        self._words.add(word)
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[state] + 1)
+                self._is_word.append(False)
+                self._has_output.append(False)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._is_word[state] = True
+        self._compiled = False
+
+    def _compile(self):
+        # Breadth-first, so that the failure link of a state, which points to a shorter state, is set before its own
+        # transitions are visited
+        queue = collections.deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            self._has_output[state] = self._is_word[state]
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._has_output[next_state] = self._is_word[next_state] or self._has_output[self._fail[next_state]]
+                queue.append(next_state)
+        self._compiled = True
+
     def split(self, text: str) -> List[str]:
         """
         Will look for the words added to the trie within `text`. Output is the original string splitted along the
@@ -108,135 +176,57 @@ class Trie:
         ["[CLS]", " This is a ", "extra_id_100"]
         ```
         """
+        if not self._compiled:
+            self._compile()
+        goto, fail, depth, is_word, has_output = self._goto, self._fail, self._depth, self._is_word, self._has_output
+
         # indexes are counted left of the chars index.
         # "hello", index 0, is left of h, index 1 is between h and e.
         # index 5 is right of the "o".
 
-        # States are going to capture every possible start (indexes as above)
-        # as keys, and have as values, a pointer to the position in the trie
-        # where we're at. This is a partial match for now.
-        # This enables to keep track of multiple matches while we're iterating
-        # the string
-        # If the trie contains, "blowing", and "lower" and we encounter the
-        # string "blower", we need to split into ["b", "lower"].
-        # This is where we need to keep track of multiple possible starts.
-        states = OrderedDict()
-
         # This will contain every indices where we need
         # to cut.
         # We force to cut at offset 0 and len(text) (added later)
         offsets = [0]
 
-        # This is used by the lookahead which needs to skip over
-        # some text where the full match exceeded the place in the initial
-        # for loop
-        skip = 0
-        # Main loop, Giving this algorithm O(n) complexity
-        for current, current_char in enumerate(text):
-            if skip and current < skip:
-                # Prevents the lookahead for matching twice
-                # like extra_id_100 and id_100
+        state = 0
+        current = 0
+        while current < len(text):
+            char = text[current]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            current += 1
+            if not has_output[state]:
                 continue
 
-            # This will track every state
-            # that stop matching, we need to stop tracking them.
-            # If we look at "lowball", we're going to match "l" (add it to states), "o", "w", then
-            # fail on "b", we need to remove 0 from the valid states.
-            to_remove = set()
-            # Whenever we found a match, we need to drop everything
-            # this is a greedy algorithm, it will match on the first found token
-            reset = False
-
-            # In this case, we already have partial matches (But unfinished)
-            for start, trie_pointer in states.items():
-                if "" in trie_pointer:
-                    # This is a final match, we need to reset and
-                    # store the results in `offsets`.
-
-                    # Lookahead to match longest first
-                    # Important in case of extra_id_1 vs extra_id_100
-                    # Here we are also actively looking for other earlier partial
-                    # matches
-                    # "[CLS]", "L", we need to match CLS even if L is special
-                    for lookstart, looktrie_pointer in states.items():
-                        if lookstart > start:
-                            # This partial match is later, we can stop looking
-                            break
-                        elif lookstart < start:
-                            # This partial match is earlier, the trie pointer
-                            # was already updated, so index is + 1
-                            lookahead_index = current + 1
-                            end = current + 1
-                        else:
-                            # Here lookstart == start and
-                            #      looktrie_pointer == trie_pointer
-                            # It wasn't updated yet so indices are current ones
-                            lookahead_index = current
-                            end = current
-                        next_char = text[lookahead_index] if lookahead_index < len(text) else None
-                        if "" in looktrie_pointer:
-                            start = lookstart
-                            end = lookahead_index
-                            skip = lookahead_index
-
-                        while next_char in looktrie_pointer:
-                            looktrie_pointer = looktrie_pointer[next_char]
-                            lookahead_index += 1
-                            if "" in looktrie_pointer:
-                                start = lookstart
-                                end = lookahead_index
-                                skip = lookahead_index
-
-                            if lookahead_index == len(text):
-                                # End of string
-                                break
-                            next_char = text[lookahead_index]
-                        # End lookahead
-
-                    # Storing and resetting
-                    offsets.append(start)
-                    offsets.append(end)
-                    reset = True
+            # The first word of the text ends here. The partial matches still going on are the states of the failure
+            # links, from the earliest start to the latest. If the trie contains "[CLS]" and "L", the match of "L"
+            # must give way to the one of "[CLS]" that started before it, so the earliest partial match that leads to
+            # a word wins, with its longest word (extra_id_100 rather than extra_id_1). The state where the first word
+            # ends always leads to a word, so the loop stops there at the latest.
+            match_state = state
+            while True:
+                start = current - depth[match_state]
+                end = current if is_word[match_state] else None
+                lookahead_state = match_state
+                lookahead_index = current
+                while lookahead_index < len(text):
+                    lookahead_state = goto[lookahead_state].get(text[lookahead_index])
+                    if lookahead_state is None:
+                        break
+                    lookahead_index += 1
+                    if is_word[lookahead_state]:
+                        end = lookahead_index
+                if end is not None:
                     break
-                elif current_char in trie_pointer:
-                    # The current character being looked at has a match within the trie
-                    # update the pointer (it will be stored back into states later).
-                    trie_pointer = trie_pointer[current_char]
-
-                    # Storing back the new pointer into the states.
-                    # Partial matches got longer by one.
-                    states[start] = trie_pointer
-                else:
-                    # The new character has not match in the trie, we need
-                    # to stop keeping track of this partial match.
-                    # We can't do it directly within the loop because of how
-                    # python iteration works
-                    to_remove.add(start)
-
-            # Either clearing the full start (we found a real match)
-            # Or clearing only the partial matches that didn't work.
-            if reset:
-                states = {}
-            else:
-                for start in to_remove:
-                    del states[start]
-
-            # If this character is a starting character within the trie
-            # start keeping track of this partial match.
-            if current >= skip and current_char in self.data:
-                states[current] = self.data[current_char]
-
-        # We have a cut at the end with states.
-        for start, trie_pointer in states.items():
-            if "" in trie_pointer:
-                # This is a final match, we need to reset and
-                # store the results in `offsets`.
-                end = len(text)
-                offsets.append(start)
-                offsets.append(end)
-                # Longest cut is always the one with lower start so the first
-                # item so we need to break.
-                break
+                match_state = fail[match_state]
+
+            # Storing and resetting
+            offsets.append(start)
+            offsets.append(end)
+            state = 0
+            current = end
 
         return self.cut_text(text, offsets)
 
@@ -265,6 +255,71 @@ class Trie:
         return tokens
 
 
+def bpe_merge(word: Tuple[str, ...], bpe_ranks: Dict[Tuple[str, str], int]) -> Tuple[str, ...]:
+    """
+    Merges the symbols of `word` with the BPE merges of `bpe_ranks`, as done by the slow BPE tokenizers.
+
+    As in the original algorithm, the pair of adjacent symbols with the lowest rank is merged everywhere in the word,
+    from left to right, before looking for the next pair. Rather than scanning all the pairs of the word after each
+    merge, the pairs are kept in a heap ordered by rank, and each merge only adds the two pairs it creates, which takes
+    O(n log n) instead of O(n²) for a word of n symbols.
+
+    Args:
+        word (`Tuple[str]`):
+            The symbols of the word, usually its characters.
+        bpe_ranks (`Dict[Tuple[str, str], int]`):
+            The rank of each merge, lower ranks being merged first.
+
+    Returns:
+        `Tuple[str]`: The symbols of the word after all the merges.
+    """
+    symbols = list(word)
+    num_symbols = len(symbols)
+    if num_symbols < 2:
+        return tuple(symbols)
+    # the symbols merged into the one on their left are set to None, the others are linked to their neighbors
+    next_index = list(range(1, num_symbols + 1))
+    prev_index = list(range(-1, num_symbols - 1))
+
+    pairs = []
+    for i in range(num_symbols - 1):
+        rank = bpe_ranks.get((symbols[i], symbols[i + 1]))
+        if rank is not None:
+            pairs.append((rank, i))
+    heapq.heapify(pairs)
+
+    while pairs:
+        rank = pairs[0][0]
+        positions = []
+        while pairs and pairs[0][0] == rank:
+            positions.append(heapq.heappop(pairs)[1])
+
+        # the positions come from left to right; the ones whose pair changed since it was pushed are skipped
+        merged = []
+        for i in positions:
+            j = next_index[i]
+            if symbols[i] is None or j >= num_symbols or bpe_ranks.get((symbols[i], symbols[j])) != rank:
+                continue
+            symbols[i] += symbols[j]
+            symbols[j] = None
+            next_index[i] = next_index[j]
+            if next_index[i] < num_symbols:
+                prev_index[next_index[i]] = i
+            merged.append(i)
+
+        for i in merged:
+            if prev_index[i] >= 0:
+                new_rank = bpe_ranks.get((symbols[prev_index[i]], symbols[i]))
+                if new_rank is not None:
+                    heapq.heappush(pairs, (new_rank, prev_index[i]))
+            if next_index[i] < num_symbols:
+                new_rank = bpe_ranks.get((symbols[i], symbols[next_index[i]]))
+                if new_rank is not None:
+                    heapq.heappush(pairs, (new_rank, i))
+
+    return tuple(symbol for symbol in symbols if symbol is not None)
+
+
 def _is_whitespace(char):
     """Checks whether `char` is a whitespace character."""
     # \t, \n, and \r are technically control characters but we treat them
@@ -329,6 +384,26 @@ def _insert_one_token_to_ordered_list(token_list: List[str], new_token: str):
         token_list.insert(insertion_idx, new_token)
 
 
+# the process pools encoding batches with `num_proc`, kept across calls for each tokenizer
+_ENCODING_POOLS = weakref.WeakKeyDictionary()
+# the copy of the tokenizer in a process of an encoding pool
+_worker_tokenizer = None
+
+
+def _init_encoding_worker(serialized_tokenizer: bytes):
+    global _worker_tokenizer
+    _worker_tokenizer = pickle.loads(serialized_tokenizer)
+
+
+def _encode_in_worker(method_name: str, in_target_mode: bool, kwargs: Dict[str, Any]) -> Dict[str, List[Any]]:
+    # tokenizers with a different processing for the targets are switched to the mode of the calling tokenizer
+    if in_target_mode:
+        _worker_tokenizer._switch_to_target_mode()
+    else:
+        _worker_tokenizer._switch_to_input_mode()
+    return dict(getattr(_worker_tokenizer, method_name)(**kwargs))
+
+
 @add_end_docstrings(INIT_TOKENIZER_DOCSTRING)
 class PreTrainedTokenizer(PreTrainedTokenizerBase):
     """
@@ -443,16 +518,25 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
             else:
                 self.unique_no_split_tokens = sorted(set(self.unique_no_split_tokens).union(set(tokens_to_add)))
         self._create_trie(self.unique_no_split_tokens)
+        # the processes encoding batches hold a copy of the tokenizer without the new tokens
+        self._close_encoding_pool()
 
         return len(tokens_to_add)
 
     def _create_trie(self, unique_no_split_tokens):
-        trie = Trie()
-        for token in unique_no_split_tokens:
-            if hasattr(self, "do_lower_case") and self.do_lower_case and token not in self.all_special_tokens:
-                trie.add(token.lower())
-            else:
-                trie.add(token)
+        if hasattr(self, "do_lower_case") and self.do_lower_case:
+            all_special_tokens = set(self.all_special_tokens)
+            words = {token if token in all_special_tokens else token.lower() for token in unique_no_split_tokens}
+        else:
+            words = set(unique_no_split_tokens)
+        words.discard("")
+        trie = getattr(self, "tokens_trie", None)
+        # Adding tokens only extends the automaton of the trie, it is rebuilt when tokens are removed (or lowercased
+        # differently after becoming special)
+        if trie is None or not trie._words <= words:
+            trie = Trie()
+        for word in sorted(words - trie._words):
+            trie.add(word)
         self.tokens_trie = trie
 
     def num_special_tokens_to_add(self, pair: bool = False) -> int:
@@ -693,6 +777,7 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         def get_input_ids(text):
@@ -721,6 +806,35 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
                 "transformers.PreTrainedTokenizerFast."
             )
 
+        if num_proc is not None and num_proc > 1 and len(batch_text_or_text_pairs) > 1:
+            return self._parallel_batch_encode(
+                num_proc,
+                "_batch_encode_plus",
+                batched_kwargs={"batch_text_or_text_pairs": batch_text_or_text_pairs},
+                kwargs={
+                    "add_special_tokens": add_special_tokens,
+                    "padding_strategy": PaddingStrategy.DO_NOT_PAD,  # we pad in batch afterward
+                    "truncation_strategy": truncation_strategy,
+                    "max_length": max_length,
+                    "stride": stride,
+                    "is_split_into_words": is_split_into_words,
+                    "return_token_type_ids": return_token_type_ids,
+                    "return_attention_mask": False,  # we pad in batch afterward
+                    "return_overflowing_tokens": return_overflowing_tokens,
+                    "return_special_tokens_mask": return_special_tokens_mask,
+                    "return_length": return_length,
+                    "verbose": verbose,
+                    **kwargs,
+                },
+                pad_kwargs={
+                    "padding": padding_strategy.value,
+                    "max_length": max_length,
+                    "pad_to_multiple_of": pad_to_multiple_of,
+                    "return_attention_mask": return_attention_mask,
+                },
+                return_tensors=return_tensors,
+            )
+
         input_ids = []
         for ids_or_pair_ids in batch_text_or_text_pairs:
             if not isinstance(ids_or_pair_ids, (list, tuple)):
@@ -818,6 +932,71 @@ class PreTrainedTokenizer(PreTrainedTokenizerBase):
 
         return batch_outputs
 
+    def _get_encoding_pool(self, num_proc: int) -> ProcessPoolExecutor:
+        num_workers, pool = _ENCODING_POOLS.get(self, (None, None))
+        if num_workers != num_proc:
+            self._close_encoding_pool()
+            # each process unpickles its copy of the tokenizer once, when it starts
+            pool = ProcessPoolExecutor(
+                max_workers=num_proc, initializer=_init_encoding_worker, initargs=(pickle.dumps(self),)
+            )
+            _ENCODING_POOLS[self] = (num_proc, pool)
+        return pool
+
+    def _close_encoding_pool(self):
+        _, pool = _ENCODING_POOLS.pop(self, (None, None))
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _parallel_batch_encode(
+        self,
+        num_proc: int,
+        method_name: str,
+        batched_kwargs: Dict[str, Optional[List[Any]]],
+        kwargs: Dict[str, Any],
+        pad_kwargs: Dict[str, Any],
+        return_tensors: Optional[Union[str, TensorType]] = None,
+    ) -> BatchEncoding:
+        """
+        Encodes a batch in `num_proc` processes, each running `method_name` without padding on a contiguous shard of
+        the batch, then pads the merged outputs as done at the end of `_batch_prepare_for_model`.
+
+        Args:
+            num_proc (`int`):
+                The number of processes.
+            method_name (`str`):
+                The batch encoding method run by the processes, such as `"_batch_encode_plus"`.
+            batched_kwargs (`Dict[str, Optional[List[Any]]]`):
+                The arguments of `method_name` holding one element per example of the batch, which are sharded.
+            kwargs (`Dict[str, Any]`):
+                The other arguments of `method_name`, which must disable padding and tensor conversion.
+            pad_kwargs (`Dict[str, Any]`):
+                The arguments of `self.pad` used to pad the merged outputs.
+            return_tensors (`str` or [`~utils.TensorType`], *optional*):
+                The type of tensors to return.
+        """
+        batch_size = len(next(value for value in batched_kwargs.values() if value is not None))
+        num_shards = min(num_proc, batch_size)
+        bounds = [batch_size * shard_idx // num_shards for shard_idx in range(num_shards + 1)]
+
+        pool = self._get_encoding_pool(num_proc)
+        futures = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            shard_kwargs = {
+                key: value[start:end] if value is not None else None for key, value in batched_kwargs.items()
+            }
+            futures.append(
+                pool.submit(_encode_in_worker, method_name, self._in_target_mode, {**kwargs, **shard_kwargs})
+            )
+
+        batch_outputs = {}
+        for future in futures:
+            for key, value in future.result().items():
+                batch_outputs.setdefault(key, []).extend(value)
+
+        batch_outputs = self.pad(batch_outputs, **pad_kwargs)
+        return BatchEncoding(batch_outputs, tensor_type=return_tensors)
+
     def prepare_for_tokenization(
         self, text: str, is_split_into_words: bool = False, **kwargs
     ) -> Tuple[str, Dict[str, Any]]:
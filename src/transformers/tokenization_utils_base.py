@@ -19,9 +19,12 @@ of output with special method for the Fast tokenizers)
 """
 
 import copy
+import itertools
 import json
 import os
 import re
+import sys
+import threading
 import warnings
 from collections import OrderedDict, UserDict
 from collections.abc import Mapping
@@ -120,6 +123,118 @@ TOKENIZER_CONFIG_FILE = "tokenizer_config.json"
 FULL_TOKENIZER_FILE = "tokenizer.json"
 _re_tokenizer_file = re.compile(r"tokenizer\.(.*)\.json")
 
+# Simple English tokenization artifacts removed by `clean_up_tokenization`, in the order they are replaced
+TOKENIZATION_ARTIFACTS = [
+    (" .", "."),
+    (" ?", "?"),
+    (" !", "!"),
+    (" ,", ","),
+    (" ' ", "'"),
+    (" n't", "n't"),
+    (" 'm", "'m"),
+    (" 's", "'s"),
+    (" 've", "'ve"),
+    (" 're", "'re"),
+]
+
+# Default size of the caches of the slow BPE tokenizers, mapping each word seen to its BPE tokens
+BPE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Default size of the encoding caches of the tokenizers, mapping each text seen to its encoding
+ENCODING_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class LRUCache:
+    """
+    Dictionary bounded by an estimate of the memory taken by its keys and values, which evicts the least recently used
+    entries when full. It is used by the slow BPE tokenizers to cache the BPE of the words they see, which would
+    otherwise grow without limit on open-vocabulary inputs, and by the encoding cache of the tokenizers (see
+    [`~PreTrainedTokenizerBase.enable_encoding_cache`]).
+
+    The lookups made with [`~LRUCache.get`] are counted in `hits` and `misses`, to help sizing the cache. The cache can
+    be shared between threads: look entries up with [`~LRUCache.get`] rather than `in` followed by `[]`, as another
+    thread may evict the entry in between.
+
+    Args:
+        max_bytes (`int`, *optional*, defaults to `BPE_CACHE_MAX_BYTES`):
+            The maximum number of bytes taken by the entries, estimated with `sys.getsizeof`. `None` disables the
+            bound. Can be changed on an existing cache, which then evicts entries on the next insertion.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = BPE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _entry_size(cls, key: Any, value: Any) -> int:
+        return cls._sizeof(key) + cls._sizeof(value)
+
+    @classmethod
+    def _sizeof(cls, obj: Any) -> int:
+        size = sys.getsizeof(obj)
+        if isinstance(obj, (tuple, list)):
+            size += sum(cls._sizeof(item) for item in obj)
+        return size
+
+    @property
+    def num_bytes(self) -> int:
+        """`int`: The estimated number of bytes taken by the entries."""
+        return self._num_bytes
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._data
+
+    def __getitem__(self, key: Any) -> Any:
+        with self._lock:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key: Any, value: Any):
+        size = self._entry_size(key, value)
+        with self._lock:
+            if key in self._data:
+                self._num_bytes -= self._entry_size(key, self._data.pop(key))
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._num_bytes += size
+            while self.max_bytes is not None and self._num_bytes > self.max_bytes:
+                evicted_key, evicted_value = self._data.popitem(last=False)
+                self._num_bytes -= self._entry_size(evicted_key, evicted_value)
+
+    def clear(self):
+        """Removes all the entries and resets the counts of hits and misses."""
+        with self._lock:
+            self._data.clear()
+            self._num_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
 
 class TruncationStrategy(ExplicitEnum):
     """
@@ -159,6 +274,192 @@ class TokenSpan(NamedTuple):
     end: int
 
 
+def _is_flat_sequence(value: Any) -> bool:
+    """Returns whether `value` is a 1D NumPy array or a list/tuple of integers."""
+    if isinstance(value, np.ndarray):
+        return value.ndim == 1
+    return isinstance(value, (list, tuple)) and all(isinstance(item, (int, np.integer)) for item in value)
+
+
+def _to_hashable(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return tuple(_to_hashable(item) for item in value)
+    return value
+
+
+class RaggedArray:
+    """
+    A batch of sequences of different lengths stored in a single flat NumPy array, along with the offsets of the
+    sequences in it.
+
+    Storing a large batch of encoded sequences this way takes one array per input (`input_ids`, `attention_mask`, ...)
+    instead of one Python list per sequence, and [`~tokenization_utils_base.PreTrainedTokenizerBase.pad`] pads it at
+    once into a preallocated NumPy array instead of padding the sequences one by one. A [`BatchEncoding`] is converted
+    to this layout with [`~BatchEncoding.to_columnar`].
+
+    Args:
+        values (`np.ndarray`):
+            The 1D array of all the values of the sequences, one sequence after the other.
+        offsets (`np.ndarray`):
+            The 1D array of shape `(num_sequences + 1,)` of the positions in `values` where each sequence starts,
+            followed by the total number of values.
+
+    Example:
+
+    ```python
+    >>> from transformers import RaggedArray
+
+    >>> array = RaggedArray.from_lists([[1, 2, 3], [4], [5, 6]])
+    >>> array.lengths
+    array([3, 1, 2])
+    >>> array.to_padded(0)
+    array([[1, 2, 3],
+           [4, 0, 0],
+           [5, 6, 0]])
+    ```
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        if values.ndim != 1 or offsets.ndim != 1 or len(offsets) == 0:
+            raise ValueError("A ragged array needs 1D values and 1D offsets starting at the first value.")
+        if offsets[0] != 0 or offsets[-1] != len(values):
+            raise ValueError(
+                f"The offsets of a ragged array must go from 0 to the number of values ({len(values)}), but go from"
+                f" {offsets[0]} to {offsets[-1]}."
+            )
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_lists(
+        cls, sequences: Sequence[Union[Sequence[int], np.ndarray]], dtype: Optional[np.dtype] = None
+    ) -> "RaggedArray":
+        """
+        Builds a ragged array from a sequence of lists or 1D NumPy arrays.
+
+        Args:
+            sequences (`Sequence[List[int]]` or `Sequence[np.ndarray]`):
+                The sequences to store.
+            dtype (`np.dtype`, *optional*):
+                The type of the values. Defaults to the type of the arrays, or to `np.int64` for lists.
+        """
+        lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(sequences) > 0 and all(isinstance(sequence, np.ndarray) for sequence in sequences):
+            values = np.concatenate(sequences)
+            values = values.astype(dtype, copy=False) if dtype is not None else values
+        else:
+            values = np.fromiter(
+                itertools.chain.from_iterable(sequences), dtype=dtype or np.int64, count=int(offsets[-1])
+            )
+        return cls(values, offsets)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """`np.ndarray`: The lengths of the sequences."""
+        return np.diff(self.offsets)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """`np.dtype`: The type of the values."""
+        return self.values.dtype
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item: Union[int, slice, Sequence[int], np.ndarray]) -> Union[np.ndarray, "RaggedArray"]:
+        """
+        With an integer, returns a view of the corresponding sequence. With a slice, returns a ragged array viewing the
+        same values. With a sequence of indices, returns a ragged array holding a copy of the selected sequences.
+        """
+        if isinstance(item, (int, np.integer)):
+            if item < 0:
+                item += len(self)
+            if not 0 <= item < len(self):
+                raise IndexError(f"Index {item} is out of range for a ragged array of {len(self)} sequences.")
+            return self.values[self.offsets[item] : self.offsets[item + 1]]
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                offsets = self.offsets[start : stop + 1]
+                return RaggedArray(self.values[offsets[0] : offsets[-1]], offsets - offsets[0])
+            item = range(start, stop, step)
+        return RaggedArray.from_lists([self[index] for index in item], dtype=self.dtype)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(num_sequences={len(self)}, num_values={len(self.values)}, dtype={self.dtype})"
+        )
+
+    def tolist(self) -> List[List[Any]]:
+        """Returns the sequences as a list of Python lists."""
+        values = self.values.tolist()
+        return [values[start:end] for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+
+    def to_padded(
+        self, padding_value: Union[int, float], length: Optional[int] = None, padding_side: str = "right"
+    ) -> np.ndarray:
+        """
+        Pads the sequences into a new array of shape `(num_sequences, length)`, in a single vectorized copy of the
+        values.
+
+        Args:
+            padding_value (`int` or `float`):
+                The value of the padded positions.
+            length (`int`, *optional*):
+                The length of the padded sequences. Defaults to the length of the longest sequence.
+            padding_side (`str`, *optional*, defaults to `"right"`):
+                The side on which the sequences are padded, `"right"` or `"left"`.
+        """
+        lengths = self.lengths
+        max_sequence_length = int(lengths.max()) if len(self) > 0 else 0
+        if length is None:
+            length = max_sequence_length
+        elif max_sequence_length > length:
+            raise ValueError(
+                f"Cannot pad sequences of up to {max_sequence_length} values to a length of {length}, you should"
+                " probably activate truncation."
+            )
+        if padding_side not in ("right", "left"):
+            raise ValueError("Invalid padding strategy:" + str(padding_side))
+
+        padded = np.full((len(self), length), padding_value, dtype=self.dtype)
+        # the row and column of every value in the padded array
+        rows = np.repeat(np.arange(len(self)), lengths)
+        columns = np.arange(len(self.values)) - np.repeat(self.offsets[:-1], lengths)
+        if padding_side == "left":
+            columns += np.repeat(length - lengths, lengths)
+        padded[rows, columns] = self.values
+        return padded
+
+    def padding_mask(self, length: Optional[int] = None, padding_side: str = "right") -> np.ndarray:
+        """
+        Returns the array of shape `(num_sequences, length)` with 1 at the positions of the values and 0 at the padded
+        positions of [`~RaggedArray.to_padded`], such as an attention mask.
+
+        Args:
+            length (`int`, *optional*):
+                The length of the padded sequences. Defaults to the length of the longest sequence.
+            padding_side (`str`, *optional*, defaults to `"right"`):
+                The side on which the sequences are padded, `"right"` or `"left"`.
+        """
+        lengths = self.lengths
+        if length is None:
+            length = int(lengths.max()) if len(self) > 0 else 0
+        positions = np.arange(length)[None, :]
+        if padding_side == "left":
+            mask = positions >= (length - lengths)[:, None]
+        else:
+            mask = positions < lengths[:, None]
+        return mask.astype(np.int64)
+
+
 class BatchEncoding(UserDict):
     """
     Holds the output of the [`~tokenization_utils_base.PreTrainedTokenizerBase.__call__`],
@@ -691,7 +992,12 @@ class BatchEncoding(UserDict):
                 raise ImportError("Unable to convert output to PyTorch tensors format, PyTorch is not installed.")
             import torch
 
-            as_tensor = torch.tensor
+            def as_tensor(value):
+                # NumPy arrays, such as the ones padded from ragged arrays, are shared with PyTorch without a copy
+                if isinstance(value, np.ndarray):
+                    return torch.from_numpy(value)
+                return torch.tensor(value)
+
             is_tensor = torch.is_tensor
         elif tensor_type == TensorType.JAX:
             if not is_flax_available():
@@ -715,6 +1021,10 @@ class BatchEncoding(UserDict):
                 if prepend_batch_axis:
                     value = [value]
 
+                if isinstance(value, RaggedArray):
+                    # sequences of different lengths need to be padded first
+                    raise ValueError(f"Cannot convert the ragged array of `{key}` to a tensor.")
+
                 if not is_tensor(value):
                     tensor = as_tensor(value)
 
@@ -741,6 +1051,21 @@ class BatchEncoding(UserDict):
 
         return self
 
+    def to_columnar(self) -> "BatchEncoding":
+        """
+        Stores the batches of sequences (`input_ids`, `attention_mask`, ...) as [`RaggedArray`], with one flat NumPy
+        array per input instead of one Python list per sequence. [`~PreTrainedTokenizerBase.pad`] and
+        [`DataCollatorWithPadding`] then pad them at once into preallocated NumPy arrays, which are converted to
+        PyTorch tensors without a copy.
+
+        Returns:
+            [`BatchEncoding`]: The same instance after modification.
+        """
+        for key, value in self.items():
+            if isinstance(value, (list, tuple)) and len(value) > 0 and _is_flat_sequence(value[0]):
+                self[key] = RaggedArray.from_lists(value)
+        return self
+
     @torch_required
     def to(self, device: Union[str, "torch.device"]) -> "BatchEncoding":
         """
@@ -763,6 +1088,161 @@ class BatchEncoding(UserDict):
         return self
 
 
+class IncrementalDecoder:
+    r"""
+    Decodes a sequence of token ids as it grows, returning only the text of the new tokens.
+
+    Calling [`~PreTrainedTokenizerBase.decode`] after every new token decodes the whole sequence every time, which is
+    quadratic in its length. An `IncrementalDecoder` only decodes a window made of the tokens not returned as text yet,
+    preceded by the tokens of the last returned text. The text of the new tokens is the difference between the
+    decoding of the window and the decoding of its first tokens alone, so that tokens whose text depends on the
+    previous ones, like the `"▁"` prefix spaces of sentencepiece or the `"##"` continuations of WordPiece, are decoded
+    as in the whole sequence. The window only spans a few tokens, and each new token is decoded a constant number of
+    times on average.
+
+    Text ending with an incomplete multi-byte character (decoded as `"�"` by byte-level BPE tokenizers) is held back
+    until the character is complete. With `clean_up_tokenization_spaces=True`, the last few characters are also held
+    back when they start a tokenization artifact removed by [`~PreTrainedTokenizerBase.clean_up_tokenization`], such as
+    `" n"` before `"'t"`, until the next tokens tell whether they complete it.
+
+    The texts returned by [`~IncrementalDecoder.add`], followed by the one returned by [`~IncrementalDecoder.flush`],
+    add up to the decoding of the whole sequence. This does not hold around tokenization artifacts for fast tokenizers
+    whose decoder cleans up the text by itself, such as the WordPiece decoder of BERT.
+
+    Args:
+        tokenizer ([`PreTrainedTokenizerBase`]):
+            The slow or fast tokenizer used to decode the tokens.
+        skip_special_tokens (`bool`, *optional*, defaults to `False`):
+            Whether or not to remove special tokens in the decoding.
+        clean_up_tokenization_spaces (`bool`, *optional*, defaults to `True`):
+            Whether or not to clean up the tokenization spaces.
+        decode_kwargs (additional keyword arguments, *optional*):
+            Will be passed to the `decode` method of the tokenizer.
+
+    Example:
+
+    ```python
+    >>> from transformers import AutoTokenizer, IncrementalDecoder
+
+    >>> tokenizer = AutoTokenizer.from_pretrained("gpt2")
+    >>> token_ids = tokenizer.encode("Hello world, 你好!")
+
+    >>> decoder = IncrementalDecoder(tokenizer)
+    >>> texts = [decoder.add(token_id) for token_id in token_ids]
+    >>> texts.append(decoder.flush())
+    >>> "".join(texts) == tokenizer.decode(token_ids)
+    True
+    ```
+    """
+
+    def __init__(
+        self,
+        tokenizer: "PreTrainedTokenizerBase",
+        skip_special_tokens: bool = False,
+        clean_up_tokenization_spaces: bool = True,
+        **decode_kwargs
+    ):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.clean_up_tokenization_spaces = clean_up_tokenization_spaces
+        self.decode_kwargs = decode_kwargs
+        # the texts cleaned up into an artifact: " n ' t" gives " n't" once " ' " is cleaned up
+        self._artifact_texts = [artifact for artifact, _ in TOKENIZATION_ARTIFACTS]
+        self._artifact_texts += [
+            artifact.replace("'", " ' ") for artifact in self._artifact_texts if "'" in artifact and artifact != " ' "
+        ]
+        self._max_artifact_length = max(len(artifact) for artifact in self._artifact_texts)
+        self.reset()
+
+    def reset(self):
+        """Discards the tokens and the text held back, to decode a new sequence."""
+        # the window: the tokens before `_read_offset` were returned as text, the following ones were not
+        self._token_ids = []
+        self._read_offset = 0
+        # the text held back until the next tokens show whether it holds a tokenization artifact
+        self._pending_text = ""
+
+    def _decode_window(self) -> str:
+        decode_kwargs = {
+            "skip_special_tokens": self.skip_special_tokens,
+            "clean_up_tokenization_spaces": False,
+            **self.decode_kwargs,
+        }
+        prefix_text = self.tokenizer.decode(self._token_ids[: self._read_offset], **decode_kwargs)
+        text = self.tokenizer.decode(self._token_ids, **decode_kwargs)
+        return text[len(prefix_text) :]
+
+    def add(self, token_ids: Union[int, List[int], "np.ndarray", "torch.Tensor", "tf.Tensor"]) -> str:
+        """
+        Adds tokens to the sequence and returns their text.
+
+        Args:
+            token_ids (`Union[int, List[int], np.ndarray, torch.Tensor, tf.Tensor]`):
+                The new token id(s).
+
+        Returns:
+            `str`: The text added by the new tokens that can no longer change. It may be empty, the text held back is
+            returned with the one of the next tokens.
+        """
+        token_ids = to_py_obj(token_ids)
+        if isinstance(token_ids, int):
+            token_ids = [token_ids]
+        self._token_ids.extend(token_ids)
+
+        text = self._decode_window()
+        if len(text) == 0 or text.endswith("�"):
+            return ""
+        # the new tokens are now the prefix of the window
+        del self._token_ids[: self._read_offset]
+        self._read_offset = len(self._token_ids)
+        return self._clean_up(text)
+
+    def flush(self) -> str:
+        """
+        Returns the text held back and resets the decoder.
+
+        Returns:
+            `str`: The end of the text of the sequence.
+        """
+        text = self._decode_window() if self._read_offset < len(self._token_ids) else ""
+        text = self._clean_up(text, final=True)
+        self.reset()
+        return text
+
+    def _clean_up(self, text: str, final: bool = False) -> str:
+        if not self.clean_up_tokenization_spaces:
+            return text
+        text = self._pending_text + text
+        if final:
+            cut = len(text)
+        else:
+            cut = self._clean_up_cut(text)
+        self._pending_text = text[cut:]
+        return self.tokenizer.clean_up_tokenization(text[:cut])
+
+    def _clean_up_cut(self, text: str) -> int:
+        # The artifacts all start with a space, so the next tokens can only complete an artifact from one of the last
+        # spaces of the text, when the text that follows it starts an artifact. Only this end of the text is held back:
+        # text without spaces, like CJK text, and the text up to the last line break are never held back.
+        cut = text.find(" ", max(len(text) - self._max_artifact_length + 1, 0))
+        while cut != -1:
+            end = text[cut:]
+            if any(len(artifact) > len(end) and artifact.startswith(end) for artifact in self._artifact_texts):
+                break
+            cut = text.find(" ", cut + 1)
+        if cut == -1:
+            return len(text)
+        # the text held back does not start in the middle of an artifact (" ' " followed by " ")
+        previous_cut = None
+        while cut != previous_cut:
+            previous_cut = cut
+            for artifact in self._artifact_texts:
+                start = text.rfind(artifact, 0, min(previous_cut + len(artifact) - 1, len(text)))
+                if start != -1 and start + len(artifact) > previous_cut:
+                    cut = min(cut, start)
+        return cut
+
+
 class SpecialTokensMixin:
     """
     A mixin derived by [`PreTrainedTokenizer`] and [`PreTrainedTokenizerFast`] to handle specific behaviors related to
@@ -960,6 +1440,10 @@ class SpecialTokensMixin:
         if not isinstance(new_tokens, (list, tuple)):
             new_tokens = [new_tokens]
 
+        # the cached encodings were made without the new tokens
+        if getattr(self, "encoding_cache", None) is not None:
+            self.encoding_cache.clear()
+
         return self._add_tokens(new_tokens, special_tokens=special_tokens)
 
     def _add_tokens(self, new_tokens: Union[List[str], List[AddedToken]], special_tokens: bool = False) -> int:
@@ -1356,6 +1840,10 @@ ENCODE_PLUS_ADDITIONAL_KWARGS_DOCSTRING = r"""
                 Whether or not to return the lengths of the encoded inputs.
             verbose (`bool`, *optional*, defaults to `True`):
                 Whether or not to print more information and warnings.
+            num_proc (`int`, *optional*):
+                The number of processes encoding a batch of sequences in parallel. Only supported by slow tokenizers,
+                as fast tokenizers already encode batches in parallel. The processes are started by the first call and
+                kept for the next ones, each with a copy of the tokenizer made when they are started.
             **kwargs: passed to the `self.tokenize()` method
 
         Return:
@@ -1502,6 +1990,8 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             {}
         )  # Use to store when we have already noticed a deprecation warning (avoid overlogging).
         self._in_target_context_manager = False
+        self._in_target_mode = False
+        self.encoding_cache = None
         super().__init__(**kwargs)
 
     @property
@@ -2510,7 +3000,9 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             encodings = self._call_one(text=text, text_pair=text_pair, **all_kwargs)
         if text_target is not None:
             self._switch_to_target_mode()
+            self._in_target_mode = True
             target_encodings = self._call_one(text=text_target, text_pair=text_pair_target, **all_kwargs)
+            self._in_target_mode = False
         # Leave back tokenizer in input mode
         self._switch_to_input_mode()
 
@@ -2613,6 +3105,8 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
                 **kwargs,
             )
         else:
+            # a single sequence is always encoded in the current process
+            kwargs.pop("num_proc", None)
             return self.encode_plus(
                 text=text,
                 text_pair=text_pair,
@@ -2634,6 +3128,152 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
                 **kwargs,
             )
 
+    def enable_encoding_cache(self, max_bytes: Optional[int] = ENCODING_CACHE_MAX_BYTES):
+        """
+        Caches the encodings of the texts passed to the tokenizer, so that the texts seen before are not tokenized
+        again. This is useful when the same texts come back often, such as product titles or templated messages.
+
+        The encodings are cached in a least recently used cache bounded in memory, keyed by the text (or pair of
+        texts) and the arguments that change its encoding, such as `add_special_tokens` or the truncation arguments.
+        They are stored unpadded, as compact NumPy arrays, and padded and converted to tensors with the other texts of
+        the batch, so that a text is found in the cache whatever the padding of the batch. The hits and misses of the
+        cache are counted in `tokenizer.encoding_cache.hits` and `tokenizer.encoding_cache.misses`.
+
+        Only the calls returning one row per text are cached (not the ones with `return_overflowing_tokens=True` or
+        model-specific arguments). The encodings returned for a fast tokenizer are not backed by
+        `tokenizers.Encoding` objects, so methods like [`~BatchEncoding.word_ids`] are not available. The cache is
+        cleared when tokens are added to the tokenizer.
+
+        Args:
+            max_bytes (`int`, *optional*, defaults to 64MB):
+                The maximum number of bytes taken by the cached encodings, estimated with `sys.getsizeof`. `None`
+                disables the bound.
+
+        Example:
+
+        ```python
+        >>> from transformers import AutoTokenizer
+
+        >>> tokenizer = AutoTokenizer.from_pretrained("bert-base-cased")
+        >>> tokenizer.enable_encoding_cache()
+        >>> inputs = tokenizer(["Hello world", "Goodbye"], padding=True)
+        >>> inputs = tokenizer("Hello world")
+        >>> tokenizer.encoding_cache.hits, tokenizer.encoding_cache.misses
+        (1, 2)
+        ```
+        """
+        self.encoding_cache = LRUCache(max_bytes)
+
+    def disable_encoding_cache(self):
+        """
+        Removes the cache of encodings enabled by [`~PreTrainedTokenizerBase.enable_encoding_cache`].
+        """
+        self.encoding_cache = None
+
+    def _use_encoding_cache(self, return_overflowing_tokens: bool, kwargs: Dict[str, Any]) -> bool:
+        # the overflowing tokens add rows to the batch, and the other arguments are specific to some tokenizers
+        return self.encoding_cache is not None and not return_overflowing_tokens and len(kwargs) == 0
+
+    def _get_cached_encodings(
+        self,
+        batch_text_or_text_pairs: Union[
+            List[TextInput],
+            List[TextInputPair],
+            List[PreTokenizedInput],
+            List[PreTokenizedInputPair],
+            List[EncodedInput],
+            List[EncodedInputPair],
+        ],
+        num_proc: Optional[int] = None,
+        **encode_kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the unpadded encodings of the texts, encoding only the ones missing from the cache.
+        """
+        options = (tuple(sorted(encode_kwargs.items())), self.truncation_side, self._in_target_mode)
+        keys = [(_to_hashable(text_or_text_pair), options) for text_or_text_pair in batch_text_or_text_pairs]
+        encodings = {}
+        for key in keys:
+            if key not in encodings:
+                encodings[key] = self.encoding_cache.get(key)
+
+        # the texts to encode, once each
+        missing = {}
+        for i, key in enumerate(keys):
+            if encodings[key] is None and key not in missing:
+                missing[key] = i
+        missing = list(missing.values())
+        if len(missing) > 0:
+            if num_proc is not None:
+                encode_kwargs["num_proc"] = num_proc
+            batch_outputs = self._batch_encode_plus(
+                [batch_text_or_text_pairs[i] for i in missing],
+                padding_strategy=PaddingStrategy.DO_NOT_PAD,
+                return_tensors=None,
+                return_overflowing_tokens=False,
+                **encode_kwargs,
+            )
+            for j, i in enumerate(missing):
+                encoding = []
+                for name, values in batch_outputs.items():
+                    value = np.asarray(values[j])
+                    # the token ids, masks and offsets are stored as 32-bit integers
+                    encoding.append((name, value.astype(np.int32) if value.dtype.kind in "iub" else values[j]))
+                encodings[keys[i]] = tuple(encoding)
+                self.encoding_cache[keys[i]] = encodings[keys[i]]
+
+        outputs = []
+        for key in keys:
+            encoded_inputs = {}
+            for name, value in encodings[key]:
+                if isinstance(value, np.ndarray):
+                    value = value.tolist()
+                    if name == "offset_mapping":
+                        value = [tuple(offsets) for offsets in value]
+                encoded_inputs[name] = value
+            outputs.append(encoded_inputs)
+        return outputs
+
+    def _pad_cached_encodings(
+        self,
+        encoded_inputs: Union[Dict[str, EncodedInput], List[Dict[str, EncodedInput]]],
+        padding_strategy: PaddingStrategy,
+        max_length: Optional[int],
+        pad_to_multiple_of: Optional[int],
+        return_tensors: Optional[Union[str, TensorType]],
+        return_attention_mask: Optional[bool],
+        return_length: bool,
+        verbose: bool,
+    ) -> BatchEncoding:
+        is_batched = isinstance(encoded_inputs, (list, tuple))
+        encoded_inputs = self.pad(
+            encoded_inputs,
+            padding=padding_strategy,
+            max_length=max_length,
+            pad_to_multiple_of=pad_to_multiple_of,
+            return_attention_mask=return_attention_mask,
+            verbose=verbose,
+        )
+        # the offsets are not padded by `pad`, fast tokenizers pad them with (0, 0)
+        if "offset_mapping" in encoded_inputs:
+            input_ids = encoded_inputs["input_ids"] if is_batched else [encoded_inputs["input_ids"]]
+            offset_mapping = encoded_inputs["offset_mapping"] if is_batched else [encoded_inputs["offset_mapping"]]
+            for ids, offsets in zip(input_ids, offset_mapping):
+                padding = [(0, 0)] * (len(ids) - len(offsets))
+                if self.padding_side == "left":
+                    offsets[:0] = padding
+                else:
+                    offsets.extend(padding)
+        # the lengths are the ones of the padded sequences, except for batches encoded by slow tokenizers, and fast
+        # tokenizers return the length of a single sequence in a list
+        if return_length and is_batched and self.is_fast:
+            encoded_inputs["length"] = [len(input_ids) for input_ids in encoded_inputs["input_ids"]]
+        elif return_length and not is_batched:
+            encoded_inputs["length"] = len(encoded_inputs["input_ids"])
+            if self.is_fast and return_tensors is None:
+                encoded_inputs["length"] = [encoded_inputs["length"]]
+        return BatchEncoding(dict(encoded_inputs), tensor_type=return_tensors, prepend_batch_axis=not is_batched)
+
     @add_end_docstrings(ENCODE_KWARGS_DOCSTRING, ENCODE_PLUS_ADDITIONAL_KWARGS_DOCSTRING)
     def encode_plus(
         self,
@@ -2686,6 +3326,36 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             **kwargs,
         )
 
+        if (
+            self._use_encoding_cache(return_overflowing_tokens, kwargs)
+            and isinstance(text, str)
+            and (text_pair is None or isinstance(text_pair, str))
+        ):
+            encodings = self._get_cached_encodings(
+                [text if text_pair is None else (text, text_pair)],
+                add_special_tokens=add_special_tokens,
+                truncation_strategy=truncation_strategy,
+                max_length=max_length,
+                stride=stride,
+                is_split_into_words=is_split_into_words,
+                return_token_type_ids=return_token_type_ids,
+                return_attention_mask=return_attention_mask,
+                return_special_tokens_mask=return_special_tokens_mask,
+                return_offsets_mapping=return_offsets_mapping,
+                return_length=return_length,
+                verbose=verbose,
+            )
+            return self._pad_cached_encodings(
+                encodings[0],
+                padding_strategy=padding_strategy,
+                max_length=max_length,
+                pad_to_multiple_of=pad_to_multiple_of,
+                return_tensors=return_tensors,
+                return_attention_mask=return_attention_mask,
+                return_length=return_length,
+                verbose=verbose,
+            )
+
         return self._encode_plus(
             text=text,
             text_pair=text_pair,
@@ -2756,6 +3426,7 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
         return_offsets_mapping: bool = False,
         return_length: bool = False,
         verbose: bool = True,
+        num_proc: Optional[int] = None,
         **kwargs
     ) -> BatchEncoding:
         """
@@ -2784,6 +3455,41 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             **kwargs,
         )
 
+        if num_proc is not None and self.is_fast:
+            raise ValueError(
+                "`num_proc` is only supported by slow tokenizers, fast tokenizers already encode batches in parallel."
+            )
+
+        if self._use_encoding_cache(return_overflowing_tokens, kwargs) and len(batch_text_or_text_pairs) > 0:
+            encodings = self._get_cached_encodings(
+                batch_text_or_text_pairs,
+                add_special_tokens=add_special_tokens,
+                truncation_strategy=truncation_strategy,
+                max_length=max_length,
+                stride=stride,
+                is_split_into_words=is_split_into_words,
+                return_token_type_ids=return_token_type_ids,
+                return_attention_mask=return_attention_mask,
+                return_special_tokens_mask=return_special_tokens_mask,
+                return_offsets_mapping=return_offsets_mapping,
+                return_length=return_length,
+                verbose=verbose,
+                num_proc=num_proc,
+            )
+            return self._pad_cached_encodings(
+                encodings,
+                padding_strategy=padding_strategy,
+                max_length=max_length,
+                pad_to_multiple_of=pad_to_multiple_of,
+                return_tensors=return_tensors,
+                return_attention_mask=return_attention_mask,
+                return_length=return_length,
+                verbose=verbose,
+            )
+
+        if num_proc is not None:
+            kwargs["num_proc"] = num_proc
+
         return self._batch_encode_plus(
             batch_text_or_text_pairs=batch_text_or_text_pairs,
             add_special_tokens=add_special_tokens,
@@ -2873,6 +3579,10 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
 
                 Instead of `List[int]` you can have tensors (numpy arrays, PyTorch tensors or TensorFlow tensors), see
                 the note above for the return type.
+
+                A batch can also hold [`RaggedArray`] instead of `List[List[int]]`, as returned by
+                [`~BatchEncoding.to_columnar`]. All its sequences are then padded at once in preallocated NumPy
+                arrays, which are returned unless `return_tensors` is set.
             padding (`bool`, `str` or [`~utils.PaddingStrategy`], *optional*, defaults to `True`):
                  Select a strategy to pad the returned sequences (according to the model's padding side and padding
                  index) among:
@@ -2923,6 +3633,38 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
                 encoded_inputs["attention_mask"] = []
             return encoded_inputs
 
+        # Convert padding_strategy in PaddingStrategy
+        padding_strategy, _, max_length, _ = self._get_padding_truncation_strategies(
+            padding=padding, max_length=max_length, verbose=verbose
+        )
+
+        # Batches given as ragged arrays, as well as batches of lists or NumPy arrays padded into tensors, are padded at
+        # once in preallocated arrays rather than sequence by sequence. This requires the padding of `_pad`, as some
+        # tokenizers pad additional inputs.
+        pads_as_ragged = (
+            padding_strategy != PaddingStrategy.DO_NOT_PAD and type(self)._pad == PreTrainedTokenizerBase._pad
+        )
+        if isinstance(required_input, RaggedArray) or (
+            pads_as_ragged
+            and isinstance(required_input, (list, tuple))
+            and _is_flat_sequence(required_input[0])
+            and (return_tensors is not None or isinstance(required_input[0], np.ndarray))
+        ):
+            if pads_as_ragged:
+                return self._pad_ragged(
+                    encoded_inputs,
+                    max_length=max_length,
+                    padding_strategy=padding_strategy,
+                    pad_to_multiple_of=pad_to_multiple_of,
+                    return_attention_mask=return_attention_mask,
+                    return_tensors=return_tensors,
+                )
+            encoded_inputs = {
+                key: value.tolist() if isinstance(value, RaggedArray) else value
+                for key, value in encoded_inputs.items()
+            }
+            required_input = encoded_inputs[self.model_input_names[0]]
+
         # If we have PyTorch/TF/NumPy tensors/arrays as inputs, we cast them as python objects
         # and rebuild them afterwards if no return_tensors is specified
         # Note that we lose the specific device the tensor may be on for PyTorch
@@ -2951,11 +3693,6 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
             for key, value in encoded_inputs.items():
                 encoded_inputs[key] = to_py_obj(value)
 
-        # Convert padding_strategy in PaddingStrategy
-        padding_strategy, _, max_length, _ = self._get_padding_truncation_strategies(
-            padding=padding, max_length=max_length, verbose=verbose
-        )
-
         required_input = encoded_inputs[self.model_input_names[0]]
         if required_input and not isinstance(required_input[0], (list, tuple)):
             encoded_inputs = self._pad(
@@ -3290,6 +4027,72 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
 
         return (ids, pair_ids, overflowing_tokens)
 
+    def _pad_ragged(
+        self,
+        encoded_inputs: Union[Dict[str, Union[RaggedArray, List[EncodedInput]]], BatchEncoding],
+        max_length: Optional[int] = None,
+        padding_strategy: PaddingStrategy = PaddingStrategy.LONGEST,
+        pad_to_multiple_of: Optional[int] = None,
+        return_attention_mask: Optional[bool] = None,
+        return_tensors: Optional[Union[str, TensorType]] = None,
+    ) -> BatchEncoding:
+        """
+        Pads a batch of encoded inputs like `_pad`, with all the sequences of an input copied at once into a
+        preallocated NumPy array.
+
+        Args:
+            encoded_inputs:
+                Dictionary of batches of tokenized inputs, as [`RaggedArray`] or lists of `List[int]` or 1D NumPy arrays.
+            max_length: maximum length of the returned arrays and optionally padding length.
+            padding_strategy: PaddingStrategy to use for padding, either `PaddingStrategy.LONGEST` or
+                `PaddingStrategy.MAX_LENGTH`.
+            pad_to_multiple_of: (optional) Integer if set will pad the sequence to a multiple of the provided value.
+            return_attention_mask:
+                (optional) Set to False to avoid returning attention mask (default: set to model specifics)
+            return_tensors:
+                (optional) The type of tensors to return. Defaults to NumPy arrays.
+        """
+        if return_attention_mask is None:
+            return_attention_mask = "attention_mask" in self.model_input_names
+
+        padding_values = {self.model_input_names[0]: self.pad_token_id, "special_tokens_mask": 1}
+        padding_values["token_type_ids"] = self.pad_token_type_id
+        if return_attention_mask:
+            padding_values["attention_mask"] = 0
+
+        # the ids given as lists are padded with the type of the tensors built from lists of Python integers
+        if return_tensors is not None and TensorType(return_tensors) in (TensorType.TENSORFLOW, TensorType.JAX):
+            dtype = np.int32
+        elif return_tensors is not None and TensorType(return_tensors) == TensorType.PYTORCH:
+            dtype = np.int64
+        else:
+            dtype = np.int_
+
+        batch = {}
+        for key, value in encoded_inputs.items():
+            if key in padding_values and not isinstance(value, RaggedArray):
+                value = RaggedArray.from_lists(value, dtype=dtype)
+            batch[key] = value
+
+        required_input = batch[self.model_input_names[0]]
+        if padding_strategy == PaddingStrategy.LONGEST:
+            max_length = int(required_input.lengths.max())
+        if max_length is not None and pad_to_multiple_of is not None and (max_length % pad_to_multiple_of != 0):
+            max_length = ((max_length // pad_to_multiple_of) + 1) * pad_to_multiple_of
+
+        for key, value in batch.items():
+            if key in padding_values:
+                batch[key] = value.to_padded(padding_values[key], max_length, padding_side=self.padding_side)
+            else:
+                # as in `_pad`, the other inputs are not padded
+                batch[key] = value.tolist() if isinstance(value, RaggedArray) else to_py_obj(value)
+        if return_attention_mask and "attention_mask" not in batch:
+            batch["attention_mask"] = required_input.padding_mask(max_length, padding_side=self.padding_side)
+            if not isinstance(encoded_inputs[self.model_input_names[0]], RaggedArray):
+                batch["attention_mask"] = batch["attention_mask"].astype(dtype, copy=False)
+
+        return BatchEncoding(batch, tensor_type=return_tensors)
+
     def _pad(
         self,
         encoded_inputs: Union[Dict[str, EncodedInput], BatchEncoding],
@@ -3501,18 +4304,8 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
         Returns:
             `str`: The cleaned-up string.
         """
-        out_string = (
-            out_string.replace(" .", ".")
-            .replace(" ?", "?")
-            .replace(" !", "!")
-            .replace(" ,", ",")
-            .replace(" ' ", "'")
-            .replace(" n't", "n't")
-            .replace(" 'm", "'m")
-            .replace(" 's", "'s")
-            .replace(" 've", "'ve")
-            .replace(" 're", "'re")
-        )
+        for artifact, replacement in TOKENIZATION_ARTIFACTS:
+            out_string = out_string.replace(artifact, replacement)
         return out_string
 
     def _eventual_warn_about_too_long_sequence(self, ids: List[int], max_length: Optional[int], verbose: bool):
@@ -3560,8 +4353,10 @@ class PreTrainedTokenizerBase(SpecialTokensMixin, PushToHubMixin):
         )
         self._switch_to_target_mode()
         self._in_target_context_manager = True
+        self._in_target_mode = True
         yield
         self._in_target_context_manager = False
+        self._in_target_mode = False
         self._switch_to_input_mode()
 
     @classmethod
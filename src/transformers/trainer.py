@@ -91,6 +91,7 @@ from .trainer_pt_utils import (
     LengthGroupedSampler,
     SequentialDistributedSampler,
     ShardSampler,
+    TokenBudgetBatchSampler,
     distributed_broadcast_scalars,
     distributed_concat,
     find_batch_size,
@@ -504,6 +505,14 @@ class Trainer:
             and args.group_by_length
         ):
             raise ValueError("the `--group_by_length` option is only available for `Dataset`, not `IterableDataset")
+        if (
+            train_dataset is not None
+            and isinstance(train_dataset, torch.utils.data.IterableDataset)
+            and args.max_tokens_per_batch is not None
+        ):
+            raise ValueError(
+                "the `--max_tokens_per_batch` option is only available for `Dataset`, not `IterableDataset`"
+            )
 
         self._signature_columns = None
 
@@ -829,12 +838,39 @@ class Trainer:
                     seed=seed,
                 )
 
+    def _get_train_batch_sampler(self) -> Optional[torch.utils.data.Sampler]:
+        if self.train_dataset is None or not has_length(self.train_dataset) or self.args.max_tokens_per_batch is None:
+            return None
+
+        if is_datasets_available() and isinstance(self.train_dataset, datasets.Dataset):
+            lengths = (
+                self.train_dataset[self.args.length_column_name]
+                if self.args.length_column_name in self.train_dataset.column_names
+                else None
+            )
+        else:
+            lengths = None
+        model_input_name = self.tokenizer.model_input_names[0] if self.tokenizer is not None else None
+        pad_to_multiple_of = getattr(self.data_collator, "pad_to_multiple_of", None)
+        return TokenBudgetBatchSampler(
+            self.args.max_tokens_per_batch,
+            dataset=self.train_dataset,
+            lengths=lengths,
+            model_input_name=model_input_name,
+            num_replicas=self.args.world_size,
+            rank=self.args.process_index,
+            seed=self.args.data_seed if self.args.data_seed is not None else self.args.seed,
+            drop_last=self.args.dataloader_drop_last,
+            pad_to_multiple_of=pad_to_multiple_of,
+        )
+
     def get_train_dataloader(self) -> DataLoader:
         """
         Returns the training [`~torch.utils.data.DataLoader`].
 
         Will use no sampler if `train_dataset` does not implement `__len__`, a random sampler (adapted to distributed
-        training if necessary) otherwise.
+        training if necessary) otherwise. With `max_tokens_per_batch`, the batches are built by a
+        [`~trainer_pt_utils.TokenBudgetBatchSampler`] instead.
 
         Subclass and override this method if you want to inject some custom behavior.
         """
@@ -866,6 +902,17 @@ class Trainer:
                 pin_memory=self.args.dataloader_pin_memory,
             )
 
+        train_batch_sampler = self._get_train_batch_sampler()
+        if train_batch_sampler is not None:
+            return DataLoader(
+                train_dataset,
+                batch_sampler=train_batch_sampler,
+                collate_fn=data_collator,
+                num_workers=self.args.dataloader_num_workers,
+                pin_memory=self.args.dataloader_pin_memory,
+                worker_init_fn=seed_worker,
+            )
+
         train_sampler = self._get_train_sampler()
 
         return DataLoader(
@@ -1525,6 +1572,9 @@ class Trainer:
             num_update_steps_per_epoch = len_dataloader // args.gradient_accumulation_steps
             num_update_steps_per_epoch = max(num_update_steps_per_epoch, 1)
             num_examples = self.num_examples(train_dataloader)
+            if isinstance(getattr(train_dataloader, "batch_sampler", None), TokenBudgetBatchSampler):
+                # The batches have a varying number of samples, use their average
+                total_train_batch_size = max(num_examples * args.gradient_accumulation_steps // len_dataloader, 1)
             if args.max_steps > 0:
                 max_steps = args.max_steps
                 num_train_epochs = args.max_steps // num_update_steps_per_epoch + int(
@@ -1609,8 +1659,17 @@ class Trainer:
         logger.info("***** Running training *****")
         logger.info(f"  Num examples = {num_examples}")
         logger.info(f"  Num Epochs = {num_train_epochs}")
-        logger.info(f"  Instantaneous batch size per device = {args.per_device_train_batch_size}")
-        logger.info(f"  Total train batch size (w. parallel, distributed & accumulation) = {total_train_batch_size}")
+        if args.max_tokens_per_batch is not None and len_dataloader is not None:
+            logger.info(f"  Max tokens per batch per device = {args.max_tokens_per_batch}")
+            logger.info(
+                "  Average total train batch size (w. parallel, distributed & accumulation) = "
+                f"{total_train_batch_size}"
+            )
+        else:
+            logger.info(f"  Instantaneous batch size per device = {args.per_device_train_batch_size}")
+            logger.info(
+                f"  Total train batch size (w. parallel, distributed & accumulation) = {total_train_batch_size}"
+            )
         logger.info(f"  Gradient Accumulation steps = {args.gradient_accumulation_steps}")
         logger.info(f"  Total optimization steps = {max_steps}")
 
@@ -1691,6 +1750,10 @@ class Trainer:
         for epoch in range(epochs_trained, num_train_epochs):
             if isinstance(train_dataloader, DataLoader) and isinstance(train_dataloader.sampler, DistributedSampler):
                 train_dataloader.sampler.set_epoch(epoch)
+            elif isinstance(train_dataloader, DataLoader) and isinstance(
+                train_dataloader.batch_sampler, TokenBudgetBatchSampler
+            ):
+                train_dataloader.batch_sampler.set_epoch(epoch)
             elif hasattr(train_dataloader, "dataset") and isinstance(train_dataloader.dataset, IterableDatasetShard):
                 train_dataloader.dataset.set_epoch(epoch)
 
@@ -662,6 +662,141 @@ class DistributedLengthGroupedSampler(DistributedSampler):
         return iter(indices)
 
 
+def get_token_budget_batches(lengths, max_tokens, pad_to_multiple_of=None, generator=None):
+    """
+    Return a list of batches of indices, each holding as many elements as fit in `max_tokens` tokens once padded to the
+    length of their longest element (padded length × batch size). To do this, the indices are:
+
+    - randomly permuted, then sorted by length, so that only the order of the elements of the same length is random
+      and the batches have the same sizes at every epoch
+    - split greedily in batches whose padded size does not exceed `max_tokens`
+
+    The batches are then randomly permuted, with the one holding the most tokens placed first, so that an OOM happens
+    sooner rather than later. An element longer than `max_tokens` is placed alone in its batch.
+    """
+    # We need to use torch for the random part as a distributed sampler will set the random seed for torch.
+    indices = torch.randperm(len(lengths), generator=generator).tolist()
+    indices.sort(key=lambda i: lengths[i])
+
+    def padded_length(index):
+        if pad_to_multiple_of is None:
+            return lengths[index]
+        return math.ceil(lengths[index] / pad_to_multiple_of) * pad_to_multiple_of
+
+    batches = []
+    batch = []
+    for index in indices:
+        # Since the elements are sorted by length, the new element is the longest of the batch
+        if len(batch) > 0 and padded_length(index) * (len(batch) + 1) > max_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if len(batch) > 0:
+        batches.append(batch)
+
+    permutation = torch.randperm(len(batches), generator=generator).tolist()
+    batches = [batches[i] for i in permutation]
+
+    # Switch to put the batch with the most tokens in first position
+    if len(batches) > 0:
+        max_idx = int(np.argmax([padded_length(batch[-1]) * len(batch) for batch in batches]))
+        batches[0], batches[max_idx] = batches[max_idx], batches[0]
+    return batches
+
+
+class TokenBudgetBatchSampler(Sampler):
+    r"""
+    Batch sampler that groups together features of the dataset of roughly the same length in batches of varying sizes,
+    each holding as many features as fit in `max_tokens` tokens once padded to the longest one (padded length × batch
+    size). Batches of short features then hold more of them than batches of long features, which keeps the memory used
+    by each batch, and the throughput, close to their maximum.
+
+    In distributed training, the batches are split between the `num_replicas` processes, which all get the same number
+    of batches. It is meant to be used as the `batch_sampler` of a [`~torch.utils.data.DataLoader`], with a data
+    collator padding the batches to their longest feature, like [`DataCollatorWithPadding`].
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        dataset: Optional[Dataset] = None,
+        lengths: Optional[List[int]] = None,
+        model_input_name: Optional[str] = None,
+        num_replicas: int = 1,
+        rank: int = 0,
+        seed: int = 0,
+        drop_last: bool = False,
+        pad_to_multiple_of: Optional[int] = None,
+    ):
+        if dataset is None and lengths is None:
+            raise ValueError("One of dataset and lengths must be provided.")
+
+        self.max_tokens = max_tokens
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.drop_last = drop_last
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+        if lengths is None:
+            model_input_name = model_input_name if model_input_name is not None else "input_ids"
+            if (
+                not (isinstance(dataset[0], dict) or isinstance(dataset[0], BatchEncoding))
+                or model_input_name not in dataset[0]
+            ):
+                raise ValueError(
+                    "Can only automatically infer lengths for datasets whose items are dictionaries with an "
+                    f"'{model_input_name}' key."
+                )
+            lengths = [len(feature[model_input_name]) for feature in dataset]
+        elif isinstance(lengths, torch.Tensor):
+            logger.info(
+                "If lengths is a torch.Tensor, TokenBudgetBatchSampler will be slow. Converting lengths to"
+                " List[int]..."
+            )
+            lengths = lengths.tolist()
+
+        self.lengths = lengths
+
+        # The batches have the same sizes at every epoch, only their elements change. A dedicated generator leaves the
+        # global random state untouched.
+        g = torch.Generator()
+        g.manual_seed(self.seed)
+        self.num_batches = len(
+            get_token_budget_batches(self.lengths, self.max_tokens, self.pad_to_multiple_of, generator=g)
+        )
+        if self.drop_last:
+            self.num_samples = self.num_batches // self.num_replicas
+        else:
+            self.num_samples = math.ceil(self.num_batches / self.num_replicas)
+        self.total_size = self.num_samples * self.num_replicas
+
+    def set_epoch(self, epoch: int):
+        """Sets the epoch of the sampler, which seeds the random composition of the batches."""
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self) -> Iterator[List[int]]:
+        # Deterministically shuffle based on epoch and seed
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        batches = get_token_budget_batches(self.lengths, self.max_tokens, self.pad_to_multiple_of, generator=g)
+
+        if not self.drop_last:
+            # add extra batches to make it evenly divisible
+            while len(batches) < self.total_size:
+                batches += batches[: (self.total_size - len(batches))]
+        else:
+            # remove tail of data to make it evenly divisible.
+            batches = batches[: self.total_size]
+
+        # subsample
+        return iter(batches[self.rank : self.total_size : self.num_replicas])
+
+
 class ShardSampler(Sampler):
     """
     Sampler that shards batches between several processes. Dispatches indices batch by batch: on 2 processes with batch
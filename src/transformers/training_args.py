@@ -396,8 +396,14 @@ class TrainingArguments:
             padding applied and be more efficient). Only useful if applying dynamic padding.
         length_column_name (`str`, *optional*, defaults to `"length"`):
             Column name for precomputed lengths. If the column exists, grouping by length will use these values rather
-            than computing them on train startup. Ignored unless `group_by_length` is `True` and the dataset is an
-            instance of `Dataset`.
+            than computing them on train startup. Ignored unless `group_by_length` is `True` or `max_tokens_per_batch`
+            is set, and the dataset is an instance of `Dataset`.
+        max_tokens_per_batch (`int`, *optional*):
+            If set, the training batches of each device hold as many samples as fit in this number of tokens once
+            padded to their longest sample (padded length × batch size), instead of `per_device_train_batch_size`
+            samples. Samples of similar lengths are grouped together, and batches of short samples hold more of them.
+            Only useful if applying dynamic padding, and only available for datasets with a length. See
+            [`~trainer_pt_utils.TokenBudgetBatchSampler`].
         report_to (`str` or `List[str]`, *optional*, defaults to `"all"`):
             The list of integrations to report the results and logs to. Supported platforms are `"azure_ml"`,
             `"comet_ml"`, `"mlflow"`, `"tensorboard"` and `"wandb"`. Use `"all"` to report to all integrations
@@ -839,6 +845,15 @@ class TrainingArguments:
         default="length",
         metadata={"help": "Column name with precomputed lengths to use when grouping by length."},
     )
+    max_tokens_per_batch: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": (
+                "If set, build the training batches of each device with as many samples as fit in this number of"
+                " tokens once padded, instead of `per_device_train_batch_size` samples."
+            )
+        },
+    )
     report_to: Optional[List[str]] = field(
         default=None, metadata={"help": "The list of integrations to report the results and logs to."}
     )
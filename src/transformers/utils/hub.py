@@ -19,12 +19,16 @@ import fnmatch
 import io
 import json
 import os
+import re
 import shutil
 import subprocess
 import sys
 import tarfile
 import tempfile
+import threading
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import partial
 from hashlib import sha256
@@ -113,6 +117,14 @@ HUGGINGFACE_CO_RESOLVE_ENDPOINT = os.environ.get("HF_ENDPOINT", HUGGINGFACE_CO_R
 HUGGINGFACE_CO_PREFIX = HUGGINGFACE_CO_RESOLVE_ENDPOINT + "/{model_id}/resolve/{revision}/{filename}"
 HUGGINGFACE_CO_EXAMPLES_TELEMETRY = HUGGINGFACE_CO_RESOLVE_ENDPOINT + "/api/telemetry/examples"
 
+# Files bigger than this are downloaded in chunks of this size, several at a time.
+DOWNLOAD_CHUNK_SIZE = 64 * 2**20
+
+# Number of seconds during which the list of files of a repo revision on the Hub, with their etags, is kept on disk and
+# used instead of sending a HEAD request per file. Not set by default, so every file is checked.
+_manifest_ttl = os.getenv("TRANSFORMERS_MANIFEST_TTL", None)
+MANIFEST_TTL = float(_manifest_ttl) if _manifest_ttl is not None else None
+
 
 def is_remote_url(url_or_filename):
     parsed = urlparse(url_or_filename)
@@ -245,6 +257,8 @@ def cached_path(
     force_extract=False,
     use_auth_token: Union[bool, str, None] = None,
     local_files_only=False,
+    progress_bar=None,
+    revision: Optional[str] = None,
 ) -> Optional[str]:
     """
     Given something that might be a URL (or might be a local path), determine which. If it's a URL, download the file
@@ -262,6 +276,8 @@ def cached_path(
             file in a folder along the archive.
         force_extract: if True when extract_compressed_file is True and the archive was already extracted,
             re-extract the archive and override the folder where it was extracted.
+        progress_bar: Optional progress bar shared by several downloads, to update instead of creating one per file.
+        revision: Optional revision of the file if it is hosted on huggingface.co, as passed to [`hf_bucket_url`].
 
     Return:
         Local path (string) of file or if networking is off, last version of file cached on disk.
@@ -291,6 +307,8 @@ def cached_path(
             user_agent=user_agent,
             use_auth_token=use_auth_token,
             local_files_only=local_files_only,
+            progress_bar=progress_bar,
+            revision=revision,
         )
     elif os.path.exists(url_or_filename):
         # File, and it exists.
@@ -430,6 +448,7 @@ def http_get(
     resume_size=0,
     headers: Optional[Dict[str, str]] = None,
     file_name: Optional[str] = None,
+    progress_bar=None,
 ):
     """
     Download remote file. Do not gobble up errors.
@@ -441,21 +460,150 @@ def http_get(
     _raise_for_status(r)
     content_length = r.headers.get("Content-Length")
     total = resume_size + int(content_length) if content_length is not None else None
-    # `tqdm` behavior is determined by `utils.logging.is_progress_bar_enabled()`
-    # and can be set using `utils.logging.enable/disable_progress_bar()`
-    progress = tqdm(
-        unit="B",
-        unit_scale=True,
-        unit_divisor=1024,
-        total=total,
-        initial=resume_size,
-        desc=f"Downloading {file_name}" if file_name is not None else "Downloading",
-    )
+    progress = _get_progress_bar(progress_bar, total, resume_size, file_name)
     for chunk in r.iter_content(chunk_size=1024):
         if chunk:  # filter out keep-alive new chunks
-            progress.update(len(chunk))
+            _update_progress_bar(progress, len(chunk))
             temp_file.write(chunk)
-    progress.close()
+    if progress_bar is None:
+        progress.close()
+
+
+class _RangeRequestsNotSupportedError(Exception):
+    pass
+
+
+def http_get_chunked(
+    url: str,
+    file_path: str,
+    size: int,
+    proxies=None,
+    headers: Optional[Dict[str, str]] = None,
+    file_name: Optional[str] = None,
+    max_connections: int = 8,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress_bar=None,
+) -> bool:
+    """
+    Download a remote file of known `size` in chunks of `chunk_size` bytes, fetched by up to `max_connections` HTTP
+    range requests at a time and written in place in `file_path`. The number of bytes received for each chunk is kept
+    in `file_path + ".json"`, so that an interrupted download resumes where each chunk stopped. Do not gobble up
+    errors.
+
+    Return:
+        Whether the download went through. If the server does not accept range requests, nothing is downloaded and
+        `False` is returned, so that the file can be fetched with [`http_get`] instead.
+    """
+    state_path = file_path + ".json"
+    num_chunks = (size + chunk_size - 1) // chunk_size
+    received = [0] * num_chunks
+    if os.path.exists(file_path) and os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state["size"] == size and state["chunk_size"] == chunk_size:
+            received = state["received"]
+    with open(file_path, "ab") as f:
+        f.truncate(size)
+
+    progress = _get_progress_bar(progress_bar, size, sum(received), file_name)
+    lock = threading.Lock()
+    last_save = time.time()
+
+    def save_state():
+        # Only called after the bytes it accounts for are written, so the state never runs ahead of the file.
+        with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"size": size, "chunk_size": chunk_size, "received": received}, f)
+        os.replace(state_path + ".tmp", state_path)
+
+    def download_chunk(chunk_idx):
+        nonlocal last_save
+        start = chunk_idx * chunk_size + received[chunk_idx]
+        end = min((chunk_idx + 1) * chunk_size, size)
+        if start >= end:
+            return
+        chunk_headers = copy.deepcopy(headers) if headers is not None else {}
+        chunk_headers["Range"] = f"bytes={start}-{end - 1}"
+        r = requests.get(url, stream=True, proxies=proxies, headers=chunk_headers)
+        _raise_for_status(r)
+        if r.status_code != 206:
+            r.close()
+            raise _RangeRequestsNotSupportedError()
+        with open(file_path, "r+b") as f:
+            f.seek(start)
+            for block in r.iter_content(chunk_size=2**20):
+                block = block[: end - start]
+                if not block:
+                    continue
+                f.write(block)
+                f.flush()
+                start += len(block)
+                with lock:
+                    received[chunk_idx] += len(block)
+                    _update_progress_bar(progress, len(block))
+                    if time.time() - last_save > 1:
+                        save_state()
+                        last_save = time.time()
+        with lock:
+            save_state()
+        if start < end:
+            raise EnvironmentError(f"Connection closed before the end of the range requested from {url}.")
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_connections, num_chunks)) as executor:
+            # Consuming the results re-raises the first error once all chunks are done or failed.
+            list(executor.map(download_chunk, range(num_chunks)))
+    except _RangeRequestsNotSupportedError:
+        if progress_bar is not None:
+            # The file is fetched again by `http_get`, which adds it to the shared progress bar.
+            with _progress_bar_lock:
+                if progress_bar.total is not None:
+                    progress_bar.total -= size
+                progress_bar.update(-sum(received))
+        return False
+    finally:
+        if progress_bar is None:
+            progress.close()
+
+    os.remove(state_path)
+    return True
+
+
+_progress_bar_lock = threading.Lock()
+
+
+def _get_progress_bar(progress_bar, total, initial, file_name):
+    """
+    Returns the progress bar of a download: `progress_bar` after adding the download to it if it is shared by several
+    downloads, or a new one.
+    """
+    if progress_bar is None:
+        # `tqdm` behavior is determined by `utils.logging.is_progress_bar_enabled()`
+        # and can be set using `utils.logging.enable/disable_progress_bar()`
+        return tqdm(
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            total=total,
+            initial=initial,
+            desc=f"Downloading {file_name}" if file_name is not None else "Downloading",
+        )
+    with _progress_bar_lock:
+        if total is not None and progress_bar.total is not None:
+            progress_bar.total += total
+        progress_bar.update(initial)
+    return progress_bar
+
+
+def _update_progress_bar(progress, n):
+    # A progress bar can be shared by the downloads of several threads.
+    with _progress_bar_lock:
+        progress.update(n)
+
+
+def _remove_chunked_download(file_path):
+    for path in [file_path, file_path + ".json"]:
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def get_from_cache(
@@ -468,11 +616,18 @@ def get_from_cache(
     user_agent: Union[Dict, str, None] = None,
     use_auth_token: Union[bool, str, None] = None,
     local_files_only=False,
+    max_connections=8,
+    progress_bar=None,
+    revision: Optional[str] = None,
 ) -> Optional[str]:
     """
     Given a URL, look for the corresponding file in the local cache. If it's not there, download it. Then return the
     path to the cached file.
 
+    Files bigger than `DOWNLOAD_CHUNK_SIZE` are downloaded with up to `max_connections` concurrent range requests
+    when the server accepts them. `progress_bar` is an optional progress bar shared by several downloads. `revision` is
+    the optional revision of a file hosted on huggingface.co, used to look it up in the manifest of its revision.
+
     Return:
         Local path (string) of file or if networking is off, last version of file cached on disk.
 
@@ -497,7 +652,15 @@ def get_from_cache(
 
     url_to_download = url
     etag = None
-    if not local_files_only:
+    size = None
+    manifest_entry = None
+    if not local_files_only and not force_download and MANIFEST_TTL is not None:
+        manifest_entry = get_manifest_entry(
+            url, cache_dir=cache_dir, headers=headers, proxies=proxies, revision=revision
+        )
+    if manifest_entry is not None:
+        etag, size = manifest_entry
+    elif not local_files_only:
         try:
             r = requests.head(url, headers=headers, allow_redirects=False, proxies=proxies, timeout=etag_timeout)
             _raise_for_status(r)
@@ -515,6 +678,9 @@ def get_from_cache(
             # between the HEAD and the GET (unlikely, but hey).
             if 300 <= r.status_code <= 399:
                 url_to_download = r.headers["Location"]
+            # The size of files stored in git-lfs is in a custom header, since the response is a redirect.
+            size = r.headers.get("X-Linked-Size") or (r.headers.get("Content-Length") if r.status_code < 300 else None)
+            size = int(size) if size is not None else None
         except (
             requests.exceptions.SSLError,
             requests.exceptions.ProxyError,
@@ -578,41 +744,66 @@ def get_from_cache(
             # Even if returning early like here, the lock will be released.
             return cache_path
 
-        if resume_download:
+        # The url_to_download might be messy, so we extract the file name from the original url.
+        file_name = url.split("/")[-1]
+        temp_file_name = None
+        if max_connections > 1 and size is not None and size > DOWNLOAD_CHUNK_SIZE:
             incomplete_path = cache_path + ".incomplete"
+            if not resume_download:
+                _remove_chunked_download(incomplete_path)
+            logger.info(f"{url} not found in cache or force_download set to True, downloading to {incomplete_path}")
+            if http_get_chunked(
+                url_to_download,
+                incomplete_path,
+                size,
+                proxies=proxies,
+                headers=headers,
+                file_name=file_name,
+                max_connections=max_connections,
+                chunk_size=DOWNLOAD_CHUNK_SIZE,
+                progress_bar=progress_bar,
+            ):
+                temp_file_name = incomplete_path
+            else:
+                # The server does not accept range requests, so we fall back to a single stream.
+                _remove_chunked_download(incomplete_path)
+
+        if temp_file_name is None:
+            if resume_download:
+                incomplete_path = cache_path + ".incomplete"
 
-            @contextmanager
-            def _resumable_file_manager() -> "io.BufferedWriter":
-                with open(incomplete_path, "ab") as f:
-                    yield f
+                @contextmanager
+                def _resumable_file_manager() -> "io.BufferedWriter":
+                    with open(incomplete_path, "ab") as f:
+                        yield f
 
-            temp_file_manager = _resumable_file_manager
-            if os.path.exists(incomplete_path):
-                resume_size = os.stat(incomplete_path).st_size
+                temp_file_manager = _resumable_file_manager
+                if os.path.exists(incomplete_path):
+                    resume_size = os.stat(incomplete_path).st_size
+                else:
+                    resume_size = 0
             else:
+                temp_file_manager = partial(tempfile.NamedTemporaryFile, mode="wb", dir=cache_dir, delete=False)
                 resume_size = 0
-        else:
-            temp_file_manager = partial(tempfile.NamedTemporaryFile, mode="wb", dir=cache_dir, delete=False)
-            resume_size = 0
 
-        # Download to temporary file, then copy to cache dir once finished.
-        # Otherwise you get corrupt cache entries if the download gets interrupted.
-        with temp_file_manager() as temp_file:
-            logger.info(f"{url} not found in cache or force_download set to True, downloading to {temp_file.name}")
-
-            # The url_to_download might be messy, so we extract the file name from the original url.
-            file_name = url.split("/")[-1]
-            http_get(
-                url_to_download,
-                temp_file,
-                proxies=proxies,
-                resume_size=resume_size,
-                headers=headers,
-                file_name=file_name,
-            )
+            # Download to temporary file, then copy to cache dir once finished.
+            # Otherwise you get corrupt cache entries if the download gets interrupted.
+            with temp_file_manager() as temp_file:
+                logger.info(f"{url} not found in cache or force_download set to True, downloading to {temp_file.name}")
+
+                http_get(
+                    url_to_download,
+                    temp_file,
+                    proxies=proxies,
+                    resume_size=resume_size,
+                    headers=headers,
+                    file_name=file_name,
+                    progress_bar=progress_bar,
+                )
+            temp_file_name = temp_file.name
 
         logger.info(f"storing {url} in cache at {cache_path}")
-        os.replace(temp_file.name, cache_path)
+        os.replace(temp_file_name, cache_path)
 
         # NamedTemporaryFile creates a file with hardwired 0600 perms (ignoring umask), so fixing it.
         umask = os.umask(0o666)
@@ -628,6 +819,124 @@ def get_from_cache(
     return cache_path
 
 
+_COMMIT_HASH_REGEX = re.compile(r"^[0-9a-f]{40}$")
+
+
+def get_manifest_entry(
+    url: str,
+    cache_dir=None,
+    headers: Optional[Dict[str, str]] = None,
+    proxies=None,
+    ttl: Optional[float] = None,
+    revision: Optional[str] = None,
+) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    Looks up the etag and size of a file hosted on huggingface.co in the manifest of its repo revision: the list of all
+    the files of the revision, fetched with a single request and kept in `cache_dir` for `ttl` seconds (forever if the
+    revision is a commit hash) so that other calls, in this process or others, don't need any request.
+
+    Args:
+        url (`str`): The url of the file, as returned by [`hf_bucket_url`] without mirror.
+        cache_dir (`str` or `os.PathLike`, *optional*): The cache directory in which manifests are kept.
+        headers (`Dict[str, str]`, *optional*): The headers to use to fetch the manifest.
+        proxies (`Dict[str, str]`, *optional*): The proxies to use to fetch the manifest.
+        ttl (`float`, *optional*):
+            The number of seconds during which a manifest is used. Defaults to the `TRANSFORMERS_MANIFEST_TTL`
+            environment variable.
+        revision (`str`, *optional*):
+            The revision of the file. Without it, the url is only looked up when it tells the revision apart from the
+            file name, which is not the case when either holds a `/`.
+
+    Return:
+        `Tuple[str, Optional[int]]`: The etag and size of the file, or `None` if the url is not the url of a file on
+        huggingface.co, its revision contains a `/` (like `refs/pr/1`) or the manifest of its revision could not be
+        fetched.
+
+    Raises:
+        [`EntryNotFoundError`]: If the file is not in the manifest of its revision.
+    """
+    if cache_dir is None:
+        cache_dir = TRANSFORMERS_CACHE
+    if ttl is None:
+        ttl = MANIFEST_TTL
+    prefix = HUGGINGFACE_CO_RESOLVE_ENDPOINT + "/"
+    if ttl is None or not url.startswith(prefix) or "/resolve/" not in url:
+        return None
+    model_id, path = url[len(prefix) :].split("/resolve/", 1)
+    # Branches like `v1/beta` and `refs/pr/1` can't be told apart from a subfolder in the url, and the manifests are
+    # only fetched for revisions without `/`.
+    if revision is None:
+        if path.count("/") != 1:
+            return None
+        revision = path.split("/", 1)[0]
+    if "/" in revision or not path.startswith(revision + "/"):
+        return None
+    filename = path[len(revision) + 1 :]
+
+    manifest_path = os.path.join(
+        cache_dir, "manifests", sha256(f"{prefix}{model_id}@{revision}".encode("utf-8")).hexdigest() + ".json"
+    )
+    if _COMMIT_HASH_REGEX.match(revision) is not None:
+        # Commits can't change, so their manifests never expire.
+        ttl = float("inf")
+    files = _load_manifest(manifest_path, ttl)
+    if files is None:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        # Only one process fetches the manifest, the others wait for it and read it from the disk.
+        with FileLock(manifest_path + ".lock"):
+            files = _load_manifest(manifest_path, ttl)
+            if files is None:
+                files = _fetch_manifest(model_id, revision, headers=headers, proxies=proxies)
+                if files is None:
+                    return None
+                with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"url": f"{prefix}{model_id}@{revision}", "time": time.time(), "files": files}, f)
+                os.replace(manifest_path + ".tmp", manifest_path)
+
+    if filename not in files:
+        raise EntryNotFoundError(f"404 Client Error: Entry Not Found for url: {url}")
+    return files[filename]["etag"], files[filename]["size"]
+
+
+def _load_manifest(manifest_path, ttl):
+    if not os.path.isfile(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if time.time() - manifest["time"] > ttl:
+            return None
+        return manifest["files"]
+    except (KeyError, ValueError):
+        # A corrupted manifest is fetched again.
+        return None
+
+
+def _fetch_manifest(model_id, revision, headers=None, proxies=None):
+    """
+    Fetches the etag and size of all the files of a repo revision. The etags are the git blob ids, or the sha256 for
+    files stored in git-lfs, as in the headers of the files.
+    """
+    url = f"{HUGGINGFACE_CO_RESOLVE_ENDPOINT}/api/models/{model_id}/revision/{revision}"
+    try:
+        r = requests.get(url, params={"blobs": True}, headers=headers, proxies=proxies, timeout=10)
+        r.raise_for_status()
+        siblings = r.json()["siblings"]
+    except (requests.exceptions.RequestException, KeyError, ValueError):
+        # We fall back to one request per file, which will raise the appropriate errors.
+        return None
+
+    files = {}
+    for sibling in siblings:
+        lfs = sibling.get("lfs")
+        etag = lfs["sha256"] if lfs is not None else sibling.get("blobId")
+        if etag is None:
+            return None
+        size = lfs["size"] if lfs is not None else sibling.get("size")
+        files[sibling["rfilename"]] = {"etag": f'"{etag}"', "size": size}
+    return files
+
+
 def get_file_from_repo(
     path_or_repo: Union[str, os.PathLike],
     filename: str,
@@ -710,6 +1019,7 @@ def get_file_from_repo(
             resume_download=resume_download,
             local_files_only=local_files_only,
             use_auth_token=use_auth_token,
+            revision=revision if revision is not None else "main",
         )
 
     except RepositoryNotFoundError:
@@ -1129,12 +1439,13 @@ def get_checkpoint_shard_files(
     revision=None,
     mirror=None,
     subfolder="",
+    max_workers=8,
 ):
     """
     For a given model:
 
     - download and cache all the shards of a sharded checkpoint if `pretrained_model_name_or_path` is a model ID on the
-      Hub
+      Hub, `max_workers` at a time
     - returns the list of paths to all the shards, as well as some metadata.
 
     For the description of each arg, see [`PreTrainedModel.from_pretrained`]. `index_filename` is the full path to the
@@ -1158,8 +1469,7 @@ def get_checkpoint_shard_files(
         return shard_filenames, sharded_metadata
 
     # At this stage pretrained_model_name_or_path is a model identifier on the Hub
-    cached_filenames = []
-    for shard_filename in shard_filenames:
+    def download_shard(shard_filename):
         shard_url = hf_bucket_url(
             pretrained_model_name_or_path,
             filename=shard_filename,
@@ -1170,7 +1480,7 @@ def get_checkpoint_shard_files(
 
         try:
             # Load from URL
-            cached_filename = cached_path(
+            return cached_path(
                 shard_url,
                 cache_dir=cache_dir,
                 force_download=force_download,
@@ -1179,6 +1489,8 @@ def get_checkpoint_shard_files(
                 local_files_only=local_files_only,
                 use_auth_token=use_auth_token,
                 user_agent=user_agent,
+                progress_bar=progress_bar,
+                revision=revision if revision is not None else "main",
             )
         # We have already dealt with RepositoryNotFoundError and RevisionNotFoundError when getting the index, so
         # we don't have to catch them here.
@@ -1193,6 +1505,17 @@ def get_checkpoint_shard_files(
                 " again after checking your internet connection."
             )
 
-        cached_filenames.append(cached_filename)
+    # One progress bar for all the shards, since they are downloaded at the same time.
+    progress_bar = None
+    if logging.is_progress_bar_enabled():
+        progress_bar = tqdm(
+            unit="B", unit_scale=True, unit_divisor=1024, total=0, desc=f"Downloading {len(shard_filenames)} shards"
+        )
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(shard_filenames)))) as executor:
+            cached_filenames = list(executor.map(download_shard, shard_filenames))
+    finally:
+        if progress_bar is not None:
+            progress_bar.close()
 
     return cached_filenames, sharded_metadata
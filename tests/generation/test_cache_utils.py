@@ -0,0 +1,203 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch, torch_device
+
+from ..test_modeling_common import ids_tensor
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        BertConfig,
+        BertLMHeadModel,
+        BloomConfig,
+        BloomForCausalLM,
+        CodeGenConfig,
+        CodeGenForCausalLM,
+        GPT2Config,
+        GPT2LMHeadModel,
+        GPTJConfig,
+        GPTJForCausalLM,
+        GPTNeoXConfig,
+        GPTNeoXForCausalLM,
+        OPTConfig,
+        OPTForCausalLM,
+        PromptCache,
+        StaticCache,
+    )
+
+
+def get_tiny_models():
+    return [
+        GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=2, n_head=4)),
+        GPTJForCausalLM(GPTJConfig(vocab_size=99, n_embd=32, n_layer=2, n_head=4, rotary_dim=4)),
+        CodeGenForCausalLM(CodeGenConfig(vocab_size=99, n_embd=32, n_layer=2, n_head=4, rotary_dim=4)),
+        GPTNeoXForCausalLM(
+            GPTNeoXConfig(
+                vocab_size=99, hidden_size=32, num_hidden_layers=2, num_attention_heads=4, intermediate_size=37
+            )
+        ),
+        OPTForCausalLM(
+            OPTConfig(
+                vocab_size=99,
+                hidden_size=32,
+                num_hidden_layers=2,
+                num_attention_heads=4,
+                ffn_dim=37,
+                word_embed_proj_dim=32,
+            )
+        ),
+        BloomForCausalLM(BloomConfig(vocab_size=99, hidden_size=32, n_layer=2, n_head=4, use_cache=True)),
+    ]
+
+
+@require_torch
+class StaticCacheTest(unittest.TestCase):
+    def test_update_writes_in_place(self):
+        cache = StaticCache(num_layers=2, batch_size=2, max_length=6, num_heads=3, head_dim=4, device=torch_device)
+        self.assertFalse(cache)
+        key_cache_ptr = cache.key_cache[0].data_ptr()
+
+        key, value = torch.rand(2, 3, 4, 4, device=torch_device), torch.rand(2, 3, 4, 4, device=torch_device)
+        full_key, full_value = cache[0].update(key, value)
+        self.assertTrue(torch.equal(full_key, key))
+        self.assertTrue(torch.equal(full_value, value))
+        self.assertEqual(cache.get_seq_length(), 4)
+        self.assertEqual(cache.get_seq_length(1), 0)
+
+        new_key, new_value = torch.rand(2, 3, 1, 4, device=torch_device), torch.rand(2, 3, 1, 4, device=torch_device)
+        full_key, full_value = cache[0].update(new_key, new_value)
+        self.assertTrue(torch.equal(full_key, torch.cat([key, new_key], dim=-2)))
+        self.assertTrue(torch.equal(full_value, torch.cat([value, new_value], dim=-2)))
+        self.assertEqual(full_key.data_ptr(), key_cache_ptr)
+
+        with self.assertRaises(ValueError):
+            cache[0].update(torch.rand(2, 3, 2, 4, device=torch_device), torch.rand(2, 3, 2, 4, device=torch_device))
+
+        cache.reset()
+        self.assertEqual(cache.get_seq_length(), 0)
+
+    def test_reorder_cache(self):
+        cache = StaticCache(num_layers=1, batch_size=3, max_length=4, num_heads=1, head_dim=2, device=torch_device)
+        key = torch.arange(3, device=torch_device, dtype=torch.float).view(3, 1, 1, 1).expand(3, 1, 2, 2)
+        cache.update(key, key, 0)
+        cache.reorder_cache(torch.tensor([2, 2, 0], device=torch_device))
+        self.assertListEqual(cache.key_cache[0][:, 0, 0, 0].tolist(), [2.0, 2.0, 0.0])
+
+    def test_from_model_requires_support(self):
+        model = BertLMHeadModel(
+            BertConfig(vocab_size=99, hidden_size=32, num_hidden_layers=2, num_attention_heads=4, is_decoder=True)
+        )
+        with self.assertRaises(ValueError):
+            StaticCache.from_model(model, batch_size=1, max_length=10)
+
+    def test_generate_matches_dynamic_cache(self):
+        for model in get_tiny_models():
+            model = model.to(torch_device).eval()
+            input_ids = ids_tensor((2, 5), 90)
+            attention_mask = torch.ones_like(input_ids)
+            attention_mask[0, :2] = 0
+
+            with self.subTest(model.config.model_type):
+                expected = model.generate(input_ids, attention_mask=attention_mask, max_length=12, pad_token_id=0)
+
+                cache = StaticCache.from_model(model, batch_size=2, max_length=12)
+                output = model.generate(
+                    input_ids, attention_mask=attention_mask, max_length=12, pad_token_id=0, past_key_values=cache
+                )
+                self.assertListEqual(output.tolist(), expected.tolist())
+                self.assertEqual(cache.get_seq_length(), output.shape[-1] - 1)
+
+                cache = StaticCache.from_model(model, batch_size=6, max_length=12)
+                expected = model.generate(input_ids, max_length=12, num_beams=3, pad_token_id=0)
+                output = model.generate(input_ids, max_length=12, num_beams=3, pad_token_id=0, past=cache)
+                self.assertListEqual(output.tolist(), expected.tolist())
+
+
+@require_torch
+class PromptCacheTest(unittest.TestCase):
+    def _get_past(self, length, value=0.0):
+        states = torch.full((1, 2, length, 4), value, device=torch_device)
+        return ((states, states),)
+
+    def test_get_longest_prefix(self):
+        prompt_cache = PromptCache(max_cache_bytes=2**20, block_size=4)
+        tokens = tuple(range(10))
+        self.assertEqual(prompt_cache.get(tokens), (0, None))
+
+        prompt_cache.put(tokens, self._get_past(10))
+        # the match extends past the last whole block shared with the stored prompt
+        length, past = prompt_cache.get(tokens[:6] + (99, 98))
+        self.assertEqual(length, 6)
+        self.assertEqual(past[0][0].shape, (1, 2, 6, 4))
+        self.assertEqual(prompt_cache.get(tokens + (11,))[0], 10)
+        # prefixes shorter than a block are not matched
+        self.assertEqual(prompt_cache.get(tokens[:3] + (99, 98, 97, 96))[0], 0)
+        self.assertEqual((prompt_cache.hits, prompt_cache.misses), (2, 2))
+
+        # a stored prefix of a new prompt is replaced by it
+        prompt_cache.put(tokens + (10, 11), self._get_past(12))
+        self.assertEqual(len(prompt_cache), 1)
+        self.assertEqual(prompt_cache.get(tokens + (10, 11))[0], 12)
+
+    def test_lru_eviction_bounded_by_bytes(self):
+        entry_bytes = 2 * 1 * 2 * 8 * 4 * 4
+        prompt_cache = PromptCache(max_cache_bytes=2 * entry_bytes, block_size=4)
+        prompts = [tuple(range(start, start + 8)) for start in (0, 100, 200)]
+
+        prompt_cache.put(prompts[0], self._get_past(8))
+        prompt_cache.put(prompts[1], self._get_past(8))
+        self.assertEqual(prompt_cache.cache_bytes, 2 * entry_bytes)
+        # touching the first prompt makes the second one the least recently used
+        prompt_cache.get(prompts[0])
+        prompt_cache.put(prompts[2], self._get_past(8))
+        self.assertEqual(prompt_cache.cache_bytes, 2 * entry_bytes)
+        self.assertEqual(prompt_cache.get(prompts[0])[0], 8)
+        self.assertEqual(prompt_cache.get(prompts[1])[0], 0)
+        self.assertEqual(prompt_cache.get(prompts[2])[0], 8)
+
+        # prompts larger than the cache are not stored
+        prompt_cache.put(tuple(range(300, 324)), self._get_past(24))
+        self.assertEqual(len(prompt_cache), 2)
+
+    def test_generate_matches_without_cache(self):
+        for model in get_tiny_models():
+            if not getattr(model, "supports_prompt_cache", False):
+                continue
+            model = model.to(torch_device).eval()
+            prompt_cache = PromptCache(max_cache_bytes=2**24, block_size=4)
+            # the prompts do not contain the pad token, which would make them look left-padded
+            system_prompt = ids_tensor((1, 9), 90) + 1
+
+            with self.subTest(model.config.model_type):
+                for _ in range(2):
+                    input_ids = torch.cat([system_prompt, ids_tensor((1, 3), 90) + 1], dim=-1)
+                    expected = model.generate(input_ids, max_length=16, pad_token_id=0)
+                    output = model.generate(input_ids, max_length=16, pad_token_id=0, prompt_cache=prompt_cache)
+                    self.assertListEqual(output.tolist(), expected.tolist())
+
+                    expected = model.generate(input_ids, max_length=16, pad_token_id=0, num_beams=2)
+                    output = model.generate(
+                        input_ids, max_length=16, pad_token_id=0, num_beams=2, prompt_cache=prompt_cache
+                    )
+                    self.assertListEqual(output.tolist(), expected.tolist())
+                # the system prompt is reused by the second and later calls
+                self.assertGreaterEqual(prompt_cache.hits, 3)
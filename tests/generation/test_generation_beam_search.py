@@ -26,7 +26,12 @@ if is_torch_available():
     import torch
 
     from transformers.generation_beam_constraints import DisjunctiveConstraint, PhrasalConstraint
-    from transformers.generation_beam_search import BeamHypotheses, BeamSearchScorer, ConstrainedBeamSearchScorer
+    from transformers.generation_beam_search import (
+        BeamHypotheses,
+        BeamSearchScorer,
+        ConstrainedBeamSearchScorer,
+        VectorizedBeamSearchScorer,
+    )
 
 
 class BeamSearchTester:
@@ -245,6 +250,81 @@ class BeamSearchTester:
         self.parent.assertListEqual(list(sequences.shape), [self.num_beams * self.batch_size, max_length])
         self.parent.assertListEqual(list(sequence_scores.shape), [self.num_beams * self.batch_size])
 
+    def check_vectorized_beam_scorer(self, input_ids, next_tokens, next_indices, next_scores):
+        for do_early_stopping in [True, False]:
+            beam_scorer = self.prepare_beam_scorer(do_early_stopping=do_early_stopping)
+            vectorized_beam_scorer = VectorizedBeamSearchScorer(
+                batch_size=self.batch_size,
+                num_beams=self.num_beams,
+                device=torch_device,
+                length_penalty=self.length_penalty,
+                do_early_stopping=do_early_stopping,
+                num_beam_hyps_to_keep=self.num_beam_hyps_to_keep,
+            )
+
+            # some hypotheses finish at every step, with decreasing scores
+            cur_input_ids = input_ids
+            beam_indices = tuple(() for _ in range(self.batch_size * self.num_beams))
+            for step in range(4):
+                tokens = next_tokens.clone()
+                tokens[:, step % self.num_beams] = self.eos_token_id
+                scores = next_scores - step
+                outputs = beam_scorer.process(
+                    cur_input_ids,
+                    scores,
+                    tokens,
+                    next_indices,
+                    pad_token_id=self.pad_token_id,
+                    eos_token_id=self.eos_token_id,
+                    beam_indices=beam_indices,
+                )
+                vectorized_outputs = vectorized_beam_scorer.process(
+                    cur_input_ids,
+                    scores,
+                    tokens,
+                    next_indices,
+                    pad_token_id=self.pad_token_id,
+                    eos_token_id=self.eos_token_id,
+                    beam_indices=beam_indices,
+                )
+                for key in ["next_beam_scores", "next_beam_tokens", "next_beam_indices"]:
+                    self.parent.assertTrue(torch.allclose(outputs[key], vectorized_outputs[key]))
+                self.parent.assertEqual(bool(beam_scorer.is_done), bool(vectorized_beam_scorer.is_done))
+
+                beam_idx = outputs["next_beam_indices"]
+                beam_indices = tuple(beam_indices[i] + (i,) for i in beam_idx.tolist())
+                cur_input_ids = torch.cat([cur_input_ids[beam_idx], outputs["next_beam_tokens"][:, None]], dim=-1)
+
+            finalize_kwargs = {
+                "max_length": self.max_length,
+                "pad_token_id": self.pad_token_id,
+                "eos_token_id": self.eos_token_id,
+                "beam_indices": beam_indices,
+            }
+            sequence_output = beam_scorer.finalize(
+                cur_input_ids,
+                outputs["next_beam_scores"],
+                outputs["next_beam_tokens"],
+                outputs["next_beam_indices"],
+                **finalize_kwargs,
+            )
+            vectorized_sequence_output = vectorized_beam_scorer.finalize(
+                cur_input_ids,
+                outputs["next_beam_scores"],
+                outputs["next_beam_tokens"],
+                outputs["next_beam_indices"],
+                **finalize_kwargs,
+            )
+            self.parent.assertListEqual(
+                sequence_output["sequences"].tolist(), vectorized_sequence_output["sequences"].tolist()
+            )
+            self.parent.assertListEqual(
+                sequence_output["beam_indices"].tolist(), vectorized_sequence_output["beam_indices"].tolist()
+            )
+            self.parent.assertTrue(
+                torch.allclose(sequence_output["sequence_scores"], vectorized_sequence_output["sequence_scores"])
+            )
+
 
 class ConstrainedBeamSearchTester:
     def __init__(
@@ -553,6 +633,10 @@ class BeamSearchTest(unittest.TestCase):
         inputs = self.beam_search_tester.prepare_inputs()
         self.beam_search_tester.check_beam_scores_finalize(*inputs)
 
+    def test_vectorized_beam_scorer(self):
+        inputs = self.beam_search_tester.prepare_inputs()
+        self.beam_search_tester.check_vectorized_beam_scorer(*inputs)
+
 
 @require_torch
 class ConstrainedBeamSearchTest(unittest.TestCase):
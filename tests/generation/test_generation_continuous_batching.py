@@ -0,0 +1,96 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch, torch_device
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import ContinuousBatchingEngine, GPT2Config, GPT2LMHeadModel
+
+
+@require_torch
+class ContinuousBatchingEngineTest(unittest.TestCase):
+    def get_model(self):
+        torch.manual_seed(0)
+        config = GPT2Config(vocab_size=99, n_embd=32, n_layer=2, n_head=4, n_positions=64)
+        return GPT2LMHeadModel(config).to(torch_device).eval()
+
+    def get_prompts(self):
+        torch.manual_seed(1)
+        return [torch.randint(0, 98, (length,)).tolist() for length in [3, 7, 5, 2, 9, 4]]
+
+    def test_greedy_matches_generate(self):
+        model = self.get_model()
+        prompts = self.get_prompts()
+        max_new_tokens = [4, 9, 1, 6, 3, 8]
+
+        engine = ContinuousBatchingEngine(model, max_batch_size=3, pad_token_id=0)
+        requests = [
+            engine.add_request(prompt, max_new_tokens=num_tokens, request_id=i)
+            for i, (prompt, num_tokens) in enumerate(zip(prompts, max_new_tokens))
+        ]
+        finished = engine.run()
+
+        self.assertEqual(sorted(request.request_id for request in finished), list(range(len(prompts))))
+        self.assertFalse(engine.has_unfinished_requests())
+        for request, prompt, num_tokens in zip(requests, prompts, max_new_tokens):
+            self.assertTrue(request.finished)
+            self.assertEqual(len(request.generated_ids), num_tokens)
+            expected = model.generate(
+                torch.tensor([prompt], device=torch_device), max_new_tokens=num_tokens, do_sample=False
+            )
+            self.assertListEqual(request.sequence, expected[0].tolist())
+
+    def test_slots_are_refilled(self):
+        model = self.get_model()
+        engine = ContinuousBatchingEngine(model, max_batch_size=2, pad_token_id=0)
+        short = engine.add_request([1, 2, 3], max_new_tokens=1)
+        long = engine.add_request([4, 5], max_new_tokens=5)
+        waiting = engine.add_request([6, 7, 8, 9], max_new_tokens=2)
+
+        # the first step prefills the two first requests, the short one finishes right away
+        self.assertListEqual(engine.step(), [short])
+        self.assertListEqual(engine.running, [long])
+
+        # its slot is given to the waiting request at the next step
+        engine.step()
+        self.assertListEqual(engine.running, [long, waiting])
+        self.assertEqual(len(waiting.generated_ids), 1)
+        self.assertEqual(len(long.generated_ids), 2)
+
+        engine.run()
+        self.assertTrue(long.finished and waiting.finished)
+
+    def test_eos_retires_request(self):
+        model = self.get_model()
+        prompt = self.get_prompts()[0]
+        first_token = model.generate(torch.tensor([prompt], device=torch_device), max_new_tokens=1)[0, -1].item()
+
+        engine = ContinuousBatchingEngine(model, max_batch_size=2, eos_token_id=first_token, pad_token_id=0)
+        request = engine.add_request(prompt, max_new_tokens=10)
+        self.assertListEqual(engine.step(), [request])
+        self.assertListEqual(request.generated_ids, [first_token])
+
+    def test_encoder_decoder_not_supported(self):
+        model = self.get_model()
+        model.config.is_encoder_decoder = True
+        with self.assertRaises(ValueError):
+            ContinuousBatchingEngine(model)
@@ -0,0 +1,161 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from transformers import is_torch_available
+from transformers.testing_utils import require_torch, require_torch_gpu, torch_device
+
+from ..test_modeling_common import ids_tensor
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        BloomConfig,
+        BloomForCausalLM,
+        FixedShapeDecodingStep,
+        GPT2Config,
+        GPT2LMHeadModel,
+        OPTConfig,
+        OPTForCausalLM,
+        StaticCache,
+    )
+
+
+def get_tiny_models():
+    return [
+        GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=2, n_head=4)),
+        BloomForCausalLM(BloomConfig(vocab_size=99, hidden_size=32, n_layer=2, n_head=4, use_cache=True)),
+    ]
+
+
+@require_torch
+class FixedShapeDecodingTest(unittest.TestCase):
+    def _get_inputs(self):
+        input_ids = ids_tensor((2, 5), 90)
+        attention_mask = torch.ones_like(input_ids)
+        attention_mask[0, :2] = 0
+        return input_ids, attention_mask
+
+    def test_greedy_matches_generate(self):
+        for model in get_tiny_models():
+            model = model.to(torch_device).eval()
+            input_ids, attention_mask = self._get_inputs()
+
+            with self.subTest(model.config.model_type):
+                expected = model.generate(input_ids, attention_mask=attention_mask, max_length=12, pad_token_id=0)
+                outputs = model.generate(
+                    input_ids,
+                    attention_mask=attention_mask,
+                    max_length=12,
+                    pad_token_id=0,
+                    fixed_shape_decoding="eager",
+                )
+                self.assertListEqual(outputs.tolist(), expected.tolist())
+
+    def test_greedy_scores_match_generate(self):
+        model = get_tiny_models()[0].to(torch_device).eval()
+        input_ids, attention_mask = self._get_inputs()
+        kwargs = {"max_length": 10, "pad_token_id": 0, "output_scores": True, "return_dict_in_generate": True}
+
+        expected = model.generate(input_ids, attention_mask=attention_mask, **kwargs)
+        outputs = model.generate(input_ids, attention_mask=attention_mask, fixed_shape_decoding="eager", **kwargs)
+        for score, expected_score in zip(outputs.scores, expected.scores):
+            self.assertTrue(torch.allclose(score, expected_score, atol=1e-5))
+
+    def test_sample_matches_generate(self):
+        for model in get_tiny_models():
+            model = model.to(torch_device).eval()
+            input_ids, attention_mask = self._get_inputs()
+            kwargs = {"do_sample": True, "max_length": 12, "pad_token_id": 0, "num_return_sequences": 2}
+
+            with self.subTest(model.config.model_type):
+                torch.manual_seed(0)
+                expected = model.generate(input_ids, attention_mask=attention_mask, **kwargs)
+                torch.manual_seed(0)
+                outputs = model.generate(
+                    input_ids, attention_mask=attention_mask, fixed_shape_decoding="eager", **kwargs
+                )
+                self.assertListEqual(outputs.tolist(), expected.tolist())
+
+    def test_decoding_step_is_reusable(self):
+        model = get_tiny_models()[0].to(torch_device).eval()
+        cache = StaticCache.from_model(model, batch_size=2, max_length=12)
+        decoding_step = FixedShapeDecodingStep(model, batch_size=2, max_length=12, cache=cache)
+        key_cache_ptr = cache.key_cache[0].data_ptr()
+
+        for _ in range(2):
+            input_ids, attention_mask = self._get_inputs()
+            expected = model.generate(input_ids, attention_mask=attention_mask, max_length=12, pad_token_id=0)
+            outputs = model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                max_length=12,
+                pad_token_id=0,
+                fixed_shape_decoding=decoding_step,
+            )
+            self.assertListEqual(outputs.tolist(), expected.tolist())
+        self.assertEqual(decoding_step.cache.key_cache[0].data_ptr(), key_cache_ptr)
+
+        # the step was allocated for a batch size of 2
+        with self.assertRaises(ValueError):
+            model.generate(ids_tensor((3, 5), 90), max_length=12, pad_token_id=0, fixed_shape_decoding=decoding_step)
+
+    def test_unsupported_settings_raise(self):
+        model = OPTForCausalLM(
+            OPTConfig(
+                vocab_size=99,
+                hidden_size=32,
+                num_hidden_layers=2,
+                num_attention_heads=4,
+                ffn_dim=37,
+                word_embed_proj_dim=32,
+            )
+        ).to(torch_device)
+        with self.assertRaises(ValueError):
+            FixedShapeDecodingStep(model, batch_size=1, max_length=10)
+
+        model = get_tiny_models()[0].to(torch_device)
+        input_ids = ids_tensor((1, 5), 90)
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, max_length=10, num_beams=2, fixed_shape_decoding="eager")
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, max_length=10, fixed_shape_decoding="compiled")
+
+    @require_torch_gpu
+    def test_cuda_graph_matches_eager(self):
+        for model in get_tiny_models():
+            model = model.to(torch_device).eval()
+            input_ids, attention_mask = self._get_inputs()
+
+            with self.subTest(model.config.model_type):
+                expected = model.generate(
+                    input_ids,
+                    attention_mask=attention_mask,
+                    max_length=12,
+                    pad_token_id=0,
+                    fixed_shape_decoding="eager",
+                )
+                outputs = model.generate(
+                    input_ids,
+                    attention_mask=attention_mask,
+                    max_length=12,
+                    pad_token_id=0,
+                    fixed_shape_decoding="cuda_graph",
+                )
+                self.assertListEqual(outputs.tolist(), expected.tolist())
@@ -260,6 +260,20 @@ class LogitsProcessorTest(unittest.TestCase):
             torch.isinf(filtered_scores_3_gram).tolist(), [[False, False, False], [True, False, False]]
         )
 
+    def test_no_repeat_ngram_dist_processor_repeated_completion(self):
+        vocab_size = 6
+        # token 2 completes both the 3-gram (0, 1, 2), which is banned, and the 3-gram (5, 4, 2), which is not
+        input_ids = torch.tensor([[0, 1, 2, 5, 4, 2, 0, 1], [0, 1, 2, 5, 4, 2, 0, 3]], device=torch_device)
+        scores = self._get_uniform_logits(2, vocab_size)
+
+        filtered_scores = NoRepeatNGramLogitsProcessor(3)(input_ids, scores.clone())
+
+        self.assertListEqual(
+            torch.isinf(filtered_scores).tolist(),
+            [[False, False, True, False, False, False], [False, False, False, False, False, False]],
+        )
+        self.assertTrue(torch.equal(filtered_scores[~torch.isinf(filtered_scores)], scores.view(-1)[:11]))
+
     def test_encoder_no_repeat_ngram_dist_processor(self):
         vocab_size = 3
         num_beams = 2
@@ -347,6 +361,38 @@ class LogitsProcessorTest(unittest.TestCase):
         filtered_scores = no_bad_words_dist_proc(input_ids, scores.clone())
         self.assertTrue(torch.allclose(scores, filtered_scores, atol=1e-3))
 
+        # sequences longer than the inputs and tokens out of the vocabulary are ignored
+        no_bad_words_dist_proc = NoBadWordsLogitsProcessor(
+            bad_words_ids=[[3, 0, 1, 0, 1, 2], [7], [1, 9]], eos_token_id=eos_token_id
+        )
+        filtered_scores = no_bad_words_dist_proc(input_ids, scores.clone())
+        self.assertTrue(torch.allclose(scores, filtered_scores, atol=1e-3))
+
+    def test_no_bad_words_dist_processor_across_steps(self):
+        vocab_size = 5
+        eos_token_id = 4
+
+        # overlapping sequences: after [0, 1, 2], both [1, 2, 3] and [2, 0] can be completed
+        bad_word_tokens = [[0, 1, 2, 3], [1, 2, 3], [2, 0], [3]]
+        no_bad_words_dist_proc = NoBadWordsLogitsProcessor(bad_words_ids=bad_word_tokens, eos_token_id=eos_token_id)
+
+        input_ids = torch.tensor([[0, 1], [1, 1]], device=torch_device, dtype=torch.long)
+        filtered_scores = no_bad_words_dist_proc(input_ids, self._get_uniform_logits(2, vocab_size))
+        self.assertListEqual(
+            torch.isinf(filtered_scores).tolist(),
+            [[False, False, False, True, False], [False, False, False, True, False]],
+        )
+
+        # the rows are reordered between steps, as in beam search
+        input_ids = torch.tensor([[1, 1, 2], [0, 1, 2], [0, 1, 2]], device=torch_device, dtype=torch.long)
+        filtered_scores = no_bad_words_dist_proc(input_ids, self._get_uniform_logits(3, vocab_size))
+        self.assertListEqual(
+            torch.isinf(filtered_scores).tolist(),
+            [[True, False, False, True, False], [True, False, False, True, False], [True, False, False, True, False]],
+        )
+        self.assertListEqual(no_bad_words_dist_proc.get_banned_tokens([0, 1, 2]), [0, 3])
+        self.assertListEqual(no_bad_words_dist_proc.get_banned_tokens([2, 1]), [3])
+
     def test_processor_list(self):
         batch_size = 4
         sequence_length = 10
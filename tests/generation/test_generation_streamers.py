@@ -0,0 +1,162 @@
+# coding=utf-8
+# Copyright 2022 The HuggingFace Team Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a clone of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from queue import Empty
+from threading import Thread
+
+from transformers import GPT2Tokenizer, TextIteratorStreamer, TextStreamer, is_torch_available
+from transformers.generation_streamers import BaseStreamer
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+from transformers.testing_utils import CaptureStdout, require_torch, torch_device
+
+from ..test_modeling_common import ids_tensor
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import GPT2Config, GPT2LMHeadModel, TextGenerationPipeline
+
+
+class RecordingStreamer(BaseStreamer):
+    def __init__(self):
+        self.values = []
+        self.ended = False
+
+    def put(self, value):
+        self.values.append(value.tolist())
+
+    def end(self):
+        self.ended = True
+
+
+@require_torch
+class StreamerTester(unittest.TestCase):
+    def setUp(self):
+        # one token per byte, so that multi-byte characters are split over several tokens
+        self.tmpdirname = tempfile.mkdtemp()
+        vocab = {char: i for i, char in enumerate(bytes_to_unicode().values())}
+        vocab["<|endoftext|>"] = len(vocab)
+        vocab_file = os.path.join(self.tmpdirname, "vocab.json")
+        merges_file = os.path.join(self.tmpdirname, "merges.txt")
+        with open(vocab_file, "w", encoding="utf-8") as fp:
+            json.dump(vocab, fp)
+        with open(merges_file, "w", encoding="utf-8") as fp:
+            fp.write("#version: 0.2\n")
+        self.tokenizer = GPT2Tokenizer(vocab_file, merges_file)
+
+        torch.manual_seed(0)
+        config = GPT2Config(vocab_size=len(vocab), n_embd=32, n_layer=2, n_head=4, eos_token_id=len(vocab) - 1)
+        self.model = GPT2LMHeadModel(config).to(torch_device).eval()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_text_streamer_matches_non_streaming(self):
+        input_ids = ids_tensor((1, 5), 256)
+        greedy_ids = self.model.generate(input_ids, max_new_tokens=10, do_sample=False)
+        greedy_text = self.tokenizer.decode(greedy_ids[0])
+
+        with CaptureStdout() as cs:
+            streamer = TextStreamer(self.tokenizer)
+            self.model.generate(input_ids, max_new_tokens=10, do_sample=False, streamer=streamer)
+        # The greedy text should be printed to stdout, except for the final "\n" in the streamer
+        self.assertEqual(cs.out[:-1], greedy_text)
+
+    def test_iterator_streamer_matches_non_streaming(self):
+        input_ids = ids_tensor((1, 5), 256)
+        for generate_kwargs in [{"do_sample": False}, {"do_sample": True}, {"num_beams": 3}]:
+            with self.subTest(**generate_kwargs):
+                torch.manual_seed(0)
+                output_ids = self.model.generate(input_ids, max_new_tokens=10, **generate_kwargs)
+                expected_text = self.tokenizer.decode(output_ids[0, input_ids.shape[-1] :])
+
+                torch.manual_seed(0)
+                streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True)
+                generation_kwargs = {"input_ids": input_ids, "max_new_tokens": 10, "streamer": streamer}
+                thread = Thread(target=self.model.generate, kwargs={**generation_kwargs, **generate_kwargs})
+                thread.start()
+                streamer_text = ""
+                for new_text in streamer:
+                    streamer_text += new_text
+                thread.join()
+
+                self.assertEqual(streamer_text, expected_text)
+
+    def test_streamer_receives_each_new_token(self):
+        input_ids = ids_tensor((1, 5), 256)
+        streamer = RecordingStreamer()
+        output_ids = self.model.generate(input_ids, max_new_tokens=4, do_sample=False, streamer=streamer)
+
+        self.assertTrue(streamer.ended)
+        self.assertListEqual(streamer.values[0], input_ids.tolist())
+        self.assertListEqual(streamer.values[1:], [[token] for token in output_ids[0, 5:].tolist()])
+
+    def test_beam_search_streams_committed_tokens(self):
+        input_ids = ids_tensor((1, 5), 256)
+        streamer = RecordingStreamer()
+        output_ids = self.model.generate(input_ids, max_new_tokens=10, num_beams=3, streamer=streamer)
+
+        self.assertTrue(streamer.ended)
+        self.assertListEqual(sum(streamer.values[1:], []), output_ids[0, 5:].tolist())
+
+    def test_streamer_requires_single_sequence(self):
+        input_ids = ids_tensor((2, 5), 256)
+        streamer = RecordingStreamer()
+        with self.assertRaises(ValueError):
+            self.model.generate(input_ids, max_new_tokens=4, streamer=streamer)
+        # the prompt is not streamed for a call rejected by the argument validation
+        self.assertListEqual(streamer.values, [])
+
+        with self.assertRaises(ValueError):
+            self.model.generate(input_ids[:1], max_new_tokens=4, max_length=10, streamer=streamer)
+        self.assertListEqual(streamer.values, [])
+
+    def test_multi_byte_characters_are_held_back(self):
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True)
+        streamer.put(torch.tensor([[0]]))
+        for token in self.tokenizer("café au lait").input_ids:
+            streamer.put(torch.tensor([[token]]))
+        streamer.end()
+
+        texts = list(streamer)
+        self.assertEqual("".join(texts), "café au lait")
+        self.assertIn("é", texts)
+
+    def test_iterator_streamer_timeout(self):
+        streamer = TextIteratorStreamer(self.tokenizer, timeout=0.001)
+        with self.assertRaises(Empty):
+            next(streamer)
+
+    def test_text_generation_pipeline(self):
+        text_generator = TextGenerationPipeline(model=self.model, tokenizer=self.tokenizer)
+        expected_text = text_generator("hello", max_new_tokens=8, do_sample=False, return_full_text=False)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True)
+        thread = Thread(
+            target=text_generator,
+            args=("hello",),
+            kwargs={"max_new_tokens": 8, "do_sample": False, "streamer": streamer},
+        )
+        thread.start()
+        streamer_text = "".join(streamer)
+        thread.join()
+
+        self.assertEqual(streamer_text, expected_text[0]["generated_text"])
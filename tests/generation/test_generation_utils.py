@@ -29,19 +29,27 @@ if is_torch_available():
     from transformers import (
         AutoModelForSeq2SeqLM,
         AutoTokenizer,
+        BartConfig,
         BartForConditionalGeneration,
         BartTokenizer,
+        BloomConfig,
+        BloomForCausalLM,
+        GPT2Config,
         GPT2LMHeadModel,
         GPT2Tokenizer,
         ImageGPTForCausalImageModeling,
+        OPTConfig,
+        OPTForCausalLM,
         Speech2TextForConditionalGeneration,
         SpeechEncoderDecoderModel,
+        StaticCache,
         VisionEncoderDecoderModel,
         top_k_top_p_filtering,
     )
     from transformers.generation_beam_constraints import DisjunctiveConstraint, PhrasalConstraint
     from transformers.generation_beam_search import BeamSearchScorer, ConstrainedBeamSearchScorer
     from transformers.generation_logits_process import (
+        EncoderNoRepeatNGramLogitsProcessor,
         ForcedBOSTokenLogitsProcessor,
         ForcedEOSTokenLogitsProcessor,
         HammingDiversityLogitsProcessor,
@@ -2699,3 +2707,195 @@ class GenerationIntegrationTests(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             model.generate(input_ids, force_words_ids=[[[-1]]])
+
+    def test_compaction_threshold_greedy_matches_greedy_search(self):
+        torch.manual_seed(0)
+        models = [
+            GPT2LMHeadModel(GPT2Config(vocab_size=8, n_embd=32, n_layer=2, n_head=4, initializer_range=0.2)),
+            BartForConditionalGeneration(
+                BartConfig(
+                    vocab_size=8,
+                    d_model=32,
+                    encoder_layers=1,
+                    decoder_layers=1,
+                    encoder_attention_heads=4,
+                    decoder_attention_heads=4,
+                    encoder_ffn_dim=37,
+                    decoder_ffn_dim=37,
+                    init_std=0.2,
+                )
+            ),
+        ]
+        input_ids = torch.randint(8, (8, 5), device=torch_device)
+
+        for model in models:
+            model = model.to(torch_device).eval()
+            kwargs = {"max_length": 25, "pad_token_id": 0, "eos_token_id": 3, "min_length": 0}
+            with self.subTest(model.config.model_type):
+                expected = model.generate(input_ids, **kwargs)
+                # the sequences finish at different steps
+                finished_early = (expected[:, -1] == 0) & (expected == 3).any(-1)
+                self.assertTrue(finished_early.any())
+                self.assertFalse(finished_early.all())
+
+                for compaction_threshold in [0.1, 0.5, 1.0]:
+                    output = model.generate(input_ids, compaction_threshold=compaction_threshold, **kwargs)
+                    self.assertListEqual(output.tolist(), expected.tolist())
+
+    def test_compaction_threshold_sample(self):
+        torch.manual_seed(0)
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=8, n_embd=32, n_layer=2, n_head=4, initializer_range=0.2))
+        model = model.to(torch_device).eval()
+        input_ids = torch.randint(8, (4, 5), device=torch_device)
+
+        output = model.generate(
+            input_ids,
+            do_sample=True,
+            max_length=25,
+            pad_token_id=0,
+            eos_token_id=3,
+            num_return_sequences=2,
+            compaction_threshold=0.1,
+        )
+        self.assertEqual(output.shape[0], 8)
+        self.assertListEqual(output[:, :5].tolist(), input_ids.repeat_interleave(2, dim=0).tolist())
+        # the sequences are padded after their eos token
+        for sequence in output[:, 5:].tolist():
+            if 3 in sequence:
+                self.assertTrue(all(token == 0 for token in sequence[sequence.index(3) + 1 :]))
+
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, max_length=10, num_beams=2, compaction_threshold=0.5)
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, max_length=10, compaction_threshold=1.5)
+
+    def test_compaction_threshold_batch_dependent_processors(self):
+        torch.manual_seed(0)
+        model = BartForConditionalGeneration(
+            BartConfig(
+                vocab_size=8,
+                d_model=32,
+                encoder_layers=1,
+                decoder_layers=1,
+                encoder_attention_heads=4,
+                decoder_attention_heads=4,
+                encoder_ffn_dim=37,
+                decoder_ffn_dim=37,
+                init_std=0.2,
+            )
+        )
+        model = model.to(torch_device).eval()
+        input_ids = torch.randint(8, (8, 5), device=torch_device)
+        kwargs = {"max_length": 25, "pad_token_id": 0, "eos_token_id": 3, "min_length": 0}
+
+        def prefix_allowed_tokens_fn(batch_id, sent):
+            return [3, 4, 5] if batch_id % 2 else [1, 2, 3]
+
+        # both processors look up the batch index of a row from its position in the batch
+        for processor_kwargs in [
+            {"encoder_no_repeat_ngram_size": 2},
+            {"prefix_allowed_tokens_fn": prefix_allowed_tokens_fn},
+        ]:
+            with self.subTest(list(processor_kwargs)[0]):
+                model.generate(input_ids, **processor_kwargs, **kwargs)
+                with self.assertRaises(ValueError):
+                    model.generate(input_ids, compaction_threshold=0.1, **processor_kwargs, **kwargs)
+
+        logits_processor = LogitsProcessorList([EncoderNoRepeatNGramLogitsProcessor(2, input_ids)])
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, compaction_threshold=0.1, logits_processor=logits_processor, **kwargs)
+
+    def test_assisted_decoding_greedy_matches_greedy_search(self):
+        torch.manual_seed(0)
+        assistant_model = GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=1, n_head=4)).to(torch_device)
+        models = [
+            GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=2, n_head=4)),
+            OPTForCausalLM(
+                OPTConfig(
+                    vocab_size=99,
+                    hidden_size=32,
+                    num_hidden_layers=2,
+                    num_attention_heads=4,
+                    ffn_dim=37,
+                    word_embed_proj_dim=32,
+                )
+            ),
+            BloomForCausalLM(BloomConfig(vocab_size=99, hidden_size=32, n_layer=2, n_head=4)),
+        ]
+        input_ids = torch.tensor([[15, 42, 7, 88, 23, 61]], device=torch_device)
+
+        for model in models:
+            model = model.to(torch_device).eval()
+            # the models are random, their default eos token could be generated at any step
+            model.config.eos_token_id = None
+            with self.subTest(model.config.model_type):
+                expected = model.generate(input_ids, max_length=30, pad_token_id=0, no_repeat_ngram_size=2)
+                output = model.generate(
+                    input_ids,
+                    max_length=30,
+                    pad_token_id=0,
+                    no_repeat_ngram_size=2,
+                    assistant_model=assistant_model,
+                    num_assistant_tokens=3,
+                    return_dict_in_generate=True,
+                    output_scores=True,
+                )
+                self.assertIsInstance(output, GreedySearchDecoderOnlyOutput)
+                self.assertListEqual(output.sequences.tolist(), expected.tolist())
+                self.assertEqual(len(output.scores), expected.shape[-1] - input_ids.shape[-1])
+
+                # stops at the eos token, even when it is drafted in the middle of the candidates
+                eos_token_id = expected[0, 15].item()
+                expected = model.generate(input_ids, max_length=30, pad_token_id=0, eos_token_id=eos_token_id)
+                output = model.generate(
+                    input_ids,
+                    max_length=30,
+                    pad_token_id=0,
+                    eos_token_id=eos_token_id,
+                    assistant_model=assistant_model,
+                )
+                self.assertListEqual(output.tolist(), expected.tolist())
+
+        # the model itself can use a preallocated cache
+        model = models[0]
+        expected = model.generate(input_ids, max_length=30, pad_token_id=0)
+        past = StaticCache.from_model(model, batch_size=1, max_length=30)
+        output = model.generate(input_ids, max_length=30, pad_token_id=0, assistant_model=assistant_model, past=past)
+        self.assertListEqual(output.tolist(), expected.tolist())
+
+    def test_assisted_decoding_sample_distribution(self):
+        torch.manual_seed(0)
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=6, n_embd=32, n_layer=2, n_head=4, initializer_range=0.2))
+        assistant_model = GPT2LMHeadModel(
+            GPT2Config(vocab_size=6, n_embd=32, n_layer=1, n_head=4, initializer_range=0.2)
+        )
+        model, assistant_model = model.to(torch_device).eval(), assistant_model.to(torch_device).eval()
+        input_ids = torch.tensor([[1, 2, 3]], device=torch_device)
+        with torch.no_grad():
+            expected_probs = model(input_ids).logits[0, -1].softmax(-1)
+
+        # the drafted token is rejected often, the first token must still follow the distribution of the model
+        num_samples = 1000
+        counts = torch.zeros(6, device=torch_device)
+        for _ in range(num_samples):
+            output = model.generate(
+                input_ids,
+                do_sample=True,
+                top_k=0,
+                max_new_tokens=2,
+                pad_token_id=0,
+                assistant_model=assistant_model,
+                num_assistant_tokens=1,
+            )
+            counts[output[0, 3]] += 1
+        total_variation = (counts / num_samples - expected_probs).abs().sum() / 2
+        self.assertLess(total_variation.item(), 0.05)
+
+    def test_assisted_decoding_checks(self):
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=99, n_embd=32, n_layer=2, n_head=4)).to(torch_device)
+        input_ids = ids_tensor((2, 6), 99)
+
+        with self.assertRaises(ValueError):
+            model.generate(input_ids, max_length=10, assistant_model=model)
+        with self.assertRaises(ValueError):
+            model.generate(input_ids[:1], max_length=10, num_beams=2, assistant_model=model)
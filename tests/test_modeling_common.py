@@ -60,6 +60,8 @@ from transformers.testing_utils import (
     torch_device,
 )
 from transformers.utils import (
+    SAFE_WEIGHTS_INDEX_NAME,
+    SAFE_WEIGHTS_NAME,
     WEIGHTS_INDEX_NAME,
     WEIGHTS_NAME,
     is_accelerate_available,
@@ -104,12 +106,14 @@ if is_torch_available():
         AutoModelForCausalLM,
         AutoTokenizer,
         BertConfig,
+        BertForMaskedLM,
         BertModel,
         PreTrainedModel,
         T5Config,
         T5ForConditionalGeneration,
     )
-    from transformers.modeling_utils import shard_checkpoint
+    from transformers.modeling_utils import load_sharded_checkpoint, load_state_dicts, shard_checkpoint
+    from transformers.pytorch_utils import load_safetensors_file, save_safetensors_file
 
 if is_tf_available():
     import tensorflow as tf
@@ -2118,6 +2122,65 @@ class ModelTesterMixin:
             with torch.no_grad():
                 model(**inputs)[0]
 
+    def test_packed_documents(self):
+        config, inputs_dict = self.model_tester.prepare_config_and_inputs_for_common()
+
+        for model_class in self.all_model_classes:
+            signature = inspect.signature(model_class.forward).parameters
+            if "document_ids" not in signature:
+                continue
+            model = model_class(config)
+            model.to(torch_device)
+            model.eval()
+
+            inputs = self._prepare_for_class(inputs_dict, model_class)
+            # pack the two halves of the sequences as two documents, with positions restarting at 0
+            packed_inputs = {name: value for name, value in inputs.items() if not isinstance(value, torch.Tensor)}
+            first_inputs = dict(packed_inputs)
+            second_inputs = dict(packed_inputs)
+            halves = {}
+            for prefix in ["", "decoder_"]:
+                input_ids = inputs.get(f"{prefix}input_ids")
+                if input_ids is None:
+                    continue
+                half = input_ids.shape[-1] // 2
+                halves[prefix] = (input_ids, half)
+                # the attention masks are left out, as a random mask can hide a whole document
+                sequence_inputs = {
+                    name: value
+                    for name, value in inputs.items()
+                    if name.startswith(prefix)
+                    and "attention_mask" not in name
+                    and isinstance(value, torch.Tensor)
+                    and value.shape == input_ids.shape
+                }
+                if f"{prefix}position_ids" in signature:
+                    position_ids = torch.cat([torch.arange(half), torch.arange(input_ids.shape[-1] - half)])
+                    sequence_inputs[f"{prefix}position_ids"] = position_ids.to(torch_device).expand_as(input_ids)
+                for name, value in sequence_inputs.items():
+                    packed_inputs[name] = value
+                    first_inputs[name] = value[..., :half].contiguous()
+                    second_inputs[name] = value[..., half:].contiguous()
+                if f"{prefix}document_ids" in signature:
+                    document_ids = torch.ones_like(input_ids)
+                    document_ids[..., half:] = 2
+                    packed_inputs[f"{prefix}document_ids"] = document_ids
+
+            with torch.no_grad():
+                packed = model(**packed_inputs, return_dict=True)
+                first = model(**first_inputs, return_dict=True)
+                second = model(**second_inputs, return_dict=True)
+
+            # the outputs of each token are compared, the pooled outputs cannot be
+            input_ids, half = halves["decoder_" if "decoder_" in halves else ""]
+            name = [name for name in packed.keys() if name != "loss"][0]
+            if packed[name].shape[: input_ids.dim()] != input_ids.shape:
+                continue
+            dim = input_ids.dim() - 1
+            length = input_ids.shape[-1]
+            self.assertTrue(torch.allclose(packed[name].narrow(dim, 0, half), first[name], atol=1e-4))
+            self.assertTrue(torch.allclose(packed[name].narrow(dim, half, length - half), second[name], atol=1e-4))
+
     @require_torch_multi_gpu
     def test_multi_gpu_data_parallel_forward(self):
         config, inputs_dict = self.model_tester.prepare_config_and_inputs_for_common()
@@ -2708,29 +2771,29 @@ class ModelUtilsTest(TestCasePlus):
 
         with self.subTest("Test sharding, no weights bigger than max size"):
             shards, index = shard_checkpoint(state_dict, max_shard_size="300kB")
-            # Split is first two layers then last two.
+            # Split is first and third layers (160kB) then second and last (180kB).
             self.assertDictEqual(
                 index,
                 {
                     "metadata": {"total_size": 340000},
                     "weight_map": {
                         "0.weight": "pytorch_model-00001-of-00002.bin",
-                        "1.weight": "pytorch_model-00001-of-00002.bin",
-                        "2.weight": "pytorch_model-00002-of-00002.bin",
+                        "1.weight": "pytorch_model-00002-of-00002.bin",
+                        "2.weight": "pytorch_model-00001-of-00002.bin",
                         "3.weight": "pytorch_model-00002-of-00002.bin",
                     },
                 },
             )
 
-            shard1 = {"0.weight": state_dict["0.weight"], "1.weight": state_dict["1.weight"]}
-            shard2 = {"2.weight": state_dict["2.weight"], "3.weight": state_dict["3.weight"]}
+            shard1 = {"0.weight": state_dict["0.weight"], "2.weight": state_dict["2.weight"]}
+            shard2 = {"1.weight": state_dict["1.weight"], "3.weight": state_dict["3.weight"]}
             self.assertDictEqual(
                 shards, {"pytorch_model-00001-of-00002.bin": shard1, "pytorch_model-00002-of-00002.bin": shard2}
             )
 
         with self.subTest("Test sharding with weights bigger than max size"):
             shards, index = shard_checkpoint(state_dict, max_shard_size="100kB")
-            # Split is first layer, second layer then last 2.
+            # Split is first and last layers, second layer then third layer.
             self.assertDictEqual(
                 index,
                 {
@@ -2739,14 +2802,14 @@ class ModelUtilsTest(TestCasePlus):
                         "0.weight": "pytorch_model-00001-of-00003.bin",
                         "1.weight": "pytorch_model-00002-of-00003.bin",
                         "2.weight": "pytorch_model-00003-of-00003.bin",
-                        "3.weight": "pytorch_model-00003-of-00003.bin",
+                        "3.weight": "pytorch_model-00001-of-00003.bin",
                     },
                 },
             )
 
-            shard1 = {"0.weight": state_dict["0.weight"]}
+            shard1 = {"0.weight": state_dict["0.weight"], "3.weight": state_dict["3.weight"]}
             shard2 = {"1.weight": state_dict["1.weight"]}
-            shard3 = {"2.weight": state_dict["2.weight"], "3.weight": state_dict["3.weight"]}
+            shard3 = {"2.weight": state_dict["2.weight"]}
             self.assertDictEqual(
                 shards,
                 {
@@ -2756,6 +2819,31 @@ class ModelUtilsTest(TestCasePlus):
                 },
             )
 
+    def test_shard_checkpoint_keeps_blocks_together(self):
+        config = BertConfig(
+            vocab_size=99, hidden_size=32, num_hidden_layers=4, num_attention_heads=4, intermediate_size=37
+        )
+        state_dict = BertModel(config).state_dict()
+        # Each layer is 27,156 bytes.
+        shards, index = shard_checkpoint(state_dict, max_shard_size="70kB")
+
+        for shard in shards.values():
+            self.assertLessEqual(sum(w.numel() * w.element_size() for w in shard.values()), 70000)
+        for layer_idx in range(4):
+            layer_shards = {
+                shard_file
+                for key, shard_file in index["weight_map"].items()
+                if key.startswith(f"encoder.layer.{layer_idx}.")
+            }
+            self.assertEqual(len(layer_shards), 1)
+
+        # Blocks bigger than the maximum size are split.
+        shards, index = shard_checkpoint(state_dict, max_shard_size="20kB")
+        layer_shards = {
+            shard_file for key, shard_file in index["weight_map"].items() if key.startswith("encoder.layer.0.")
+        }
+        self.assertGreater(len(layer_shards), 1)
+
     def test_checkpoint_sharding_local(self):
         model = BertModel.from_pretrained("hf-internal-testing/tiny-random-bert")
 
@@ -2808,6 +2896,142 @@ class ModelUtilsTest(TestCasePlus):
         for p1, p2 in zip(model.parameters(), ref_model.parameters()):
             self.assertTrue(torch.allclose(p1, p2))
 
+    def test_safetensors_file(self):
+        state_dict = {
+            "float": torch.randn(3, 5),
+            "half": torch.randn(7).half(),
+            "bfloat": torch.randn(2, 3).bfloat16(),
+            "long": torch.arange(5),
+            "bool": torch.tensor([True, False, True]),
+            "byte": torch.arange(3, dtype=torch.uint8),
+            "scalar": torch.tensor(2.0, dtype=torch.float64),
+            "empty": torch.zeros(0, 4),
+        }
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, SAFE_WEIGHTS_NAME)
+            save_safetensors_file(state_dict, filename, metadata={"format": "pt"})
+            loaded = load_safetensors_file(filename)
+            self.assertListEqual(sorted(loaded.keys()), sorted(state_dict.keys()))
+            for key, tensor in state_dict.items():
+                self.assertEqual(loaded[key].dtype, tensor.dtype)
+                self.assertTrue(torch.equal(loaded[key], tensor))
+
+            # The mapping is copy-on-write, so changing a loaded tensor does not change the file.
+            loaded["float"].zero_()
+            self.assertTrue(torch.equal(load_safetensors_file(filename)["float"], state_dict["float"]))
+
+    def test_checkpoint_safe_serialization(self):
+        config = BertConfig(
+            vocab_size=99, hidden_size=32, num_hidden_layers=2, num_attention_heads=4, intermediate_size=37
+        )
+        model = BertForMaskedLM(config)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model.save_pretrained(tmp_dir, safe_serialization=True)
+            self.assertTrue(os.path.isfile(os.path.join(tmp_dir, SAFE_WEIGHTS_NAME)))
+            self.assertFalse(os.path.isfile(os.path.join(tmp_dir, WEIGHTS_NAME)))
+            # Tied weights the model knows how to rebuild are not saved twice.
+            saved_keys = load_safetensors_file(os.path.join(tmp_dir, SAFE_WEIGHTS_NAME)).keys()
+            self.assertIn("cls.predictions.bias", saved_keys)
+            self.assertNotIn("cls.predictions.decoder.bias", saved_keys)
+
+            new_model = BertForMaskedLM.from_pretrained(tmp_dir)
+            for (n1, p1), (n2, p2) in zip(model.state_dict().items(), new_model.state_dict().items()):
+                self.assertEqual(n1, n2)
+                self.assertTrue(torch.equal(p1, p2))
+            self.assertIs(new_model.cls.predictions.decoder.weight, new_model.bert.embeddings.word_embeddings.weight)
+
+            # A sharded save in the same folder replaces the previous checkpoint.
+            model.save_pretrained(tmp_dir, safe_serialization=True, max_shard_size="20kB")
+            self.assertTrue(os.path.isfile(os.path.join(tmp_dir, SAFE_WEIGHTS_INDEX_NAME)))
+            self.assertFalse(os.path.isfile(os.path.join(tmp_dir, SAFE_WEIGHTS_NAME)))
+            with open(os.path.join(tmp_dir, SAFE_WEIGHTS_INDEX_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+            shards_found = set(f for f in os.listdir(tmp_dir) if f.endswith(".safetensors"))
+            self.assertSetEqual(set(index["weight_map"].values()), shards_found)
+            self.assertGreater(len(shards_found), 1)
+
+            # The index gives where each weight lies in its shard.
+            state_dict = model.state_dict()
+            self.assertSetEqual(set(index["weight_offsets"].keys()), set(index["weight_map"].keys()))
+            for key, (begin, end) in index["weight_offsets"].items():
+                with open(os.path.join(tmp_dir, index["weight_map"][key]), "rb") as f:
+                    f.seek(begin)
+                    data = f.read(end - begin)
+                expected = state_dict[key]
+                self.assertTrue(
+                    torch.equal(torch.frombuffer(bytearray(data), dtype=expected.dtype), expected.view(-1))
+                )
+
+            new_model = BertForMaskedLM.from_pretrained(tmp_dir)
+            for p1, p2 in zip(model.parameters(), new_model.parameters()):
+                self.assertTrue(torch.equal(p1, p2))
+
+            new_model = BertForMaskedLM(config)
+            load_sharded_checkpoint(new_model, tmp_dir, strict=False)
+            for p1, p2 in zip(model.parameters(), new_model.parameters()):
+                self.assertTrue(torch.equal(p1, p2))
+
+            # Saving in the PyTorch format removes the safetensors checkpoint, which would be loaded in priority.
+            model.save_pretrained(tmp_dir)
+            self.assertTrue(os.path.isfile(os.path.join(tmp_dir, WEIGHTS_NAME)))
+            self.assertListEqual([f for f in os.listdir(tmp_dir) if "safetensors" in f], [])
+
+    def test_load_state_dicts(self):
+        state_dicts = [{f"{i}.weight": torch.randn(50, 50)} for i in range(6)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint_files = []
+            for i, state_dict in enumerate(state_dicts):
+                checkpoint_files.append(os.path.join(tmp_dir, f"{i}.bin"))
+                torch.save(state_dict, checkpoint_files[-1])
+            file_size = os.path.getsize(checkpoint_files[0])
+
+            for num_workers, max_memory in [(1, None), (3, None), (3, 2 * file_size), (3, 1)]:
+                with self.subTest(num_workers=num_workers, max_memory=max_memory):
+                    started = []
+                    used = []
+
+                    def load_state_dict(checkpoint_file):
+                        started.append(checkpoint_file)
+                        return torch.load(checkpoint_file)
+
+                    with mock.patch("transformers.modeling_utils.load_state_dict", side_effect=load_state_dict):
+                        for state_dict in load_state_dicts(checkpoint_files, num_workers, max_memory):
+                            used.append(state_dict)
+                            # Files read while this one is used are the ones ahead of it.
+                            held = len(started) - len(used) + 1
+                            self.assertLessEqual(held, num_workers + 1)
+                            if max_memory is not None:
+                                self.assertLessEqual(held, max(max_memory // file_size, 1))
+
+                    self.assertListEqual(started, checkpoint_files)
+                    self.assertEqual(len(used), len(state_dicts))
+                    for state_dict, expected in zip(used, state_dicts):
+                        self.assertListEqual(list(state_dict.keys()), list(expected.keys()))
+                        for key in expected:
+                            self.assertTrue(torch.equal(state_dict[key], expected[key]))
+
+    def test_checkpoint_sharding_parallel_loading(self):
+        config = BertConfig(
+            vocab_size=99, hidden_size=32, num_hidden_layers=2, num_attention_heads=4, intermediate_size=37
+        )
+        model = BertModel(config)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model.save_pretrained(tmp_dir, max_shard_size="20kB")
+            self.assertTrue(os.path.isfile(os.path.join(tmp_dir, WEIGHTS_INDEX_NAME)))
+
+            new_model = BertModel.from_pretrained(tmp_dir, shard_loading_workers=4, shard_loading_max_memory="50kB")
+            for p1, p2 in zip(model.parameters(), new_model.parameters()):
+                self.assertTrue(torch.equal(p1, p2))
+
+            new_model = BertModel(config)
+            load_sharded_checkpoint(new_model, tmp_dir, shard_loading_workers=4)
+            for p1, p2 in zip(model.parameters(), new_model.parameters()):
+                self.assertTrue(torch.equal(p1, p2))
+
     @require_accelerate
     def test_from_pretrained_low_cpu_mem_usage_functional(self):
         # test that we can use `from_pretrained(..., low_cpu_mem_usage=True)` with normal and
@@ -23,6 +23,7 @@ import re
 import shutil
 import sys
 import tempfile
+import threading
 import unittest
 import unittest.mock as mock
 from collections import OrderedDict
@@ -61,7 +62,7 @@ from transformers.testing_utils import (
     require_torch,
     slow,
 )
-from transformers.tokenization_utils import AddedToken, Trie
+from transformers.tokenization_utils import AddedToken, LRUCache, Trie, bpe_merge
 
 
 if is_torch_available():
@@ -4002,9 +4003,95 @@ class TrieTest(unittest.TestCase):
         trie.add("CD")
         self.assertEqual(trie.split("ABCD"), ["ABC", "D"])
 
+    def test_trie_abandoned_partial_match(self):
+        # The partial match of "ABD" stops at "C", it must not hide the "B" found on the way
+        trie = Trie()
+        trie.add("B")
+        trie.add("ABD")
+        self.assertEqual(trie.split("ABCD"), ["A", "B", "CD"])
+        self.assertEqual(trie.split("ABDAB"), ["ABD", "A", "B"])
+
+    def test_trie_add_after_split(self):
+        trie = Trie()
+        trie.add("abcd")
+        self.assertEqual(trie.split("xabcbc"), ["xabcbc"])
+        trie.add("bc")
+        self.assertEqual(trie.split("xabcbc"), ["xa", "bc", "bc"])
+        self.assertEqual(trie.split("xabcd"), ["x", "abcd"])
+        self.assertIn("bc", trie)
+
     def test_cut_text_hardening(self):
         # Even if the offsets are wrong, we necessarily output correct string
         # parts.
         trie = Trie()
         parts = trie.cut_text("ABC", [0, 0, 2, 1, 2, 3])
         self.assertEqual(parts, ["AB", "C"])
+
+
+class BPETest(unittest.TestCase):
+    def test_bpe_merge(self):
+        bpe_ranks = {("l", "o"): 0, ("lo", "w"): 1, ("e", "r"): 2, ("a", "a"): 3}
+        self.assertEqual(bpe_merge(("l", "o", "w", "e", "r"), bpe_ranks), ("low", "er"))
+        self.assertEqual(bpe_merge(("l", "o", "l", "o", "w"), bpe_ranks), ("lo", "low"))
+        self.assertEqual(bpe_merge(("x",), bpe_ranks), ("x",))
+        # all the occurrences of a pair are merged from left to right before the next pair
+        self.assertEqual(bpe_merge(("a", "a", "a"), bpe_ranks), ("aa", "a"))
+        self.assertEqual(bpe_merge(("a", "a", "a", "a", "a"), bpe_ranks), ("aa", "aa", "a"))
+        bpe_ranks[("aa", "a")] = 4
+        self.assertEqual(bpe_merge(("a", "a", "a", "a", "a"), bpe_ranks), ("aa", "aaa"))
+        # a pair created by a merge is merged before the remaining pairs with a higher rank
+        bpe_ranks = {("b", "c"): 0, ("a", "bc"): 1, ("a", "b"): 2}
+        self.assertEqual(bpe_merge(("a", "b", "c", "a", "b"), bpe_ranks), ("abc", "ab"))
+
+    def test_lru_cache(self):
+        cache = LRUCache(max_bytes=None)
+        cache["a"] = "b"
+        entry_size = cache.num_bytes
+
+        cache = LRUCache(max_bytes=3 * entry_size)
+        for key in ["a", "b", "c"]:
+            cache[key] = key
+        self.assertEqual(cache["a"], "a")
+        # the least recently used entry is evicted
+        cache["d"] = "d"
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.num_bytes, 3 * entry_size)
+        self.assertEqual(cache.get("b", "missing"), "missing")
+        self.assertEqual(cache.get("c"), "c")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # entries larger than the cache are not kept
+        cache["e"] = "e" * 1000
+        self.assertNotIn("e", cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.num_bytes, 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_lru_cache_threads(self):
+        cache = LRUCache(max_bytes=None)
+        cache["a"] = "a"
+        cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(cache.get("a"), "a")
+
+        entry_size = cache.num_bytes
+        cache = LRUCache(max_bytes=4 * entry_size)
+        keys = [str(i) for i in range(10)]
+
+        def lookup(offset):
+            for i in range(1000):
+                key = keys[(i + offset) % len(keys)]
+                value = cache.get(key)
+                if value is None:
+                    cache[key] = key
+                else:
+                    self.assertEqual(value, key)
+
+        threads = [threading.Thread(target=lookup, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.hits + cache.misses, 4000)
+        self.assertLessEqual(cache.num_bytes, 4 * entry_size)
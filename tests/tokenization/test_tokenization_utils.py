@@ -15,6 +15,7 @@
 """
 isort:skip_file
 """
+import json
 import os
 import pickle
 import tempfile
@@ -30,13 +31,25 @@ from transformers import (
     BatchEncoding,
     BertTokenizer,
     BertTokenizerFast,
+    IncrementalDecoder,
     PreTrainedTokenizer,
+    RaggedArray,
+    T5Tokenizer,
     TensorType,
     TokenSpan,
     is_tokenizers_available,
 )
-from transformers.models.gpt2.tokenization_gpt2 import GPT2Tokenizer
-from transformers.testing_utils import CaptureStderr, require_flax, require_tf, require_tokenizers, require_torch, slow
+from transformers.models.gpt2.tokenization_gpt2 import GPT2Tokenizer, bytes_to_unicode
+from transformers.testing_utils import (
+    CaptureStderr,
+    get_tests_dir,
+    require_flax,
+    require_sentencepiece,
+    require_tf,
+    require_tokenizers,
+    require_torch,
+    slow,
+)
 
 
 if is_tokenizers_available():
@@ -285,3 +298,276 @@ class TokenizerUtilsTest(unittest.TestCase):
         with tempfile.TemporaryDirectory() as tmpdirname:
             bert_tokenizer.save(os.path.join(tmpdirname, "tokenizer.json"))
             PreTrainedTokenizerFast(tokenizer_file=os.path.join(tmpdirname, "tokenizer.json"))
+
+    def _get_bert_vocab_file(self, tmpdirname):
+        vocab_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "hello", "world", "the", "low", "##er", "##s"]
+        vocab_tokens += [".", "'", "s"]
+        vocab_file = os.path.join(tmpdirname, "vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+        return vocab_file
+
+    def test_added_tokens_extend_trie(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname), do_lower_case=False)
+        trie = tokenizer.tokens_trie
+        tokenizer.add_tokens(["newtoken"])
+        tokenizer.add_special_tokens({"additional_special_tokens": ["[NEW]"]})
+        self.assertIs(tokenizer.tokens_trie, trie)
+        self.assertListEqual(tokenizer.tokenize("hello[NEW]newtoken world"), ["hello", "[NEW]", "newtoken", "world"])
+
+        # the trie is rebuilt when tokens are removed from it
+        tokenizer.unique_no_split_tokens.remove("newtoken")
+        tokenizer._create_trie(tokenizer.unique_no_split_tokens)
+        self.assertIsNot(tokenizer.tokens_trie, trie)
+        self.assertNotIn("newtoken", tokenizer.tokens_trie)
+        self.assertIn("[NEW]", tokenizer.tokens_trie)
+
+    def _decode_incrementally(self, tokenizer, token_ids, **decode_kwargs):
+        decoder = IncrementalDecoder(tokenizer, **decode_kwargs)
+        texts = [decoder.add(token_id) for token_id in token_ids]
+        texts.append(decoder.flush())
+        return texts
+
+    def test_incremental_decoder(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        token_ids = tokenizer.encode("hello world . the lowers ' s the lower")
+
+        for kwargs in [{}, {"skip_special_tokens": True}, {"clean_up_tokenization_spaces": False}]:
+            with self.subTest(**kwargs):
+                texts = self._decode_incrementally(tokenizer, token_ids, **kwargs)
+                self.assertEqual("".join(texts), tokenizer.decode(token_ids, **kwargs))
+
+        # " '" is only cleaned up once the next token shows whether it is followed by a space
+        decoder = IncrementalDecoder(tokenizer)
+        self.assertEqual(decoder.add(tokenizer.convert_tokens_to_ids(["hello", "world"])), "hello world")
+        self.assertEqual(decoder.add(tokenizer.convert_tokens_to_ids(".")), ".")
+        self.assertEqual(
+            decoder.add(tokenizer.convert_tokens_to_ids(["the", "low", "##er", "##s", "'"])), " the lowers"
+        )
+        self.assertEqual(decoder.add(tokenizer.convert_tokens_to_ids("s")), "'s")
+        self.assertEqual(decoder.flush(), "")
+
+    def test_incremental_decoder_byte_level(self):
+        # one token per byte, so that multi-byte characters are split over several tokens
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            vocab_file = os.path.join(tmpdirname, "vocab.json")
+            merges_file = os.path.join(tmpdirname, "merges.txt")
+            with open(vocab_file, "w", encoding="utf-8") as fp:
+                json.dump({char: i for i, char in enumerate(bytes_to_unicode().values())}, fp)
+            with open(merges_file, "w", encoding="utf-8") as fp:
+                fp.write("#version: 0.2\n")
+            tokenizer = GPT2Tokenizer(vocab_file, merges_file)
+        token_ids = tokenizer.encode("Hello world, 你好 ! I don ' t know")
+
+        texts = self._decode_incrementally(tokenizer, token_ids)
+        self.assertEqual("".join(texts), tokenizer.decode(token_ids))
+        self.assertNotIn("�", texts)
+
+        # text without spaces, like CJK text, and the text up to a line break are not held back
+        text = "你好世界。\n今天天气很好。\n" * 3
+        token_ids = tokenizer.encode(text)
+        texts = self._decode_incrementally(tokenizer, token_ids)
+        self.assertEqual("".join(texts), text)
+        self.assertEqual(texts[-1], "")
+        for i, token_id in enumerate(token_ids):
+            if tokenizer.decode(token_id) == "\n":
+                self.assertEqual("".join(texts[: i + 1]), tokenizer.decode(token_ids[: i + 1]))
+
+    @require_sentencepiece
+    def test_incremental_decoder_sentencepiece(self):
+        tokenizer = T5Tokenizer(get_tests_dir("fixtures/test_sentencepiece.model"))
+        token_ids = tokenizer.encode("This is a test, isn't it? I was born in 92000, and this is falsé.")
+
+        texts = self._decode_incrementally(tokenizer, token_ids)
+        self.assertEqual("".join(texts), tokenizer.decode(token_ids))
+        # the prefix spaces of the words are kept after the first one
+        texts = self._decode_incrementally(tokenizer, token_ids, clean_up_tokenization_spaces=False)
+        self.assertEqual(texts[:3], ["This", " is", " a"])
+        self.assertEqual("".join(texts), tokenizer.decode(token_ids, clean_up_tokenization_spaces=False))
+
+    def _check_encoding_cache(self, tokenizer_class, **kwargs):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = tokenizer_class(self._get_bert_vocab_file(tmpdirname))
+            cached_tokenizer = tokenizer_class(self._get_bert_vocab_file(tmpdirname))
+        cached_tokenizer.enable_encoding_cache()
+        texts = ["hello world", "the lowers", "hello world", "hello the world lower"]
+        pairs = list(zip(texts, reversed(texts)))
+
+        for call_kwargs in [
+            {},
+            {"padding": True, "return_length": True},
+            {"padding": "max_length", "max_length": 8, "truncation": True},
+            {"add_special_tokens": False, "return_special_tokens_mask": True},
+            {"padding": True, "return_tensors": "np", "return_token_type_ids": False, **kwargs},
+        ]:
+            with self.subTest(**call_kwargs):
+                for inputs in [texts, pairs, texts[0]]:
+                    for _ in range(2):
+                        expected = tokenizer(inputs, **call_kwargs)
+                        outputs = cached_tokenizer(inputs, **call_kwargs)
+                        self.assertListEqual(sorted(outputs.keys()), sorted(expected.keys()))
+                        for key in expected:
+                            if isinstance(expected[key], np.ndarray):
+                                self.assertTrue(np.array_equal(outputs[key], expected[key]))
+                            else:
+                                self.assertEqual(outputs[key], expected[key])
+
+        # the texts are encoded once for each set of arguments, the single text being the first of the batch
+        self.assertEqual(cached_tokenizer.encoding_cache.misses, 5 * 7)
+        self.assertEqual(cached_tokenizer.encoding_cache.hits, 5 * 9)
+
+        # the cache is cleared when tokens are added
+        cached_tokenizer.add_tokens(["newtoken"])
+        self.assertEqual(len(cached_tokenizer.encoding_cache), 0)
+        self.assertListEqual(cached_tokenizer("hello newtoken").input_ids, cached_tokenizer.encode("hello newtoken"))
+        cached_tokenizer.disable_encoding_cache()
+        self.assertIsNone(cached_tokenizer.encoding_cache)
+
+    def test_encoding_cache(self):
+        self._check_encoding_cache(BertTokenizer)
+
+    @require_tokenizers
+    def test_encoding_cache_fast(self):
+        self._check_encoding_cache(BertTokenizerFast, return_offsets_mapping=True)
+
+    def test_batch_encode_with_num_proc(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        texts = ["hello world", "the lowers", "hello", "hello the world lower", "world world"]
+        pairs = list(zip(texts, reversed(texts)))
+
+        for kwargs in [{}, {"padding": True}, {"padding": "max_length", "max_length": 8, "truncation": True}]:
+            with self.subTest(**kwargs):
+                self.assertDictEqual(dict(tokenizer(texts, num_proc=2, **kwargs)), dict(tokenizer(texts, **kwargs)))
+                self.assertDictEqual(dict(tokenizer(pairs, num_proc=3, **kwargs)), dict(tokenizer(pairs, **kwargs)))
+
+        # the processes are kept across calls, and restarted once tokens are added
+        tokenizer.add_tokens(["newtoken"])
+        self.assertDictEqual(
+            dict(tokenizer(["newtoken hello", "world"], num_proc=2)), dict(tokenizer(["newtoken hello", "world"]))
+        )
+        tokenizer._close_encoding_pool()
+
+    @require_torch
+    def test_batch_encode_with_num_proc_pt(self):
+        import torch
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        texts = ["hello world", "the lowers", "hello", "hello the world lower"]
+
+        batch = tokenizer(texts, padding=True, return_tensors="pt", num_proc=2)
+        expected = tokenizer(texts, padding=True, return_tensors="pt")
+        self.assertListEqual(sorted(batch.keys()), sorted(expected.keys()))
+        for key in expected:
+            self.assertTrue(isinstance(batch[key], torch.Tensor))
+            self.assertTrue(torch.equal(batch[key], expected[key]))
+        tokenizer._close_encoding_pool()
+
+    @require_tokenizers
+    def test_batch_encode_with_num_proc_fast_raises(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizerFast(self._get_bert_vocab_file(tmpdirname))
+        with self.assertRaises(ValueError):
+            tokenizer(["hello world", "the lowers"], num_proc=2)
+
+    def test_ragged_array(self):
+        array = RaggedArray.from_lists([[1, 2, 3], [], [4], [5, 6]])
+        self.assertEqual(len(array), 4)
+        self.assertListEqual(array.lengths.tolist(), [3, 0, 1, 2])
+        self.assertListEqual(array[0].tolist(), [1, 2, 3])
+        self.assertListEqual(array[-1].tolist(), [5, 6])
+        self.assertListEqual(array[1:].tolist(), [[], [4], [5, 6]])
+        self.assertListEqual(array[::2].tolist(), [[1, 2, 3], [4]])
+        self.assertListEqual(array[[3, 0]].tolist(), [[5, 6], [1, 2, 3]])
+
+        self.assertListEqual(array.to_padded(0).tolist(), [[1, 2, 3], [0, 0, 0], [4, 0, 0], [5, 6, 0]])
+        self.assertListEqual(
+            array.to_padded(-1, length=4, padding_side="left").tolist(),
+            [[-1, 1, 2, 3], [-1, -1, -1, -1], [-1, -1, -1, 4], [-1, -1, 5, 6]],
+        )
+        self.assertListEqual(
+            array.padding_mask(padding_side="left").tolist(), [[1, 1, 1], [0, 0, 0], [0, 0, 1], [0, 1, 1]]
+        )
+        with self.assertRaises(ValueError):
+            array.to_padded(0, length=2)
+
+        # slices share the values of the array
+        self.assertTrue(np.shares_memory(array[2:].values, array.values))
+        array = RaggedArray.from_lists([np.array([1, 2], dtype=np.int32), np.array([3], dtype=np.int32)])
+        self.assertEqual(array.dtype, np.int32)
+
+    def test_pad_columnar_batch_encoding(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        texts = ["hello world", "the lowers", "hello", "hello the world lower"]
+        encoding = tokenizer(texts, return_special_tokens_mask=True)
+        columnar_encoding = tokenizer(texts, return_special_tokens_mask=True).to_columnar()
+        self.assertTrue(isinstance(columnar_encoding["input_ids"], RaggedArray))
+
+        for padding_side in ["right", "left"]:
+            tokenizer.padding_side = padding_side
+            for kwargs in [{}, {"padding": "max_length", "max_length": 10}, {"pad_to_multiple_of": 4}]:
+                with self.subTest(padding_side=padding_side, **kwargs):
+                    expected = tokenizer.pad(encoding, **kwargs)
+                    batch = tokenizer.pad(columnar_encoding, **kwargs)
+                    for key in expected:
+                        self.assertTrue(isinstance(batch[key], np.ndarray))
+                        self.assertListEqual(batch[key].tolist(), expected[key])
+
+                    # examples holding NumPy arrays are padded in the same way
+                    examples = [{key: value[i] for key, value in columnar_encoding.items()} for i in range(len(texts))]
+                    batch = tokenizer.pad(examples, **kwargs)
+                    for key in expected:
+                        self.assertListEqual(batch[key].tolist(), expected[key])
+
+        # without padding, the sequences are returned as lists
+        batch = tokenizer.pad(columnar_encoding, padding=False)
+        self.assertListEqual(batch["input_ids"], encoding["input_ids"])
+
+    @require_torch
+    def test_pad_columnar_batch_encoding_pt(self):
+        import torch
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        texts = ["hello world", "the lowers", "hello"]
+        expected = tokenizer(texts, padding=True, return_tensors="pt")
+        batch = tokenizer.pad(tokenizer(texts).to_columnar(), return_tensors="pt")
+        for key in expected:
+            self.assertTrue(torch.equal(batch[key], expected[key]))
+
+        with self.assertRaises(ValueError):
+            tokenizer(texts).to_columnar().convert_to_tensors("pt")
+
+    def test_pad_lists_dtype(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        encoding = tokenizer(["hello world", "the lowers", "hello"])
+
+        # the padded arrays have the type of the arrays built from lists of Python integers
+        batch = tokenizer.pad(encoding, return_tensors="np")
+        for key in batch:
+            self.assertEqual(batch[key].dtype, np.asarray(encoding[key][0]).dtype)
+
+    @require_torch
+    def test_pad_lists_dtype_pt(self):
+        import torch
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        batch = tokenizer.pad(tokenizer(["hello world", "the lowers", "hello"]), return_tensors="pt")
+        for key in batch:
+            self.assertEqual(batch[key].dtype, torch.int64)
+
+    @require_tf
+    def test_pad_lists_dtype_tf(self):
+        import tensorflow as tf
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            tokenizer = BertTokenizer(self._get_bert_vocab_file(tmpdirname))
+        batch = tokenizer.pad(tokenizer(["hello world", "the lowers", "hello"]), return_tensors="tf")
+        for key in batch:
+            self.assertEqual(batch[key].dtype, tf.int32)
@@ -20,11 +20,13 @@ import unittest
 import numpy as np
 
 from transformers import (
+    BatchEncoding,
     BertTokenizer,
     DataCollatorForLanguageModeling,
     DataCollatorForPermutationLanguageModeling,
     DataCollatorForTokenClassification,
     DataCollatorForWholeWordMask,
+    DataCollatorWithPacking,
     DataCollatorWithPadding,
     default_data_collator,
     is_tf_available,
@@ -123,6 +125,69 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         batch = data_collator(features)
         self.assertEqual(batch["input_ids"].shape, torch.Size([2, 8]))
 
+    def test_data_collator_with_padding_columnar(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        encoding = BatchEncoding({"input_ids": [[0, 1, 2], [0, 1, 2, 3, 4, 5]], "label": [0, 1]}).to_columnar()
+        data_collator = DataCollatorWithPadding(tokenizer)
+
+        batch = data_collator(encoding)
+        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["input_ids"][0].tolist(), [0, 1, 2] + [tokenizer.pad_token_id] * 3)
+        self.assertEqual(batch["attention_mask"][0].tolist(), [1, 1, 1, 0, 0, 0])
+        self.assertEqual(batch["labels"].tolist(), [0, 1])
+
+        # examples viewing the columnar batch
+        features = [{key: value[i] for key, value in encoding.items()} for i in range(2)]
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["labels"].tolist(), [0, 1])
+
+    def test_data_collator_with_packing(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [{"input_ids": [0, 1, 2]}, {"input_ids": [3, 4, 5, 6, 7]}, {"input_ids": [8, 9]}]
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=6)
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        pad = tokenizer.pad_token_id
+        self.assertEqual(batch["input_ids"].tolist(), [[3, 4, 5, 6, 7, pad], [0, 1, 2, 8, 9, pad]])
+        self.assertEqual(batch["attention_mask"].tolist(), [[1, 1, 1, 1, 1, 0], [1, 1, 1, 1, 1, 0]])
+        self.assertEqual(batch["document_ids"].tolist(), [[1, 1, 1, 1, 1, 0], [1, 1, 1, 2, 2, 0]])
+        self.assertEqual(batch["position_ids"].tolist(), [[0, 1, 2, 3, 4, 0], [0, 1, 2, 0, 1, 0]])
+        self.assertEqual(batch["labels"].tolist(), [[-100, 4, 5, 6, 7, -100], [-100, 1, 2, -100, 9, -100]])
+
+        # the first label is only ignored for next-token labels
+        token_features = [dict(feature, labels=[label % 2 for label in feature["input_ids"]]) for feature in features]
+        batch = data_collator(token_features)
+        self.assertEqual(batch["labels"].tolist(), [[1, 0, 1, 0, 1, -100], [0, 1, 0, 0, 1, -100]])
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=6, mask_first_label=True)
+        batch = data_collator(token_features)
+        self.assertEqual(batch["labels"].tolist(), [[-100, 0, 1, 0, 1, -100], [-100, 1, 0, -100, 1, -100]])
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=6, mask_first_label=False)
+        batch = data_collator(features)
+        self.assertEqual(batch["labels"].tolist(), [[3, 4, 5, 6, 7, -100], [0, 1, 2, 8, 9, -100]])
+
+        # one label per example, as for sequence classification, cannot be packed
+        for name in ["label", "labels"]:
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                data_collator([dict(feature, **{name: 1}) for feature in features])
+
+        # sequence-to-sequence examples are packed on both sides
+        features = [
+            {"input_ids": [0, 1, 2], "labels": [1, 2]},
+            {"input_ids": [3, 4, 5, 6, 7], "labels": [3]},
+            {"input_ids": [8, 9], "labels": [4, 5, 6]},
+        ]
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=6, max_target_length=4)
+        batch = data_collator(features)
+        self.assertEqual(
+            batch["input_ids"].tolist(),
+            [[3, 4, 5, 6, 7, pad], [0, 1, 2, pad, pad, pad], [8, 9, pad, pad, pad, pad]],
+        )
+        self.assertEqual(batch["labels"].tolist(), [[3, -100, -100, -100], [1, 2, -100, -100], [4, 5, 6, -100]])
+        self.assertEqual(batch["decoder_document_ids"].tolist(), [[1, 0, 0, 0], [1, 1, 0, 0], [1, 1, 1, 0]])
+        self.assertNotIn("position_ids", batch)
+
     def test_data_collator_for_token_classification(self):
         tokenizer = BertTokenizer(self.vocab_file)
         features = [
@@ -235,6 +300,32 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
         self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
 
+    def test_data_collator_for_whole_word_mask_masks_whole_words(self):
+        vocab_file = os.path.join(self.tmpdirname, "wwm_vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"]]))
+            vocab_writer.write("".join([x + "\n" for x in ["a", "##b", "##c", "d", "##e"]]))
+        tokenizer = BertTokenizer(vocab_file)
+
+        # Words are [a ##b ##c] and [d ##e], and 3 tokens out of 7 are masked: only one of the words fits
+        features = [{"input_ids": [1, 5, 6, 7, 8, 9, 2]}, {"input_ids": [1, 5, 6, 7, 2]}]
+        data_collator = DataCollatorForWholeWordMask(tokenizer, mlm_probability=0.4, return_tensors="pt")
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2, 3], [4, 5]])
+            # The only word of the second sequence has 3 tokens, more than the 5 * 0.4 = 2 tokens to mask
+            self.assertTrue(all(label == -100 for label in batch["labels"].tolist()[1]))
+
+        # With Chinese references, the tokens at the given positions are sub-words
+        features = [{"input_ids": [1, 5, 8, 5, 8, 9, 2], "chinese_ref": [2, 4]}]
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2], [3, 4, 5]])
+
     def test_plm(self):
         tokenizer = BertTokenizer(self.vocab_file)
         no_pad_features = [{"input_ids": list(range(10))}, {"input_ids": list(range(10))}]
@@ -517,6 +608,32 @@ class TFDataCollatorIntegrationTest(unittest.TestCase):
         self.assertEqual(batch["input_ids"].shape.as_list(), [2, 10])
         self.assertEqual(batch["labels"].shape.as_list(), [2, 10])
 
+    def test_data_collator_for_whole_word_mask_masks_whole_words(self):
+        vocab_file = os.path.join(self.tmpdirname, "wwm_vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"]]))
+            vocab_writer.write("".join([x + "\n" for x in ["a", "##b", "##c", "d", "##e"]]))
+        tokenizer = BertTokenizer(vocab_file)
+
+        # Words are [a ##b ##c] and [d ##e], and 3 tokens out of 7 are masked: only one of the words fits
+        features = [{"input_ids": [1, 5, 6, 7, 8, 9, 2]}, {"input_ids": [1, 5, 6, 7, 2]}]
+        data_collator = DataCollatorForWholeWordMask(tokenizer, mlm_probability=0.4, return_tensors="tf")
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].numpy().tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2, 3], [4, 5]])
+            # The only word of the second sequence has 3 tokens, more than the 5 * 0.4 = 2 tokens to mask
+            self.assertTrue(all(label == -100 for label in batch["labels"].numpy().tolist()[1]))
+
+        # With Chinese references, the tokens at the given positions are sub-words
+        features = [{"input_ids": [1, 5, 8, 5, 8, 9, 2], "chinese_ref": [2, 4]}]
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].numpy().tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2], [3, 4, 5]])
+
     def test_plm(self):
         tokenizer = BertTokenizer(self.vocab_file)
         no_pad_features = [{"input_ids": list(range(10))}, {"input_ids": list(range(10))}]
@@ -673,6 +790,21 @@ class NumpyDataCollatorIntegrationTest(unittest.TestCase):
         batch = data_collator(features)
         self.assertEqual(batch["input_ids"].shape, (2, 8))
 
+    def test_data_collator_with_packing(self):
+        tokenizer = BertTokenizer(self.vocab_file)
+        features = [{"input_ids": [0, 1, 2]}, {"input_ids": [3, 4, 5, 6, 7]}, {"input_ids": [8, 9]}]
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=6, return_tensors="np")
+        batch = data_collator(features)
+        self.assertEqual(batch["input_ids"].shape, (2, 6))
+        self.assertEqual(batch["document_ids"].tolist(), [[1, 1, 1, 1, 1, 0], [1, 1, 1, 2, 2, 0]])
+        self.assertEqual(batch["position_ids"].tolist(), [[0, 1, 2, 3, 4, 0], [0, 1, 2, 0, 1, 0]])
+
+        data_collator = DataCollatorWithPacking(tokenizer, max_length=4, return_tensors="np")
+        batch = data_collator(features)
+        pad = tokenizer.pad_token_id
+        self.assertEqual(batch["input_ids"].tolist(), [[3, 4, 5, 6], [0, 1, 2, pad], [8, 9, pad, pad]])
+
     def test_data_collator_for_token_classification(self):
         tokenizer = BertTokenizer(self.vocab_file)
         features = [
@@ -789,6 +921,32 @@ class NumpyDataCollatorIntegrationTest(unittest.TestCase):
         self.assertEqual(batch["input_ids"].shape, (2, 10))
         self.assertEqual(batch["labels"].shape, (2, 10))
 
+    def test_data_collator_for_whole_word_mask_masks_whole_words(self):
+        vocab_file = os.path.join(self.tmpdirname, "wwm_vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("".join([x + "\n" for x in ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"]]))
+            vocab_writer.write("".join([x + "\n" for x in ["a", "##b", "##c", "d", "##e"]]))
+        tokenizer = BertTokenizer(vocab_file)
+
+        # Words are [a ##b ##c] and [d ##e], and 3 tokens out of 7 are masked: only one of the words fits
+        features = [{"input_ids": [1, 5, 6, 7, 8, 9, 2]}, {"input_ids": [1, 5, 6, 7, 2]}]
+        data_collator = DataCollatorForWholeWordMask(tokenizer, mlm_probability=0.4, return_tensors="np")
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2, 3], [4, 5]])
+            # The only word of the second sequence has 3 tokens, more than the 5 * 0.4 = 2 tokens to mask
+            self.assertTrue(all(label == -100 for label in batch["labels"].tolist()[1]))
+
+        # With Chinese references, the tokens at the given positions are sub-words
+        features = [{"input_ids": [1, 5, 8, 5, 8, 9, 2], "chinese_ref": [2, 4]}]
+        for seed in range(10):
+            set_seed(seed)
+            batch = data_collator(features)
+            masked = [i for i, label in enumerate(batch["labels"].tolist()[0]) if label != -100]
+            self.assertIn(masked, [[1, 2], [3, 4, 5]])
+
     def test_plm(self):
         tokenizer = BertTokenizer(self.vocab_file)
         no_pad_features = [{"input_ids": list(range(10))}, {"input_ids": list(range(10))}]
@@ -0,0 +1,115 @@
+# coding=utf-8
+# Copyright 2022 the HuggingFace Inc. team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from transformers import GPT2Tokenizer
+from transformers.testing_utils import get_tests_dir, require_torch
+from transformers.utils import is_torch_available
+
+
+if is_torch_available():
+    import torch
+
+    from transformers import (
+        LineByLineTextDataset,
+        LineByLineWithSOPTextDataset,
+        TextDataset,
+        TextDatasetForNextSentencePrediction,
+    )
+
+
+PATH_SAMPLE_TEXT = f"{get_tests_dir()}/fixtures/sample_text.txt"
+
+
+@require_torch
+class LanguageModelingDatasetsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tokenizer = GPT2Tokenizer(
+            f"{get_tests_dir()}/fixtures/vocab.json", f"{get_tests_dir()}/fixtures/merges.txt"
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_text_dataset_cache(self):
+        dataset = TextDataset(self.tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16, cache_dir=self.tmp_dir)
+        cached_dataset = TextDataset(self.tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16, cache_dir=self.tmp_dir)
+        self.assertIsInstance(cached_dataset.examples.values, np.memmap)
+        self.assertEqual(cached_dataset.examples.dtype, np.uint16)
+        self.assertEqual(len(dataset), len(cached_dataset))
+        for i in range(len(dataset)):
+            self.assertEqual(dataset[i].tolist(), cached_dataset[i].tolist())
+            self.assertEqual(dataset[i].dtype, torch.long)
+
+        dataset = LineByLineTextDataset(self.tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16)
+        cached_dataset = LineByLineTextDataset(
+            self.tokenizer, file_path=PATH_SAMPLE_TEXT, block_size=16, cache_dir=self.tmp_dir, num_proc=2
+        )
+        self.assertEqual(len(dataset), 31)
+        self.assertEqual(len(cached_dataset), 31)
+        for i in range(len(dataset)):
+            self.assertEqual(dataset[i]["input_ids"].tolist(), cached_dataset[i]["input_ids"].tolist())
+
+    def test_text_dataset_parallel(self):
+        # byte-level BPE merges consecutive line breaks and spaces into tokens
+        vocab = ["<|endoftext|>", "\u010a", "\u010a\u010a", "\u0120", "\u0120\u0120"] + list("delnortw")
+        with open(os.path.join(self.tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump({token: i for i, token in enumerate(vocab)}, f)
+        with open(os.path.join(self.tmp_dir, "merges.txt"), "w", encoding="utf-8") as f:
+            f.write("#version: 0.2\n\u010a \u010a\n\u0120 \u0120\n")
+        tokenizer = GPT2Tokenizer(os.path.join(self.tmp_dir, "vocab.json"), os.path.join(self.tmp_dir, "merges.txt"))
+        file_path = os.path.join(self.tmp_dir, "text.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("hello world\n\n\nlower newer\n  the wider\nhello\n\nnew lower\n" * 3)
+
+        for path in [PATH_SAMPLE_TEXT, file_path]:
+            dataset = TextDataset(tokenizer, file_path=path, block_size=4, cache_dir=self.tmp_dir)
+            for num_proc in [2, 3, 5]:
+                with self.subTest(path=path, num_proc=num_proc):
+                    cache_dir = os.path.join(self.tmp_dir, str(num_proc))
+                    parallel_dataset = TextDataset(
+                        tokenizer, file_path=path, block_size=4, cache_dir=cache_dir, num_proc=num_proc
+                    )
+                    self.assertEqual(len(dataset), len(parallel_dataset))
+                    for i in range(len(dataset)):
+                        self.assertEqual(dataset[i].tolist(), parallel_dataset[i].tolist())
+
+    def test_sentence_pair_datasets_examples(self):
+        file_path = os.path.join(self.tmp_dir, "sample_text.txt")
+        shutil.copy(PATH_SAMPLE_TEXT, file_path)
+        dataset = TextDatasetForNextSentencePrediction(self.tokenizer, file_path=file_path, block_size=16)
+        self.assertGreater(len(dataset.documents), 1)
+        self.assertEqual(len(dataset.examples), len(dataset))
+        self.assertEqual(dataset.examples[0].keys(), dataset[0].keys())
+        for name, value in dataset.examples[-1].items():
+            self.assertEqual(value.tolist(), dataset[len(dataset) - 1][name].tolist())
+
+        file_dir = os.path.join(self.tmp_dir, "wiki")
+        os.makedirs(file_dir)
+        with open(os.path.join(file_dir, "wiki_1"), "w", encoding="utf-8") as f:
+            f.write('<doc id="1">\nTitle\nhello world\nlower newer\nthe wider\n</doc>\n')
+        dataset = LineByLineWithSOPTextDataset(self.tokenizer, file_dir=file_dir, block_size=16)
+        self.assertEqual(len(dataset.examples), len(dataset))
+        self.assertEqual(len(dataset.examples[:1]), 1)
+        for name, value in dataset.examples[0].items():
+            self.assertEqual(value.tolist(), dataset[0][name].tolist())
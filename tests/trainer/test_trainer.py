@@ -720,6 +720,28 @@ class TrainerIntegrationTest(TestCasePlus, TrainerIntegrationCommon):
         new_eval_dataset = RegressionDataset(length=128)
         self.assertEqual(len(trainer.get_eval_dataloader(new_eval_dataset)), 128 // (32 * n_gpu))
 
+    def test_max_tokens_per_batch(self):
+        config = GPT2Config(vocab_size=100, n_positions=128, n_embd=32, n_layer=3, n_head=4)
+        tiny_gpt2 = GPT2LMHeadModel(config)
+        lengths = torch.randint(4, 32, (64,)).tolist()
+        train_dataset = [{"input_ids": torch.randint(0, 100, (length,)).tolist()} for length in lengths]
+
+        def data_collator(features):
+            input_ids = [torch.tensor(feature["input_ids"]) for feature in features]
+            input_ids = nn.utils.rnn.pad_sequence(input_ids, batch_first=True)
+            return {"input_ids": input_ids, "labels": input_ids}
+
+        args = TrainingArguments("./test", max_tokens_per_batch=128, num_train_epochs=2, report_to=[])
+        trainer = Trainer(tiny_gpt2, args, train_dataset=train_dataset, data_collator=data_collator)
+        train_dataloader = trainer.get_train_dataloader()
+        batches = list(train_dataloader)
+        for batch in batches:
+            self.assertLessEqual(batch["input_ids"].numel(), 128)
+        self.assertEqual(sum(len(batch["input_ids"]) for batch in batches), 64)
+
+        train_output = trainer.train()
+        self.assertEqual(train_output.global_step, 2 * len(train_dataloader))
+
     # tests that we do not require dataloader to have a .dataset attribute
     def test_dataloader_without_dataset(self):
         train_dataset = RegressionDataset(length=128)
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import copy
+import math
 import unittest
 
 import numpy as np
@@ -40,7 +41,9 @@ if is_torch_available():
         LengthGroupedSampler,
         SequentialDistributedSampler,
         ShardSampler,
+        TokenBudgetBatchSampler,
         get_parameter_names,
+        get_token_budget_batches,
         numpy_pad_and_concatenate,
         torch_pad_and_concatenate,
     )
@@ -234,6 +237,73 @@ class TrainerUtilsTest(unittest.TestCase):
         # The indices should be a permutation of range(100)
         self.assertEqual(list(sorted(indices_process_0 + indices_process_1)), list(range(100)))
 
+    def test_token_budget_batches(self):
+        # Get some inputs of random lengths
+        lengths = torch.randint(1, 25, (100,)).tolist()
+        # Put one bigger than the budget to check it ends up alone in the first batch
+        lengths[32] = 80
+
+        batches = get_token_budget_batches(lengths, max_tokens=64)
+        # The batch with the most tokens should be first
+        self.assertEqual(batches[0], [32])
+        # Every other batch fits in the budget once padded to its longest element
+        for batch in batches[1:]:
+            self.assertLessEqual(max(lengths[i] for i in batch) * len(batch), 64)
+        # The indices should be a permutation of range(100)
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(100)))
+
+        batches = get_token_budget_batches(lengths, max_tokens=64, pad_to_multiple_of=8)
+        for batch in batches[1:]:
+            self.assertLessEqual(math.ceil(max(lengths[i] for i in batch) / 8) * 8 * len(batch), 64)
+
+    def test_token_budget_batch_sampler(self):
+        lengths = torch.randint(1, 25, (100,)).tolist()
+
+        sampler = TokenBudgetBatchSampler(64, lengths=lengths)
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(100)))
+
+        # A new epoch changes the batches, but not their sizes
+        sampler.set_epoch(1)
+        new_batches = list(sampler)
+        self.assertNotEqual(new_batches, batches)
+        self.assertEqual(sorted(len(batch) for batch in new_batches), sorted(len(batch) for batch in batches))
+
+        # Creating a sampler leaves the global random state untouched
+        state = torch.random.get_rng_state()
+        TokenBudgetBatchSampler(64, lengths=lengths)
+        self.assertTrue(torch.equal(torch.random.get_rng_state(), state))
+
+    def test_token_budget_batch_sampler_with_dict(self):
+        data = [{"input_ids": list(range(length))} for length in [3, 5, 2, 7, 4, 6]]
+
+        batches = list(TokenBudgetBatchSampler(10, dataset=data))
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(6)))
+        for batch in batches:
+            self.assertLessEqual(max(len(data[i]["input_ids"]) for i in batch) * len(batch), 10)
+
+    def test_distributed_token_budget_batch_sampler(self):
+        lengths = torch.randint(1, 25, (100,)).tolist()
+
+        for drop_last in [False, True]:
+            samplers = [
+                TokenBudgetBatchSampler(64, lengths=lengths, num_replicas=3, rank=rank, drop_last=drop_last)
+                for rank in range(3)
+            ]
+            batches = [list(sampler) for sampler in samplers]
+            num_batches = len(get_token_budget_batches(lengths, 64))
+            # All processes get the same number of batches
+            for process_batches in batches:
+                self.assertEqual(len(process_batches), len(samplers[0]))
+            if drop_last:
+                self.assertEqual(len(samplers[0]), num_batches // 3)
+            else:
+                self.assertEqual(len(samplers[0]), math.ceil(num_batches / 3))
+                # The processes cover the whole dataset
+                indices = {i for process_batches in batches for batch in process_batches for i in batch}
+                self.assertEqual(indices, set(range(100)))
+
     def test_get_parameter_names(self):
         model = nn.Sequential(TstLayer(128), nn.ModuleList([TstLayer(128), TstLayer(128)]))
         # fmt: off
@@ -16,9 +16,16 @@ import contextlib
 import importlib
 import io
 import json
+import os
+import shutil
 import tempfile
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from unittest import mock
+
+from tqdm import tqdm
 
 import transformers
 
@@ -43,7 +50,9 @@ from transformers.utils import (
     is_flax_available,
     is_tf_available,
     is_torch_available,
+    url_to_filename,
 )
+from transformers.utils.hub import get_checkpoint_shard_files, get_manifest_entry
 
 
 MODEL_ID = DUMMY_UNKNOWN_IDENTIFIER
@@ -170,6 +179,227 @@ class GetFromCacheTests(unittest.TestCase):
             self.assertIsNone(get_file_from_repo(tmp_dir, "b.txt"))
 
 
+class _HubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the `files` of the server, with an ETag and support for range requests if `accept_ranges` is set, and the
+    list of files of a repo revision like the Hub API.
+    """
+
+    def do_HEAD(self):
+        self._send(with_body=False)
+
+    def do_GET(self):
+        self._send(with_body=True)
+
+    def _send(self, with_body):
+        if self.path.startswith("/api/models/"):
+            self.server.requests.append((self.command, self.path, None))
+            model_id, revision = self.path.split("?")[0][len("/api/models/") :].split("/revision/")
+            prefix = f"/{model_id}/resolve/{revision}/"
+            siblings = [
+                {"rfilename": path[len(prefix) :], "blobId": str(hash(content)), "size": len(content)}
+                for path, content in self.server.files.items()
+                if path.startswith(prefix)
+            ]
+            body = json.dumps({"siblings": siblings}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.send_header("X-Error-Code", "EntryNotFound")
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range") if self.server.accept_ranges else None
+        self.server.requests.append((self.command, self.path, range_header))
+        start, end = 0, len(content)
+        if range_header is not None:
+            start, end = range_header[len("bytes=") :].split("-")
+            start, end = int(start), int(end) + 1 if end else len(content)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(content)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", f'"{hash(content)}"')
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(content[start:end])
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerDownloadTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _HubRequestHandler)
+        self.server.files = {}
+        self.server.requests = []
+        self.server.accept_ranges = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.mirror = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def add_file(self, filename, size, prefix="/org/model/"):
+        content = os.urandom(size)
+        self.server.files[f"{prefix}{filename}"] = content
+        return content
+
+    def get_ranges(self, filename):
+        return [r for method, path, r in self.server.requests if method == "GET" and path.endswith(filename)]
+
+    def test_get_checkpoint_shard_files(self):
+        shards = {
+            f"pytorch_model-0000{i}-of-00003.bin": self.add_file(f"pytorch_model-0000{i}-of-00003.bin", 2500)
+            for i in range(1, 4)
+        }
+        index_file = os.path.join(self.cache_dir, "index.json")
+        with open(index_file, "w") as f:
+            json.dump({"metadata": {}, "weight_map": {str(i): shard for i, shard in enumerate(shards)}}, f)
+
+        with mock.patch("transformers.utils.hub.DOWNLOAD_CHUNK_SIZE", 1000):
+            cached_files, _ = get_checkpoint_shard_files(
+                "org/model", index_file, cache_dir=self.cache_dir, mirror=self.mirror
+            )
+
+        for cached_file, (shard, content) in zip(cached_files, shards.items()):
+            with open(cached_file, "rb") as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(
+                filename_to_url(cached_file, cache_dir=self.cache_dir)[0], f"{self.mirror}/org/model/{shard}"
+            )
+            self.assertListEqual(sorted(self.get_ranges(shard)), ["bytes=0-999", "bytes=1000-1999", "bytes=2000-2499"])
+        # Only the cached files, their metadata and locks are left.
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3 * 3 + 1)
+
+        # A second call uses the cache.
+        self.server.requests.clear()
+        cached_files_again, _ = get_checkpoint_shard_files(
+            "org/model", index_file, cache_dir=self.cache_dir, mirror=self.mirror
+        )
+        self.assertListEqual(cached_files_again, cached_files)
+        self.assertListEqual([method for method, _, _ in self.server.requests], ["HEAD"] * 3)
+
+    def test_resume_chunked_download(self):
+        content = self.add_file(WEIGHTS_NAME, 2500)
+        url = f"{self.mirror}/org/model/{WEIGHTS_NAME}"
+
+        # An interrupted download which received the first chunk and part of the second one.
+        incomplete_file = os.path.join(self.cache_dir, url_to_filename(url, f'"{hash(content)}"') + ".incomplete")
+        with open(incomplete_file, "wb") as f:
+            f.write(content[:1300])
+        with open(incomplete_file + ".json", "w") as f:
+            json.dump({"size": 2500, "chunk_size": 1000, "received": [1000, 300, 0]}, f)
+
+        with mock.patch("transformers.utils.hub.DOWNLOAD_CHUNK_SIZE", 1000):
+            cached_file = get_from_cache(url, cache_dir=self.cache_dir, resume_download=True)
+
+        with open(cached_file, "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertListEqual(sorted(self.get_ranges(WEIGHTS_NAME)), ["bytes=1300-1999", "bytes=2000-2499"])
+        self.assertFalse(os.path.exists(incomplete_file))
+        self.assertFalse(os.path.exists(incomplete_file + ".json"))
+
+    def test_download_without_range_requests(self):
+        self.server.accept_ranges = False
+        content = self.add_file(WEIGHTS_NAME, 2500)
+
+        with mock.patch("transformers.utils.hub.DOWNLOAD_CHUNK_SIZE", 1000):
+            cached_file = get_from_cache(f"{self.mirror}/org/model/{WEIGHTS_NAME}", cache_dir=self.cache_dir)
+
+        with open(cached_file, "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(any(f.endswith(".incomplete") for f in os.listdir(self.cache_dir)))
+
+        # The file is only counted once in a shared progress bar.
+        other_cache_dir = os.path.join(self.cache_dir, "other")
+        with tqdm(total=0, file=io.StringIO()) as progress_bar:
+            with mock.patch("transformers.utils.hub.DOWNLOAD_CHUNK_SIZE", 1000):
+                get_from_cache(
+                    f"{self.mirror}/org/model/{WEIGHTS_NAME}", cache_dir=other_cache_dir, progress_bar=progress_bar
+                )
+            self.assertEqual((progress_bar.total, progress_bar.n), (2500, 2500))
+
+    def test_manifest_cache(self):
+        config = self.add_file(CONFIG_NAME, 100, prefix="/org/model/resolve/main/")
+        weights = self.add_file(WEIGHTS_NAME, 1000, prefix="/org/model/resolve/main/")
+        url_prefix = f"{self.mirror}/org/model/resolve/main/"
+
+        with mock.patch("transformers.utils.hub.HUGGINGFACE_CO_RESOLVE_ENDPOINT", self.mirror):
+            # Without manifest, each file is checked with a HEAD request.
+            config_file = get_from_cache(url_prefix + CONFIG_NAME, cache_dir=self.cache_dir)
+            self.assertListEqual([method for method, _, _ in self.server.requests], ["HEAD", "GET"])
+
+            with mock.patch("transformers.utils.hub.MANIFEST_TTL", 3600):
+                # The list of files of the revision is fetched once, and gives the same cache files.
+                self.server.requests.clear()
+                self.assertEqual(get_from_cache(url_prefix + CONFIG_NAME, cache_dir=self.cache_dir), config_file)
+                weights_file = get_from_cache(url_prefix + WEIGHTS_NAME, cache_dir=self.cache_dir)
+                self.assertListEqual(
+                    [(method, path.split("?")[0]) for method, path, _ in self.server.requests],
+                    [
+                        ("GET", "/api/models/org/model/revision/main"),
+                        ("GET", f"/org/model/resolve/main/{WEIGHTS_NAME}"),
+                    ],
+                )
+                for cached_file, content in [(config_file, config), (weights_file, weights)]:
+                    with open(cached_file, "rb") as f:
+                        self.assertEqual(f.read(), content)
+
+                # Then, no request is needed, even for files missing from the revision.
+                self.server.requests.clear()
+                self.assertEqual(get_from_cache(url_prefix + WEIGHTS_NAME, cache_dir=self.cache_dir), weights_file)
+                with self.assertRaises(EntryNotFoundError):
+                    get_from_cache(url_prefix + "missing.bin", cache_dir=self.cache_dir)
+                self.assertListEqual(self.server.requests, [])
+
+            # An expired manifest is fetched again.
+            self.assertEqual(
+                get_manifest_entry(url_prefix + CONFIG_NAME, cache_dir=self.cache_dir, ttl=0),
+                (f'"{hash(config)}"', 100),
+            )
+            self.assertEqual(len(self.server.requests), 1)
+
+    def test_manifest_revision_with_slash(self):
+        contents = {
+            revision: self.add_file(CONFIG_NAME, 100, prefix=f"/org/model/resolve/{revision}/")
+            for revision in ["refs/pr/1", "v1/beta"]
+        }
+        subfolder_config = self.add_file(CONFIG_NAME, 100, prefix="/org/model/resolve/main/sub/")
+
+        with mock.patch("transformers.utils.hub.HUGGINGFACE_CO_RESOLVE_ENDPOINT", self.mirror):
+            with mock.patch("transformers.utils.hub.MANIFEST_TTL", 3600):
+                # Revisions containing a `/` fall back to a HEAD request per file, with or without their name.
+                for revision, content in contents.items():
+                    url = f"{self.mirror}/org/model/resolve/{revision}/{CONFIG_NAME}"
+                    self.assertIsNone(get_manifest_entry(url, cache_dir=self.cache_dir))
+                    self.assertIsNone(get_manifest_entry(url, cache_dir=self.cache_dir, revision=revision))
+                    self.server.requests.clear()
+                    cached_file = get_from_cache(url, cache_dir=self.cache_dir, revision=revision)
+                    self.assertListEqual([method for method, _, _ in self.server.requests], ["HEAD", "GET"])
+                    with open(cached_file, "rb") as f:
+                        self.assertEqual(f.read(), content)
+
+                # A file in a subfolder is only looked up in the manifest when its revision is known.
+                url = f"{self.mirror}/org/model/resolve/main/sub/{CONFIG_NAME}"
+                self.server.requests.clear()
+                self.assertIsNone(get_manifest_entry(url, cache_dir=self.cache_dir))
+                self.assertListEqual(self.server.requests, [])
+                self.assertEqual(
+                    get_manifest_entry(url, cache_dir=self.cache_dir, revision="main"),
+                    (f'"{hash(subfolder_config)}"', 100),
+                )
+
+
 class GenericUtilTests(unittest.TestCase):
     @unittest.mock.patch("sys.stdout", new_callable=io.StringIO)
     def test_context_managers_no_context(self, mock_stdout):